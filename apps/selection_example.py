@@ -7,15 +7,21 @@ import numpy
 from OpenGL.GL import *
 from OpenGL.GLU import *
 
-from graphics.core import Transform
+from graphics.core import Camera
 from graphics.opengl import SimpleViewer
 from graphics.opengl import Shader
+from graphics.opengl import UniformBuffer
+from graphics.opengl import gl_state
+from graphics.opengl import IdMap, PickingService
+from graphics.opengl import StreamBuffer
 
 render_vtx_shader = """
 #version 150
  
-uniform mat4 modelview;
-uniform mat4 projection;
+layout(std140) uniform Camera {
+    mat4 modelview;
+    mat4 projection;
+};
  
 in vec3 position;
 in vec3 color;
@@ -42,8 +48,10 @@ void main(){
 select_vtx_shader = """
 #version 150
 
-uniform mat4 modelview;
-uniform mat4 projection;
+layout(std140) uniform Camera {
+    mat4 modelview;
+    mat4 projection;
+};
 
 in vec3 position;
 in float id;
@@ -80,76 +88,95 @@ state.width  = 800
 state.height = 600
 state.aspect = state.width/state.height
 state.mouse  = (0,0)
+state.view   = Camera( eye=(4.0,4.0,4.0), fov=45.0, aspect=state.aspect, near=0.1, far=10.0 )
 
 def resize_cb( w, h ):
     state.width = w
     state.height = h
     state.aspect = w/h
-    glViewport( 0, 0, state.width, state.height )
+    state.view.aspect = state.aspect
+    gl_state.viewport( 0, 0, state.width, state.height )
+    if hasattr( state, 'picker' ):
+        state.picker.resize( w, h )
+
+def static_attribute( vao, location, data ):
+    """Uploads (N,components) data once and points attribute location of vao at it"""
+    data = numpy.ascontiguousarray( data, dtype=numpy.float32 )
+    buffer = glGenBuffers(1)
+    gl_state.bind_vertex_array( vao )
+    gl_state.bind_buffer( GL_ARRAY_BUFFER, buffer )
+    glBufferData( GL_ARRAY_BUFFER, data.nbytes, data, GL_STATIC_DRAW )
+    glVertexAttribPointer( location, data.shape[1], GL_FLOAT, GL_FALSE, 0, None )
+    gl_state.enable_vertex_attrib_array( location )
+    return buffer
 
 def initialize_cb():
-    glEnable(GL_DEPTH_TEST)
+    gl_state.enable(GL_DEPTH_TEST)
     glClearColor( 0.7, 0.7, 1.0, 0.0 )
 
-    state.vao = glGenVertexArrays(1)
-    glBindVertexArray( state.vao )
-
     state.positions = numpy.random.standard_normal( size=(5000,3) )
     state.colors    = numpy.random.uniform( size=state.positions.shape )
     state.ids       = numpy.random.randint( low=1, high=2**24-1, size=state.positions.shape[0] )
-    state.id_map = { v: k for k,v in enumerate( state.ids ) }
+    state.id_map    = IdMap( state.ids )
+    state.picker    = PickingService( state.width, state.height )
+
+    # colours are streamed, only rows whose highlight changes are re-sent
+    state.color_stream = StreamBuffer( state.colors )
+    state.selected     = -1
 
     # the rendering shader
     state.render_shader = Shader( render_vtx_shader, render_frg_shader )
     state.select_shader = Shader( select_vtx_shader, select_frg_shader )
 
+    # camera matrices shared by both shaders through a uniform block
+    state.camera = UniformBuffer( 'Camera', [('modelview','mat4'),('projection','mat4')] )
+
+    # positions and ids never change, they are uploaded once and each pass
+    # only binds its vertex array, ids up to 2**24 are exact as floats
+    state.render_vao, state.select_vao = glGenVertexArrays(2)
+    static_attribute( state.render_vao, state.render_shader.attribute_location('position'), state.positions )
+    static_attribute( state.select_vao, state.select_shader.attribute_location('position'), state.positions )
+    static_attribute( state.select_vao, state.select_shader.attribute_location('id'), state.ids[:,None] )
+
 def mouse_move_cb( evt ):
     state.mouse = ( evt.x(), state.height-evt.y() )
+    state.picker.request( *state.mouse )
 
-def render_cb():
-    # camera stuff
-    projection = Transform().perspective( 45.0, state.aspect, 0.1, 10.0 )
-    modelview = Transform().lookat(4.0,4.0,4.0,0.0,0.0,0.0,0.0,1.0,0.0)
-
-    ## Selection code.
-    glClearColor(0.0,0.0,0.0,0.0)
-    glClear( GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT )
+def render_ids():
     state.select_shader.use()
-    state.select_shader['modelview']  = modelview.matrix()
-    state.select_shader['projection'] = projection.matrix()
-
-    state.select_shader['position'] = state.positions
-    state.select_shader['id']       = state.ids
-
-    # draw scene here
+    gl_state.bind_vertex_array( state.select_vao )
     glPointSize( 10.0 )
     glDrawArrays( GL_POINTS, 0, state.positions.shape[0] )
-    glFlush()
 
-    # read the pixel under the mouse and convert to an integer,
-    # if the result is in the map of ids, mark as selected
-    rgb = glReadPixels( state.mouse[0], state.mouse[1], 1, 1, GL_RGBA, GL_UNSIGNED_BYTE, None )
-    idx = int(rgb[0]) + int(rgb[1])*256 + int(rgb[2])*65536
-    if idx in state.id_map:
-        selected = state.id_map[idx]
-    else:
-        selected = -1
+def render_cb():
+    gl_state.begin_frame()
+
+    # camera stuff, cached until the camera changes
+    state.camera['modelview']  = state.view.view().matrix( copy=False )
+    state.camera['projection'] = state.view.projection().matrix( copy=False )
+    state.camera.bind()
+
+    ## Selection code, the id pass only renders when the cursor moves and
+    ## its result arrives a frame or two later without stalling
+    state.picker.update( render_ids )
+    selected = int( state.id_map.lookup( state.picker.result() ) )
 
     # Rendering code
     glClearColor( 0.7, 0.7, 1.0, 0.0 )
     glClear( GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT )
 
     # highlight the selected point in yellow
-    tcolors = state.colors.copy()
-    if selected >= 0:
-        tcolors[selected] = (1.0,1.0,0.0)
+    state.color_stream.begin_frame()
+    if selected != state.selected:
+        if state.selected >= 0:
+            state.color_stream.write( state.colors[state.selected], offset=state.selected )
+        if selected >= 0:
+            state.color_stream.write( (1.0,1.0,0.0), offset=selected )
+        state.selected = selected
 
     state.render_shader.use()
-    state.render_shader['modelview']  = modelview.matrix()
-    state.render_shader['projection'] = projection.matrix()
-
-    state.render_shader['position'] = state.positions
-    state.render_shader['color'] = tcolors
+    gl_state.bind_vertex_array( state.render_vao )
+    state.color_stream.attrib_pointer( state.render_shader.attribute_location('color') )
 
     glPointSize( 10.0 )
     glDrawArrays( GL_POINTS, 0, state.positions.shape[0] )
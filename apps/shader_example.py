@@ -8,9 +8,9 @@ from OpenGL.GL import *
 from OpenGL.GLU import *
 
 import graphics
-from graphics.core import Transform
+from graphics.core import Camera, Transform
 from graphics.opengl import SimpleViewer
-from graphics.opengl import Shader
+from graphics.opengl import Shader, gl_state
 
 vtx_shader = """
 #version 150
@@ -74,15 +74,17 @@ state.width  = 800
 state.height = 600
 state.aspect = state.width/state.height
 state.frame  = 0
+state.camera = Camera( eye=(0.0,0.0,4.0), fov=45.0, aspect=state.aspect, near=0.1, far=10.0 )
 
 def resize_cb( w, h ):
     state.width = w
     state.height = h
     state.aspect = w/h
-    glViewport( 0, 0, state.width, state.height )
+    state.camera.aspect = state.aspect
+    gl_state.viewport( 0, 0, state.width, state.height )
 
 def initialize_cb():
-    glEnable(GL_DEPTH_TEST)
+    gl_state.enable(GL_DEPTH_TEST)
     glClearColor( 0.7, 0.7, 1.0, 0.0 )
 
     # Shader stuff
@@ -104,17 +106,17 @@ def initialize_cb():
     state.materials = { mat.name: mat for mat in materials }
 
     # unbind any vertex arrays
-    glBindVertexArray(0)
+    gl_state.bind_vertex_array(0)
 
 
 def render_cb():
     state.frame += 1
     glClear( GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT )
 
-    projection = Transform().perspective( 45.0, state.aspect, 0.1, 10.0 )
-    view       = Transform().lookat(0.0,0.0,4.0,0.0,0.0,0.0,0.0,1.0,0.0)
+    projection = state.camera.projection()
+    view       = state.camera.view()
     model      = Transform().rotate( state.azimuth, 0.0, 1.0, 0.0 ).rotate( state.elevation, 1.0, 0.0, 0.0 )
-    cam_pos    = view.inverse()*(0.0, 0.0, 0.0)
+    cam_pos    = state.camera.eye
 
     # enable the shader 
     state.shader.use()
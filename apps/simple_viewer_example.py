@@ -7,6 +7,7 @@ from OpenGL.GL import *
 from OpenGL.GLU import *
 
 from graphics.opengl.simple_viewer import SimpleViewer
+from graphics.opengl.state import gl_state
 
 width = 800
 height = 600
@@ -16,10 +17,10 @@ def resize( w, h ):
     width = w
     height = h
     aspect = w/h
-    glViewport( 0, 0, width, height )
+    gl_state.viewport( 0, 0, width, height )
 
 def initialize():
-    glEnable(GL_DEPTH_TEST)
+    gl_state.enable(GL_DEPTH_TEST)
     glClearColor( 0.7, 0.7, 1.0, 0.0 )
 
 def render():
@@ -5,7 +5,7 @@ import sys
 from OpenGL.GL import *
 
 from graphics.core import Transform
-from graphics.opengl import Application, SimpleViewer, Shader
+from graphics.opengl import Application, SimpleViewer, Shader, gl_state
 
 width = 800
 height = 600
@@ -34,10 +34,10 @@ def resize( w, h ):
     width = w
     height = h
     aspect = w/h
-    glViewport( 0, 0, width, height )
+    gl_state.viewport( 0, 0, width, height )
 
 def initialize():
-    glEnable(GL_DEPTH_TEST)
+    gl_state.enable(GL_DEPTH_TEST)
     glClearColor( 0.7, 0.7, 1.0, 0.0 )
 
     program = Shader( vertex_shader, fragment_shader )
@@ -0,0 +1,59 @@
+"""Benchmark of vectorized frustum culling
+
+Culls randomly placed objects against a camera frustum with bounding
+spheres, bounding boxes and chunked bounding boxes. Objects are sorted
+along a Morton curve first so chunks are spatially coherent.
+
+Usage::
+
+    python benchmarks/bench_culling.py [objects]
+
+"""
+
+import sys
+import time
+
+import numpy
+
+from graphics.core import Camera
+from graphics.geometry import FrustumCuller, cull_boxes, cull_spheres
+
+def morton_order( points, bits=10 ):
+    """Returns the order of points along a 3D Morton curve"""
+    lo = points.min(axis=0)
+    q  = ((points - lo)/numpy.ptp(points,axis=0).max()*((1 << bits)-1)).astype(numpy.uint64)
+    code = numpy.zeros( points.shape[0], dtype=numpy.uint64 )
+    for b in range(bits):
+        for axis in range(3):
+            code |= ((q[:,axis] >> numpy.uint64(b)) & numpy.uint64(1)) << numpy.uint64(3*b+axis)
+    return numpy.argsort( code )
+
+def timed( func, repeat=5 ):
+    best = numpy.inf
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min( best, time.perf_counter()-start )
+    return best, result
+
+def main( objects=1000000 ):
+    rng = numpy.random.default_rng( 0 )
+    centers = rng.uniform( -500, 500, (objects,3) ).astype(numpy.float32)
+    centers = centers[ morton_order( centers ) ]
+    half    = rng.uniform( 0.1, 2.0, (objects,3) ).astype(numpy.float32)
+    radii   = numpy.linalg.norm( half, axis=1 )
+    mins, maxs = centers - half, centers + half
+
+    camera = Camera( eye=(0.0,0.0,0.0), target=(1.0,0.2,0.3), fov=60.0, aspect=16/9, near=0.1, far=400.0 )
+    VP = camera.view_projection()
+
+    t, culler = timed( lambda: FrustumCuller( mins, maxs ), repeat=1 )
+    print( '{} objects, chunk build {:.1f} ms'.format( objects, t*1e3 ) )
+    for name, func in ( ('spheres',        lambda: cull_spheres( VP, centers, radii )),
+                        ('boxes',          lambda: cull_boxes( VP, mins, maxs )),
+                        ('chunked boxes',  lambda: culler.visible( VP )) ):
+        t, mask = timed( func )
+        print( '{:20s} {:8.2f} ms  {:8d} visible'.format( name, t*1e3, int(numpy.count_nonzero(mask)) ) )
+
+if __name__ == '__main__':
+    main( *[ int(a) for a in sys.argv[1:] ] )
@@ -0,0 +1,46 @@
+"""Frame time and CPU usage of the SimpleViewer scheduling modes
+
+Opens a viewer with a trivial render callback and runs it for a few
+seconds in each mode, printing SimpleViewer.frame_stats(). In ON_DEMAND
+mode a redraw is requested every 100 ms to stand in for user input.
+
+Usage::
+
+    python benchmarks/bench_frame_pacing.py [seconds]
+
+"""
+
+import sys
+
+from PyQt5 import QtCore
+from OpenGL.GL import *
+
+from graphics.opengl import SimpleViewer
+
+def run( app, mode, seconds ):
+    viewer = SimpleViewer( mode=mode, fps=60.0 )
+    viewer.render_cb.connect( lambda: glClear( GL_COLOR_BUFFER_BIT ) )
+    viewer.resize( 320, 240 )
+    viewer.show()
+
+    poke = QtCore.QTimer()
+    if mode == SimpleViewer.ON_DEMAND:
+        poke.timeout.connect( viewer.request_redraw )
+        poke.start( 100 )
+
+    QtCore.QTimer.singleShot( int(seconds*1000), app.quit )
+    app.exec_()
+    poke.stop()
+    stats = viewer.frame_stats()
+    viewer.close()
+    return stats
+
+def main( seconds=3.0 ):
+    app = SimpleViewer.application()
+    print( '{:10s} {:>7s} {:>8s} {:>8s} {:>8s} {:>8s} {:>6s}'.format( 'mode', 'fps', 'mean ms', 'p50 ms', 'p95 ms', 'max ms', 'cpu' ) )
+    for mode in ( SimpleViewer.ON_DEMAND, SimpleViewer.FIXED, SimpleViewer.VSYNC ):
+        s = run( app, mode, seconds )
+        print( '{:10s} {:7.1f} {:8.2f} {:8.2f} {:8.2f} {:8.2f} {:5.0%}'.format( s['mode'], s['fps'], *s['frame_ms'], s['cpu'] ) )
+
+if __name__ == '__main__':
+    main( *[ float(a) for a in sys.argv[1:] ] )
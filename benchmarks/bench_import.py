@@ -0,0 +1,42 @@
+"""Benchmark of package import times
+
+Imports graphics and its subpackages in fresh interpreters, the headless
+ones before and after accessing a name, and prints the best wall time of
+several runs and whether PyQt5 was loaded.
+
+Usage::
+
+    python benchmarks/bench_import.py [runs]
+
+"""
+
+import subprocess
+import sys
+
+STATEMENTS = [
+    'import graphics',
+    'import graphics.io',
+    'from graphics.io import load_obj',
+    'from graphics.geometry import Mesh, BVH',
+    'from graphics.core import Camera',
+    'from graphics.opengl import Shader',
+    'from graphics import *',
+]
+
+def measure( statement ):
+    code = ( 'import sys, time\n'
+             't = time.perf_counter()\n'
+             '{}\n'
+             'print( time.perf_counter() - t, "PyQt5" in sys.modules )' ).format( statement )
+    out = subprocess.run( [sys.executable, '-c', code], check=True, stdout=subprocess.PIPE, universal_newlines=True ).stdout
+    elapsed, qt = out.split()[-2:]
+    return float(elapsed), qt == 'True'
+
+def main( runs=5 ):
+    for statement in STATEMENTS:
+        results = [ measure( statement ) for i in range(runs) ]
+        best = min( t for t, qt in results )
+        print( '{:45s} {:8.1f} ms  {}'.format( statement, best*1e3, 'PyQt5' if results[0][1] else '' ) )
+
+if __name__ == '__main__':
+    main( *[ int(a) for a in sys.argv[1:] ] )
@@ -0,0 +1,64 @@
+"""Throughput of headless thumbnail rendering
+
+Renders a batch of images of a wavy grid mesh with an OffscreenRenderer, once
+reading every image back immediately with render() and once through the
+pipelined render_batch(), for several numbers of frames in flight, and
+prints images per second. Run without a display to use EGL on Mesa
+llvmpipe.
+
+Usage::
+
+    python benchmarks/bench_offscreen.py [images] [size]
+
+"""
+
+import os
+import sys
+import time
+import math
+
+# PyOpenGL picks its platform when first imported
+if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+    os.environ.setdefault( 'PYOPENGL_PLATFORM', 'egl' )
+
+from graphics.geometry import Mesh
+from graphics.opengl import OffscreenRenderer
+
+def grid( n ):
+    """Returns a finalized n x n quad height field"""
+    mesh = Mesh()
+    for i in range(n+1):
+        for j in range(n+1):
+            x, y = i/n - 0.5, j/n - 0.5
+            mesh.add_vertex( (x, 0.1*math.sin( 10.0*x )*math.cos( 10.0*y ), y) )
+    mesh.add_texcoord( (0.0,0.0) )
+    mesh.add_material( 'default' )
+    for i in range(n):
+        for j in range(n):
+            v = i*(n+1) + j
+            mesh.add_face( [v, v+1, v+n+2, v+n+1], [0,0,0,0] )
+    mesh.finalize()
+    return mesh
+
+def main( images=200, size=256 ):
+    mesh, materials = grid( 100 ), None
+    renderer = OffscreenRenderer( size, size )
+    print( 'backend {}, {} triangles, {}x{} images'.format( renderer.backend, mesh.vertices.shape[0]//3, size, size ) )
+
+    camera = renderer.fit_camera( mesh )
+    renderer.render( mesh, materials, camera )
+    start = time.perf_counter()
+    for i in range(images):
+        renderer.render( mesh, materials, camera )
+    print( '{:24s} {:8.1f} images/s'.format( 'render', images/(time.perf_counter()-start) ) )
+    renderer.delete()
+
+    for frames in (1,2,3,4):
+        renderer = OffscreenRenderer( size, size, frames_in_flight=frames )
+        for image in renderer.render_batch( [(mesh, materials, camera)]*images ):
+            pass
+        print( '{:24s} {:8.1f} images/s'.format( 'render_batch {} in flight'.format(frames), renderer.images_per_second ) )
+        renderer.delete()
+
+if __name__ == '__main__':
+    main( *[ int(a) for a in sys.argv[1:] ] )
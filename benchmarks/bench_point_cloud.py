@@ -0,0 +1,57 @@
+"""Benchmark of the point octree build and node selection
+
+Builds an octree of a noisy sphere shell out of core and prints the
+build rate, the node count and the time to select nodes within
+increasing point budgets. PointCloudRenderer.update selects every
+frame, selections slower than FRAME_MS are reported and make the
+benchmark exit with 1.
+
+Usage::
+
+    python benchmarks/bench_point_cloud.py [points]
+
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy
+
+from graphics.core import Camera
+from graphics.geometry import PointOctree
+
+# best of REPEAT selections must fit in a 60 Hz frame
+FRAME_MS = 16.7
+REPEAT = 5
+
+def main( points=4000000 ):
+    rng = numpy.random.default_rng( 0 )
+    P = rng.normal( 0.0, 1.0, (points,3) )
+    P = (P/numpy.linalg.norm( P, axis=1 )[:,None]*rng.normal( 1.0, 0.01, (points,1) )).astype(numpy.float32)
+    path = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        octree = PointOctree.build( path, P )
+        elapsed = time.perf_counter() - start
+        print( '{} points, {} nodes, build {:.2f} s ({:.1f} M points/s)'.format( points, len(octree), elapsed, points/elapsed*1e-6 ) )
+
+        camera = Camera( eye=(0.0,0.0,2.5), fov=45.0, near=0.01, far=10.0 )
+        slow = 0
+        for budget in (100000, 1000000, 3000000):
+            best = float('inf')
+            for _ in range( REPEAT ):
+                start = time.perf_counter()
+                sel = octree.select( camera, 1080, budget )
+                best = min( best, (time.perf_counter()-start)*1e3 )
+            slow += best > FRAME_MS
+            print( '{:>10d} budget {:8.2f} ms  {:6d} nodes {:9d} points{}'.format(
+                budget, best, sel.size, int( octree.nodes['count'][sel].sum() ), '  over frame' if best > FRAME_MS else '' ) )
+        del octree
+    finally:
+        shutil.rmtree( path )
+    return 1 if slow else 0
+
+if __name__ == '__main__':
+    sys.exit( main( *[ int(a) for a in sys.argv[1:] ] ) )
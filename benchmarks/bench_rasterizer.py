@@ -0,0 +1,40 @@
+"""Benchmark of the NumPy software rasterizer
+
+Rasterizes a cloud of small random triangles filling the view into
+512x512 depth and id buffers, in the calling process and with process
+pools of increasing size, and prints the time per frame and the
+fraction of covered pixels.
+
+Usage::
+
+    python benchmarks/bench_rasterizer.py [triangles] [size]
+
+"""
+
+import os
+import sys
+import time
+
+import numpy
+
+from graphics.core import Camera
+from graphics.geometry import rasterize
+
+def main( triangles=1000000, size=512 ):
+    rng = numpy.random.default_rng( 0 )
+    centers = rng.uniform( -1.0, 1.0, (triangles,1,3) )
+    tris = (centers + rng.normal( 0.0, 0.004, (triangles,3,3) )).astype(numpy.float32)
+    camera = Camera( eye=(0.0,0.0,2.6), fov=45.0, near=0.5, far=10.0 )
+    P, V = camera.projection(), camera.view()
+
+    print( '{} triangles, {}x{}'.format( triangles, size, size ) )
+    # one worker rasterizes in the calling process
+    for workers in sorted( {1, 2, 4, os.cpu_count()} ):
+        if workers > os.cpu_count():
+            continue
+        start = time.perf_counter()
+        depth, ids = rasterize( tris, size, size, P, V, workers=workers )
+        print( '{:>10s} {:8.1f} ms  {:5.1f}% covered'.format( 'workers {}'.format(workers), (time.perf_counter()-start)*1e3, 100.0*numpy.mean( ids >= 0 ) ) )
+
+if __name__ == '__main__':
+    main( *[ int(a) for a in sys.argv[1:] ] )
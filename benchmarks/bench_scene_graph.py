@@ -0,0 +1,55 @@
+"""Benchmark of incremental world-transform updates in a SceneGraph
+
+Builds a random 100k node tree and changes the local transform of 1% of
+the nodes per frame, comparing the incremental update with a full
+recompute and with per-node Transform chains.
+
+Usage::
+
+    python benchmarks/bench_scene_graph.py [nodes] [fraction]
+
+"""
+
+import sys
+import time
+
+import numpy
+
+from graphics.core import SceneGraph, Transform, TransformArray
+
+def main( nodes=100000, fraction=0.01, frames=20 ):
+    rng = numpy.random.default_rng( 0 )
+    # random tree with a branching factor of roughly four
+    parents = numpy.concatenate( ([-1], rng.integers( 0, numpy.arange(1,nodes)//4+1 )) )
+    locals_ = TransformArray( nodes ).rotate( rng.uniform(-180,180,nodes), 0, 1, 0 ).translate( 1.0, 0.0, 0.0 ).matrices()
+
+    scene = SceneGraph( nodes )
+    scene.add_nodes( parents, locals_ )
+    start = time.perf_counter()
+    scene.update()
+    full = time.perf_counter() - start
+
+    count = int( nodes*fraction )
+    elapsed = 0.0
+    changed = 0
+    for frame in range(frames):
+        ids = rng.choice( nodes, count, replace=False )
+        start = time.perf_counter()
+        scene.set_locals( ids, locals_[ids] )
+        changed += scene.update().size
+        elapsed += time.perf_counter() - start
+
+    start = time.perf_counter()
+    world = []
+    for i in range(nodes):
+        T = Transform( locals_[i] )
+        world.append( T if parents[i] < 0 else world[parents[i]]*T )
+    naive = time.perf_counter() - start
+
+    print( 'nodes {}, {:.0%} changed per frame'.format( nodes, fraction ) )
+    print( '{:40s} {:10.2f} ms'.format( 'full update', full*1e3 ) )
+    print( '{:40s} {:10.2f} ms ({:.0f} nodes)'.format( 'incremental update per frame', elapsed/frames*1e3, changed/frames ) )
+    print( '{:40s} {:10.2f} ms'.format( 'Transform chains', naive*1e3 ) )
+
+if __name__ == '__main__':
+    main( *[ float(a) if '.' in a else int(a) for a in sys.argv[1:] ] )
@@ -0,0 +1,345 @@
+"""Benchmark suite for I/O, mesh building, transforms and GL uploads
+
+Generates synthetic inputs at several scales in a temporary directory, a
+wavy grid mesh with a number of triangles and materials written as
+.obj/.mtl files, then times:
+
+    load_mtl_file   a library of scale/10 materials
+    load_obj        parsing and finalizing the .obj file
+    save_obj        writing the loaded mesh
+    finalize        Mesh.finalize of a mesh built with add_face
+    apply_points    Transform.apply_points on the mesh vertices
+    attribute       Shader vertex attribute upload of the mesh vertices
+
+and, once per run, Transform chains, closed-form and projective inverses
+and Shader uniform matrix uploads. GL cases only run when a context can
+be created, see graphics.opengl.OffscreenRenderer.
+
+Every case is run repeat times on fresh inputs and reports the best and
+mean wall time. Peak memory is measured in a separate run under
+tracemalloc, which includes numpy buffers, since tracing slows Python
+code down. Results are written as JSON together with machine metadata
+and compared against a baseline, cases slower or using more memory than
+threshold are reported as regressions and make the runner exit with 1.
+
+Usage::
+
+    python benchmarks/bench_suite.py --output results.json
+    python benchmarks/bench_suite.py --scales 1000 100000 10000000 --repeat 1
+    python benchmarks/bench_suite.py --baseline results.json --threshold 0.15
+
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+
+import numpy
+
+from graphics.core import Transform
+from graphics.geometry import Mesh
+from graphics.appearance import Material
+from graphics.io import load_obj, save_obj, load_mtl_file, save_mtl_file
+
+SCALES = (1000, 10000, 100000)
+
+vtx_shader = """
+#version 330
+
+uniform mat4 model;
+in vec3 position;
+
+void main(){
+    gl_Position = model*vec4(position,1.0);
+}
+"""
+
+frg_shader = """
+#version 330
+
+out vec4 result;
+
+void main(){
+    result = vec4(1.0);
+}
+"""
+
+def grid( triangles, materials=4 ):
+    """Returns the vertices, texcoords, (T,3) triangles and per-triangle
+    material of a wavy n x n grid with about the requested triangle count"""
+    n = max( int( math.ceil( math.sqrt( triangles/2.0 ) ) ), 1 )
+    u, v = numpy.meshgrid( numpy.linspace( 0.0, 1.0, n+1 ), numpy.linspace( 0.0, 1.0, n+1 ), indexing='ij' )
+    vtx = numpy.stack( (u - 0.5, 0.1*numpy.sin( 10.0*u )*numpy.cos( 10.0*v ), v - 0.5), axis=-1 ).reshape(-1,3)
+    tex = numpy.stack( (u, v), axis=-1 ).reshape(-1,2)
+    q = (numpy.arange( n )[:,None]*(n+1) + numpy.arange( n )).ravel()
+    tri = numpy.concatenate( (numpy.stack( (q, q+1, q+n+2), axis=1 ), numpy.stack( (q, q+n+2, q+n+1), axis=1 )), axis=1 )
+    tri = tri.reshape(-1,3)[:triangles]
+    mat = numpy.arange( tri.shape[0] )*materials//tri.shape[0]
+    return vtx, tex, tri, mat
+
+def synthetic_materials( count ):
+    return [ Material( mdict={ 'name': 'mat{}'.format(i), 'diffuse': (i%7/7.0, i%5/5.0, i%3/3.0),
+                               'specular_exponent': float(i%100), 'diffuse_map': 'diffuse{}.png'.format(i) } )
+             for i in range(count) ]
+
+def synthetic_mesh( triangles, materials=4 ):
+    """Returns an unfinalized Mesh built through the add_* methods"""
+    vtx, tex, tri, mat = grid( triangles, materials )
+    mesh = Mesh()
+    for p in vtx.tolist():
+        mesh.add_vertex( p )
+    for t in tex.tolist():
+        mesh.add_texcoord( t )
+    names = [ mesh.add_material( 'mat{}'.format(i) ) for i in range(materials) ]
+    for face, m in zip( tri.tolist(), mat.tolist() ):
+        mesh.add_face( face, face, names[m] )
+    return mesh
+
+def synthetic_points( triangles ):
+    """Returns the (3T,3) float32 corners of a grid, as Mesh.vertices"""
+    vtx, tex, tri, mat = grid( triangles )
+    return vtx[tri].reshape(-1,3).astype(numpy.float32)
+
+def synthetic_obj( directory, triangles, materials=4 ):
+    """Writes a grid mesh as .obj with a .mtl library and returns its path"""
+    vtx, tex, tri, mat = grid( triangles, materials )
+    name = os.path.join( directory, 'grid{}.obj'.format(triangles) )
+    save_mtl_file( synthetic_materials( materials ), os.path.splitext(name)[0] + '.mtl' )
+    with open( name, 'w' ) as f:
+        f.write( 'mtllib {}\n'.format( os.path.basename( os.path.splitext(name)[0] + '.mtl' ) ) )
+        numpy.savetxt( f, vtx, fmt='v %.6f %.6f %.6f' )
+        numpy.savetxt( f, tex, fmt='vt %.6f %.6f' )
+        bounds = numpy.searchsorted( mat, numpy.arange( materials+1 ) )
+        for m in range(materials):
+            f.write( 'usemtl mat{}\n'.format(m) )
+            faces = tri[bounds[m]:bounds[m+1]] + 1
+            numpy.savetxt( f, numpy.repeat( faces, 2, axis=1 ), fmt='f %d/%d %d/%d %d/%d' )
+    return name
+
+class Case(object):
+    def __init__( self, name, scale, run, setup=None, items=None ):
+        """A benchmark case
+
+        Args:
+            name (string): case name, results are matched on name and scale
+
+            scale (int): number of triangles of the input, 0 for cases
+                that do not depend on the scale
+
+            run (callable): timed function, called with the result of setup
+
+            setup (callable): untimed function returning a fresh input,
+                called before every run
+
+            items (int): number of items processed per run, for rates
+        """
+        self.name  = name
+        self.scale = scale
+        self.run   = run
+        self.setup = setup if setup is not None else (lambda: None)
+        self.items = items
+
+    def measure( self, repeat, memory ):
+        times = []
+        for i in range(repeat):
+            arg = self.setup()
+            start = time.perf_counter()
+            self.run( arg )
+            times.append( time.perf_counter() - start )
+        result = { 'name': self.name, 'scale': self.scale, 'best': min(times),
+                   'mean': sum(times)/len(times), 'repeat': repeat, 'items': self.items, 'peak_bytes': None }
+        if memory:
+            arg = self.setup()
+            tracemalloc.start()
+            self.run( arg )
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return result
+
+def io_cases( directory, scale ):
+    obj = synthetic_obj( directory, scale )
+    mtl = os.path.join( directory, 'library{}.mtl'.format(scale) )
+    save_mtl_file( synthetic_materials( max( scale//10, 1 ) ), mtl )
+    mesh, materials = load_obj( obj )
+    out = os.path.join( directory, 'saved{}.obj'.format(scale) )
+    triangles = mesh.vertices.shape[0]//3
+    return [
+        Case( 'load_mtl_file', scale, lambda arg: load_mtl_file( mtl ), items=max( scale//10, 1 ) ),
+        Case( 'load_obj',      scale, lambda arg: load_obj( obj ), items=triangles ),
+        Case( 'save_obj',      scale, lambda arg: save_obj( mesh, out ), items=triangles ),
+        Case( 'finalize',      scale, lambda arg: arg.finalize(), setup=lambda: synthetic_mesh( scale ), items=triangles ),
+    ]
+
+def transform_cases( scale ):
+    points = synthetic_points( scale )
+    out = numpy.empty_like( points )
+    T = Transform().scale( 2.0, 1.0, 0.5 ).rotate( 30.0, 0.0, 1.0, 0.0 ).translate( 1.0, 2.0, 3.0 )
+    P = Transform().perspective( 45.0, 1.5, 0.1, 100.0 ).lookat( 3.0, 2.0, 5.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0 )
+    return [
+        Case( 'apply_points',           scale, lambda arg: T.apply_points( points, out=out ), items=points.shape[0] ),
+        Case( 'apply_points_projective', scale, lambda arg: P.apply_points( points, out=out ), items=points.shape[0] ),
+    ]
+
+def chain( count ):
+    T = Transform()
+    for i in range(count):
+        T = T.translate( 0.1, 0.0, 0.0 ).rotate( 1.0, 0.0, 1.0, 0.0 ).scale( 1.001, 1.0, 1.0 )
+    return T
+
+def fixed_cases():
+    affine = [ Transform().scale( 2.0, 1.0, 0.5 ).rotate( float(i), 0.0, 1.0, 0.0 ).translate( 1.0, 2.0, 3.0 ) for i in range(1000) ]
+    projective = [ Transform().perspective( 45.0, 1.5, 0.1, 100.0 ).rotate( float(i), 0.0, 1.0, 0.0 ) for i in range(1000) ]
+    def inverses( transforms ):
+        for T in transforms:
+            T.translate_( 0.0, 0.0, 0.0 )
+            T.inverse()
+    return [
+        Case( 'transform_chain',      0, lambda arg: chain( 1000 ), items=3000 ),
+        Case( 'inverse_affine',       0, lambda arg: inverses( affine ), items=len(affine) ),
+        Case( 'inverse_projective',   0, lambda arg: inverses( projective ), items=len(projective) ),
+    ]
+
+def gl_cases( scales ):
+    """Returns the Shader upload cases and the renderer owning the context,
+    or no cases and None without a GL context"""
+    # PyOpenGL picks its platform when first imported
+    if 'OpenGL' not in sys.modules and not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+        os.environ.setdefault( 'PYOPENGL_PLATFORM', 'egl' )
+    from graphics.opengl import OffscreenRenderer, Shader
+    from OpenGL.GL import glFinish, glGenVertexArrays, glBindVertexArray
+    try:
+        renderer = OffscreenRenderer( 1, 1 )
+    except RuntimeError as e:
+        print( 'skipping GL cases: {}'.format(e) )
+        return [], None
+    # core profiles need a vertex array for attribute uploads
+    glBindVertexArray( glGenVertexArrays(1) )
+    shader = Shader( vtx_shader, frg_shader )
+    shader.use()
+    M = Transform().perspective( 45.0, 1.5, 0.1, 100.0 ).matrix()
+    def uniforms( count ):
+        for i in range(count):
+            shader['model'] = M
+        glFinish()
+    def attribute( points ):
+        shader['position'] = points
+        glFinish()
+    cases = [ Case( 'uniform_matrix', 0, lambda arg: uniforms( 1000 ), items=1000 ) ]
+    for scale in scales:
+        points = synthetic_points( scale )
+        cases.append( Case( 'attribute', scale, lambda arg, points=points: attribute( points ), items=points.shape[0] ) )
+    return cases, renderer
+
+def git_revision():
+    try:
+        out = subprocess.run( ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname( os.path.abspath(__file__) ),
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, check=True )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def metadata( renderer ):
+    meta = {
+        'time':       time.strftime( '%Y-%m-%dT%H:%M:%SZ', time.gmtime() ),
+        'platform':   platform.platform(),
+        'machine':    platform.machine(),
+        'processor':  platform.processor(),
+        'cpu_count':  os.cpu_count(),
+        'python':     '{} {}'.format( platform.python_implementation(), platform.python_version() ),
+        'numpy':      numpy.__version__,
+        'revision':   git_revision(),
+        'gl':         None,
+    }
+    if renderer is not None:
+        from OpenGL.GL import glGetString, GL_RENDERER, GL_VERSION
+        meta['gl'] = { 'backend': renderer.backend, 'renderer': glGetString( GL_RENDERER ).decode(),
+                       'version': glGetString( GL_VERSION ).decode() }
+    try:
+        import resource
+        meta['max_rss_kb'] = resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss
+    except ImportError:
+        pass
+    return meta
+
+def compare( results, baseline, threshold ):
+    """Prints the ratio of results to the baseline and returns the cases
+    slower or with a larger peak than 1+threshold times the baseline"""
+    base = { (r['name'], r['scale']): r for r in baseline['results'] }
+    regressions = []
+    print( '\n{:28s} {:>10s} {:>10s} {:>10s} {:>8s}'.format( 'case', 'scale', 'baseline', 'current', 'ratio' ) )
+    for r in results:
+        b = base.get( (r['name'], r['scale']) )
+        if b is None:
+            continue
+        ratio = r['best']/b['best'] if b['best'] > 0.0 else 1.0
+        flags = []
+        if ratio > 1.0 + threshold:
+            flags.append( 'SLOWER' )
+        if r['peak_bytes'] and b['peak_bytes'] and r['peak_bytes'] > (1.0 + threshold)*b['peak_bytes']:
+            flags.append( 'MEMORY {:.2f}x'.format( r['peak_bytes']/b['peak_bytes'] ) )
+        if flags:
+            regressions.append( (r, flags) )
+        print( '{:28s} {:10d} {:8.2f}ms {:8.2f}ms {:7.2f}x {}'.format(
+            r['name'], r['scale'], b['best']*1e3, r['best']*1e3, ratio, ' '.join(flags) ) )
+    return regressions
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description='Benchmark suite for graphics' )
+    parser.add_argument( '--scales', type=int, nargs='+', default=SCALES, help='triangle counts of the inputs' )
+    parser.add_argument( '--repeat', type=int, default=3, help='timed runs per case' )
+    parser.add_argument( '--filter', default='', help='only run cases whose name contains this' )
+    parser.add_argument( '--no-memory', action='store_true', help='skip the tracemalloc runs' )
+    parser.add_argument( '--no-gl', action='store_true', help='skip the GL upload cases' )
+    parser.add_argument( '--output', help='JSON file to write the results to' )
+    parser.add_argument( '--baseline', help='JSON results to compare against' )
+    parser.add_argument( '--threshold', type=float, default=0.1, help='relative slowdown reported as a regression' )
+    args = parser.parse_args( argv )
+
+    directory = tempfile.mkdtemp()
+    renderer  = None
+    results   = []
+    try:
+        cases = fixed_cases()
+        for scale in args.scales:
+            cases += io_cases( directory, scale ) + transform_cases( scale )
+        if not args.no_gl:
+            gl, renderer = gl_cases( args.scales )
+            cases += gl
+
+        print( '{:28s} {:>10s} {:>10s} {:>10s} {:>12s} {:>10s}'.format( 'case', 'scale', 'best', 'mean', 'items/s', 'peak' ) )
+        for case in cases:
+            if args.filter not in case.name:
+                continue
+            r = case.measure( args.repeat, not args.no_memory )
+            results.append( r )
+            rate = '{:12.0f}'.format( r['items']/r['best'] ) if r['items'] and r['best'] > 0.0 else ' '*12
+            peak = '{:8.1f}MB'.format( r['peak_bytes']/2.0**20 ) if r['peak_bytes'] is not None else ''
+            print( '{:28s} {:10d} {:8.2f}ms {:8.2f}ms {} {:>10s}'.format(
+                r['name'], r['scale'], r['best']*1e3, r['mean']*1e3, rate, peak ) )
+        report = { 'metadata': metadata( renderer ), 'results': results }
+    finally:
+        if renderer is not None:
+            renderer.delete()
+        shutil.rmtree( directory )
+
+    if args.output:
+        with open( args.output, 'w' ) as f:
+            json.dump( report, f, indent=2 )
+    if args.baseline:
+        with open( args.baseline ) as f:
+            regressions = compare( results, json.load( f ), args.threshold )
+        if regressions:
+            print( '\n{} regressions over {:.0f}%'.format( len(regressions), 100.0*args.threshold ) )
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit( main() )
@@ -0,0 +1,40 @@
+"""Microbenchmark of per-frame camera and normal-matrix inversion
+
+Compares the general 4x4 numpy.linalg.inv used previously with the
+closed-form inverse selected by the transform kind, both freshly computed
+and cached on a transform reused across frames.
+
+Usage::
+
+    python benchmarks/bench_transform_inverse.py
+
+"""
+
+import timeit
+
+import numpy
+
+from graphics.core import Transform
+from graphics.core.transform import _inverse
+
+def report( name, func, number=20000 ):
+    t = min( timeit.repeat( func, number=number, repeat=5 ) )/number
+    print( '{:40s} {:8.2f} us'.format( name, t*1e6 ) )
+
+def main():
+    camera = Transform().lookat( 3.0, 2.0, 5.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0 )
+    model  = Transform().scale( 2.0, 1.0, 0.5 ).rotate( 30.0, 0.0, 1.0, 0.0 ).translate( 1.0, 2.0, 3.0 )
+    modelview = camera*model
+
+    print('camera (rigid)')
+    report( 'numpy.linalg.inv',   lambda: numpy.linalg.inv( camera.M ) )
+    report( 'closed form',        lambda: _inverse( camera.M, camera.kind ) )
+    report( 'cached',             lambda: camera.inverse() )
+
+    print('normal matrix (affine)')
+    report( 'numpy.linalg.inv',   lambda: numpy.linalg.inv( modelview.M[:3,:3] ).T )
+    report( 'closed form',        lambda: _inverse( modelview.M, modelview.kind )[0][:3,:3].T )
+    report( 'cached',             lambda: modelview.normal_matrix() )
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,14 @@ import os
 
 GRAPHICS_DATA_DIR = os.path.abspath('{}/../data'.format(os.path.dirname(__file__)))
 
-from graphics.io import *
-from graphics.core import *
-from graphics.geometry import *
-from graphics.appearance import *
-from graphics.opengl import *
\ No newline at end of file
+from graphics.lazy import lazy_exports
+
+# subpackages are imported on first access, graphics.opengl and with it
+# PyQt5 and PyOpenGL only when one of its names is used
+__getattr__, __dir__ = lazy_exports( __name__, {
+    'phase':           'graphics.instrument',
+    'add_listener':    'graphics.instrument',
+    'remove_listener': 'graphics.instrument',
+    'PhaseRecord':     'graphics.instrument',
+    'PhaseCollector':  'graphics.instrument',
+}, ('io','core','geometry','appearance','opengl') )
@@ -1 +1,5 @@
-from graphics.appearance.materials import *
\ No newline at end of file
+from graphics.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports( __name__, {
+    'Material': 'graphics.appearance.materials',
+})
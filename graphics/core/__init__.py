@@ -1,2 +1,9 @@
+from graphics.lazy import lazy_exports
 
-from graphics.core.transform import Transform
\ No newline at end of file
+__getattr__, __dir__ = lazy_exports( __name__, {
+    'Transform':      'graphics.core.transform',
+    'TransformArray': 'graphics.core.transform_array',
+    'SceneGraph':     'graphics.core.scene_graph',
+    'Camera':         'graphics.core.camera',
+    'frustum_planes': 'graphics.core.camera',
+})
@@ -0,0 +1,206 @@
+"""Perspective camera with cached matrices
+
+A Camera holds the gluLookat and gluPerspective parameters and lazily
+builds the view, projection and view-projection Transforms, their
+inverses and the six frustum planes. Cached values are only dropped when
+a parameter actually changes: moving the camera keeps the projection and
+resizing the window keeps the view.
+
+Planes are rows (a,b,c,d) with unit normals pointing into the frustum,
+so a world-space point p is inside when a*p.x + b*p.y + c*p.z + d >= 0
+for all six, in the order left, right, bottom, top, near, far.
+
+Example::
+
+    camera = Camera( eye=(4.0,4.0,4.0), fov=45.0, aspect=w/h, near=0.1, far=10.0 )
+
+    def resize_cb( w, h ):
+        camera.aspect = w/h
+
+    def render_cb():
+        shader['view']       = camera.view().matrix()
+        shader['projection'] = camera.projection().matrix()
+
+    # world points under the cursor, window origin at the bottom left
+    near, far = camera.unproject( [[x,y,0.0],[x,y,1.0]], viewport=(0,0,w,h) )
+
+"""
+
+import numpy
+
+from graphics.core.transform import Transform
+
+def frustum_planes( T ):
+    """Returns the (6,4) frustum planes of a projection*modelview Transform
+
+    Planes are normalized, point inwards and are ordered left, right,
+    bottom, top, near, far. With a projection alone the planes are in
+    view space, with projection*view in world space and with
+    projection*view*model in object space.
+    """
+    M = T.M if isinstance(T,Transform) else numpy.asarray( T )
+    P = numpy.array([
+        M[3] + M[0],
+        M[3] - M[0],
+        M[3] + M[1],
+        M[3] - M[1],
+        M[3] + M[2],
+        M[3] - M[2]
+    ], dtype=numpy.float64 )
+    P /= numpy.linalg.norm( P[:,:3], axis=1, keepdims=True )
+    return P.astype(numpy.float32)
+
+class Camera(object):
+    def __init__( self, eye=(0.0,0.0,1.0), target=(0.0,0.0,0.0), up=(0.0,1.0,0.0), fov=45.0, aspect=1.0, near=0.1, far=100.0 ):
+        """Creates a camera
+
+        Args:
+            eye, target, up (3-sequences): gluLookat parameters
+
+            fov, aspect, near, far (float): gluPerspective parameters,
+                fov is the vertical field of view in degrees
+        """
+        self.__lookat = tuple( tuple( float(v) for v in p ) for p in (eye, target, up) )
+        self.__lens   = ( float(fov), float(aspect), float(near), float(far) )
+        self.version  = 0
+        self.__view   = None
+        self.__proj   = None
+        self.__viewproj = None
+        self.__planes   = None
+
+    def __set_view( self, index, value ):
+        lookat = list(self.__lookat)
+        lookat[index] = tuple( float(v) for v in value )
+        if tuple(lookat) != self.__lookat:
+            self.__lookat = tuple(lookat)
+            self.__view = self.__viewproj = self.__planes = None
+            self.version += 1
+
+    def __set_lens( self, index, value ):
+        lens = list(self.__lens)
+        lens[index] = float(value)
+        if tuple(lens) != self.__lens:
+            self.__lens = tuple(lens)
+            self.__proj = self.__viewproj = self.__planes = None
+            self.version += 1
+
+    @property
+    def eye( self ):
+        return numpy.array( self.__lookat[0] )
+
+    @eye.setter
+    def eye( self, value ):
+        self.__set_view( 0, value )
+
+    @property
+    def target( self ):
+        return numpy.array( self.__lookat[1] )
+
+    @target.setter
+    def target( self, value ):
+        self.__set_view( 1, value )
+
+    @property
+    def up( self ):
+        return numpy.array( self.__lookat[2] )
+
+    @up.setter
+    def up( self, value ):
+        self.__set_view( 2, value )
+
+    @property
+    def fov( self ):
+        return self.__lens[0]
+
+    @fov.setter
+    def fov( self, value ):
+        self.__set_lens( 0, value )
+
+    @property
+    def aspect( self ):
+        return self.__lens[1]
+
+    @aspect.setter
+    def aspect( self, value ):
+        self.__set_lens( 1, value )
+
+    @property
+    def near( self ):
+        return self.__lens[2]
+
+    @near.setter
+    def near( self, value ):
+        self.__set_lens( 2, value )
+
+    @property
+    def far( self ):
+        return self.__lens[3]
+
+    @far.setter
+    def far( self, value ):
+        self.__set_lens( 3, value )
+
+    def view( self ):
+        """Returns the cached view Transform"""
+        if self.__view is None:
+            self.__view = Transform().lookat( *sum( self.__lookat, () ) )
+        return self.__view
+
+    def projection( self ):
+        """Returns the cached projection Transform"""
+        if self.__proj is None:
+            self.__proj = Transform().perspective( *self.__lens )
+        return self.__proj
+
+    def view_projection( self ):
+        """Returns the cached projection*view Transform"""
+        if self.__viewproj is None:
+            self.__viewproj = self.projection()*self.view()
+        return self.__viewproj
+
+    def inverse_view( self ):
+        return self.view().inverse()
+
+    def inverse_projection( self ):
+        return self.projection().inverse()
+
+    def inverse_view_projection( self ):
+        return self.view_projection().inverse()
+
+    def frustum_planes( self ):
+        """Returns the cached (6,4) world-space frustum planes, see frustum_planes"""
+        if self.__planes is None:
+            self.__planes = frustum_planes( self.view_projection() )
+        return self.__planes
+
+    def project( self, points, viewport=None ):
+        """Projects (N,3) world points
+
+        Args:
+            points (array-like): (N,3) world-space points
+
+            viewport (4-sequence): optional x, y, width, height; if given
+                window coordinates with depth in [0,1] are returned as
+                by gluProject, otherwise normalized device coordinates
+
+        Returns:
+            (N,3) projected points
+        """
+        P = self.view_projection().apply_points( points )
+        if viewport is not None:
+            x, y, w, h = viewport
+            P = P.reshape(-1,3)
+            P[:,0] = x + (P[:,0] + 1.0)*0.5*w
+            P[:,1] = y + (P[:,1] + 1.0)*0.5*h
+            P[:,2] = (P[:,2] + 1.0)*0.5
+        return P.reshape( numpy.shape(points) )
+
+    def unproject( self, points, viewport=None ):
+        """Inverse of project, (N,3) window or normalized device coordinates to world points"""
+        P = numpy.array( points, dtype=numpy.float32 ).reshape(-1,3)
+        if viewport is not None:
+            x, y, w, h = viewport
+            P[:,0] = 2.0*(P[:,0] - x)/w - 1.0
+            P[:,1] = 2.0*(P[:,1] - y)/h - 1.0
+            P[:,2] = 2.0*P[:,2] - 1.0
+        return self.inverse_view_projection().apply_points( P ).reshape( numpy.shape(points) )
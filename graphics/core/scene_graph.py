@@ -0,0 +1,197 @@
+"""Flat scene graph with incremental world-transform updates
+
+Nodes are stored in contiguous arrays in parent-index order: every node's
+parent has a smaller index than the node itself, so appending nodes keeps
+the arrays topologically sorted. Each node holds a local 4x4 transform and
+the graph maintains a packed (N,4,4) array of world matrices, where
+world = world[parent] * local as for chained Transform products.
+
+Changing a local transform only flags the node. On update, flags are
+pushed down to descendants one tree level at a time and the world
+matrices of flagged nodes are recomputed with a single batched matrix
+multiply per level, so only dirty subtrees are touched.
+
+Example::
+
+    scene = SceneGraph()
+    root  = scene.add_node()
+    arm   = scene.add_node( root, Transform().translate( 1.0, 0.0, 0.0 ) )
+    hand  = scene.add_node( arm,  Transform().rotate( 30.0, 0.0, 0.0, 1.0 ) )
+
+    # per frame
+    scene.set_local( arm, Transform().rotate( angle, 0.0, 1.0, 0.0 ) )
+    changed = scene.update()
+    data = scene.column_major()
+
+"""
+
+import numpy
+
+from graphics.core.transform import Transform
+
+def _grown( arr, capacity, count, fill=0 ):
+    """Returns arr resized to capacity rows, keeping the first count"""
+    new = numpy.full( (capacity,)+arr.shape[1:], fill, dtype=arr.dtype )
+    new[:count] = arr[:count]
+    return new
+
+class SceneGraph(object):
+    def __init__( self, capacity=1024 ):
+        """Creates an empty scene graph
+
+        Args:
+            capacity (int): initial number of nodes storage is allocated
+                for, doubled as needed
+        """
+        self.__count  = 0
+        self.__parent = numpy.full( capacity, -1, dtype=numpy.int64 )
+        self.__depth  = numpy.zeros( capacity, dtype=numpy.int64 )
+        self.__dirty  = numpy.zeros( capacity, dtype=bool )
+        self.__local  = numpy.zeros( (capacity,4,4), dtype=numpy.float32 )
+        self.__world  = numpy.zeros( (capacity,4,4), dtype=numpy.float32 )
+        self.__levels = None
+
+    def __len__( self ):
+        return self.__count
+
+    def __grow( self, count ):
+        capacity = self.__parent.shape[0]
+        if count <= capacity:
+            return
+        capacity = max( 2*capacity, count )
+        self.__parent = _grown( self.__parent, capacity, self.__count, -1 )
+        self.__depth  = _grown( self.__depth,  capacity, self.__count )
+        self.__dirty  = _grown( self.__dirty,  capacity, self.__count )
+        self.__local  = _grown( self.__local,  capacity, self.__count )
+        self.__world  = _grown( self.__world,  capacity, self.__count )
+
+    def add_node( self, parent=-1, local=None ):
+        """Appends a node, returning its index
+
+        Args:
+            parent (int): index of the parent node, -1 for a root
+
+            local (Transform or numpy.ndarray): local transform, identity
+                if None
+        """
+        return int( self.add_nodes( [parent], None if local is None else self.__matrix(local)[None] )[0] )
+
+    def add_nodes( self, parents, matrices=None ):
+        """Appends nodes in bulk
+
+        Args:
+            parents (array-like): (K,) parent indices, each either -1, an
+                existing node or an earlier node of this call
+
+            matrices (numpy.ndarray): optional (K,4,4) local transforms
+
+        Returns:
+            (K,) indices of the new nodes
+        """
+        parents = numpy.asarray( parents, dtype=numpy.int64 ).ravel()
+        k = parents.size
+        first = self.__count
+        index = numpy.arange( first, first+k )
+        if numpy.any( parents >= index ) or numpy.any( parents < -1 ):
+            raise ValueError('Parents must precede their children')
+
+        self.__grow( first+k )
+        self.__parent[index] = parents
+        self.__local[index]  = numpy.eye( 4, dtype=numpy.float32 ) if matrices is None else matrices
+        self.__dirty[index]  = True
+
+        # depths in order, parents within this batch are resolved level by level
+        depth = numpy.zeros( k, dtype=numpy.int64 )
+        known = parents < first
+        depth[known] = numpy.where( parents[known] >= 0, self.__depth[numpy.maximum(parents[known],0)] + 1, 0 )
+        while not numpy.all( known ):
+            pending = numpy.flatnonzero( ~known )
+            ready = known[parents[pending]-first]
+            depth[pending[ready]] = depth[parents[pending[ready]]-first] + 1
+            known[pending[ready]] = True
+        self.__depth[index] = depth
+        self.__count += k
+        self.__levels = None
+        return index
+
+    @staticmethod
+    def __matrix( T ):
+        return T.M if isinstance(T,Transform) else numpy.asarray( T, dtype=numpy.float32 )
+
+    def parent( self, node ):
+        return int( self.__parent[node] )
+
+    def local( self, node ):
+        """Returns the local transform of a node"""
+        return Transform( self.__local[node] )
+
+    def world( self, node ):
+        """Returns the world transform of a node as of the last update"""
+        return Transform( self.__world[node] )
+
+    def set_local( self, node, T ):
+        """Sets the local transform of a node and flags it for update"""
+        self.__local[node] = self.__matrix( T )
+        self.__dirty[node] = True
+
+    def set_locals( self, nodes, M ):
+        """Sets the local transforms of many nodes from a (K,4,4) array"""
+        self.__local[nodes] = M
+        self.__dirty[nodes] = True
+
+    def __level_order( self ):
+        """Returns node indices sorted by depth and the start of each level"""
+        if self.__levels is None:
+            depth = self.__depth[:self.__count]
+            order = numpy.argsort( depth, kind='stable' )
+            starts = numpy.searchsorted( depth[order], numpy.arange( depth.max()+2 if depth.size else 1 ) )
+            self.__levels = (order, starts)
+        return self.__levels
+
+    def update( self ):
+        """Recomputes the world matrices of flagged nodes and their descendants
+
+        Returns:
+            indices of the nodes whose world matrix changed
+        """
+        n = self.__count
+        dirty = self.__dirty[:n]
+        if not numpy.any( dirty ):
+            return numpy.zeros( 0, dtype=numpy.int64 )
+
+        order, starts = self.__level_order()
+        parent = self.__parent[:n]
+        changed = []
+        for level in range( starts.size-1 ):
+            nodes = order[starts[level]:starts[level+1]]
+            if level > 0:
+                # push flags down from the previous level
+                dirty[nodes] |= dirty[parent[nodes]]
+            nodes = nodes[dirty[nodes]]
+            if nodes.size == 0:
+                continue
+            if level == 0:
+                self.__world[nodes] = self.__local[nodes]
+            else:
+                self.__world[nodes] = numpy.matmul( self.__world[parent[nodes]], self.__local[nodes] )
+            changed.append( nodes )
+        dirty[:] = False
+        return numpy.sort( numpy.concatenate( changed ) )
+
+    def world_matrices( self ):
+        """Returns a read-only (N,4,4) view of the row-major world matrices"""
+        view = self.__world[:self.__count].view()
+        view.flags.writeable = False
+        return view
+
+    def column_major( self, out=None ):
+        """Returns the world matrices as contiguous (N,16) float32 column-major
+        data for glUniformMatrix4fv or instanced mat4 attributes
+
+        Args:
+            out (ndarray): optional preallocated (N,16) float32 array
+        """
+        if out is None:
+            out = numpy.empty( (self.__count,16), dtype=numpy.float32 )
+        out.reshape(-1,4,4)[...] = self.__world[:self.__count].transpose(0,2,1)
+        return out
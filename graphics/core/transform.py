@@ -26,6 +26,26 @@ T[:,3] would be the third point if T is a 4xN matrix. This can be used to
 apply transformations to existing 4x4 numpy matrices as well but only by 
 pre-multiplying the numpy matrix with a transform.
 
+Large sets of row-major (N,3) points or vectors, such as Mesh arrays or
+point clouds, should use Transform.apply_points and
+Transform.apply_vectors, which avoid homogeneous copies, accept an out
+array and work through the input in chunks, optionally on a thread pool.
+
+Each transform tracks its kind, one of IDENTITY, TRANSLATION, RIGID,
+AFFINE or PROJECTIVE, as operations are chained. The kind selects a
+closed-form inverse: negated translation, transposed rotation for rigid
+transforms and a 3x3 inverse for affine ones, falling back to a general
+4x4 inverse only for projective transforms. The inverse is cached on the
+transform until it is next modified in place or its matrix M is
+reassigned.
+
+Every builder also has an in-place form with a trailing underscore, e.g.
+translate_, which modifies the transform and returns it for chaining.
+Translations, scales and rotations update rows of the matrix directly
+and the remaining builders multiply through preallocated scratch
+buffers, so per-frame code can rebuild a transform without allocating
+new Transforms.
+
 Implemented functions::
 
     glTranslate    -> Transform.translate
@@ -45,16 +65,25 @@ Example::
     # scale by (2,3,4) then translate by (1,2,3) then rotate 45 degrees about y-axis
     T = Transform().scale(2,3,4).translate(1,2,3).rotate( 45.0, 0.0, 1.0, 0.0 )
 
-    # get the inverse
+    # get the inverse, computed in closed form since T is affine
     iT = T.inverse()
 
     # retrieve the matrix, transpose for OpenGL column-major layout
     t = T.matrix().transpose()
 
+    # transform mesh vertices in place
+    T.apply_points( mesh.vertices, out=mesh.vertices )
+
+    # rebuild a camera every frame without allocating
+    camera.identity_().lookat_( *eye, *center, *up )
+    upload( camera.matrix( copy=False ) )
+
 """
 
+import math
 import numpy
-import collections
+import collections.abc
+from concurrent.futures import ThreadPoolExecutor
 
 def homogenize( A, hom=1.0 ):
     """Homogenize an input point or set of points
@@ -75,12 +104,15 @@ def homogenize( A, hom=1.0 ):
 
     """
     if len(A) == 3:
-        if isinstance(A,collections.Sequence):
+        if isinstance(A,collections.abc.Sequence):
             return numpy.array([A[0],A[1],A[2],hom],dtype=numpy.float32)
         elif isinstance(A,numpy.ndarray):
-            return numpy.row_stack( (A,hom*numpy.ones_like(A[0])) )
+            R = numpy.empty( (4,)+A.shape[1:], dtype=numpy.result_type(A,numpy.float32) )
+            R[:3] = A
+            R[3]  = hom
+            return R
     elif len(A) == 4:
-        if isinstance(A,collections.Sequence):
+        if isinstance(A,collections.abc.Sequence):
             return numpy.array( A, dtype=numpy.float32 )
         elif isinstance(A,numpy.ndarray):
             return A
@@ -89,33 +121,238 @@ def homogenize( A, hom=1.0 ):
 
 
 
+IDENTITY    = 0
+TRANSLATION = 1
+RIGID       = 2
+AFFINE      = 3
+PROJECTIVE  = 4
+
+def classify( M, tol=1e-5 ):
+    """Returns the kind of a 4x4 matrix, the most specific of IDENTITY,
+    TRANSLATION, RIGID, AFFINE and PROJECTIVE within tolerance tol"""
+    I = numpy.eye( 4, dtype=M.dtype )
+    if numpy.abs( M[3] - I[3] ).max() > tol:
+        return PROJECTIVE
+    A = M[:3,:3]
+    if numpy.abs( A - I[:3,:3] ).max() <= tol:
+        return IDENTITY if numpy.abs( M[:3,3] ).max() <= tol else TRANSLATION
+    if numpy.abs( numpy.dot( A, A.T ) - I[:3,:3] ).max() <= tol:
+        return RIGID
+    return AFFINE
+
+def _inverse( M, kind ):
+    """Closed-form inverse of a 4x4 matrix of the given kind"""
+    if kind == PROJECTIVE:
+        return numpy.linalg.inv( M ), PROJECTIVE
+    # small fixed-size arithmetic is fastest on python floats
+    a, b, c, d = M.tolist()
+    if kind == AFFINE:
+        # adjugate of the 3x3 block from cross products of its rows
+        A = [ [ b[1]*c[2]-b[2]*c[1], c[1]*a[2]-c[2]*a[1], a[1]*b[2]-a[2]*b[1] ],
+              [ b[2]*c[0]-b[0]*c[2], c[2]*a[0]-c[0]*a[2], a[2]*b[0]-a[0]*b[2] ],
+              [ b[0]*c[1]-b[1]*c[0], c[0]*a[1]-c[1]*a[0], a[0]*b[1]-a[1]*b[0] ] ]
+        det = a[0]*A[0][0] + a[1]*A[1][0] + a[2]*A[2][0]
+        if det == 0.0:
+            raise numpy.linalg.LinAlgError('Singular matrix')
+        A = [ [ x/det for x in row ] for row in A ]
+    elif kind == RIGID:
+        A = [ [ a[0], b[0], c[0] ], [ a[1], b[1], c[1] ], [ a[2], b[2], c[2] ] ]
+    else:
+        A = [ [ 1.0, 0.0, 0.0 ], [ 0.0, 1.0, 0.0 ], [ 0.0, 0.0, 1.0 ] ]
+    t = ( a[3], b[3], c[3] )
+    R = [ row + [ -(row[0]*t[0] + row[1]*t[1] + row[2]*t[2]) ] for row in A ]
+    R.append( [ 0.0, 0.0, 0.0, 1.0 ] )
+    return numpy.array( R, dtype=numpy.float32 ), kind
+
 class Transform:
-    def __init__( self, T=None ):
-        """Initialize a Transform as identity or specified matrix"""
+    def __init__( self, T=None, kind=None ):
+        """Initialize a Transform as identity or specified matrix
+
+        Args:
+            T (Transform or numpy.ndarray): transform or 4x4 matrix to copy
+
+            kind (int): kind of T if known, otherwise it is classified
+                from the matrix
+        """
+        self.__inverse = None
+        self.__buffers = None
         if T is not None:
             if isinstance(T,Transform):
-                self.M = T.M.copy()
+                self.__M = T.M.copy()
+                self.kind = T.kind
             elif isinstance(T,numpy.ndarray):
-                self.M = T.copy()
+                self.__M = T.copy()
+                self.kind = classify( self.__M ) if kind is None else kind
             else:
                 raise ValueError('Expected a transform or 4x4 numpy.ndarray')
         else:
-            self.M = numpy.eye( 4, dtype=numpy.float32 )
-
-    def matrix( self ):
-        """Return the transformation matric"""
-        return self.M.copy()
+            self.__M = numpy.eye( 4, dtype=numpy.float32 )
+            self.kind = IDENTITY
+
+    @property
+    def M( self ):
+        """The 4x4 matrix, assigning a new one reclassifies the transform
+        and drops the cached inverse, while writes into its elements must
+        be followed by an assignment or done with the in-place methods"""
+        return self.__M
+
+    @M.setter
+    def M( self, M ):
+        self.__M = M
+        self.__modified( IDENTITY )
+        self.kind = classify( M )
+
+    def matrix( self, copy=True ):
+        """Return the transformation matric
+
+        Args:
+            copy (bool): if False a read-only view of the matrix is
+                returned instead of a copy, valid until the transform is
+                next modified in place
+        """
+        if copy:
+            return self.__M.copy()
+        view = self.__M.view()
+        view.flags.writeable = False
+        return view
+
+    def __scratch( self, dtype=None ):
+        """Returns (2,4,4) scratch matrices reused by the in-place operations,
+        of dtype or else the dtype of the matrix"""
+        dtype = self.__M.dtype if dtype is None else dtype
+        if self.__buffers is None or self.__buffers.dtype != dtype:
+            self.__buffers = numpy.empty( (2,4,4), dtype=dtype )
+        return self.__buffers
+
+    def __modified( self, kind ):
+        """Updates the kind after an in-place operation and drops the cached inverse"""
+        self.kind = max( self.kind, kind )
+        if self.__inverse is not None:
+            self.__inverse.__inverse = None
+            self.__inverse = None
+
+    def identity_( self ):
+        """Resets the transform to identity in place"""
+        self.__M[...] = 0.0
+        self.__M[0,0] = self.__M[1,1] = self.__M[2,2] = self.__M[3,3] = 1.0
+        self.__modified( IDENTITY )
+        self.kind = IDENTITY
+        return self
+
+    def set_( self, T ):
+        """Copies another Transform into this one in place"""
+        self.__M[...] = T.M
+        self.__modified( T.kind )
+        self.kind = T.kind
+        return self
+
+    def mul_( self, T ):
+        """Post-multiplies by another Transform in place, self = self*T"""
+        S = self.__scratch( numpy.result_type( self.__M, T.M ) )
+        numpy.dot( self.__M, T.M, out=S[0] )
+        self.__M[...] = S[0]
+        self.__modified( T.kind )
+        return self
 
     def inverse( self ):
-        """Return the inverse of the transform"""
-        return Transform( numpy.linalg.inv(self.M) )
+        """Return the inverse of the transform, computed once and cached"""
+        if self.__inverse is None:
+            M, kind = _inverse( self.__M, self.kind )
+            self.__inverse = Transform( M, kind )
+            self.__inverse.__inverse = self
+        return self.__inverse
+
+    def normal_matrix( self ):
+        """Return the 3x3 inverse-transpose of the upper block, used to transform normals"""
+        if self.kind <= RIGID:
+            return self.__M[:3,:3].copy()
+        return self.inverse().M[:3,:3].T.copy()
+
+    def apply_points( self, P, out=None, chunk_size=1<<18, workers=None ):
+        """Transform an array of points
+
+        The upper 3x3 block and translation are applied directly, the
+        homogeneous divide is only performed for projective transforms.
+        Inputs are processed in chunks of rows, so large or memory-mapped
+        arrays are never copied as a whole.
+
+        Args:
+            P (array-like): (N,3) row-major points, or a single 3-element point
+
+            out (ndarray): optional (N,3) output array, may be P itself
+                for an in-place transform
+
+            chunk_size (int): number of rows processed at a time
+
+            workers (int): if given, chunks are processed by a pool of
+                this many threads
+
+        Returns:
+            (N,3) transformed points, out if it was given
+        """
+        return self.__apply_rows( P, out, chunk_size, workers, True )
+
+    def apply_vectors( self, V, out=None, chunk_size=1<<18, workers=None ):
+        """Transform an array of direction vectors by the upper 3x3 block,
+        arguments as for apply_points"""
+        return self.__apply_rows( V, out, chunk_size, workers, False )
+
+    def __apply_rows( self, P, out, chunk_size, workers, points ):
+        if not isinstance(P, numpy.ndarray):
+            P = numpy.asarray( P, dtype=numpy.float32 )
+        shape = P.shape
+        P = P.reshape(-1,3)
+        if out is None:
+            out = numpy.empty( P.shape, dtype=numpy.result_type(P,numpy.float32) )
+        rows = out.reshape(-1,3)
+
+        M = self.__M
+        A = M[:3,:3].T
+        t = M[:3,3]
+        w = M[3,:3]
+        kind = self.kind if points else min( self.kind, AFFINE )
+
+        def chunk( start ):
+            src = P[start:start+chunk_size]
+            dst = rows[start:start+chunk_size]
+            if kind == IDENTITY or (kind == TRANSLATION and not points):
+                dst[...] = src
+            elif kind == TRANSLATION:
+                numpy.add( src, t, out=dst )
+            elif kind == PROJECTIVE:
+                h = numpy.dot( src, w )
+                h += M[3,3]
+                numpy.matmul( src, A, out=dst )
+                dst += t
+                dst /= h[:,None]
+            else:
+                numpy.matmul( src, A, out=dst )
+                if points:
+                    dst += t
+
+        starts = range( 0, P.shape[0], chunk_size )
+        if workers and len(starts) > 1:
+            with ThreadPoolExecutor( max_workers=workers ) as pool:
+                list( pool.map( chunk, starts ) )
+        else:
+            for start in starts:
+                chunk( start )
+        return out.reshape( shape ) if out.shape != shape else out
+
+    def __chain( self, T, kind ):
+        return Transform( numpy.dot( T, self.__M ), max( kind, self.kind ) )
 
     def __mul__( self, T ):
         """Post-multiply by another Transformation or (set of) point(s)"""
         if isinstance(T, Transform):
-            return Transform( numpy.dot(self.M, T.M) )
+            return Transform( numpy.dot(self.__M, T.M), max( self.kind, T.kind ) )
+        elif not isinstance(T, (collections.abc.Sequence, numpy.ndarray)):
+            return NotImplemented
+        elif isinstance(T, numpy.ndarray) and len(T) == 3:
+            # columns of points, transformed without a homogeneous copy
+            return self.apply_points( T.T ).T
         else:
-            R = numpy.dot( self.M, homogenize(T) )
+            R = numpy.dot( self.__M, homogenize(T) )
             if len(T) == 3:
                 R[0] /= R[3]
                 R[1] /= R[3]
@@ -124,43 +361,80 @@ class Transform:
             else:
                 return R
 
+    def __apply( self, L, kind ):
+        """Pre-multiplies M in place by L through the scratch buffers"""
+        S = self.__scratch( numpy.result_type( L, self.__M ) )
+        numpy.dot( L, self.__M, out=S[0] )
+        self.__M[...] = S[0]
+        self.__modified( kind )
+        return self
+
     def perspective( self, fovy, aspect, near, far ):
         """Implementation of gluPerspective"""
+        return self.__chain( self.__perspective( fovy, aspect, near, far ), PROJECTIVE )
+
+    def perspective_( self, fovy, aspect, near, far ):
+        """In-place perspective"""
+        return self.__apply( self.__perspective( fovy, aspect, near, far ), PROJECTIVE )
+
+    @staticmethod
+    def __perspective( fovy, aspect, near, far ):
         f = 1.0/numpy.tan(numpy.deg2rad(fovy)/2)
-        T = numpy.array([
+        return numpy.array([
             [f/aspect, 0.0, 0.0, 0.0],
             [     0.0,   f, 0.0, 0.0],
             [     0.0, 0.0, (far+near)/(near-far), 2*far*near/(near-far) ],
             [ 0.0, 0.0, -1.0, 0.0]
         ], dtype=numpy.float32)
-        return Transform( numpy.dot( T, self.M ) )
 
     def frustum( self, left, right, bottom, top, near, far ):
         """Implementation of gluFrustum"""
+        return self.__chain( self.__frustum( left, right, bottom, top, near, far ), PROJECTIVE )
+
+    def frustum_( self, left, right, bottom, top, near, far ):
+        """In-place frustum"""
+        return self.__apply( self.__frustum( left, right, bottom, top, near, far ), PROJECTIVE )
+
+    @staticmethod
+    def __frustum( left, right, bottom, top, near, far ):
         A = (right+left)/(right-left)
         B = (top+bottom)/(top-bottom)
         C = -(far+near)/(far-near)
         D = -2*far*near/(far-near)
-        T = numpy.array([
+        return numpy.array([
             [ 2.0*near/(right-left),                 0.0,    A, 0.0 ],
             [ 0.0,                   2*near/(top-bottom),    B, 0.0 ],
             [ 0.0,                                   0.0,    C,   D ],
             [ 0.0,                                   0.0, -1.0, 0.0 ]
         ], dtype=numpy.float32 )
-        return Transform( numpy.dot( T, self.M ) )
 
     def ortho( self, left, right, bottom, top, near, far ):
         """Implementation of glOrtho"""
-        T = numpy.array([
+        return self.__chain( self.__ortho( left, right, bottom, top, near, far ), AFFINE )
+
+    def ortho_( self, left, right, bottom, top, near, far ):
+        """In-place ortho"""
+        return self.__apply( self.__ortho( left, right, bottom, top, near, far ), AFFINE )
+
+    @staticmethod
+    def __ortho( left, right, bottom, top, near, far ):
+        return numpy.array([
             [2.0/(right-left),              0.0,             0.0, -(right+left)/(right-left)],
             [             0.0, 2.0/(top-bottom),             0.0, -(top+bottom)/(top-bottom)],
             [             0.0,              0.0, -2.0/(far-near), -(far+near)/(far-near) ],
             [ 0.0, 0.0, 0.0, 1.0 ]
         ], dtype=numpy.float32 )
-        return Transform( numpy.dot( T, self.M ) ) 
 
     def lookat( self, ex, ey, ez, cx, cy, cz, ux, uy, uz ):
         """Implementation of gluLookat"""
+        return self.__chain( self.__lookat( ex, ey, ez, cx, cy, cz, ux, uy, uz ), RIGID )
+
+    def lookat_( self, ex, ey, ez, cx, cy, cz, ux, uy, uz ):
+        """In-place lookat"""
+        return self.__apply( self.__lookat( ex, ey, ez, cx, cy, cz, ux, uy, uz ), RIGID )
+
+    @staticmethod
+    def __lookat( ex, ey, ez, cx, cy, cz, ux, uy, uz ):
         f = numpy.array([cx-ex,cy-ey,cz-ez],dtype=numpy.float32)
         f /= numpy.linalg.norm(f)
         u = numpy.array([ux,uy,uz],dtype=numpy.float32)
@@ -168,50 +442,69 @@ class Transform:
         r /= numpy.linalg.norm(r)
         u = numpy.cross( r, f )
         e = numpy.array([ex,ey,ez],dtype=numpy.float32)
-        T = numpy.array([
+        return numpy.array([
             [ r[0],  r[1],  r[2], -numpy.dot(r,e)],
             [ u[0],  u[1],  u[2], -numpy.dot(u,e)],
             [-f[0], -f[1], -f[2],  numpy.dot(f,e)],
             [ 0.0,  0.0,  0.0, 1.0]
         ], dtype=numpy.float32)
-        return Transform( numpy.dot( T, self.M ) )
 
     def translate( self, x, y, z ):
         """Implementation of glTranslatef"""
-        T = numpy.array([
-            [1.0, 0.0, 0.0,   x],
-            [0.0, 1.0, 0.0,   y],
-            [0.0, 0.0, 1.0,   z],
-            [0.0, 0.0, 0.0, 1.0]
-        ], dtype=numpy.float32 )
-        return Transform( numpy.dot( T, self.M ) )
+        return Transform( self ).translate_( x, y, z )
+
+    def translate_( self, x, y, z ):
+        """In-place translate, adds multiples of the last row to the first three"""
+        M = self.__M
+        if self.kind < PROJECTIVE:
+            # last row is (0,0,0,1), only the translation column changes
+            M[0,3] += x
+            M[1,3] += y
+            M[2,3] += z
+        else:
+            S = self.__scratch()
+            for row, t in ( (0,x), (1,y), (2,z) ):
+                numpy.multiply( M[3], t, out=S[1,0] )
+                M[row] += S[1,0]
+        self.__modified( TRANSLATION )
+        return self
 
     def scale( self, x, y, z ):
         """Implementation of glScalef"""
-        S = numpy.array([
-            [  x, 0.0, 0.0, 0.0],
-            [0.0,   y, 0.0, 0.0],
-            [0.0, 0.0,   z, 0.0],
-            [0.0, 0.0, 0.0, 1.0]
-        ], dtype=numpy.float32 )
-        return Transform( numpy.dot( S, self.M ) )
+        return Transform( self ).scale_( x, y, z )
+
+    def scale_( self, x, y, z ):
+        """In-place scale, multiplies the first three rows"""
+        M = self.__M
+        M[0] *= x
+        M[1] *= y
+        M[2] *= z
+        self.__modified( AFFINE )
+        return self
 
     def rotate( self, deg, ax, ay, az ):
         """Implementation of glRotatef"""
-        L = numpy.sqrt(ax**2+ay**2+az**2)
+        return Transform( self ).rotate_( deg, ax, ay, az )
+
+    def rotate_( self, deg, ax, ay, az ):
+        """In-place rotate, multiplies the first three rows by the rotation"""
+        # scalar math module functions avoid numpy scalar overhead
+        L = math.sqrt(ax**2+ay**2+az**2)
         x = ax/L
         y = ay/L
         z = az/L
 
-        rad = numpy.deg2rad( deg )
-        c = numpy.cos(rad)
-        s = numpy.sin(rad)
+        rad = math.radians( deg )
+        c = math.cos(rad)
+        s = math.sin(rad)
         C = 1.0-c
 
-        R = numpy.array([
-            [x*x*C + c,   x*y*C - z*s, x*z*C + y*s, 0.0],
-            [y*x*C + z*s, y*y*C + c,   y*z*C - x*s, 0.0],
-            [z*x*C - y*s, z*y*C + x*s, z*z*C + c,   0.0],
-            [0.0, 0.0, 0.0, 1.0]            
-        ], dtype=numpy.float32 )
-        return Transform( numpy.dot( R, self.M ) )
\ No newline at end of file
+        S = self.__scratch()
+        R = S[1].reshape(16)[:9].reshape(3,3)
+        R[...] = ((x*x*C + c,   x*y*C - z*s, x*z*C + y*s),
+                  (y*x*C + z*s, y*y*C + c,   y*z*C - x*s),
+                  (z*x*C - y*s, z*y*C + x*s, z*z*C + c  ))
+        numpy.dot( R, self.__M[:3], out=S[0,:3] )
+        self.__M[:3] = S[0,:3]
+        self.__modified( RIGID )
+        return self
@@ -0,0 +1,202 @@
+"""Batched 4x4 transformations
+
+A TransformArray holds N row-major transforms in a single (N,4,4)
+float32 array and offers the builder vocabulary of Transform, where every
+parameter may be a scalar or an (N,) array giving one value per
+transform. As with Transform, chained operations are applied
+left-to-right and each returns a new TransformArray.
+
+Builders are applied directly to the rows of the stacked matrices:
+translations add multiples of the last row, scales multiply rows and
+rotations multiply the upper three rows by a batch of 3x3 matrices, so
+no per-element 4x4 matrices are built.
+
+Example::
+
+    from graphics.core import TransformArray
+
+    # one transform per object, spinning at different rates
+    T = TransformArray( N ).rotate( rate*t, 0, 1, 0 ).translate( px, py, pz )
+
+    # compose with a shared camera transform and apply to object centers
+    MV = camera * T
+    centers = MV.apply_points( numpy.zeros((N,3)) )
+
+    # column-major (N,16) data for an instanced mat4 attribute
+    data = MV.column_major()
+
+"""
+
+import numpy
+
+from graphics.core.transform import Transform
+
+def _param( value, n ):
+    """Broadcasts a scalar or per-element parameter to an (n,) float32 array"""
+    return numpy.broadcast_to( numpy.asarray( value, dtype=numpy.float32 ), (n,) )
+
+class TransformArray(object):
+    def __init__( self, T=1 ):
+        """Initialize N identity transforms or from existing matrices
+
+        Args:
+            T (int, ndarray, TransformArray or sequence of Transform): number
+                of identity transforms, an (N,4,4) array of row-major
+                matrices, or transforms to copy
+        """
+        if isinstance(T,TransformArray):
+            self.M = T.M.copy()
+        elif isinstance(T,numpy.ndarray):
+            if T.ndim != 3 or T.shape[1:] != (4,4):
+                raise ValueError('Expected an (N,4,4) numpy.ndarray')
+            self.M = T.astype(numpy.float32)
+        elif isinstance(T,(int,numpy.integer)):
+            self.M = numpy.tile( numpy.eye( 4, dtype=numpy.float32 ), (int(T),1,1) )
+        else:
+            self.M = numpy.array( [ t.M for t in T ], dtype=numpy.float32 ).reshape(-1,4,4)
+
+    def __len__( self ):
+        return self.M.shape[0]
+
+    def __getitem__( self, key ):
+        """Returns a Transform for an integer index, otherwise a TransformArray"""
+        if isinstance(key,(int,numpy.integer)):
+            return Transform( self.M[key] )
+        return TransformArray( self.M[key] )
+
+    def __setitem__( self, key, T ):
+        self.M[key] = T.M
+
+    def matrices( self ):
+        """Return a copy of the (N,4,4) transformation matrices"""
+        return self.M.copy()
+
+    def inverse( self ):
+        """Return the inverse of every transform"""
+        return TransformArray( numpy.linalg.inv( self.M ) )
+
+    def __mul__( self, T ):
+        """Post-multiply elementwise by a TransformArray or by a single Transform"""
+        return TransformArray( numpy.matmul( self.M, T.M ) )
+
+    def __rmul__( self, T ):
+        """Pre-multiply every transform by a single Transform"""
+        return TransformArray( numpy.matmul( T.M, self.M ) )
+
+    def __matmul__( self, T ):
+        return self.__mul__( T )
+
+    def __rmatmul__( self, T ):
+        return self.__rmul__( T )
+
+    def matmul( self, T ):
+        """Return self * T, T is a TransformArray of equal length or a Transform"""
+        return self.__mul__( T )
+
+    def apply_points( self, P ):
+        """Transform points, dividing by the homogeneous coordinate
+
+        Args:
+            P (array-like): (N,3) points, one per transform, or (N,K,3)
+                sets of K points per transform
+
+        Returns:
+            float32 array of the same shape as P
+        """
+        P = numpy.asarray( P, dtype=numpy.float32 )
+        single = P.ndim == 2
+        if single:
+            P = P[:,None,:]
+        R = numpy.matmul( P, self.M[:,:3,:3].transpose(0,2,1) ) + self.M[:,None,:3,3]
+        w = numpy.matmul( P, self.M[:,3,:3,None] )[...,0] + self.M[:,None,3,3]
+        R /= w[...,None]
+        return R[:,0] if single else R
+
+    def apply_vectors( self, V ):
+        """Transform direction vectors by the upper 3x3 block, shapes as for apply_points"""
+        V = numpy.asarray( V, dtype=numpy.float32 )
+        if V.ndim == 2:
+            return numpy.matmul( self.M[:,:3,:3], V[:,:,None] )[...,0]
+        return numpy.matmul( V, self.M[:,:3,:3].transpose(0,2,1) )
+
+    def column_major( self, out=None ):
+        """Return the matrices as contiguous (N,16) float32 column-major data,
+        the layout expected by glUniformMatrix4fv and instanced mat4 attributes
+
+        Args:
+            out (ndarray): optional preallocated (N,16) float32 array, reused
+                to avoid an allocation per frame
+        """
+        if out is None:
+            out = numpy.empty( (len(self),16), dtype=numpy.float32 )
+        out.reshape(-1,4,4)[...] = self.M.transpose(0,2,1)
+        return out
+
+    def __premultiply( self, L ):
+        return TransformArray( numpy.matmul( L, self.M ) )
+
+    def translate( self, x, y, z ):
+        """Batched glTranslatef"""
+        n = len(self)
+        M = self.M.copy()
+        M[:,0] += _param(x,n)[:,None]*self.M[:,3]
+        M[:,1] += _param(y,n)[:,None]*self.M[:,3]
+        M[:,2] += _param(z,n)[:,None]*self.M[:,3]
+        return TransformArray( M )
+
+    def scale( self, x, y, z ):
+        """Batched glScalef"""
+        n = len(self)
+        M = self.M.copy()
+        M[:,0] *= _param(x,n)[:,None]
+        M[:,1] *= _param(y,n)[:,None]
+        M[:,2] *= _param(z,n)[:,None]
+        return TransformArray( M )
+
+    def rotate( self, deg, ax, ay, az ):
+        """Batched glRotatef"""
+        n = len(self)
+        ax, ay, az = _param(ax,n), _param(ay,n), _param(az,n)
+        L = numpy.sqrt( ax**2 + ay**2 + az**2 )
+        x, y, z = ax/L, ay/L, az/L
+
+        rad = numpy.deg2rad( _param(deg,n) )
+        c = numpy.cos(rad)
+        s = numpy.sin(rad)
+        C = 1.0-c
+
+        R = numpy.empty( (n,3,3), dtype=numpy.float32 )
+        R[:,0,0] = x*x*C + c
+        R[:,0,1] = x*y*C - z*s
+        R[:,0,2] = x*z*C + y*s
+        R[:,1,0] = y*x*C + z*s
+        R[:,1,1] = y*y*C + c
+        R[:,1,2] = y*z*C - x*s
+        R[:,2,0] = z*x*C - y*s
+        R[:,2,1] = z*y*C + x*s
+        R[:,2,2] = z*z*C + c
+
+        M = self.M.copy()
+        M[:,:3] = numpy.matmul( R, self.M[:,:3] )
+        return TransformArray( M )
+
+    def lookat( self, ex, ey, ez, cx, cy, cz, ux, uy, uz ):
+        """Batched gluLookat"""
+        n = len(self)
+        e = numpy.stack( (_param(ex,n), _param(ey,n), _param(ez,n)), axis=1 )
+        f = numpy.stack( (_param(cx,n), _param(cy,n), _param(cz,n)), axis=1 ) - e
+        f /= numpy.linalg.norm( f, axis=1, keepdims=True )
+        u = numpy.stack( (_param(ux,n), _param(uy,n), _param(uz,n)), axis=1 )
+        r = numpy.cross( f, u )
+        r /= numpy.linalg.norm( r, axis=1, keepdims=True )
+        u = numpy.cross( r, f )
+
+        T = numpy.zeros( (n,4,4), dtype=numpy.float32 )
+        T[:,0,:3] = r
+        T[:,1,:3] = u
+        T[:,2,:3] = -f
+        T[:,0,3]  = -numpy.sum( r*e, axis=1 )
+        T[:,1,3]  = -numpy.sum( u*e, axis=1 )
+        T[:,2,3]  =  numpy.sum( f*e, axis=1 )
+        T[:,3,3]  = 1.0
+        return self.__premultiply( T )
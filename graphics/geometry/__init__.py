@@ -1,2 +1,21 @@
-from graphics.geometry.mesh import *
-from graphics.geometry.simple_shapes import *
+from graphics.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports( __name__, {
+    'Mesh':             'graphics.geometry.mesh',
+    'cube':             'graphics.geometry.simple_shapes',
+    'BVH':              'graphics.geometry.bvh',
+    'screen_rays':      'graphics.geometry.bvh',
+    'PointGrid':        'graphics.geometry.point_index',
+    'FrustumCuller':    'graphics.geometry.culling',
+    'classify_boxes':   'graphics.geometry.culling',
+    'cull_boxes':       'graphics.geometry.culling',
+    'cull_spheres':     'graphics.geometry.culling',
+    'mesh_bounds':      'graphics.geometry.culling',
+    'transform_boxes':  'graphics.geometry.culling',
+    'rasterize':        'graphics.geometry.rasterizer',
+    'PointOctree':      'graphics.geometry.point_octree',
+    'mesh_indices':     'graphics.geometry.vertex_cache',
+    'cache_stats':      'graphics.geometry.vertex_cache',
+    'optimize_indices': 'graphics.geometry.vertex_cache',
+    'optimize_mesh':    'graphics.geometry.vertex_cache',
+})
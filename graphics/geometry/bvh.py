@@ -0,0 +1,298 @@
+"""Bounding volume hierarchy for CPU ray casting against triangles
+
+The hierarchy is built level by level with a binned surface area
+heuristic: all nodes of a level are binned, scored and partitioned
+together with numpy operations, so the build cost is a few array passes
+per level rather than Python work per node. Nodes are stored in flat
+arrays; children of an interior node are adjacent, leaves reference a
+contiguous run of the triangle permutation.
+
+Ray queries are batched. Each iteration tests every live (ray, node)
+pair against the node bounds at once, expands interior nodes to their
+children and intersects leaf triangles with a vectorized Moller-Trumbore
+test, pruning pairs that lie beyond the closest hit found so far.
+
+Example::
+
+    bvh = BVH.from_mesh( mesh )
+    origins, directions = screen_rays( [(x,y)], width, height, projection, modelview )
+    tri, t, bary = bvh.intersect( origins, directions )
+
+"""
+
+import numpy
+
+class BVH(object):
+    def __init__( self, triangles, leaf_size=4, bins=16 ):
+        """Builds the hierarchy
+
+        Args:
+            triangles (array-like): (T,3,3) triangle corners, or (3T,3)
+                vertices with three consecutive vertices per triangle as
+                in graphics.geometry.Mesh.vertices
+
+            leaf_size (int): nodes with at most this many triangles may
+                become leaves
+
+            bins (int): number of SAH bins per node
+        """
+        tris = numpy.asarray( triangles, dtype=numpy.float32 ).reshape(-1,3,3)
+        self.triangles = tris
+        self.leaf_size = max( int(leaf_size), 1 )
+        self.bins      = max( int(bins), 2 )
+        self.__build()
+
+    @staticmethod
+    def from_mesh( mesh, leaf_size=4, bins=16 ):
+        """Builds a BVH over the triangles of a finalized Mesh"""
+        return BVH( mesh.vertices, leaf_size, bins )
+
+    def __len__( self ):
+        return self.node_min.shape[0]
+
+    def __build( self ):
+        tris = self.triangles
+        T    = tris.shape[0]
+
+        # per-axis rows of triangle bounds and centroids, kept permuted in
+        # tree order so each level gathers nearly sequential positions
+        order = numpy.arange( T, dtype=numpy.int64 )
+        tmin  = numpy.ascontiguousarray( tris.min( axis=1 ).T )
+        tmax  = numpy.ascontiguousarray( tris.max( axis=1 ).T )
+        cent  = 0.5*(tmin + tmax)
+
+        # a binary tree over T leaves has at most 2T-1 nodes
+        cap = max( 2*T-1, 1 )
+        self.node_min   = numpy.zeros( (cap,3), dtype=numpy.float32 )
+        self.node_max   = numpy.zeros( (cap,3), dtype=numpy.float32 )
+        self.node_child = numpy.full( cap, -1, dtype=numpy.int64 )
+        self.node_start = numpy.zeros( cap, dtype=numpy.int64 )
+        self.node_count = numpy.zeros( cap, dtype=numpy.int64 )
+        self.node_count[0] = T
+        num_nodes = 1
+
+        # nodes of the current level: node index, start, count
+        ids, starts, counts = numpy.array([0]), numpy.array([0]), numpy.array([T])
+        while T > 0 and ids.size:
+            offsets = numpy.cumsum(counts) - counts
+            pos = numpy.repeat( starts - offsets, counts ) + numpy.arange( counts.sum() )
+            self.node_min[ids] = numpy.minimum.reduceat( tmin[:,pos], offsets, axis=1 ).T
+            self.node_max[ids] = numpy.maximum.reduceat( tmax[:,pos], offsets, axis=1 ).T
+
+            # nodes small enough become leaves, the rest are split
+            inner = counts > self.leaf_size
+            if not numpy.any(inner):
+                break
+            ids, starts, counts = ids[inner], starts[inner], counts[inner]
+            n = ids.size
+            offsets = numpy.cumsum(counts) - counts
+            seg  = numpy.repeat( numpy.arange(n), counts )
+            rank = numpy.arange( seg.size ) - offsets[seg]
+            pos  = starts[seg] + rank
+
+            # bin centroids along the longest centroid axis of each node
+            cen  = cent[:,pos]
+            cmin = numpy.minimum.reduceat( cen, offsets, axis=1 )
+            cmax = numpy.maximum.reduceat( cen, offsets, axis=1 )
+            B      = int( min( self.bins, counts.max() ) )
+            extent = cmax - cmin
+            axis   = numpy.argmax( extent, axis=0 )
+            ext    = extent[axis,numpy.arange(n)]
+            scale  = numpy.where( ext > 0, B/numpy.where(ext > 0, ext, 1.0), 0.0 )
+            c      = cen[axis[seg],numpy.arange(seg.size)] - cmin[axis,numpy.arange(n)][seg]
+            bin_id = numpy.clip( (c*scale[seg]).astype(numpy.int64), 0, B-1 )
+            key    = seg*B + bin_id
+
+            cnt   = numpy.bincount( key, minlength=n*B ).reshape(n,B).T
+            bbmin = numpy.full( (3,n*B), numpy.inf, dtype=numpy.float32 )
+            bbmax = numpy.full( (3,n*B), -numpy.inf, dtype=numpy.float32 )
+            for a in range(3):
+                numpy.minimum.at( bbmin[a], key, tmin[a,pos] )
+                numpy.maximum.at( bbmax[a], key, tmax[a,pos] )
+            # (axis, bin, node) layout so the sweeps run along contiguous nodes
+            bbmin = numpy.ascontiguousarray( bbmin.reshape(3,n,B).transpose(0,2,1) )
+            bbmax = numpy.ascontiguousarray( bbmax.reshape(3,n,B).transpose(0,2,1) )
+
+            # sweep from both sides, SAH cost of splitting after bin k
+            lcnt  = numpy.cumsum( cnt, axis=0 )[:-1]
+            rcnt  = numpy.cumsum( cnt[::-1], axis=0 )[::-1][1:]
+            larea = _area( numpy.minimum.accumulate( bbmin, axis=1 ), numpy.maximum.accumulate( bbmax, axis=1 ) )[:-1]
+            rarea = _area( numpy.minimum.accumulate( bbmin[:,::-1], axis=1 )[:,::-1],
+                           numpy.maximum.accumulate( bbmax[:,::-1], axis=1 )[:,::-1] )[1:]
+            cost  = numpy.where( (lcnt > 0) & (rcnt > 0), lcnt*larea + rcnt*rarea, numpy.inf )
+            split = numpy.argmin( cost, axis=0 )
+
+            # nodes whose centroids can not be binned apart get a median split
+            median = ~numpy.isfinite( cost[split,numpy.arange(n)] )
+            left = numpy.where( median[seg], rank < (counts[seg]//2), bin_id <= split[seg] )
+            nl   = numpy.bincount( seg, weights=left, minlength=n ).astype(numpy.int64)
+
+            # partition each node, left side first, keeping the rows in step
+            perm = pos[ numpy.lexsort( (~left, seg) ) ]
+            order[pos] = order[perm]
+            for arr in (tmin, tmax, cent):
+                arr[:,pos] = arr[:,perm]
+
+            # children of a split node are stored next to each other
+            first = num_nodes + 2*numpy.arange( n )
+            num_nodes += 2*n
+            self.node_child[ids] = first
+            self.node_count[ids] = 0
+
+            cids   = numpy.arange( first[0], num_nodes )
+            cstart = numpy.empty( 2*n, dtype=numpy.int64 )
+            ccount = numpy.empty( 2*n, dtype=numpy.int64 )
+            cstart[0::2] = starts
+            ccount[0::2] = nl
+            cstart[1::2] = starts + nl
+            ccount[1::2] = counts - nl
+            self.node_start[cids] = cstart
+            self.node_count[cids] = ccount
+            ids, starts, counts = cids, cstart, ccount
+
+        self.node_min   = self.node_min[:num_nodes]
+        self.node_max   = self.node_max[:num_nodes]
+        self.node_child = self.node_child[:num_nodes]
+        self.node_start = self.node_start[:num_nodes]
+        self.node_count = self.node_count[:num_nodes]
+        self.order      = order
+
+        # triangles in leaf order for coherent access
+        tris = tris[order]
+        self.__v0 = tris[:,0]
+        self.__e1 = tris[:,1] - tris[:,0]
+        self.__e2 = tris[:,2] - tris[:,0]
+
+    def intersect( self, origins, directions, tmin=0.0, tmax=numpy.inf ):
+        """Finds the closest triangle hit along each ray
+
+        Args:
+            origins (array-like): (R,3) ray origins
+
+            directions (array-like): (R,3) ray directions, need not be
+                normalized, distances are in units of direction length
+
+            tmin, tmax (float): valid ray parameter interval
+
+        Returns:
+            (R,) int64 triangle index, -1 where nothing was hit
+
+            (R,) float32 ray parameter of the hit, inf where nothing was hit
+
+            (R,2) float32 barycentric coordinates (u,v) of the hit, the
+                hit point is (1-u-v)*p0 + u*p1 + v*p2
+        """
+        org = numpy.asarray( origins, dtype=numpy.float32 ).reshape(-1,3)
+        dirs = numpy.asarray( directions, dtype=numpy.float32 ).reshape(-1,3)
+        R = org.shape[0]
+
+        best_t   = numpy.full( R, tmax, dtype=numpy.float32 )
+        best_tri = numpy.full( R, -1, dtype=numpy.int64 )
+        best_uv  = numpy.zeros( (R,2), dtype=numpy.float32 )
+        if R == 0 or self.triangles.shape[0] == 0:
+            return best_tri, numpy.full( R, numpy.inf, dtype=numpy.float32 ), best_uv
+
+        # zero direction components give infinite slabs, nan where an
+        # origin lies on a slab plane is ignored by fmax/fmin
+        with numpy.errstate( divide='ignore', invalid='ignore' ):
+            inv = 1.0/dirs
+            rays  = numpy.arange( R )
+            nodes = numpy.zeros( R, dtype=numpy.int64 )
+            while rays.size:
+                # slab test of every live pair
+                o  = org[rays]
+                iv = inv[rays]
+                t0 = (self.node_min[nodes] - o)*iv
+                t1 = (self.node_max[nodes] - o)*iv
+                near = numpy.fmax.reduce( numpy.minimum(t0,t1), axis=1 )
+                far  = numpy.fmin.reduce( numpy.maximum(t0,t1), axis=1 )
+                live = (numpy.maximum( near, tmin ) <= numpy.minimum( far, best_t[rays] ))
+                rays, nodes = rays[live], nodes[live]
+
+                child = self.node_child[nodes]
+                leaf  = child < 0
+                if numpy.any(leaf):
+                    self.__intersect_leaves( org, dirs, rays[leaf], nodes[leaf], tmin, best_t, best_tri, best_uv )
+
+                inner = ~leaf
+                rays  = numpy.repeat( rays[inner], 2 )
+                nodes = (child[inner,None] + _PAIR).ravel()
+
+        hit_t = numpy.where( best_tri >= 0, best_t, numpy.inf ).astype(numpy.float32)
+        return best_tri, hit_t, best_uv
+
+    def __intersect_leaves( self, org, dirs, rays, nodes, tmin, best_t, best_tri, best_uv ):
+        counts = self.node_count[nodes]
+        r = numpy.repeat( rays, counts )
+        k = numpy.arange( r.size ) - numpy.repeat( numpy.cumsum(counts)-counts, counts ) + numpy.repeat( self.node_start[nodes], counts )
+
+        # Moller-Trumbore on all (ray, triangle) pairs
+        d  = dirs[r]
+        e1 = self.__e1[k]
+        e2 = self.__e2[k]
+        p  = _cross( d, e2 )
+        det = numpy.einsum( 'ij,ij->i', e1, p )
+        inv = 1.0/det
+        s = org[r] - self.__v0[k]
+        u = numpy.einsum( 'ij,ij->i', s, p )*inv
+        q = _cross( s, e1 )
+        v = numpy.einsum( 'ij,ij->i', d, q )*inv
+        t = numpy.einsum( 'ij,ij->i', e2, q )*inv
+        hit = (numpy.abs(det) > 1e-12) & (u >= 0) & (v >= 0) & (u+v <= 1) & (t >= tmin) & (t < best_t[r])
+        if not numpy.any(hit):
+            return
+        r, k, t, u, v = r[hit], k[hit], t[hit], u[hit], v[hit]
+
+        # closest hit per ray
+        sel = numpy.lexsort( (t, r) )
+        r, k, t, u, v = r[sel], k[sel], t[sel], u[sel], v[sel]
+        first = numpy.concatenate( ([True], r[1:] != r[:-1]) )
+        r, k, t, u, v = r[first], k[first], t[first], u[first], v[first]
+        best_t[r]   = t
+        best_tri[r] = self.order[k]
+        best_uv[r,0] = u
+        best_uv[r,1] = v
+
+_PAIR = numpy.array( [0,1], dtype=numpy.int64 )
+
+def _cross( a, b ):
+    # numpy.cross carries noticeable per-call overhead for small batches
+    c = numpy.empty( a.shape, dtype=numpy.result_type(a,b) )
+    c[:,0] = a[:,1]*b[:,2] - a[:,2]*b[:,1]
+    c[:,1] = a[:,2]*b[:,0] - a[:,0]*b[:,2]
+    c[:,2] = a[:,0]*b[:,1] - a[:,1]*b[:,0]
+    return c
+
+def _area( bmin, bmax ):
+    # surface area of boxes stored with the axis first, empty boxes have none
+    d = numpy.maximum( bmax - bmin, 0.0 )
+    d = numpy.where( numpy.isfinite(d), d, 0.0 )
+    return 2.0*(d[0]*d[1] + d[1]*d[2] + d[2]*d[0])
+
+def screen_rays( points, width, height, projection, modelview ):
+    """Unprojects window pixels into world-space rays
+
+    Args:
+        points (array-like): (N,2) window coordinates with origin at the
+            bottom left
+
+        width, height (int): viewport size
+
+        projection, modelview (graphics.core.Transform): camera transforms
+
+    Returns:
+        (N,3) ray origins on the near plane and (N,3) unit directions
+    """
+    pts = numpy.asarray( points, dtype=numpy.float64 ).reshape(-1,2)
+    ndc = numpy.empty( (pts.shape[0],2,4) )
+    ndc[:,:,0] = (2.0*pts[:,0:1]/width - 1.0)
+    ndc[:,:,1] = (2.0*pts[:,1:2]/height - 1.0)
+    ndc[:,0,2] = -1.0
+    ndc[:,1,2] =  1.0
+    ndc[:,:,3] =  1.0
+    M = (projection*modelview).inverse().matrix().astype(numpy.float64)
+    w = ndc @ M.T
+    w = w[...,:3]/w[...,3:4]
+    d = w[:,1] - w[:,0]
+    d /= numpy.linalg.norm( d, axis=1, keepdims=True )
+    return w[:,0].astype(numpy.float32), d.astype(numpy.float32)
@@ -0,0 +1,162 @@
+"""Vectorized view-frustum culling
+
+Bounds of many objects are tested against the six planes of a
+projection*modelview Transform in single array passes, returning boolean
+visibility masks that can filter any draw submission loop. Planes are as
+returned by graphics.core.frustum_planes, unit normals pointing inwards.
+
+A FrustumCuller additionally groups objects into chunks of consecutive
+indices with their own bounds. Chunks entirely outside the frustum are
+rejected and chunks entirely inside accepted without testing their
+objects, so coherent scenes only test objects near the frustum boundary.
+Objects should be ordered spatially, e.g. by a space-filling curve, for
+chunks to be tight.
+
+Example::
+
+    mins, maxs = transform_boxes( scene.world_matrices(), *mesh_bounds( meshes ) )
+    culler = FrustumCuller( mins, maxs )
+
+    visible = culler.visible( camera.view_projection() )
+    for i in numpy.flatnonzero( visible ):
+        queue.submit( shader, meshes[i], ... )
+
+"""
+
+import numpy
+
+from graphics.core.transform import Transform
+from graphics.core.camera import frustum_planes
+
+OUTSIDE      = 0
+INTERSECTING = 1
+INSIDE       = 2
+
+def _planes( frustum ):
+    """Returns (6,4) planes from a Transform, 4x4 matrix or plane array"""
+    if isinstance(frustum,Transform):
+        return frustum_planes( frustum )
+    frustum = numpy.asarray( frustum, dtype=numpy.float32 )
+    return frustum_planes( frustum ) if frustum.shape == (4,4) else frustum
+
+def mesh_bounds( meshes ):
+    """Returns (N,3) mins and maxs of the cached aabb of each mesh"""
+    boxes = [ mesh.aabb for mesh in meshes ]
+    return numpy.array( [ b[0] for b in boxes ], dtype=numpy.float32 ).reshape(-1,3), \
+           numpy.array( [ b[1] for b in boxes ], dtype=numpy.float32 ).reshape(-1,3)
+
+def transform_boxes( M, mins, maxs ):
+    """Returns the axis-aligned bounds of affinely transformed boxes
+
+    Args:
+        M (ndarray or Transform): 4x4 transform applied to every box, or
+            (N,4,4) transforms, one per box
+
+        mins, maxs (array-like): (N,3) box corners
+
+    Returns:
+        (N,3) mins and maxs of the transformed boxes
+    """
+    M = M.M if isinstance(M,Transform) else numpy.asarray( M, dtype=numpy.float32 )
+    mins = numpy.asarray( mins, dtype=numpy.float32 )
+    maxs = numpy.asarray( maxs, dtype=numpy.float32 )
+    c = 0.5*(mins + maxs)
+    e = 0.5*(maxs - mins)
+    if M.ndim == 2:
+        c = c @ M[:3,:3].T + M[:3,3]
+        e = e @ numpy.abs( M[:3,:3] ).T
+    else:
+        c = numpy.matmul( M[:,:3,:3], c[:,:,None] )[...,0] + M[:,:3,3]
+        e = numpy.matmul( numpy.abs( M[:,:3,:3] ), e[:,:,None] )[...,0]
+    return c - e, c + e
+
+def classify_boxes( frustum, mins, maxs ):
+    """Classifies boxes as OUTSIDE, INTERSECTING or INSIDE the frustum
+
+    Args:
+        frustum (Transform or ndarray): projection*modelview transform,
+            its 4x4 matrix or (6,4) planes
+
+        mins, maxs (array-like): (N,3) box corners
+
+    Returns:
+        (N,) uint8 classification
+    """
+    P = _planes( frustum )
+    mins = numpy.asarray( mins, dtype=numpy.float32 )
+    maxs = numpy.asarray( maxs, dtype=numpy.float32 )
+    c = 0.5*(mins + maxs)
+    e = 0.5*(maxs - mins)
+    d = c @ P[:,:3].T
+    d += P[:,3]
+    r = e @ numpy.abs( P[:,:3] ).T
+    result = numpy.full( c.shape[0], INTERSECTING, dtype=numpy.uint8 )
+    result[ numpy.all( d >= r, axis=1 ) ] = INSIDE
+    result[ numpy.any( d < -r, axis=1 ) ] = OUTSIDE
+    return result
+
+def cull_boxes( frustum, mins, maxs ):
+    """Returns an (N,) mask of boxes that are at least partially inside the frustum"""
+    P = _planes( frustum )
+    mins = numpy.asarray( mins, dtype=numpy.float32 )
+    maxs = numpy.asarray( maxs, dtype=numpy.float32 )
+    d = (0.5*(mins + maxs)) @ P[:,:3].T
+    d += P[:,3]
+    d += (0.5*(maxs - mins)) @ numpy.abs( P[:,:3] ).T
+    return numpy.all( d >= 0.0, axis=1 )
+
+def cull_spheres( frustum, centers, radii ):
+    """Returns an (N,) mask of spheres that are at least partially inside the frustum"""
+    P = _planes( frustum )
+    d = numpy.asarray( centers, dtype=numpy.float32 ) @ P[:,:3].T
+    d += P[:,3]
+    d += numpy.asarray( radii, dtype=numpy.float32 ).reshape(-1,1)
+    return numpy.all( d >= 0.0, axis=1 )
+
+class FrustumCuller(object):
+    def __init__( self, mins, maxs, chunk_size=256 ):
+        """Creates a culler for a fixed set of object bounds
+
+        Args:
+            mins, maxs (array-like): (N,3) object bounding boxes
+
+            chunk_size (int): number of consecutive objects per chunk
+        """
+        self.chunk_size = chunk_size
+        self.update( mins, maxs )
+
+    def __len__( self ):
+        return self.__mins.shape[0]
+
+    def update( self, mins, maxs, indices=None ):
+        """Replaces the bounds of all objects, or of the given objects only,
+        and recomputes the chunk bounds"""
+        if indices is None:
+            self.__mins = numpy.array( mins, dtype=numpy.float32 ).reshape(-1,3)
+            self.__maxs = numpy.array( maxs, dtype=numpy.float32 ).reshape(-1,3)
+        else:
+            self.__mins[indices] = mins
+            self.__maxs[indices] = maxs
+        starts = numpy.arange( 0, self.__mins.shape[0], self.chunk_size )
+        if starts.size:
+            self.__chunk_mins = numpy.minimum.reduceat( self.__mins, starts, axis=0 )
+            self.__chunk_maxs = numpy.maximum.reduceat( self.__maxs, starts, axis=0 )
+        else:
+            self.__chunk_mins = self.__chunk_maxs = numpy.zeros( (0,3), dtype=numpy.float32 )
+
+    def visible( self, frustum ):
+        """Returns the (N,) visibility mask of the objects
+
+        Args:
+            frustum (Transform or ndarray): projection*modelview transform,
+                its 4x4 matrix or (6,4) planes
+        """
+        P = _planes( frustum )
+        n = self.__mins.shape[0]
+        chunk = classify_boxes( P, self.__chunk_mins, self.__chunk_maxs )
+        state = numpy.repeat( chunk, self.chunk_size )[:n]
+        mask = state == INSIDE
+        test = numpy.flatnonzero( state == INTERSECTING )
+        if test.size:
+            mask[test] = cull_boxes( P, self.__mins[test], self.__maxs[test] )
+        return mask
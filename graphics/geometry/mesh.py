@@ -1,6 +1,8 @@
 import os
 import numpy
 
+from graphics.instrument import phase
+
 class Mesh:
     def __init__( self ):
         self.init_vtx = []
@@ -17,6 +19,8 @@ class Mesh:
         self.nor = None
         self.tri = None
         self.mat_tris = None
+        self.bbox = None
+        self.bsphere = None
 
     @property
     def vertices( self ):
@@ -42,6 +46,33 @@ class Mesh:
             raise ValueError('Must load existing mesh or call finalize before accessing material triangles')
         return self.mat_tris
 
+    @property
+    def aabb( self ):
+        """Axis-aligned bounds of the vertices as (min, max) float32 3-vectors,
+        computed on first access, see invalidate_bounds"""
+        if self.bbox is None:
+            vtx = self.vertices
+            if vtx.shape[0] == 0:
+                raise ValueError('Mesh has no vertices to bound')
+            self.bbox = ( vtx.min(axis=0), vtx.max(axis=0) )
+        return self.bbox
+
+    @property
+    def bounding_sphere( self ):
+        """Bounding sphere of the vertices as (center, radius), centered on
+        the aabb, computed on first access, see invalidate_bounds"""
+        if self.bsphere is None:
+            lo, hi = self.aabb
+            center = 0.5*(lo + hi)
+            radius = float( numpy.sqrt( numpy.max( numpy.sum( (self.vertices - center)**2, axis=1 ) ) ) )
+            self.bsphere = ( center, radius )
+        return self.bsphere
+
+    def invalidate_bounds( self ):
+        """Drops the cached bounds, call after modifying vertices in place"""
+        self.bbox = None
+        self.bsphere = None
+
     @property
     def material_file( self ):
         return self.mat_file
@@ -79,12 +110,22 @@ class Mesh:
         return len(self.init_tri)
 
     def finalize( self ):
+        """Builds the non-indexed vertex, texture coordinate and normal
+        arrays, with triangles sorted by material, reported as the phase
+        finalize, see graphics.instrument"""
+        with phase('finalize') as p:
+            self.__finalize()
+            p.count( triangles=len(self.init_tri) )
+
+    def __finalize( self ):
         vtx = []
         tex = []
         fnor = []
         vnor = [ numpy.array((0,0,0),dtype=float) for a in range(len(self.init_vtx)) ]
 
-        self.mat, self.init_tri = zip( *[ (mat,tri) for mat, tri in sorted(zip(self.mat,self.init_tri))] )
+        with phase('finalize.sort') as p:
+            self.mat, self.init_tri = zip( *[ (mat,tri) for mat, tri in sorted(zip(self.mat,self.init_tri))] )
+            p.count( triangles=len(self.init_tri) )
 
         self.num_materials = 0
         self.mat_tris = {}
@@ -92,49 +133,56 @@ class Mesh:
         curr_mat  = 0
         mat_start = 0 
 
-        for idx,f in enumerate(self.init_tri):
-            if self.mat[idx] != curr_mat:
-                self.mat_tris[self.materials[curr_mat]] = (mat_start,idx)
-                curr_mat  = self.mat[idx]
-                mat_start = idx
-
-            # compute face normal
-            a = numpy.array( self.init_vtx[f[0][0]] )
-            b = numpy.array( self.init_vtx[f[1][0]] )
-            c = numpy.array( self.init_vtx[f[2][0]] )
-            n = numpy.cross( c-a, b-a )
-            vnor[ f[0][0] ] += n
-            vnor[ f[1][0] ] += n
-            vnor[ f[2][0] ] += n
-
-            vtx.append( a )
-            if self.init_tex[f[0][1]] is not None:
-                tex.append( self.init_tex[f[0][1]] )
-            else:
-                tex.append( (0.0, 0.0) )
-
-            vtx.append( b )
-            if self.init_tex[f[1][1]] is not None:
-                tex.append( self.init_tex[f[1][1]] )
-            else:
-                tex.append( (0.0, 0.0) )
-
-            vtx.append( c )
-            if self.init_tex[f[2][1]] is not None:
-                tex.append( self.init_tex[f[2][1]] )
-            else:
-                tex.append( (0.0, 0.0) )
-
-        self.mat_tris[self.materials[curr_mat]] = (mat_start,len(self.init_tri))
-
-        self.vtx = numpy.array( vtx, dtype=numpy.float32 )
-        self.tex = numpy.array( tex, dtype=numpy.float32 )
-        self.nor = numpy.zeros_like( self.vtx )
-        self.tri = numpy.array( self.init_tri )
+        with phase('finalize.faces') as p:
+            for idx,f in enumerate(self.init_tri):
+                if self.mat[idx] != curr_mat:
+                    self.mat_tris[self.materials[curr_mat]] = (mat_start,idx)
+                    curr_mat  = self.mat[idx]
+                    mat_start = idx
+
+                # compute face normal
+                a = numpy.array( self.init_vtx[f[0][0]] )
+                b = numpy.array( self.init_vtx[f[1][0]] )
+                c = numpy.array( self.init_vtx[f[2][0]] )
+                n = numpy.cross( c-a, b-a )
+                vnor[ f[0][0] ] += n
+                vnor[ f[1][0] ] += n
+                vnor[ f[2][0] ] += n
+
+                vtx.append( a )
+                if self.init_tex[f[0][1]] is not None:
+                    tex.append( self.init_tex[f[0][1]] )
+                else:
+                    tex.append( (0.0, 0.0) )
+
+                vtx.append( b )
+                if self.init_tex[f[1][1]] is not None:
+                    tex.append( self.init_tex[f[1][1]] )
+                else:
+                    tex.append( (0.0, 0.0) )
+
+                vtx.append( c )
+                if self.init_tex[f[2][1]] is not None:
+                    tex.append( self.init_tex[f[2][1]] )
+                else:
+                    tex.append( (0.0, 0.0) )
+
+            self.mat_tris[self.materials[curr_mat]] = (mat_start,len(self.init_tri))
+            p.count( triangles=len(self.init_tri) )
+
+        with phase('finalize.arrays') as p:
+            self.vtx = numpy.array( vtx, dtype=numpy.float32 )
+            self.invalidate_bounds()
+            self.tex = numpy.array( tex, dtype=numpy.float32 )
+            self.nor = numpy.zeros_like( self.vtx )
+            self.tri = numpy.array( self.init_tri )
+            p.count( vertices=self.vtx.shape[0] )
 
         # accumulate normals to vertices
-        for idx, f in enumerate(self.init_tri):
-            self.nor[idx*3+0,:] = vnor[f[0][0]]/numpy.linalg.norm(vnor[f[0][0]])
-            self.nor[idx*3+1,:] = vnor[f[1][0]]/numpy.linalg.norm(vnor[f[1][0]])
-            self.nor[idx*3+2,:] = vnor[f[2][0]]/numpy.linalg.norm(vnor[f[2][0]])
+        with phase('finalize.normals') as p:
+            for idx, f in enumerate(self.init_tri):
+                self.nor[idx*3+0,:] = vnor[f[0][0]]/numpy.linalg.norm(vnor[f[0][0]])
+                self.nor[idx*3+1,:] = vnor[f[1][0]]/numpy.linalg.norm(vnor[f[1][0]])
+                self.nor[idx*3+2,:] = vnor[f[2][0]]/numpy.linalg.norm(vnor[f[2][0]])
+            p.count( vertices=self.nor.shape[0] )
 
@@ -0,0 +1,356 @@
+"""Hashed uniform grid index for nearest-neighbour queries on point clouds
+
+Points are bucketed into cubic cells whose integer coordinates are packed
+into a single 64-bit key. The index keeps the point ids sorted by cell
+key together with the start of every occupied cell, so finding the
+points of a batch of cells is a searchsorted over the occupied keys and
+all queries are evaluated for whole batches at once.
+
+Points can be inserted and removed incrementally for streaming scans:
+new points are held in a small unsorted side list that queries scan
+directly, removals are tombstones, and the sorted structure is rebuilt
+once either grows past a fraction of the index.
+
+Example::
+
+    grid = PointGrid( points )
+    ids, dist = grid.knearest( queries, 8 )
+    qi, ids, dist = grid.radius( queries, 0.05 )
+    ids = grid.pick( origins, directions, numpy.deg2rad(0.5) )
+
+"""
+
+import numpy
+
+_BITS = 21
+_BIAS = 1 << (_BITS-1)
+_MASK = (1 << _BITS) - 1
+
+# (ray, cell) pairs of the coarsest level tested at once by cone()
+_CONE_BATCH = 1 << 20
+# cells per axis merged into a cell of the next coarser level by cone()
+_CONE_BRANCH = 4
+# coarser levels are added until one has at most this many cells
+_CONE_TOP = 64
+
+def _pack( cells ):
+    c = (cells.astype(numpy.int64) + _BIAS) & _MASK
+    return (c[...,0] << (2*_BITS)) | (c[...,1] << _BITS) | c[...,2]
+
+def _unpack( keys ):
+    return numpy.stack( ( (keys >> (2*_BITS)) & _MASK, (keys >> _BITS) & _MASK, keys & _MASK ), axis=1 ) - _BIAS
+
+class PointGrid(object):
+    def __init__( self, points=None, cell_size=None, points_per_cell=8, rebuild_fraction=0.1 ):
+        """Creates the index
+
+        Args:
+            points (array-like): optional (N,3) initial points, given ids 0..N-1
+
+            cell_size (float): edge length of the grid cells, chosen from
+                the bounds of the initial points if None
+
+            points_per_cell (int): target occupancy used to choose the
+                cell size
+
+            rebuild_fraction (float): pending inserts or removals, as a
+                fraction of the indexed points, that trigger a rebuild
+        """
+        pts = numpy.zeros( (0,3), dtype=numpy.float32 ) if points is None else numpy.asarray( points, dtype=numpy.float32 ).reshape(-1,3)
+        if cell_size is None:
+            cell_size = 1.0
+            if pts.shape[0] > 0:
+                ext = numpy.maximum( pts.max(axis=0) - pts.min(axis=0), 1e-6 )
+                cell_size = float( (numpy.prod(ext)*points_per_cell/pts.shape[0])**(1.0/3.0) )
+                cell_size = max( cell_size, float(ext.max())/(_BIAS-1) )
+        self.cell_size = float(cell_size)
+        self.rebuild_fraction = rebuild_fraction
+
+        self.__points  = pts.copy()
+        self.__alive   = numpy.ones( pts.shape[0], dtype=bool )
+        self.__count   = pts.shape[0]
+        self.__pending = []
+        self.__removed = 0
+        self.__rebuild()
+
+    def __len__( self ):
+        return int( numpy.count_nonzero( self.__alive[:self.__count] ) )
+
+    @property
+    def points( self ):
+        """(N,3) point storage indexed by id, removed ids hold stale values"""
+        return self.__points[:self.__count]
+
+    def __cells( self, pts ):
+        return numpy.floor( pts/self.cell_size ).astype(numpy.int64)
+
+    def __rebuild( self ):
+        ids = numpy.flatnonzero( self.__alive[:self.__count] )
+        keys = _pack( self.__cells( self.__points[ids] ) )
+        order = numpy.argsort( keys, kind='stable' )
+        self.__ids = ids[order]
+        keys = keys[order]
+        first = numpy.concatenate( ([True], keys[1:] != keys[:-1]) ) if keys.size else numpy.zeros(0,dtype=bool)
+        self.__cell_keys  = keys[first]
+        self.__cell_start = numpy.concatenate( (numpy.flatnonzero(first), [keys.size]) )
+        self.__cell_coords = _unpack( self.__cell_keys )
+        # bounds of the occupied cells, query boxes are clipped to them
+        if self.__cell_keys.size:
+            self.__cell_lo = self.__cell_coords.min( axis=0 )
+            self.__cell_hi = self.__cell_coords.max( axis=0 )
+        else:
+            self.__cell_lo = numpy.zeros( 3, dtype=numpy.int64 )
+            self.__cell_hi = numpy.full( 3, -1, dtype=numpy.int64 )
+        self.__levels  = None
+        self.__pending = []
+        self.__removed = 0
+
+    def __maybe_rebuild( self ):
+        limit = max( self.rebuild_fraction*max(self.__ids.size,1), 1024 )
+        if len(self.__pending) > limit or self.__removed > limit:
+            self.__rebuild()
+
+    def insert( self, points ):
+        """Adds points, returning their (M,) ids"""
+        pts = numpy.asarray( points, dtype=numpy.float32 ).reshape(-1,3)
+        n = pts.shape[0]
+        if self.__count + n > self.__points.shape[0]:
+            cap = max( 2*self.__points.shape[0], self.__count + n, 1024 )
+            grown = numpy.zeros( (cap,3), dtype=numpy.float32 )
+            grown[:self.__count] = self.__points[:self.__count]
+            alive = numpy.zeros( cap, dtype=bool )
+            alive[:self.__count] = self.__alive[:self.__count]
+            self.__points, self.__alive = grown, alive
+        ids = numpy.arange( self.__count, self.__count+n )
+        self.__points[ids] = pts
+        self.__alive[ids]  = True
+        self.__count += n
+        self.__pending.extend( ids.tolist() )
+        self.__maybe_rebuild()
+        return ids
+
+    def remove( self, ids ):
+        """Removes points by id, unknown or already removed ids are ignored"""
+        ids = numpy.asarray( ids, dtype=numpy.int64 ).ravel()
+        ids = ids[(ids >= 0) & (ids < self.__count)]
+        ids = ids[self.__alive[ids]]
+        self.__alive[ids] = False
+        self.__removed += ids.size
+        self.__maybe_rebuild()
+
+    def __cell_points( self, keys ):
+        """Returns (position in keys, point id) pairs for the points of each cell key"""
+        keys = keys.ravel()
+        ck = self.__cell_keys
+        if ck.size == 0:
+            return numpy.zeros( 0, dtype=numpy.int64 ), numpy.zeros( 0, dtype=numpy.int64 )
+        c = numpy.minimum( numpy.searchsorted( ck, keys ), ck.size-1 )
+        found = ck[c] == keys
+        which = numpy.flatnonzero( found )
+        start = self.__cell_start[c[found]]
+        count = self.__cell_start[c[found]+1] - start
+        owner = numpy.repeat( which, count )
+        k = numpy.arange( owner.size ) - numpy.repeat( numpy.cumsum(count)-count, count ) + numpy.repeat( start, count )
+        ids = self.__ids[k]
+        keep = self.__alive[ids]
+        return owner[keep], ids[keep]
+
+    def __candidates( self, queries, radius ):
+        """Returns (query, id) pairs of points in the cells overlapping each query sphere"""
+        lo = numpy.maximum( self.__cells( queries - radius[:,None] ), self.__cell_lo )
+        hi = numpy.minimum( self.__cells( queries + radius[:,None] ), self.__cell_hi )
+        span = numpy.maximum( hi - lo + 1, 0 )
+        size = numpy.prod( span, axis=1 )
+
+        # boxes with more cells than are occupied test the occupied cells instead
+        big = size > self.__cell_keys.size
+        size[big] = 0
+
+        # enumerate the cells of every other query box
+        q = numpy.repeat( numpy.arange(queries.shape[0]), size )
+        r = numpy.arange( q.size ) - numpy.repeat( numpy.cumsum(size)-size, size )
+        sy = span[q,1]
+        sz = span[q,2]
+        cells = lo[q] + numpy.stack( (r//(sy*sz), (r//sz)%sy, r%sz), axis=1 )
+        for i in numpy.flatnonzero( big ):
+            inside = numpy.all( (self.__cell_coords >= lo[i]) & (self.__cell_coords <= hi[i]), axis=1 )
+            cells = numpy.concatenate( (cells, self.__cell_coords[inside]) )
+            q = numpy.concatenate( (q, numpy.full( numpy.count_nonzero(inside), i, dtype=q.dtype )) )
+
+        # the corners of a box far from its query are outside the sphere
+        gap = numpy.maximum( numpy.maximum( cells*self.cell_size - queries[q], queries[q] - (cells+1)*self.cell_size ), 0.0 )
+        near = numpy.einsum( 'ij,ij->i', gap, gap ) <= radius[q]**2
+        owner, ids = self.__cell_points( _pack(cells[near]) )
+        qi = q[near][owner]
+
+        if self.__pending:
+            # unsorted recent inserts are tested against every query
+            pend = numpy.array( self.__pending, dtype=numpy.int64 )
+            pend = pend[self.__alive[pend]]
+            qi  = numpy.concatenate( (qi, numpy.repeat( numpy.arange(queries.shape[0]), pend.size )) )
+            ids = numpy.concatenate( (ids, numpy.tile( pend, queries.shape[0] )) )
+        return qi, ids
+
+    def radius( self, queries, radius ):
+        """Finds all points within radius of each query
+
+        Args:
+            queries (array-like): (Q,3) query points
+
+            radius (float or array-like): search radius, scalar or per query
+
+        Returns:
+            (K,) query index, (K,) point id and (K,) distance of every
+            match, sorted by query and then distance
+        """
+        qs = numpy.asarray( queries, dtype=numpy.float32 ).reshape(-1,3)
+        rad = numpy.broadcast_to( numpy.asarray( radius, dtype=numpy.float32 ), (qs.shape[0],) )
+        qi, ids = self.__candidates( qs, rad )
+        d = numpy.linalg.norm( self.__points[ids] - qs[qi], axis=1 )
+        keep = d <= rad[qi]
+        qi, ids, d = qi[keep], ids[keep], d[keep]
+        order = numpy.lexsort( (d, qi) )
+        return qi[order], ids[order], d[order]
+
+    def knearest( self, queries, k ):
+        """Finds the k nearest points of each query
+
+        Search radii are the distance to the occupied cells, zero for
+        queries among them, plus a margin that starts at one cell and
+        doubles for queries that have not yet found k points within their
+        radius, so the result is exact.
+
+        Returns:
+            (Q,k) point ids, -1 where fewer than k points exist
+
+            (Q,k) distances, inf where fewer than k points exist
+        """
+        qs = numpy.asarray( queries, dtype=numpy.float32 ).reshape(-1,3)
+        Q = qs.shape[0]
+        ids  = numpy.full( (Q,k), -1, dtype=numpy.int64 )
+        dist = numpy.full( (Q,k), numpy.inf, dtype=numpy.float32 )
+        total = len(self)
+        if Q == 0 or k <= 0 or total == 0:
+            return ids, dist
+
+        todo = numpy.arange( Q )
+        lo = self.__cell_lo*self.cell_size
+        hi = (self.__cell_hi + 1)*self.cell_size
+        outside = numpy.linalg.norm( numpy.maximum( numpy.maximum( lo - qs, qs - hi ), 0.0 ), axis=1 )
+        margin = numpy.full( Q, self.cell_size, dtype=numpy.float32 )
+        while todo.size:
+            qi, pi, d = self.radius( qs[todo], outside[todo] + margin[todo] )
+            counts = numpy.bincount( qi, minlength=todo.size )
+            need = numpy.minimum( k, total )
+            done = counts >= need
+            if numpy.any(done):
+                # matches are sorted by distance within each query
+                rank = numpy.arange( qi.size ) - numpy.repeat( numpy.cumsum(counts)-counts, counts )
+                sel  = done[qi] & (rank < k)
+                ids[todo[qi[sel]],rank[sel]]  = pi[sel]
+                dist[todo[qi[sel]],rank[sel]] = d[sel]
+            todo = todo[~done]
+            margin[todo] *= 2.0
+        return ids, dist
+
+    def __cone_levels( self ):
+        """Returns the occupied cells and coarser grids over them, coarsest
+        first, as (centers, bounding radius, child start, children) where
+        the children of cell i are children[start[i]:start[i+1]] of the
+        next level, start and children are None for the finest level"""
+        coords, size = self.__cell_coords, self.cell_size
+        start = children = None
+        levels = []
+        while True:
+            levels.append( ( (coords + 0.5)*size, 0.5*numpy.sqrt(3.0)*size, start, children ) )
+            if coords.shape[0] <= _CONE_TOP:
+                break
+            keys = _pack( coords//_CONE_BRANCH )
+            children = numpy.argsort( keys, kind='stable' )
+            keys = keys[children]
+            first = numpy.concatenate( ([True], keys[1:] != keys[:-1]) )
+            start = numpy.concatenate( (numpy.flatnonzero(first), [keys.size]) )
+            coords = _unpack( keys[first] )
+            size *= _CONE_BRANCH
+        return levels[::-1]
+
+    def cone( self, origins, directions, angle, max_distance=numpy.inf ):
+        """Finds points inside a cone around each ray, e.g. the pixel
+        footprint of a pick ray
+
+        Args:
+            origins (array-like): (R,3) cone apexes
+
+            directions (array-like): (R,3) cone axes
+
+            angle (float): half-angle of the cone in radians
+
+            max_distance (float): points further along the axis are ignored
+
+        Returns:
+            (K,) ray index, (K,) point id, (K,) distance along the axis
+            and (K,) angle from the axis of every match
+        """
+        org  = numpy.asarray( origins, dtype=numpy.float32 ).reshape(-1,3)
+        dirs = numpy.asarray( directions, dtype=numpy.float32 ).reshape(-1,3)
+        dirs = dirs/numpy.linalg.norm( dirs, axis=1, keepdims=True )
+        tan  = numpy.tan( angle )
+
+        # conservative test of the bounding spheres of the cells of every
+        # level, coarsest first, only the children of the cells that pass
+        # are tested at the next level
+        if self.__levels is None:
+            self.__levels = self.__cone_levels()
+        top = self.__levels[0][0].shape[0]
+        org64, dirs64 = org.astype(numpy.float64), dirs.astype(numpy.float64)
+        rays, cells = [], []
+        step = max( _CONE_BATCH//max(top,1), 1 )
+        for first in range( 0, org.shape[0] if top else 0, step ):
+            r = numpy.repeat( numpy.arange( first, min( first+step, org.shape[0] ) ), top )
+            c = numpy.tile( numpy.arange( top ), r.size//top )
+            for centers, crad, start, children in self.__levels:
+                v = centers[c] - org64[r]
+                along = numpy.einsum( 'ij,ij->i', v, dirs64[r] )
+                reach = crad + tan*numpy.maximum( along + crad, 0.0 )
+                hit = (numpy.einsum( 'ij,ij->i', v, v ) - along**2 <= reach**2) & (along >= -crad) & (along <= max_distance + crad)
+                hit = numpy.flatnonzero( hit )
+                r, c = r[hit], c[hit]
+                if start is not None:
+                    n = start[c+1] - start[c]
+                    r = numpy.repeat( r, n )
+                    c = children[numpy.arange( n.sum() ) - numpy.repeat( numpy.cumsum(n) - n - start[c], n )]
+            rays.append( r )
+            cells.append( c )
+        if rays:
+            rays = numpy.concatenate( rays )
+            owner, ids = self.__cell_points( self.__cell_keys[numpy.concatenate( cells )] )
+            qi = rays[owner]
+        else:
+            qi  = numpy.zeros( 0, dtype=numpy.int64 )
+            ids = numpy.zeros( 0, dtype=numpy.int64 )
+
+        if self.__pending:
+            pend = numpy.array( self.__pending, dtype=numpy.int64 )
+            pend = pend[self.__alive[pend]]
+            qi  = numpy.concatenate( (qi, numpy.repeat( numpy.arange(org.shape[0]), pend.size )) )
+            ids = numpy.concatenate( (ids, numpy.tile( pend, org.shape[0] )) )
+
+        v = self.__points[ids] - org[qi]
+        along = numpy.einsum( 'ij,ij->i', v, dirs[qi] )
+        perp  = numpy.linalg.norm( v - along[:,None]*dirs[qi], axis=1 )
+        ang   = numpy.arctan2( perp, along )
+        keep  = (along >= 0) & (along <= max_distance) & (ang <= angle)
+        return qi[keep], ids[keep], along[keep], ang[keep]
+
+    def pick( self, origins, directions, angle, max_distance=numpy.inf ):
+        """Returns the (R,) id of the point closest to each ray axis within
+        the cone, preferring nearer points on ties, -1 where none"""
+        qi, ids, along, ang = self.cone( origins, directions, angle, max_distance )
+        R = numpy.asarray( origins ).reshape(-1,3).shape[0]
+        result = numpy.full( R, -1, dtype=numpy.int64 )
+        if qi.size:
+            order = numpy.lexsort( (along, ang, qi) )
+            qi, ids = qi[order], ids[order]
+            first = numpy.concatenate( ([True], qi[1:] != qi[:-1]) )
+            result[qi[first]] = ids[first]
+        return result
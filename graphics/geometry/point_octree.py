@@ -0,0 +1,362 @@
+"""Out-of-core octree with level-of-detail selection for large point clouds
+
+A PointOctree stores a point cloud in a directory: the points reordered
+so that the points of every node are contiguous, in a memory-mapped
+points.npy, and a table of nodes in nodes.npy. Points are distributed
+additively: a node holds about one point per cell of a resolution^3 grid
+over its cube, the points not taken by a node go on to its children, so
+drawing a node together with all its ancestors shows its region at the
+node's point spacing.
+
+Building never holds the whole cloud in memory. Points are read in
+chunks, counting-sorted into coarse Morton buckets in a temporary file,
+each bucket is sorted by full Morton code, and a single streaming pass
+over the sorted points assigns every point its level: at level l the
+first point not taken by a shallower level in each grid cell of the
+node is kept. Because Morton order keeps every cell contiguous this only
+needs the last cell seen per level carried between chunks. A final
+counting sort by level makes each node a contiguous range of points.
+
+select() picks the nodes to draw for a camera: nodes whose projected
+point spacing, the screen-space error, is largest are refined first
+until the point budget is spent, so the budget always goes where it
+reduces the error the most. It works through the tree a level at a
+time in numpy, errors and culling are only computed for the children of
+nodes that may still be selected.
+
+Example::
+
+    octree = PointOctree.build( 'scan.octree', points, colors )
+
+    octree = PointOctree( 'scan.octree' )
+    nodes  = octree.select( camera, height, budget=2000000 )
+    data   = octree.node_points( nodes[0] )
+
+"""
+
+import os
+import json
+
+import numpy
+
+from graphics.geometry.culling import cull_boxes
+
+# record of a stored point, also the vertex layout used for drawing
+POINT_DTYPE = numpy.dtype([ ('position', numpy.float32, 3), ('color', numpy.uint8, 4) ])
+
+NODE_DTYPE = numpy.dtype([
+    ('key',         numpy.uint64),
+    ('level',       numpy.int64),
+    ('start',       numpy.int64),
+    ('count',       numpy.int64),
+    ('center',      numpy.float32, 3),
+    ('half',        numpy.float32),
+    ('spacing',     numpy.float32),
+    ('parent',      numpy.int64),
+    ('child_start', numpy.int64),
+    ('child_count', numpy.int64)
+])
+
+_LEVEL_SHIFT = numpy.uint64(58)
+_NONE = numpy.uint64(0xffffffffffffffff)
+
+def _spread( v ):
+    """Spreads the low 21 bits of v to every third bit"""
+    x = v.astype(numpy.uint64) & numpy.uint64(0x1fffff)
+    for shift, mask in ( (32,0x1f00000000ffff), (16,0x1f0000ff0000ff), (8,0x100f00f00f00f00f),
+                         (4,0x10c30c30c30c30c3), (2,0x1249249249249249) ):
+        x = (x | (x << numpy.uint64(shift))) & numpy.uint64(mask)
+    return x
+
+def _compact( x ):
+    """Inverse of _spread"""
+    x = x & numpy.uint64(0x1249249249249249)
+    for shift, mask in ( (2,0x10c30c30c30c30c3), (4,0x100f00f00f00f00f), (8,0x1f0000ff0000ff),
+                         (16,0x1f00000000ffff), (32,0x1fffff) ):
+        x = (x ^ (x >> numpy.uint64(shift))) & numpy.uint64(mask)
+    return x
+
+def morton_codes( cells ):
+    """Returns the Morton codes of (N,3) integer cell coordinates of up to 21 bits"""
+    cells = numpy.asarray( cells )
+    return (_spread( cells[:,0] ) << numpy.uint64(2)) | (_spread( cells[:,1] ) << numpy.uint64(1)) | _spread( cells[:,2] )
+
+def morton_cells( codes ):
+    """Returns the (N,3) cell coordinates of Morton codes"""
+    codes = numpy.asarray( codes, dtype=numpy.uint64 )
+    return numpy.stack( (_compact( codes >> numpy.uint64(2) ), _compact( codes >> numpy.uint64(1) ), _compact( codes )), axis=1 ).astype(numpy.int64)
+
+def _chunks( n, chunk_size ):
+    for start in range( 0, n, chunk_size ):
+        yield start, min( start+chunk_size, n )
+
+class PointOctree(object):
+    def __init__( self, path ):
+        """Opens an octree written by build, points are memory-mapped
+
+        Args:
+            path (string): octree directory
+        """
+        with open( os.path.join( path, 'octree.json' ) ) as f:
+            meta = json.load( f )
+        self.path       = path
+        self.origin     = numpy.array( meta['origin'], dtype=numpy.float64 )
+        self.size       = float( meta['size'] )
+        self.depth      = int( meta['depth'] )
+        self.resolution = int( meta['resolution'] )
+        self.nodes      = numpy.load( os.path.join( path, 'nodes.npy' ) )
+        self.points     = numpy.load( os.path.join( path, 'points.npy' ), mmap_mode='r' )
+        half = self.nodes['half'][:,None]
+        self.__mins = self.nodes['center'] - half
+        self.__maxs = self.nodes['center'] + half
+
+    def __len__( self ):
+        return self.nodes.shape[0]
+
+    def node_points( self, node ):
+        """Returns the memory-mapped (count,) POINT_DTYPE records of a node"""
+        start, count = int( self.nodes['start'][node] ), int( self.nodes['count'][node] )
+        return self.points[start:start+count]
+
+    def children( self, node ):
+        start = int( self.nodes['child_start'][node] )
+        return numpy.arange( start, start + int( self.nodes['child_count'][node] ) )
+
+    def screen_errors( self, camera, height, nodes=None ):
+        """Returns the projected point spacing of nodes in pixels
+
+        The error of a child is always less than half the error of its
+        parent, the child's bounding sphere lies within the parent's.
+
+        Args:
+            camera (graphics.core.Camera): perspective camera
+
+            height (int): viewport height in pixels
+
+            nodes (array-like): node indices, all nodes if None
+        """
+        nodes = slice( None ) if nodes is None else nodes
+        radius = self.nodes['half'][nodes]*numpy.float32(numpy.sqrt(3.0))
+        dist = numpy.linalg.norm( self.nodes['center'][nodes] - camera.eye.astype(numpy.float32), axis=1 ) - radius
+        dist = numpy.maximum( dist, camera.near )
+        scale = 0.5*height/numpy.tan( numpy.radians( camera.fov )*0.5 )
+        return self.nodes['spacing'][nodes]*scale/dist
+
+    def select( self, camera, height, budget, min_error=1.0 ):
+        """Selects visible nodes to draw within a point budget
+
+        Nodes are refined in order of decreasing screen-space error and
+        always after their parent, so the selection is a subtree that
+        can be drawn additively.
+
+        Args:
+            camera (graphics.core.Camera): perspective camera
+
+            height (int): viewport height in pixels
+
+            budget (int): maximum total number of points
+
+            min_error (float): nodes whose point spacing projects to
+                fewer pixels are not refined further
+
+        Returns:
+            (K,) node indices in selection order, parents first
+        """
+        if len(self) == 0:
+            return numpy.zeros( 0, dtype=numpy.int64 )
+        planes = camera.frustum_planes()
+        first, nchild = self.nodes['child_start'], self.nodes['child_count']
+
+        # a node's error is below its parent's, so refining by decreasing
+        # error selects the longest prefix of the candidates sorted by
+        # decreasing error that fits the budget. Candidates are found a
+        # level at a time, only nodes ahead of the cut are refined.
+        node  = numpy.zeros( 0, dtype=numpy.int64 )
+        error = numpy.zeros( 0, dtype=numpy.float32 )
+        cut   = -numpy.inf
+        frontier = numpy.zeros( 1, dtype=numpy.int64 )
+        while frontier.size:
+            e = self.screen_errors( camera, height, frontier )
+            # the root is drawn whatever its error
+            keep = numpy.flatnonzero( (e > cut) & ((e >= min_error) | (frontier == 0)) )
+            frontier, e = frontier[keep], e[keep]
+            keep = numpy.flatnonzero( cull_boxes( planes, self.__mins[frontier], self.__maxs[frontier] ) )
+            frontier, e = frontier[keep], e[keep]
+            node  = numpy.concatenate( (node, frontier) )
+            error = numpy.concatenate( (error, e) )
+            order = numpy.lexsort( (node, -error) )
+            node, error = node[order], error[order]
+            over = numpy.searchsorted( numpy.cumsum( self.nodes['count'][node] ), budget, side='right' )
+            if over < node.size:
+                # candidates after the first one over budget stay behind it
+                cut = error[over]
+                node, error = node[:over+1], error[:over+1]
+                frontier = frontier[e > cut]
+            n = nchild[frontier]
+            frontier = numpy.arange( n.sum() ) - numpy.repeat( numpy.cumsum( n ) - n - first[frontier], n )
+        over = numpy.searchsorted( numpy.cumsum( self.nodes['count'][node] ), budget, side='right' )
+        return node[:over]
+
+    @staticmethod
+    def build( path, points, colors=None, resolution=16, depth=16, chunk_size=1<<22 ):
+        """Builds an octree directory from a point cloud
+
+        Args:
+            path (string): output directory, created if needed
+
+            points (array-like): (N,3) positions, may be a memory-mapped
+                array larger than memory
+
+            colors (array-like): optional (N,3) or (N,4) uint8 colours,
+                white if None
+
+            resolution (int): power of two number of grid cells per axis
+                of a node, a node holds at most resolution^3 points
+                except at the deepest level
+
+            depth (int): depth of the finest grid, at most 19 levels
+                of nodes and grid together
+
+            chunk_size (int): number of points processed at a time
+
+        Returns:
+            the opened PointOctree
+        """
+        grid = int( numpy.log2( resolution ) )
+        if 1 << grid != resolution:
+            raise ValueError('Resolution must be a power of two')
+        if depth > 19 or depth <= grid:
+            raise ValueError('Depth must be larger than log2(resolution) and at most 19')
+        os.makedirs( path, exist_ok=True )
+        n = len(points)
+
+        # bounding cube
+        lo = numpy.full( 3, numpy.inf )
+        hi = numpy.full( 3, -numpy.inf )
+        for s, e in _chunks( n, chunk_size ):
+            p = numpy.asarray( points[s:e], dtype=numpy.float64 )
+            lo = numpy.minimum( lo, p.min( axis=0 ) )
+            hi = numpy.maximum( hi, p.max( axis=0 ) )
+        if n == 0:
+            lo, hi = numpy.zeros(3), numpy.ones(3)
+        size = max( float( (hi - lo).max() ), 1e-6 )*(1.0 + 1e-6)
+        cells = 1 << depth
+
+        def chunk( s, e ):
+            p = numpy.asarray( points[s:e], dtype=numpy.float64 )
+            q = numpy.clip( ((p - lo)/size*cells).astype(numpy.int64), 0, cells-1 )
+            rec = numpy.empty( e-s, dtype=[ ('code', numpy.uint64), ('point', POINT_DTYPE) ] )
+            rec['code'] = morton_codes( q )
+            rec['point']['position'] = p
+            if colors is None:
+                rec['point']['color'] = 255
+            else:
+                c = numpy.asarray( colors[s:e] )
+                rec['point']['color'][:,:c.shape[1]] = c
+                if c.shape[1] == 3:
+                    rec['point']['color'][:,3] = 255
+            return rec
+
+        def scatter( out, keys, data, cursor ):
+            """Stable counting-sort scatter of a chunk into out"""
+            order = numpy.argsort( keys, kind='stable' )
+            keys  = keys[order]
+            start = numpy.searchsorted( keys, keys, side='left' )
+            out[ cursor[keys] + numpy.arange( keys.size ) - start ] = data[order]
+            cursor += numpy.bincount( keys, minlength=cursor.size )
+
+        # counting sort into coarse Morton buckets that fit in memory
+        buckets = 0
+        while buckets < depth and n/8**buckets > chunk_size:
+            buckets += 1
+        bshift = numpy.uint64( 3*(depth - buckets) )
+        hist = numpy.zeros( 8**buckets, dtype=numpy.int64 )
+        for s, e in _chunks( n, chunk_size ):
+            hist += numpy.bincount( (chunk( s, e )['code'] >> bshift).astype(numpy.int64), minlength=hist.size )
+        tmp_path = os.path.join( path, 'sorted.tmp' )
+        tmp = numpy.lib.format.open_memmap( tmp_path, mode='w+', dtype=[ ('code', numpy.uint64), ('point', POINT_DTYPE) ], shape=(n,) )
+        cursor = numpy.concatenate( ([0], numpy.cumsum( hist )[:-1]) )
+        for s, e in _chunks( n, chunk_size ):
+            rec = chunk( s, e )
+            scatter( tmp, (rec['code'] >> bshift).astype(numpy.int64), rec, cursor )
+        ends = numpy.cumsum( hist )
+        for s, e in zip( ends - hist, ends ):
+            if e - s > 1:
+                seg = tmp[s:e]
+                tmp[s:e] = seg[ numpy.argsort( seg['code'], kind='stable' ) ]
+
+        # levels: the first remaining point of each grid cell of a node
+        # stays at that node, the cell seen last is carried across chunks
+        finest = depth - grid
+        carry  = numpy.full( finest, _NONE, dtype=numpy.uint64 )
+        levels_path = os.path.join( path, 'levels.tmp' )
+        levels = numpy.lib.format.open_memmap( levels_path, mode='w+', dtype=numpy.uint8, shape=(n,) )
+        for s, e in _chunks( n, chunk_size ):
+            code  = tmp['code'][s:e]
+            level = numpy.full( e-s, finest, dtype=numpy.uint8 )
+            rest  = numpy.arange( e-s )
+            for l in range( finest ):
+                if rest.size == 0:
+                    break
+                cell  = code[rest] >> numpy.uint64( 3*(finest - l) )
+                first = numpy.empty( rest.size, dtype=bool )
+                first[0]  = cell[0] != carry[l]
+                first[1:] = cell[1:] != cell[:-1]
+                carry[l]  = cell[-1]
+                level[rest[first]] = l
+                rest = rest[~first]
+            levels[s:e] = level
+
+        # counting sort by level, nodes become contiguous runs of keys
+        hist = numpy.zeros( finest+1, dtype=numpy.int64 )
+        for s, e in _chunks( n, chunk_size ):
+            hist += numpy.bincount( levels[s:e], minlength=finest+1 )
+        cursor = numpy.concatenate( ([0], numpy.cumsum( hist )[:-1]) )
+        keys_path = os.path.join( path, 'keys.tmp' )
+        out  = numpy.lib.format.open_memmap( os.path.join( path, 'points.npy' ), mode='w+', dtype=POINT_DTYPE, shape=(n,) )
+        keys = numpy.lib.format.open_memmap( keys_path, mode='w+', dtype=numpy.uint64, shape=(n,) )
+        for s, e in _chunks( n, chunk_size ):
+            rec   = tmp[s:e]
+            level = levels[s:e].astype(numpy.int64)
+            shift = numpy.uint64(3)*(numpy.uint64(depth) - level.astype(numpy.uint64))
+            key   = (level.astype(numpy.uint64) << _LEVEL_SHIFT) | (rec['code'] >> shift)
+            scatter( keys, level, key, cursor.copy() )
+            scatter( out, level, rec['point'], cursor )
+
+        # node table from the runs of equal keys
+        starts, last = [], _NONE
+        for s, e in _chunks( n, chunk_size ):
+            key = numpy.asarray( keys[s:e] )
+            new = numpy.empty( e-s, dtype=bool )
+            new[0]  = key[0] != last
+            new[1:] = key[1:] != key[:-1]
+            starts.append( s + numpy.flatnonzero( new ) )
+            last = key[-1]
+        starts = numpy.concatenate( starts ) if starts else numpy.zeros( 0, dtype=numpy.int64 )
+        nodes = numpy.zeros( starts.size, dtype=NODE_DTYPE )
+        nodes['key']   = keys[starts]
+        nodes['start'] = starts
+        nodes['count'] = numpy.diff( numpy.append( starts, n ) )
+        out.flush()
+        del out, tmp, levels, keys
+        for tmp_file in (tmp_path, levels_path, keys_path):
+            os.remove( tmp_file )
+
+        level = (nodes['key'] >> _LEVEL_SHIFT).astype(numpy.int64)
+        prefix = nodes['key'] & ~(numpy.uint64(0x3f) << _LEVEL_SHIFT)
+        edge = size/(1 << level)
+        nodes['level']   = level
+        nodes['center']  = lo + (morton_cells( prefix ) + 0.5)*edge[:,None]
+        nodes['half']    = 0.5*edge
+        nodes['spacing'] = edge/resolution
+        parent_key = ((level - 1).clip(0).astype(numpy.uint64) << _LEVEL_SHIFT) | (prefix >> numpy.uint64(3))
+        nodes['parent'] = numpy.where( level > 0, numpy.searchsorted( nodes['key'], parent_key ), -1 )
+        # parents are non-decreasing in key order, children are contiguous
+        index = numpy.arange( starts.size )
+        nodes['child_start'] = numpy.searchsorted( nodes['parent'], index, side='left' )
+        nodes['child_count'] = numpy.searchsorted( nodes['parent'], index, side='right' ) - nodes['child_start']
+        numpy.save( os.path.join( path, 'nodes.npy' ), nodes )
+
+        with open( os.path.join( path, 'octree.json' ), 'w' ) as f:
+            json.dump( { 'origin': lo.tolist(), 'size': size, 'depth': depth, 'resolution': resolution, 'points': n }, f, indent=2 )
+        return PointOctree( path )
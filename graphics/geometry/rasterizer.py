@@ -0,0 +1,242 @@
+"""Tiled software rasterizer for depth and triangle-id buffers
+
+rasterize() renders triangles into a depth buffer and a buffer of
+triangle indices with numpy only, so picking, visibility tests and
+silhouette thumbnails work without an OpenGL context and give the same
+result on every machine.
+
+Triangles are transformed to clip space, clipped against the near plane
+and snapped to a 1/256 pixel grid in window coordinates, so the edge
+functions are evaluated exactly and the top-left fill rule covers pixels
+on edges shared by two triangles exactly once. Each triangle is binned
+into the screen tiles its pixel bounds overlap. Tiles are then processed
+one at a time: the candidate pixels of all of a tile's triangles are
+expanded into one array, tested against the three edge functions at once
+and resolved with a single minimum reduction on a 64-bit key holding the
+depth in its high and the triangle index in its low bits, so the nearest
+fragment wins and ties go to the lower index.
+
+With workers, bands of tile rows are rasterized in a process pool.
+
+Buffers are indexed [y,x] with the origin at the bottom left, as window
+coordinates and glReadPixels, flip the rows for top-down images.
+
+Example::
+
+    depth, ids = rasterize( mesh.vertices, 512, 512, camera.projection(), camera.view() )
+    hit = ids[y,x]      # -1 for background
+
+"""
+
+import concurrent.futures
+
+import numpy
+
+from graphics.core.transform import Transform
+
+# sub-pixel precision of snapped vertex positions
+SUBPIXEL = 256.0
+
+_BACKGROUND = numpy.uint64(0xffffffffffffffff)
+
+def _matrix( T ):
+    return T.M if isinstance(T,Transform) else numpy.asarray( T )
+
+def _clip_near( C, ids ):
+    """Clips (T,3,4) clip-space triangles against the near plane z = -w,
+    returning the clipped triangles and the index of their source triangle"""
+    d = C[...,2] + C[...,3]
+    inside = d >= 0.0
+    n = inside.sum( axis=1 )
+    tris = [ C[n == 3] ]
+    src  = [ ids[n == 3] ]
+
+    for count in (1,2):
+        sel = numpy.flatnonzero( n == count )
+        if sel.size == 0:
+            continue
+        # rotate the odd vertex out, keeping the winding
+        first = numpy.argmax( inside[sel] if count == 1 else ~inside[sel], axis=1 )
+        order = (first[:,None] + numpy.arange(3)) % 3
+        T = numpy.take_along_axis( C[sel], order[:,:,None], axis=1 )
+        D = numpy.take_along_axis( d[sel], order, axis=1 )
+        a, b, c = T[:,0], T[:,1], T[:,2]
+        ab = a + (b - a)*(D[:,0]/(D[:,0] - D[:,1]))[:,None]
+        ac = a + (c - a)*(D[:,0]/(D[:,0] - D[:,2]))[:,None]
+        if count == 1:
+            tris.append( numpy.stack( (a,ab,ac), axis=1 ) )
+            src.append( ids[sel] )
+        else:
+            tris.append( numpy.stack( (ab,b,c), axis=1 ) )
+            tris.append( numpy.stack( (ab,c,ac), axis=1 ) )
+            src += [ ids[sel], ids[sel] ]
+    return numpy.concatenate( tris ), numpy.concatenate( src )
+
+def _min3( a ):
+    return numpy.minimum( numpy.minimum( a[0], a[1] ), a[2] )
+
+def _max3( a ):
+    return numpy.maximum( numpy.maximum( a[0], a[1] ), a[2] )
+
+def _setup( triangles, width, height, projection, modelview, cull_backfaces ):
+    """Returns the edge equations, depth plane and pixel bounds of the
+    triangles that cover at least one pixel center"""
+    V = numpy.asarray( triangles, dtype=numpy.float64 ).reshape(-1,3)
+    M = _matrix( projection ).astype(numpy.float64) @ _matrix( modelview ).astype(numpy.float64)
+    C = (V @ M[:,:3].T + M[:,3]).reshape(-1,3,4)
+    ids = numpy.arange( C.shape[0], dtype=numpy.int64 )
+    if (C[...,2] + C[...,3]).min( initial=0.0 ) < 0.0:
+        C, ids = _clip_near( C, ids )
+
+    # per-corner rows of window coordinates snapped to the sub-pixel grid,
+    # reductions over the three corners are done on whole rows
+    C = numpy.ascontiguousarray( C.transpose(2,1,0) )
+    w = C[3]
+    keep = (w[0] > 0.0) & (w[1] > 0.0) & (w[2] > 0.0)
+    x = numpy.round( (C[0]/w + 1.0)*(0.5*width*SUBPIXEL) )/SUBPIXEL
+    y = numpy.round( (C[1]/w + 1.0)*(0.5*height*SUBPIXEL) )/SUBPIXEL
+    z = (C[2]/w + 1.0)*0.5
+
+    area = (x[1] - x[0])*(y[2] - y[0]) - (y[1] - y[0])*(x[2] - x[0])
+    keep &= area > 0.0 if cull_backfaces else area != 0.0
+    # pixel centers i+0.5 inside the bounds
+    x0 = numpy.maximum( numpy.ceil( _min3(x) - 0.5 ), 0 )
+    x1 = numpy.minimum( numpy.floor( _max3(x) - 0.5 ), width-1 )
+    y0 = numpy.maximum( numpy.ceil( _min3(y) - 0.5 ), 0 )
+    y1 = numpy.minimum( numpy.floor( _max3(y) - 0.5 ), height-1 )
+    keep &= (x0 <= x1) & (y0 <= y1) & (_min3(z) <= 1.0)
+
+    keep = numpy.flatnonzero( keep )
+    x, y, z, area, ids = x[:,keep], y[:,keep], z[:,keep], area[keep], ids[keep]
+    lo = numpy.stack( (x0[keep], y0[keep]), axis=1 ).astype(numpy.int64)
+    hi = numpy.stack( (x1[keep], y1[keep]), axis=1 ).astype(numpy.int64)
+
+    # counter-clockwise order, so the inside is left of every edge
+    cw = area < 0.0
+    for r in (x, y, z):
+        r[1,cw], r[2,cw] = r[2,cw], r[1,cw]
+    area = numpy.abs( area )
+
+    # edge i runs opposite vertex i, E(p) = A*x + B*y + C >= 0 inside
+    E = numpy.empty( (ids.size,3,3) )
+    for i in range(3):
+        j, k = (i+1)%3, (i+2)%3
+        E[:,0,i] = y[j] - y[k]
+        E[:,1,i] = x[k] - x[j]
+        E[:,2,i] = -(E[:,0,i]*x[j] + E[:,1,i]*y[j])
+    # top-left rule: pixels exactly on an edge belong to left and top edges
+    topleft = (E[:,0] > 0.0) | ((E[:,0] == 0.0) & (E[:,1] < 0.0))
+    Z = (z/area).T
+    return E, topleft, Z, lo, hi, ids
+
+def _raster_band( E, topleft, Z, lo, hi, ids, width, y0, y1, tile_size ):
+    """Rasterizes rows [y0,y1) into an array of 64-bit depth/id keys"""
+    keys = numpy.full( (y1-y0)*width, _BACKGROUND, dtype=numpy.uint64 )
+    if ids.size == 0:
+        return keys.reshape( y1-y0, width )
+
+    # bin triangles into the tiles overlapped by their pixel bounds
+    t0 = lo//tile_size
+    t1 = hi//tile_size
+    t0[:,1] = numpy.maximum( t0[:,1], y0//tile_size )
+    t1[:,1] = numpy.minimum( t1[:,1], (y1-1)//tile_size )
+    tw = t1[:,0] - t0[:,0] + 1
+    th = numpy.maximum( t1[:,1] - t0[:,1] + 1, 0 )
+    counts = tw*th
+    tri = numpy.repeat( numpy.arange( ids.size ), counts )
+    off = numpy.arange( tri.size ) - numpy.repeat( numpy.cumsum(counts) - counts, counts )
+    tx  = t0[tri,0] + off % tw[tri]
+    ty  = t0[tri,1] + off // tw[tri]
+    tiles_x = (width + tile_size - 1)//tile_size
+    tile = ty*tiles_x + tx
+    order = numpy.argsort( tile, kind='stable' )
+    tile, tri = tile[order], tri[order]
+    bounds = numpy.flatnonzero( numpy.diff( tile ) ) + 1
+    starts = numpy.concatenate( ([0], bounds) )
+    ends   = numpy.concatenate( (bounds, [tile.size]) )
+
+    for s, e in zip( starts, ends ):
+        t = tri[s:e]
+        tx0 = int( tile[s] % tiles_x )*tile_size
+        ty0 = int( tile[s] // tiles_x )*tile_size
+        x0 = numpy.maximum( lo[t,0], tx0 )
+        x1 = numpy.minimum( hi[t,0], tx0 + tile_size - 1 )
+        ya = numpy.maximum( lo[t,1], max( ty0, y0 ) )
+        yb = numpy.minimum( hi[t,1], min( ty0 + tile_size, y1 ) - 1 )
+        w = x1 - x0 + 1
+        n = w*(yb - ya + 1)
+
+        # candidate pixels of every triangle of the tile
+        f   = numpy.repeat( numpy.arange( t.size ), n )
+        off = numpy.arange( f.size ) - numpy.repeat( numpy.cumsum(n) - n, n )
+        px  = x0[f] + off % w[f]
+        py  = ya[f] + off // w[f]
+        f   = t[f]
+        cx  = px + 0.5
+        cy  = py + 0.5
+
+        e  = E[f]
+        ev = e[:,0]*cx[:,None] + e[:,1]*cy[:,None] + e[:,2]
+        inside = numpy.all( (ev > 0.0) | ((ev == 0.0) & topleft[f]), axis=1 )
+        ev = ev[inside]
+        f  = f[inside]
+        # adding zero turns -0.0, whose bits would sort last, into 0.0
+        depth = numpy.einsum( 'ij,ij->i', ev, Z[f] ).astype(numpy.float32) + numpy.float32(0.0)
+        valid = (depth >= 0.0) & (depth <= 1.0)
+        pix = ((py[inside] - y0)*width + px[inside])[valid]
+        key = depth[valid].view(numpy.uint32).astype(numpy.uint64) << numpy.uint64(32)
+        key |= ids[f[valid]].astype(numpy.uint64)
+        numpy.minimum.at( keys, pix, key )
+    return keys.reshape( y1-y0, width )
+
+def _raster_band_args( args ):
+    return _raster_band( *args )
+
+def rasterize( triangles, width, height, projection, modelview, tile_size=32, cull_backfaces=False, workers=None ):
+    """Rasterizes triangles into depth and triangle-id buffers
+
+    Args:
+        triangles (array-like): (T,3,3) triangle corners, or (3T,3)
+            vertices with three consecutive vertices per triangle as in
+            graphics.geometry.Mesh.vertices
+
+        width, height (int): buffer size in pixels
+
+        projection, modelview (graphics.core.Transform): camera
+            transforms, 4x4 arrays are accepted as well
+
+        tile_size (int): edge length of the square screen tiles
+
+        cull_backfaces (bool): skip triangles that are clockwise in
+            window coordinates
+
+        workers (int): number of processes rasterizing bands of tiles,
+            None rasterizes in the calling process
+
+    Returns:
+        (height,width) float32 window depth in [0,1], 1 for background,
+        and (height,width) int64 index of the visible triangle, -1 for
+        background
+    """
+    E, topleft, Z, lo, hi, ids = _setup( triangles, width, height, projection, modelview, cull_backfaces )
+
+    if workers is None or workers <= 1:
+        keys = _raster_band( E, topleft, Z, lo, hi, ids, width, 0, height, tile_size )
+    else:
+        # several bands per worker balance uneven screen coverage
+        rows  = (height + tile_size - 1)//tile_size
+        cuts  = numpy.unique( numpy.linspace( 0, rows, min( 4*workers, rows )+1 ).astype(numpy.int64) )*tile_size
+        cuts[-1] = height
+        jobs = []
+        for y0, y1 in zip( cuts[:-1], cuts[1:] ):
+            sel = (hi[:,1] >= y0) & (lo[:,1] < y1)
+            jobs.append( (E[sel], topleft[sel], Z[sel], lo[sel], hi[sel], ids[sel], width, int(y0), int(y1), tile_size) )
+        with concurrent.futures.ProcessPoolExecutor( max_workers=workers ) as pool:
+            keys = numpy.concatenate( list( pool.map( _raster_band_args, jobs ) ) )
+
+    depth = (keys >> numpy.uint64(32)).astype(numpy.uint32).view(numpy.float32)
+    index = (keys & numpy.uint64(0xffffffff)).astype(numpy.int64)
+    background = keys == _BACKGROUND
+    depth[background] = 1.0
+    index[background] = -1
+    return depth, index
@@ -0,0 +1,623 @@
+"""Vertex cache, vertex fetch and overdraw optimization of index buffers
+
+Finalized meshes are non-indexed and their triangles are in sorted input
+order, so the post-transform vertex cache of the GPU is barely used.
+mesh_indices() merges identical vertices into an index buffer and
+optimize_indices() reorders it for rendering:
+
+1. the triangles of each material range are reordered for vertex cache
+   locality with Tipsify [Sander, Nehab and Barczak 2007], which fans
+   around a vertex and moves on to the neighbouring vertex that is
+   still in a FIFO cache of cache_size entries,
+2. optionally, the Tipsify clusters are split where their cache miss
+   ratio is already good and sorted so clusters facing away from the
+   mesh center are drawn first, which reduces overdraw of convex parts,
+3. vertices are renumbered in order of first use, so vertex fetch reads
+   memory sequentially.
+
+Material ranges keep their position and size, so material_triangles
+remain valid for the optimized index buffer. With stats=True the average
+cache miss ratio per triangle (ACMR) and per vertex (ATVR, 1.0 is
+optimal) of a FIFO cache are reported before and after.
+
+Tipsify is sequential, one fan after the other, and runs in a Python
+loop for ranges of up to 131072 triangles. Larger ranges are split into
+regions of about 2048 triangles, grown breadth first, that are ordered
+side by side, one fan of every region per vectorized step. The vertices
+on region borders cost about 0.05 more ACMR on a regular grid. The
+overdraw pass simulates large orders side by side as well. cache_misses
+and cache_stats simulate the whole index buffer exactly in a Python
+loop, so the statistics are only computed on request.
+
+Example::
+
+    rows, indices, stats = optimize_mesh( mesh, cache_size=16, overdraw=True, stats=True )
+    position = mesh.vertices[rows]
+    normal   = mesh.normals[rows]
+    glDrawElements( GL_TRIANGLES, indices.size, GL_UNSIGNED_INT, indices )
+    print( 'ACMR {acmr_before:.3f} -> {acmr_after:.3f}'.format( **stats ) )
+
+"""
+
+import numpy
+
+def mesh_indices( mesh ):
+    """Merges identical vertices of a finalized, non-indexed mesh
+
+    Vertices are identical when their position, texture coordinate and
+    normal are bitwise equal.
+
+    Args:
+        mesh (graphics.geometry.Mesh): finalized mesh
+
+    Returns:
+        (V,) int64 row of mesh.vertices of each unique vertex, in order of
+        first use, and (T,3) uint32 triangle indices into those rows
+    """
+    # adding zero merges -0.0 and 0.0
+    attrs = numpy.concatenate( (mesh.vertices, mesh.texture_coords, mesh.normals), axis=1 ).astype(numpy.float32) + numpy.float32(0.0)
+    attrs = numpy.ascontiguousarray( attrs )
+    keys = attrs.view( numpy.dtype( (numpy.void, attrs.dtype.itemsize*attrs.shape[1]) ) ).ravel()
+    order = numpy.argsort( keys, kind='stable' )
+    sorted_keys = keys[order]
+    first = numpy.ones( order.size, dtype=bool )
+    first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    group = numpy.cumsum( first ) - 1
+    # the stable sort makes the first row of each group its smallest
+    rows = order[first]
+    unique = numpy.empty( order.size, dtype=numpy.int64 )
+    unique[order] = group
+    # number vertices in order of first use
+    rank = numpy.argsort( rows, kind='stable' )
+    remap = numpy.empty( rank.size, dtype=numpy.int64 )
+    remap[rank] = numpy.arange( rank.size )
+    return rows[rank], remap[unique].reshape(-1,3).astype(numpy.uint32)
+
+def cache_misses( indices, cache_size=16 ):
+    """Returns the (T,) number of FIFO vertex cache misses of each triangle"""
+    flat = numpy.asarray( indices ).ravel()
+    if flat.size == 0:
+        return numpy.zeros( 0, dtype=numpy.int64 )
+    stamp = [ -cache_size-1 ]*( int( flat.max() ) + 1 )
+    miss  = bytearray( flat.size )
+    s = 0
+    for i, v in enumerate( flat.tolist() ):
+        if s - stamp[v] > cache_size:
+            stamp[v] = s
+            s += 1
+            miss[i] = 1
+    return numpy.frombuffer( bytes(miss), dtype=numpy.uint8 ).reshape(-1,3).sum( axis=1, dtype=numpy.int64 )
+
+def cache_stats( indices, cache_size=16 ):
+    """Returns the ACMR, misses per triangle, and ATVR, misses per
+    referenced vertex, of a FIFO cache of cache_size vertices"""
+    indices = numpy.asarray( indices )
+    if indices.size == 0:
+        return 0.0, 0.0
+    misses = int( cache_misses( indices, cache_size ).sum() )
+    referenced = numpy.count_nonzero( numpy.bincount( indices.ravel().astype(numpy.int64) ) )
+    return misses/float( indices.shape[0] ), misses/float( referenced )
+
+# ranges of more triangles are ordered by regions, side by side
+_SERIAL = 1 << 17
+# triangles per region
+_REGION = 2048
+# recent candidates kept per region for dead ends
+_RING = 32
+# vertices a dead end looks ahead at once
+_SCAN = 256
+# triangles per cluster simulated side by side by optimize_overdraw
+_LANE = 512
+
+def _argsort( keys ):
+    """Stable argsort of non-negative int64 keys, faster than a stable
+    numpy.argsort for keys in random order"""
+    return numpy.sort( keys*keys.size + numpy.arange( keys.size ) ) % keys.size
+
+def _first( keys ):
+    """Returns whether each key of a sorted array starts a run"""
+    first = numpy.ones( keys.size, dtype=bool )
+    first[1:] = keys[1:] != keys[:-1]
+    return first
+
+def _gather( offsets, rows ):
+    """Returns the CSR positions of the entries of rows and their number"""
+    lo = offsets[rows]
+    n  = offsets[rows+1] - lo
+    return numpy.arange( n.sum() ) - numpy.repeat( numpy.cumsum( n ) - n - lo, n ), n
+
+def _adjacency( indices, vertex_count ):
+    """Returns CSR offsets and triangles around each vertex"""
+    flat = indices.ravel()
+    offsets = numpy.zeros( vertex_count+1, dtype=numpy.int64 )
+    numpy.cumsum( numpy.bincount( flat, minlength=vertex_count ), out=offsets[1:] )
+    return offsets, _argsort( flat )//3
+
+def _regions( indices, offsets, adjacent, size ):
+    """Grows regions of at most size vertices breadth first
+
+    Seeds are spread by hashing their vertex index. Vertices that no
+    region reached when all stopped growing are seeded again, four times
+    as densely, until every referenced vertex has a region.
+
+    Returns:
+        (V,) int64 region of each vertex, -1 if not referenced, the
+        number of regions and the (V,) int64 step that reached each vertex
+    """
+    V = offsets.size - 1
+    referenced = offsets[1:] > offsets[:-1]
+    region = numpy.full( V, -1, dtype=numpy.int64 )
+    step   = numpy.zeros( V, dtype=numpy.int64 )
+    mark   = numpy.zeros( V, dtype=bool )
+    grown  = numpy.zeros( 0, dtype=numpy.int64 )
+    count  = s = 0
+    stride = size
+    while True:
+        free = numpy.flatnonzero( referenced & (region < 0) )
+        if free.size == 0:
+            break
+        seeds = free[(free*2654435761) % 4294967296 < 4294967296//stride]
+        if seeds.size == 0:
+            seeds = free[:1]
+        region[seeds] = count + numpy.arange( seeds.size )
+        count += seeds.size
+        grown = numpy.append( grown, numpy.ones( seeds.size, dtype=numpy.int64 ) )
+        frontier = seeds
+        while frontier.size:
+            s += 1
+            frontier = frontier[grown[region[frontier]] < size]
+            pos, n = _gather( offsets, frontier )
+            v = numpy.take( indices, adjacent[pos], axis=0 ).ravel()
+            r = numpy.repeat( region[frontier], 3*n )
+            new = numpy.flatnonzero( region[v] < 0 )
+            v, r = v[new], r[new]
+            # the first region to reach a vertex takes it
+            region[v[::-1]] = r[::-1]
+            mark[v] = True
+            frontier = numpy.flatnonzero( mark )
+            mark[frontier] = False
+            step[frontier] = s
+            grown += numpy.bincount( region[frontier], minlength=count )
+        stride = max( 1, stride//4 )
+    return region, count, step
+
+def tipsify( indices, vertex_count, cache_size=16 ):
+    """Orders triangles for a FIFO vertex cache with Tipsify
+
+    More than 131072 triangles are split into regions that are ordered
+    side by side and concatenated, each region is a cluster of its own.
+
+    Args:
+        indices (array-like): (T,3) triangle indices below vertex_count
+
+        vertex_count (int): number of vertices
+
+        cache_size (int): number of vertices in the cache
+
+    Returns:
+        (T,) int64 triangle order and the int64 start positions in that
+        order of the clusters, where Tipsify had to jump to a vertex
+        that is not adjacent to the previous fan
+    """
+    indices = numpy.asarray( indices, dtype=numpy.int64 ).reshape(-1,3)
+    if indices.shape[0] == 0:
+        return numpy.zeros( 0, dtype=numpy.int64 ), numpy.zeros( 0, dtype=numpy.int64 )
+    if indices.shape[0] > _SERIAL:
+        return _tipsify_regions( indices, vertex_count, cache_size )
+    offsets, adjacent = _adjacency( indices, vertex_count )
+    live     = numpy.diff( offsets ).tolist()
+    offsets  = offsets.tolist()
+    adjacent = adjacent.tolist()
+    tris     = indices.tolist()
+    k        = cache_size
+
+    stamp   = [ 0 ]*vertex_count
+    emitted = bytearray( len(tris) )
+    order   = []
+    starts  = [ 0 ]
+    dead    = []
+    s       = k + 1
+    cursor  = 0
+    f       = int( indices[0,0] )
+    while f >= 0:
+        # fan around f, emitting its remaining triangles
+        candidates = []
+        for t in adjacent[offsets[f]:offsets[f+1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = 1
+            order.append( t )
+            tri = tris[t]
+            candidates += tri
+            a, b, c = tri
+            live[a] -= 1
+            live[b] -= 1
+            live[c] -= 1
+            if s - stamp[a] > k:
+                stamp[a] = s
+                s += 1
+            if s - stamp[b] > k:
+                stamp[b] = s
+                s += 1
+            if s - stamp[c] > k:
+                stamp[c] = s
+                s += 1
+        dead += candidates
+
+        # the candidate that stays in the cache while its fan is emitted,
+        # preferring the oldest
+        f, best = -1, -1
+        for v in candidates:
+            if live[v] > 0:
+                p = s - stamp[v] if s - stamp[v] + 2*live[v] <= k else 0
+                if p > best:
+                    f, best = v, p
+        if f >= 0:
+            continue
+
+        # dead end, recently used vertices first, then the next in order
+        if len(order) < len(tris):
+            starts.append( len(order) )
+        while dead:
+            v = dead.pop()
+            if live[v] > 0:
+                f = v
+                break
+        else:
+            while cursor < vertex_count and live[cursor] == 0:
+                cursor += 1
+            f = cursor if cursor < vertex_count else -1
+    return numpy.array( order, dtype=numpy.int64 ), numpy.array( starts, dtype=numpy.int64 )
+
+def _tipsify_regions( indices, vertex_count, cache_size ):
+    """Tipsify on regions of about _REGION triangles, side by side
+
+    Every step emits the fan of each region and picks its next fan vertex
+    as tipsify does. Vertices are copied into every region that uses them,
+    so regions share no cache or adjacency state. A dead end picks the
+    most recent of the last _RING candidates that still has triangles,
+    else the next vertex in breadth first order of the region.
+    """
+    T, k = indices.shape[0], cache_size
+    offsets, adjacent = _adjacency( indices, vertex_count )
+    region, count, step = _regions( indices, offsets, adjacent, _REGION//2 )
+
+    # triangles belong to the region of their first vertex, the vertices
+    # of other regions are copied
+    flat  = indices.ravel()
+    owner = numpy.repeat( region[indices[:,0]], 3 )
+    other = numpy.flatnonzero( owner != region[flat] )
+    copies, copy = numpy.unique( owner[other]*vertex_count + flat[other], return_inverse=True )
+    vregion = numpy.concatenate( (region, copies//vertex_count) )
+    vstep   = numpy.concatenate( (step, step[copies % vertex_count]) )
+    # number the vertices of each region in breadth first order, the
+    # unreferenced ones of region -1 first
+    rank = numpy.empty( vregion.size, dtype=numpy.int64 )
+    rank[_argsort( (vregion+1)*(int( step.max() )+1) + vstep )] = numpy.arange( vregion.size )
+    local = rank[flat]
+    local[other] = rank[vertex_count + copy]
+    bounds = numpy.searchsorted( numpy.sort( vregion ), numpy.arange( count+1 ) )
+    V = vregion.size
+    offsets = numpy.zeros( V+1, dtype=numpy.int64 )
+    numpy.cumsum( numpy.bincount( local, minlength=V ), out=offsets[1:] )
+    adjacent = _argsort( local )//3
+    local = local.reshape(-1,3)
+
+    live    = numpy.diff( offsets )
+    stamp   = numpy.zeros( V, dtype=numpy.int64 )
+    seen    = numpy.empty( V, dtype=numpy.int64 )
+    emitted = numpy.zeros( T, dtype=bool )
+    clock   = numpy.full( count, k + 1, dtype=numpy.int64 )
+    ring    = numpy.full( (count, _RING), -1, dtype=numpy.int64 )
+    head    = numpy.zeros( count, dtype=numpy.int64 )
+    jumped  = numpy.ones( count, dtype=bool )
+    cursor  = bounds[:-1].copy()
+    end     = bounds[1:]
+    # start at the first vertex of the first triangle of each region,
+    # regions may own no triangle
+    first = numpy.full( count, -1, dtype=numpy.int64 )
+    first[owner[::-3]] = numpy.arange( T-1, -1, -1 )
+    f = numpy.where( first >= 0, local[first,0], -1 )
+    emits, jumps = [], []
+    while True:
+        active = numpy.flatnonzero( f >= 0 )
+        if active.size == 0:
+            break
+        # fan around f, emitting its remaining triangles
+        pos, n = _gather( offsets, f[active] )
+        t = adjacent[pos]
+        keep = numpy.flatnonzero( ~emitted[t] )
+        t, r = t[keep], numpy.repeat( active, n )[keep]
+        emitted[t] = True
+        emits.append( numpy.stack( (r, t) ) )
+        jumps.append( jumped[r] )
+        jumped[active] = False
+        v = numpy.take( local, t, axis=0 ).ravel()
+        numpy.subtract.at( live, v, 1 )
+
+        # the first reference of each vertex is a candidate and may miss,
+        # misses are stamped in order
+        i = numpy.arange( v.size )
+        seen[v[::-1]] = i[::-1]
+        u = numpy.flatnonzero( seen[v] == i )
+        v, r = v[u], r[u//3]
+        starts = numpy.flatnonzero( _first( r ) )
+        group = numpy.cumsum( _first( r ) ) - 1
+        miss = clock[r] - stamp[v] > k
+        m = numpy.flatnonzero( miss )
+        c = numpy.cumsum( miss )
+        base = (c - miss)[starts]
+        stamp[v[m]] = clock[r[m]] + c[m] - 1 - base[group[m]]
+        clock[r[starts]] += numpy.diff( numpy.append( base, c[-1] ) )
+
+        # the candidate that stays in the cache while its fan is emitted,
+        # preferring the oldest
+        nf = numpy.full( count, -1, dtype=numpy.int64 )
+        if starts.size:
+            age = clock[r] - stamp[v]
+            lv = live[v]
+            p = numpy.where( age + 2*lv <= k, age, 0 )
+            p[lv == 0] = -1
+            best = numpy.maximum.reduceat( p, starts )
+            hit = numpy.flatnonzero( p == best[group] )
+            hit = hit[_first( group[hit] )]
+            ok = numpy.flatnonzero( best >= 0 )
+            nf[r[starts[ok]]] = v[hit[ok]]
+            ring[r, (head[r] + i[:r.size] - starts[group]) % _RING] = v
+            head[r[starts]] += numpy.diff( numpy.append( starts, r.size ) )
+
+        # dead end, recently used vertices first, then the next in order
+        dead = numpy.flatnonzero( (nf < 0) & (cursor < end) )
+        if dead.size:
+            jumped[dead] = True
+            recent = ring[dead[:,None], (head[dead,None] - 1 - numpy.arange( _RING )) % _RING]
+            alive = (recent >= 0) & (live[recent] > 0)
+            j = numpy.argmax( alive, axis=1 )
+            found = alive[numpy.arange( dead.size ), j]
+            nf[dead[found]] = recent[found,j[found]]
+            ring[dead] = -1
+            dead = dead[~found]
+        while dead.size:
+            ahead = cursor[dead,None] + numpy.arange( _SCAN )
+            alive = (ahead < end[dead,None]) & (live[numpy.minimum( ahead, V-1 )] > 0)
+            j = numpy.argmax( alive, axis=1 )
+            found = alive[numpy.arange( dead.size ), j]
+            nf[dead[found]] = ahead[found,j[found]]
+            cursor[dead] += numpy.where( found, j, _SCAN )
+            dead = dead[~found & (cursor[dead] < end[dead])]
+        f = nf
+
+    # concatenate the regions, a cluster starts with the first fan of a
+    # region in a step after a jump
+    r, t = numpy.concatenate( emits, axis=1 )
+    first = numpy.concatenate( [ _first( e[0] ) for e in emits ] ) & numpy.concatenate( jumps )
+    rank = numpy.argsort( r, kind='stable' )
+    return t[rank], numpy.flatnonzero( first[rank] )
+
+def _clusters( tris, starts, cache_size, limit ):
+    """Simulates the clusters of an order, each with an empty FIFO cache
+
+    Clusters are simulated side by side, one triangle of each per step,
+    in lanes of at most _LANE triangles that also start with an empty
+    cache. A cluster is split where its ACMR drops to limit.
+
+    Args:
+        tris (numpy.ndarray): (T,3) int64 triangles in order
+
+        starts (array-like): sorted int64 cluster starts, including 0
+
+        cache_size (int): number of vertices in the cache
+
+        limit (float): ACMR that splits a cluster, negative to not split
+
+    Returns:
+        sorted int64 cluster starts and the total number of misses
+    """
+    T, k = tris.shape[0], cache_size
+    lanes  = numpy.union1d( starts, numpy.arange( 0, T, _LANE ) )
+    length = numpy.diff( numpy.append( lanes, T ) )
+    # longest first, so the lanes still running are a prefix
+    rank   = numpy.argsort( -length, kind='stable' )
+    lanes, length = lanes[rank], length[rank]
+    V      = int( tris.max() ) + 1
+    stamp  = numpy.zeros( V, dtype=numpy.int64 )
+    owner  = numpy.full( V, -1, dtype=numpy.int64 )
+    clock  = numpy.full( lanes.size, k + 1, dtype=numpy.int64 )
+    count  = numpy.zeros( lanes.size, dtype=numpy.int64 )
+    total  = numpy.zeros( lanes.size, dtype=numpy.int64 )
+    lane   = numpy.arange( lanes.size )
+    cuts   = [ numpy.asarray( starts, dtype=numpy.int64 ) ]
+    misses = 0
+    for i in range( int( length[0] ) ):
+        n = numpy.count_nonzero( length > i )
+        pos = lanes[:n] + i
+        cut = numpy.flatnonzero( (count[:n] > 0) & (total[:n] <= limit*count[:n]) )
+        if cut.size:
+            cuts.append( pos[cut] )
+            count[cut] = total[cut] = 0
+            # moving the clock past the cache size empties the cache
+            clock[cut] += k + 1
+        tri = numpy.take( tris, pos, axis=0 )
+        for c in range( 3 ):
+            v = tri[:,c]
+            miss = (owner[v] != lane[:n]) | (clock[:n] - stamp[v] > k)
+            m = numpy.flatnonzero( miss )
+            stamp[v[m]] = clock[m]
+            owner[v[m]] = m
+            clock[:n] += miss
+            total[:n] += miss
+            misses += m.size
+        count[:n] += 1
+    return numpy.unique( numpy.concatenate( cuts ) ), misses
+
+def optimize_overdraw( indices, positions, order, starts, cache_size=16, threshold=1.05 ):
+    """Reorders Tipsify clusters to reduce overdraw
+
+    Clusters are split where their ACMR, starting with an empty cache,
+    drops to threshold times the ACMR of the whole order, so reordering
+    them costs a bounded number of cache misses. Clusters are then sorted
+    by how much their area weighted normal points away from the mesh
+    centroid, drawing the outside of convex parts first. Orders of more
+    than 131072 triangles are simulated side by side in pieces of 512
+    triangles, each starting with an empty cache.
+
+    Args:
+        indices (array-like): (T,3) triangle indices into positions
+
+        positions (array-like): (V,3) vertex positions
+
+        order, starts (array-like): triangle order and cluster starts as
+            returned by tipsify
+
+        cache_size (int): number of vertices in the cache
+
+        threshold (float): allowed ACMR increase, at least 1.0
+
+    Returns:
+        (T,) int64 triangle order
+    """
+    indices   = numpy.asarray( indices, dtype=numpy.int64 ).reshape(-1,3)
+    positions = numpy.asarray( positions, dtype=numpy.float64 )
+    order     = numpy.asarray( order, dtype=numpy.int64 )
+    if order.size == 0:
+        return order
+    # soft cluster boundaries within the hard ones, each cluster is
+    # simulated starting with an empty cache, so its ACMR does not depend
+    # on the cluster drawn before it
+    tris = numpy.take( indices, order, axis=0 )
+    if order.size > _SERIAL:
+        misses = _clusters( tris, [ 0 ], cache_size, -1.0 )[1]
+        cuts = _clusters( tris, starts, cache_size, threshold*misses/float( order.size ) )[0]
+    else:
+        limit = threshold*cache_misses( tris, cache_size ).sum()/float( order.size )
+        hard  = set( numpy.asarray( starts ).tolist() )
+        stamp = [ -cache_size-1 ]*positions.shape[0]
+        cuts  = []
+        count = total = s = 0
+        for i, tri in enumerate( tris.tolist() ):
+            if i in hard or (count > 0 and total <= limit*count):
+                cuts.append( i )
+                count = total = 0
+                # moving the clock past the cache size empties the cache
+                s += cache_size + 1
+            for v in tri:
+                if s - stamp[v] > cache_size:
+                    stamp[v] = s
+                    s += 1
+                    total += 1
+            count += 1
+        cuts = numpy.array( cuts, dtype=numpy.int64 )
+
+    P = positions[indices[order]]
+    # outward normals as in Mesh.finalize
+    n = numpy.cross( P[:,2] - P[:,0], P[:,1] - P[:,0] )
+    area = numpy.linalg.norm( n, axis=1 )
+    c = P.mean( axis=1 )
+    weight = numpy.maximum( area, 1e-30 )
+    center = (c*weight[:,None]).sum( axis=0 )/weight.sum()
+    cluster_area   = numpy.add.reduceat( weight, cuts )
+    cluster_center = numpy.add.reduceat( c*weight[:,None], cuts )/cluster_area[:,None]
+    cluster_normal = numpy.add.reduceat( n, cuts )
+    length = numpy.linalg.norm( cluster_normal, axis=1 )
+    cluster_normal /= numpy.maximum( length, 1e-30 )[:,None]
+    key = numpy.einsum( 'ij,ij->i', cluster_center - center, cluster_normal )
+
+    sizes = numpy.diff( numpy.append( cuts, order.size ) )
+    ranked = numpy.argsort( -key, kind='stable' )
+    first = numpy.repeat( cuts[ranked], sizes[ranked] )
+    off = numpy.arange( order.size ) - numpy.repeat( numpy.cumsum( sizes[ranked] ) - sizes[ranked], sizes[ranked] )
+    return order[first + off]
+
+def optimize_vertex_fetch( indices ):
+    """Renumbers vertices in order of first use
+
+    Returns:
+        (T,3) uint32 renumbered indices and the (V,) int64 old index of
+        each new vertex, vertices that are not referenced are dropped
+    """
+    flat = numpy.asarray( indices, dtype=numpy.int64 ).ravel()
+    # the reversed assignment leaves the first use of each vertex
+    first = numpy.zeros( int( flat.max() ) + 1 if flat.size else 0, dtype=numpy.int64 )
+    first[flat[::-1]] = numpy.arange( flat.size-1, -1, -1 )
+    vertices = flat[first[flat] == numpy.arange( flat.size )]
+    remap = first
+    remap[vertices] = numpy.arange( vertices.size )
+    return remap[flat].reshape(-1,3).astype(numpy.uint32), vertices
+
+def optimize_indices( indices, positions=None, ranges=None, cache_size=16, overdraw=False, threshold=1.05, stats=False ):
+    """Reorders triangles for the vertex cache and vertices for fetch
+
+    Args:
+        indices (array-like): (T,3) triangle indices
+
+        positions (array-like): (V,3) vertex positions, needed for overdraw
+
+        ranges (iterable): (start,end) triangle ranges that are reordered
+            separately and keep their place, e.g. material_triangles
+            values, None treats all triangles as one range
+
+        cache_size (int): number of vertices of the simulated FIFO cache
+
+        overdraw (bool): whether to reorder clusters to reduce overdraw
+
+        threshold (float): ACMR increase allowed for overdraw clusters
+
+        stats (bool): whether to simulate the cache before and after, in
+            Python at about a microsecond per index
+
+    Returns:
+        (T,3) uint32 indices, the (V,) int64 old index of each new vertex
+        and a dict of acmr_before, acmr_after, atvr_before and atvr_after,
+        None unless stats is set
+    """
+    indices = numpy.array( indices, dtype=numpy.int64 ).reshape(-1,3)
+    if overdraw and positions is None:
+        raise ValueError('Overdraw optimization needs vertex positions')
+    if stats:
+        acmr_before, atvr_before = cache_stats( indices, cache_size )
+    if ranges is None:
+        ranges = [ (0, indices.shape[0]) ]
+
+    for start, end in sorted( set( ranges ) ):
+        if end <= start:
+            continue
+        sub = indices[start:end]
+        # compact the vertices of the range
+        used = numpy.flatnonzero( numpy.bincount( sub.ravel() ) )
+        local = numpy.zeros( int( used[-1] ) + 1, dtype=numpy.int64 )
+        local[used] = numpy.arange( used.size )
+        local = local[sub]
+        order, starts = tipsify( local, used.size, cache_size )
+        if overdraw:
+            order = optimize_overdraw( local, numpy.asarray( positions )[used], order, starts, cache_size, threshold )
+        indices[start:end] = sub[order]
+
+    indices, vertices = optimize_vertex_fetch( indices )
+    if stats:
+        acmr_after, atvr_after = cache_stats( indices, cache_size )
+        stats = { 'acmr_before': acmr_before, 'acmr_after': acmr_after,
+                  'atvr_before': atvr_before, 'atvr_after': atvr_after }
+    else:
+        stats = None
+    return indices, vertices, stats
+
+def optimize_mesh( mesh, cache_size=16, overdraw=False, threshold=1.05, stats=False ):
+    """Builds an optimized index buffer for a finalized mesh
+
+    The triangles of every material range are reordered within the
+    range, so mesh.material_triangles apply to the index buffer.
+
+    Args:
+        mesh (graphics.geometry.Mesh): finalized mesh
+
+        cache_size, overdraw, threshold, stats: see optimize_indices
+
+    Returns:
+        (V,) int64 row of mesh.vertices, texture_coords and normals of
+        each vertex, (T,3) uint32 indices into those rows and the ACMR
+        and ATVR statistics of optimize_indices, None unless stats is set
+    """
+    rows, indices = mesh_indices( mesh )
+    ranges = mesh.material_triangles.values()
+    indices, vertices, stats = optimize_indices( indices, mesh.vertices[rows], ranges, cache_size, overdraw, threshold, stats )
+    return rows[vertices], indices, stats
@@ -0,0 +1,192 @@
+"""Named phase timings for the load, finalize and save pipeline
+
+Library code wraps its expensive steps in phase() scopes, e.g. parsing,
+sorting triangles or computing normals. When a phase ends, every
+registered listener is called with a PhaseRecord holding its name, start
+and wall time, item counts and, if a listener asked for it, the
+tracemalloc peak of bytes allocated during the phase, which includes
+numpy buffers.
+
+Without listeners phase() returns a shared no-op scope after a single
+list check, so instrumented code costs nothing measurable. Phases are
+reported innermost first and may nest, the peak of an enclosing phase
+includes the peaks of the phases inside it. Listeners are process wide
+and phases are meant to be used from one thread at a time.
+
+Phases emitted by graphics and their counts::
+
+    load_obj                           triangles
+    load_obj.parse                     vertices, texcoords, triangles
+    load_mtl_file                      materials
+    finalize, finalize.sort,
+    finalize.faces                     triangles
+    finalize.arrays, finalize.normals  vertices
+    save_obj                           vertices, triangles
+    save_obj.vertices                  vertices
+    save_obj.faces                     triangles
+
+Example::
+
+    from graphics import PhaseCollector, add_listener
+
+    with PhaseCollector( memory=True ) as phases:
+        mesh, materials = load_obj( 'scan.obj' )
+    phases.print_summary()
+
+    # or a custom listener
+    add_listener( lambda record: log.info( '%s %.3fs', record.name, record.seconds ) )
+
+"""
+
+import sys
+import time
+import collections
+import tracemalloc
+
+PhaseRecord = collections.namedtuple( 'PhaseRecord', ['name', 'start', 'seconds', 'counts', 'peak_bytes', 'depth'] )
+
+# registered (callback, memory) pairs
+_listeners = []
+# phases currently open, innermost last
+_open = []
+
+class _NullPhase(object):
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *exc ):
+        return False
+
+    def count( self, **counts ):
+        pass
+
+_NULL_PHASE = _NullPhase()
+
+class _Phase(object):
+    def __init__( self, name, memory ):
+        self.name   = name
+        self.memory = memory
+        self.counts = {}
+
+    def count( self, **counts ):
+        """Adds item counts reported with the phase"""
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get( key, 0 ) + value
+
+    def __enter__( self ):
+        self.depth = len(_open)
+        if self.memory:
+            self.owner = not tracemalloc.is_tracing()
+            if self.owner:
+                tracemalloc.start()
+            current, peak = tracemalloc.get_traced_memory()
+            # keep the peak reached so far by the enclosing phases
+            for outer in _open:
+                if outer.memory:
+                    outer.peak = max( outer.peak, peak )
+            tracemalloc.reset_peak()
+            self.base = current
+            self.peak = current
+        _open.append( self )
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__( self, *exc ):
+        seconds = time.perf_counter() - self.start
+        peak_bytes = None
+        if self.memory:
+            self.peak = max( self.peak, tracemalloc.get_traced_memory()[1] )
+            peak_bytes = self.peak - self.base
+            if self.owner:
+                tracemalloc.stop()
+        _open.remove( self )
+        record = PhaseRecord( self.name, self.start, seconds, self.counts, peak_bytes, self.depth )
+        for callback, memory in list(_listeners):
+            callback( record )
+        return False
+
+def phase( name ):
+    """Returns a context manager reporting the enclosed code as phase name
+
+    The returned object has a count(**counts) method adding item counts
+    to the record, e.g. p.count( faces=n ).
+    """
+    if not _listeners:
+        return _NULL_PHASE
+    return _Phase( name, any( memory for callback, memory in _listeners ) )
+
+def add_listener( callback, memory=False ):
+    """Registers a function called with a PhaseRecord when a phase ends
+
+    Args:
+        callback (callable): called with each PhaseRecord
+
+        memory (bool): whether phases trace allocations with tracemalloc
+            for peak_bytes while this listener is registered, which slows
+            Python code down considerably
+    """
+    _listeners.append( (callback, memory) )
+
+def remove_listener( callback ):
+    """Unregisters a function registered with add_listener"""
+    for i, (cb, memory) in enumerate(_listeners):
+        if cb == callback:
+            del _listeners[i]
+            return
+    raise ValueError('{!r} is not a registered listener'.format( callback ))
+
+class PhaseCollector(object):
+    def __init__( self, memory=False ):
+        """Collects calls, total time, counts and the largest peak per
+        phase name, registered while used as a context manager or between
+        install and remove
+
+        Args:
+            memory (bool): whether to trace peak memory, see add_listener
+        """
+        self.memory = memory
+        self.phases = collections.OrderedDict()
+
+    def __call__( self, record ):
+        entry = self.phases.get( record.name )
+        if entry is None:
+            entry = self.phases[record.name] = { 'calls': 0, 'seconds': 0.0, 'counts': collections.Counter(),
+                                                 'peak_bytes': None, 'depth': record.depth, 'start': record.start }
+        entry['calls']   += 1
+        entry['seconds'] += record.seconds
+        entry['counts'].update( record.counts )
+        entry['depth']    = min( entry['depth'], record.depth )
+        entry['start']    = min( entry['start'], record.start )
+        if record.peak_bytes is not None:
+            entry['peak_bytes'] = max( entry['peak_bytes'] or 0, record.peak_bytes )
+
+    def install( self ):
+        add_listener( self, self.memory )
+        return self
+
+    def remove( self ):
+        remove_listener( self )
+
+    def __enter__( self ):
+        return self.install()
+
+    def __exit__( self, *exc ):
+        self.remove()
+        return False
+
+    def reset( self ):
+        self.phases.clear()
+
+    def summary( self ):
+        """Returns a table of the phases indented by nesting, in the order
+        they were first entered"""
+        lines = [ '{:32s} {:>6s} {:>10s} {:>10s}  {}'.format( 'phase', 'calls', 'total', 'peak', 'counts' ) ]
+        for name, entry in sorted( self.phases.items(), key=lambda item: item[1]['start'] ):
+            peak = '{:8.1f}MB'.format( entry['peak_bytes']/2.0**20 ) if entry['peak_bytes'] is not None else ''
+            counts = ' '.join( '{}={}'.format( k, v ) for k, v in sorted( entry['counts'].items() ) )
+            lines.append( '{:32s} {:6d} {:8.2f}ms {:>10s}  {}'.format(
+                '  '*entry['depth'] + name, entry['calls'], entry['seconds']*1e3, peak, counts ) )
+        return '\n'.join( lines )
+
+    def print_summary( self, file=None ):
+        print( self.summary(), file=file if file is not None else sys.stdout )
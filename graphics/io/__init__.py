@@ -1 +1,8 @@
-from graphics.io.wavefront import *
\ No newline at end of file
+from graphics.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports( __name__, {
+    'save_mtl_file': 'graphics.io.wavefront',
+    'load_mtl_file': 'graphics.io.wavefront',
+    'load_obj':      'graphics.io.wavefront',
+    'save_obj':      'graphics.io.wavefront',
+})
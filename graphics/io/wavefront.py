@@ -7,6 +7,7 @@ material definitions in .mtl files
 import os
 
 import graphics
+from graphics.instrument import phase
 
 def save_mtl_file( materials, filename ):
     """Saves a list of materials to a file
@@ -47,7 +48,7 @@ def load_mtl_file( filename ):
     Returns:
         list of graphics.appearance.Material objects
     """
-    with open( filename, 'r' ) as f:
+    with phase('load_mtl_file') as p, open( filename, 'r' ) as f:
         materials = []
         curr_mat = None
 
@@ -83,6 +84,7 @@ def load_mtl_file( filename ):
 
         if curr_mat is not None:
             materials.append( curr_mat )
+        p.count( materials=len(materials) )
         return materials
 
 
@@ -99,37 +101,40 @@ def load_obj( filename ):
             one material, or None if the object does not
             reference any material library
     """
-    with open( filename, 'r' ) as f:
+    with phase('load_obj') as p, open( filename, 'r' ) as f:
         mesh = graphics.geometry.Mesh()
         path = os.path.dirname(os.path.abspath(filename))
         materials = None
         curr_mat = -1
-        for line in f:
-            toks = line.split()
-            if len(toks) == 0:
-                continue
-            elif toks[0] == 'mtllib':
-                mesh.material_file = toks[1]
-                materials = load_mtl_file( '{}/{}'.format(path,toks[1]) )
-            elif toks[0] == 'usemtl':
-                curr_mat = mesh.add_material( toks[1] )
-            elif toks[0] == 'v':
-                mesh.add_vertex( (float(toks[1]),float(toks[2]), float(toks[3])) )
-            elif toks[0] == 'vt':
-                mesh.add_texcoord( (float(toks[1]), float(toks[2])) )
-            elif toks[0] == 'f':
-                vtx = []
-                tc  = []
-                for tok in toks[1:]:
-                    if '/' not in tok:
-                        vtx.append( int(tok)-1 )
-                    else:
-                        ind = tok.split('/')
-                        vtx.append( int(ind[0])-1 )
-                        if len(ind[1]) > 0:
-                            tc.append( int(ind[1])-1 )
-                mesh.add_face( vtx, tc, curr_mat )
+        with phase('load_obj.parse') as parse:
+            for line in f:
+                toks = line.split()
+                if len(toks) == 0:
+                    continue
+                elif toks[0] == 'mtllib':
+                    mesh.material_file = toks[1]
+                    materials = load_mtl_file( '{}/{}'.format(path,toks[1]) )
+                elif toks[0] == 'usemtl':
+                    curr_mat = mesh.add_material( toks[1] )
+                elif toks[0] == 'v':
+                    mesh.add_vertex( (float(toks[1]),float(toks[2]), float(toks[3])) )
+                elif toks[0] == 'vt':
+                    mesh.add_texcoord( (float(toks[1]), float(toks[2])) )
+                elif toks[0] == 'f':
+                    vtx = []
+                    tc  = []
+                    for tok in toks[1:]:
+                        if '/' not in tok:
+                            vtx.append( int(tok)-1 )
+                        else:
+                            ind = tok.split('/')
+                            vtx.append( int(ind[0])-1 )
+                            if len(ind[1]) > 0:
+                                tc.append( int(ind[1])-1 )
+                    mesh.add_face( vtx, tc, curr_mat )
+            parse.count( vertices=len(mesh.init_vtx), texcoords=len(mesh.init_tex), triangles=len(mesh.init_tri) )
         mesh.finalize()
+        p.count( triangles=len(mesh.init_tri) )
         return mesh, materials
 
 def save_obj( mesh, filename, mat_file=None ):
@@ -143,7 +148,7 @@ def save_obj( mesh, filename, mat_file=None ):
         mat_file (string): name of material file to write,
             *defined relative to path of filename*
     """
-    with open( filename, 'w' ) as f:
+    with phase('save_obj') as p, open( filename, 'w' ) as f:
         d = os.path.splitext(filename)[0]
         mfile = '{}.mtl'.format(d)
         if mat_file is not None:
@@ -157,13 +162,18 @@ def save_obj( mesh, filename, mat_file=None ):
         vtx = mesh.vertices
         nor = mesh.normals
         tex = mesh.texture_coords
-        for idx in range(vtx.shape[0]):
-            f.write('v {} {} {}\n'.format(vtx[idx,0],vtx[idx,1],vtx[idx,2]) )
-            f.write('vn {} {} {}\n'.format(nor[idx,0],nor[idx,1],nor[idx,2]) )
-            f.write('vt {} {}\n'.format(tex[idx,0],tex[idx,1]) )
-        for idx in range(0,vtx.shape[0],3):
-            mid = mesh.mat[idx//3]
-            if mid >= 0 and mid != last_mat:
-                f.write( 'usemtl {}\n'.format(mesh.materials[mid]) )
-                last_mat = mid
-            f.write( 'f {}/{}/{} {}/{}/{} {}/{}/{}\n'.format(idx+1,idx+1,idx+1,idx+2,idx+2,idx+2,idx+3,idx+3,idx+3))
+        with phase('save_obj.vertices') as q:
+            for idx in range(vtx.shape[0]):
+                f.write('v {} {} {}\n'.format(vtx[idx,0],vtx[idx,1],vtx[idx,2]) )
+                f.write('vn {} {} {}\n'.format(nor[idx,0],nor[idx,1],nor[idx,2]) )
+                f.write('vt {} {}\n'.format(tex[idx,0],tex[idx,1]) )
+            q.count( vertices=vtx.shape[0] )
+        with phase('save_obj.faces') as q:
+            for idx in range(0,vtx.shape[0],3):
+                mid = mesh.mat[idx//3]
+                if mid >= 0 and mid != last_mat:
+                    f.write( 'usemtl {}\n'.format(mesh.materials[mid]) )
+                    last_mat = mid
+                f.write( 'f {}/{}/{} {}/{}/{} {}/{}/{}\n'.format(idx+1,idx+1,idx+1,idx+2,idx+2,idx+2,idx+3,idx+3,idx+3))
+            q.count( triangles=vtx.shape[0]//3 )
+        p.count( vertices=vtx.shape[0], triangles=vtx.shape[0]//3 )
@@ -0,0 +1,66 @@
+"""Lazy package exports with module-level __getattr__ (PEP 562)
+
+A package lists the names it exports and the submodule defining each of
+them; a submodule is only imported when one of its names is first
+accessed, after which the name is stored in the package and costs a
+plain attribute lookup. Importing graphics.io therefore never loads
+graphics.opengl, PyQt5 or PyOpenGL.
+
+from-imports, dir() and attribute access all resolve through the table.
+__all__ is built on first access as well, so star-imports still load
+every submodule and see the same names as before.
+
+Example::
+
+    __getattr__, __dir__ = lazy_exports( __name__, {
+        'Mesh': 'graphics.geometry.mesh',
+        'cube': 'graphics.geometry.simple_shapes',
+    })
+
+"""
+
+import importlib
+import sys
+
+def lazy_exports( package, exports, subpackages=() ):
+    """Returns the __getattr__ and __dir__ functions of a lazy package
+
+    Args:
+        package (str): name of the package, usually __name__
+
+        exports (dict): exported name to the absolute name of the module
+            defining it
+
+        subpackages (sequence of str): names of subpackages, imported on
+            first access and searched in order for names not in exports
+
+    Returns:
+        the module-level __getattr__ and __dir__ functions
+    """
+    def __getattr__( name ):
+        module = sys.modules[package]
+        if name in subpackages:
+            return importlib.import_module( '{}.{}'.format( package, name ) )
+        if name == '__all__':
+            value = list( exports )
+            for sub in subpackages:
+                value += importlib.import_module( '{}.{}'.format( package, sub ) ).__all__
+        elif name in exports:
+            value = getattr( importlib.import_module( exports[name] ), name )
+        elif not name.startswith('__'):
+            for sub in subpackages:
+                sub = importlib.import_module( '{}.{}'.format( package, sub ) )
+                if name in getattr( sub, '__all__', () ):
+                    value = getattr( sub, name )
+                    break
+            else:
+                raise AttributeError( 'module {!r} has no attribute {!r}'.format( package, name ) )
+        else:
+            raise AttributeError( 'module {!r} has no attribute {!r}'.format( package, name ) )
+        setattr( module, name, value )
+        return value
+
+    def __dir__():
+        return sorted( set( vars( sys.modules[package] ) ) | set( exports ) | set( subpackages ) )
+
+    return __getattr__, __dir__
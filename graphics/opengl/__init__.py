@@ -1,4 +1,21 @@
-from graphics.opengl.app import Application
-from graphics.opengl.shader import Shader
-from graphics.opengl.opengl_viewer import GLWidget
-from graphics.opengl.simple_viewer import SimpleViewer
+from graphics.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports( __name__, {
+    'Application':        'graphics.opengl.app',
+    'Shader':             'graphics.opengl.shader',
+    'GLWidget':           'graphics.opengl.opengl_viewer',
+    'SimpleViewer':       'graphics.opengl.simple_viewer',
+    'UniformBuffer':      'graphics.opengl.uniform_buffer',
+    'ProgramCache':       'graphics.opengl.program_cache',
+    'GLState':            'graphics.opengl.state',
+    'gl_state':           'graphics.opengl.state',
+    'RenderQueue':        'graphics.opengl.render_queue',
+    'MeshBatch':          'graphics.opengl.multi_draw',
+    'IdMap':              'graphics.opengl.picking',
+    'PickingService':     'graphics.opengl.picking',
+    'Profiler':           'graphics.opengl.profiler',
+    'gl_profiler':        'graphics.opengl.profiler',
+    'OffscreenRenderer':  'graphics.opengl.offscreen',
+    'StreamBuffer':       'graphics.opengl.stream_buffer',
+    'PointCloudRenderer': 'graphics.opengl.point_cloud',
+})
@@ -0,0 +1,301 @@
+"""Batched multi-draw indirect submission of many meshes
+
+A MeshBatch packs the vertices and indices of many meshes into shared
+buffers, handing out ranges with a RangeAllocator, and records one
+indirect draw command per material range of each mesh. The commands are
+written to a GL_DRAW_INDIRECT_BUFFER and submitted with a single
+glMultiDrawElementsIndirect call (GL 4.3, available on Mesa's llvmpipe).
+
+Each command's baseInstance selects an entry of a per-draw instance
+attribute holding the material index, which the shader uses to look up
+the material in a uniform block filled by the batch. This works without
+gl_DrawID / ARB_shader_draw_parameters::
+
+    #version 430
+    layout(location=0) in vec3 position;
+    layout(location=1) in vec3 normal;
+    layout(location=2) in uint material_index;
+
+    layout(std140) uniform MaterialBlock {
+        vec4 diffuse[256];
+        vec4 ambient[256];
+        vec4 specular[256];   // w holds the specular exponent
+    };
+
+Example::
+
+    batch = MeshBatch()
+    for mesh, materials in scene:
+        batch.add( mesh, materials )
+    shader.use()
+    batch.draw()
+
+"""
+
+import numpy
+from OpenGL.GL import *
+
+from graphics.geometry.vertex_cache import optimize_mesh
+from graphics.opengl.state import gl_state
+from graphics.opengl.uniform_buffer import UniformBuffer
+
+class RangeAllocator(object):
+    def __init__( self, capacity ):
+        """First-fit allocator of [offset,offset+size) ranges within capacity"""
+        self.capacity = capacity
+        self.__free   = [ (0,capacity) ] if capacity > 0 else []
+        self.__used   = {}
+
+    def allocate( self, size ):
+        """Returns the offset of a free range of size elements, or None if none fits"""
+        for i, (offset, avail) in enumerate(self.__free):
+            if avail >= size:
+                if avail == size:
+                    del self.__free[i]
+                else:
+                    self.__free[i] = (offset+size, avail-size)
+                self.__used[offset] = size
+                return offset
+        return None
+
+    def free( self, offset ):
+        """Returns a range to the allocator, coalescing with free neighbours"""
+        size = self.__used.pop( offset )
+        self.__free.append( (offset,size) )
+        self.__free.sort()
+        merged = []
+        for lo, n in self.__free:
+            if merged and merged[-1][0] + merged[-1][1] == lo:
+                merged[-1] = (merged[-1][0], merged[-1][1]+n)
+            else:
+                merged.append( (lo,n) )
+        self.__free = merged
+
+    def grow( self, capacity ):
+        """Extends the managed range to capacity elements"""
+        if capacity <= self.capacity:
+            return
+        if self.__free and sum(self.__free[-1]) == self.capacity:
+            self.__free[-1] = (self.__free[-1][0], capacity-self.__free[-1][0])
+        else:
+            self.__free.append( (self.capacity, capacity-self.capacity) )
+        self.capacity = capacity
+
+    def used( self ):
+        return sum( self.__used.values() )
+
+class MeshBatch(object):
+    def __init__( self, vertex_capacity=1<<16, index_capacity=1<<16, max_materials=256, state=None ):
+        """Creates an empty batch, GL objects are created on the first draw
+
+        Args:
+            vertex_capacity (int): initial number of vertices, doubled as needed
+
+            index_capacity (int): initial number of indices, doubled as needed
+
+            max_materials (int): size of the material uniform arrays
+
+            state (graphics.opengl.GLState): state cache used for binds,
+                defaults to the shared gl_state
+        """
+        self.state = state if state is not None else gl_state
+        self.max_materials = max_materials
+
+        self.__vertices = RangeAllocator( vertex_capacity )
+        self.__indices  = RangeAllocator( index_capacity )
+        self.__position = numpy.zeros( (vertex_capacity,3), dtype=numpy.float32 )
+        self.__normal   = numpy.zeros( (vertex_capacity,3), dtype=numpy.float32 )
+        self.__index    = numpy.zeros( index_capacity, dtype=numpy.uint32 )
+
+        self.__meshes    = {}
+        self.__next      = 0
+        self.__materials = {}
+        self.__matdata   = numpy.zeros( (3,max_materials,4), dtype=numpy.float32 )
+
+        self.__vao     = None
+        self.__buffers = None
+        self.__ubo     = UniformBuffer( 'MaterialBlock', [
+            ('diffuse',  'vec4', max_materials),
+            ('ambient',  'vec4', max_materials),
+            ('specular', 'vec4', max_materials)
+        ], state=self.state )
+
+        self.__realloc  = True
+        self.__dirty    = []
+        self.__commands = None
+
+    def __material_index( self, material ):
+        key = id(material)
+        if key not in self.__materials:
+            idx = len(self.__materials)
+            if idx >= self.max_materials:
+                raise ValueError('MeshBatch is limited to {} materials'.format(self.max_materials))
+            self.__materials[key] = (idx, material)
+            if material is not None:
+                self.__matdata[0,idx,:3] = material.diffuse
+                self.__matdata[1,idx,:3] = material.ambient
+                self.__matdata[2,idx,:3] = material.specular
+                self.__matdata[2,idx,3]  = material.specular_exponent
+        return self.__materials[key][0]
+
+    @staticmethod
+    def __alloc( allocator, size, *arrays ):
+        offset = allocator.allocate( size )
+        if offset is not None:
+            return offset, arrays
+        # the grown tail alone always fits the request
+        capacity = max( 2*allocator.capacity, allocator.capacity+size )
+        allocator.grow( capacity )
+        grown = []
+        for arr in arrays:
+            new = numpy.zeros( (capacity,)+arr.shape[1:], dtype=arr.dtype )
+            new[:arr.shape[0]] = arr
+            grown.append( new )
+        return allocator.allocate( size ), grown
+
+    def add( self, mesh, materials=None, optimize=False ):
+        """Adds a finalized mesh to the batch
+
+        Args:
+            mesh (graphics.geometry.Mesh): finalized mesh
+
+            materials (dict or list): materials by name, or a list of
+                graphics.appearance.Material as returned by load_obj
+
+            optimize (bool): whether to merge identical vertices and
+                order the indices for the vertex cache, see
+                graphics.geometry.optimize_mesh
+
+        Returns:
+            int handle used to remove the mesh
+        """
+        if materials is not None and not isinstance(materials,dict):
+            materials = { m.name: m for m in materials }
+
+        if optimize:
+            rows, index, stats = optimize_mesh( mesh )
+            vtx   = mesh.vertices[rows]
+            nor   = mesh.normals[rows]
+            index = index.ravel()
+        else:
+            # meshes are unindexed, indices are local to the mesh and offset by baseVertex
+            vtx   = mesh.vertices
+            nor   = mesh.normals
+            index = numpy.arange( vtx.shape[0], dtype=numpy.uint32 )
+        n  = vtx.shape[0]
+        ni = index.size
+
+        voffset, arrays = self.__alloc( self.__vertices, n, self.__position, self.__normal )
+        if arrays[0] is not self.__position:
+            self.__position, self.__normal = arrays
+            self.__realloc = True
+        ioffset, arrays = self.__alloc( self.__indices, ni, self.__index )
+        if arrays[0] is not self.__index:
+            self.__index, = arrays
+            self.__realloc = True
+
+        self.__position[voffset:voffset+n] = vtx
+        self.__normal[voffset:voffset+n]   = nor
+        self.__index[ioffset:ioffset+ni]   = index
+        self.__dirty.append( (voffset, n, ioffset, ni) )
+
+        draws = []
+        for matname, (start, end) in sorted( mesh.material_triangles.items(), key=lambda x: x[1] ):
+            if end <= start:
+                continue
+            material = materials.get(matname) if materials is not None else None
+            draws.append( (3*(end-start), ioffset+3*start, voffset, self.__material_index(material)) )
+
+        handle = self.__next
+        self.__next += 1
+        self.__meshes[handle] = (voffset, ioffset, draws)
+        self.__commands = None
+        return handle
+
+    def remove( self, handle ):
+        voffset, ioffset, draws = self.__meshes.pop( handle )
+        self.__vertices.free( voffset )
+        self.__indices.free( ioffset )
+        self.__commands = None
+
+    def commands( self ):
+        """Returns (N,5) uint32 DrawElementsIndirectCommand records and (N,) material indices
+
+        Record layout is count, instanceCount, firstIndex, baseVertex,
+        baseInstance; baseInstance is the draw index, selecting that
+        draw's entry of the material index attribute.
+        """
+        if self.__commands is None:
+            draws = [ d for h in sorted(self.__meshes) for d in self.__meshes[h][2] ]
+            cmd = numpy.zeros( (len(draws),5), dtype=numpy.uint32 )
+            mat = numpy.zeros( len(draws), dtype=numpy.uint32 )
+            if draws:
+                d = numpy.array( draws, dtype=numpy.uint32 )
+                cmd[:,0] = d[:,0]
+                cmd[:,1] = 1
+                cmd[:,2] = d[:,1]
+                cmd[:,3] = d[:,2]
+                cmd[:,4] = numpy.arange( len(draws), dtype=numpy.uint32 )
+                mat[:]   = d[:,3]
+            self.__commands = (cmd, mat, True)
+        return self.__commands[0], self.__commands[1]
+
+    def __upload( self ):
+        if self.__vao is None:
+            self.__vao = glGenVertexArrays(1)
+            self.__buffers = glGenBuffers(5)
+
+        position, normal, index, indirect, matidx = self.__buffers
+        if self.__realloc:
+            self.state.bind_buffer( GL_ARRAY_BUFFER, position )
+            glBufferData( GL_ARRAY_BUFFER, self.__position.nbytes, self.__position, GL_STATIC_DRAW )
+            self.state.bind_buffer( GL_ARRAY_BUFFER, normal )
+            glBufferData( GL_ARRAY_BUFFER, self.__normal.nbytes, self.__normal, GL_STATIC_DRAW )
+
+            self.state.bind_vertex_array( self.__vao )
+            self.state.bind_buffer( GL_ELEMENT_ARRAY_BUFFER, index )
+            glBufferData( GL_ELEMENT_ARRAY_BUFFER, self.__index.nbytes, self.__index, GL_STATIC_DRAW )
+            self.state.bind_buffer( GL_ARRAY_BUFFER, position )
+            glVertexAttribPointer( 0, 3, GL_FLOAT, GL_FALSE, 0, None )
+            self.state.enable_vertex_attrib_array( 0 )
+            self.state.bind_buffer( GL_ARRAY_BUFFER, normal )
+            glVertexAttribPointer( 1, 3, GL_FLOAT, GL_FALSE, 0, None )
+            self.state.enable_vertex_attrib_array( 1 )
+            self.state.bind_buffer( GL_ARRAY_BUFFER, matidx )
+            glVertexAttribIPointer( 2, 1, GL_UNSIGNED_INT, 0, None )
+            glVertexAttribDivisor( 2, 1 )
+            self.state.enable_vertex_attrib_array( 2 )
+            self.__realloc = False
+        else:
+            for voffset, nv, ioffset, ni in self.__dirty:
+                self.state.bind_buffer( GL_ARRAY_BUFFER, position )
+                glBufferSubData( GL_ARRAY_BUFFER, voffset*12, nv*12, self.__position[voffset:voffset+nv] )
+                self.state.bind_buffer( GL_ARRAY_BUFFER, normal )
+                glBufferSubData( GL_ARRAY_BUFFER, voffset*12, nv*12, self.__normal[voffset:voffset+nv] )
+                self.state.bind_vertex_array( self.__vao )
+                self.state.bind_buffer( GL_ELEMENT_ARRAY_BUFFER, index )
+                glBufferSubData( GL_ELEMENT_ARRAY_BUFFER, ioffset*4, ni*4, self.__index[ioffset:ioffset+ni] )
+        self.__dirty = []
+
+        cmd, mat = self.commands()
+        if self.__commands[2] and cmd.size:
+            self.state.bind_buffer( GL_DRAW_INDIRECT_BUFFER, indirect )
+            glBufferData( GL_DRAW_INDIRECT_BUFFER, cmd.nbytes, cmd, GL_DYNAMIC_DRAW )
+            self.state.bind_buffer( GL_ARRAY_BUFFER, matidx )
+            glBufferData( GL_ARRAY_BUFFER, mat.nbytes, mat, GL_DYNAMIC_DRAW )
+            self.__commands = (cmd, mat, False)
+
+        self.__ubo['diffuse']  = self.__matdata[0]
+        self.__ubo['ambient']  = self.__matdata[1]
+        self.__ubo['specular'] = self.__matdata[2]
+        self.__ubo.bind()
+
+    def draw( self ):
+        """Draws every mesh of the batch with one glMultiDrawElementsIndirect call"""
+        cmd, mat = self.commands()
+        if cmd.shape[0] == 0:
+            return
+        self.__upload()
+        self.state.bind_vertex_array( self.__vao )
+        self.state.bind_buffer( GL_DRAW_INDIRECT_BUFFER, self.__buffers[3] )
+        glMultiDrawElementsIndirect( GL_TRIANGLES, GL_UNSIGNED_INT, None, cmd.shape[0], 0 )
@@ -0,0 +1,411 @@
+"""Headless rendering of meshes to numpy images
+
+An OffscreenRenderer owns its own OpenGL context, created without a
+window through EGL (a surfaceless display on Mesa, so no X server is
+needed) or, failing that, a hidden Qt offscreen surface. Meshes are drawn
+with a simple Phong shader and a headlight into a framebuffer object and
+returned as (height,width,4) uint8 RGBA images with the first row at the
+top.
+
+render() reads each image back immediately. render_batch() instead reads
+each frame into one of a ring of pixel buffer objects guarded by fence
+syncs and only maps a buffer once frames_in_flight later frames have been
+submitted, so the CPU prepares and uploads the next meshes while earlier
+frames are still being rasterized. The throughput of the last batch is
+kept in images_per_second.
+
+PyOpenGL binds to one platform when it is first imported, GLX on Linux
+with a display. Without a window system the EGL backend therefore needs
+PYOPENGL_PLATFORM=egl in the environment before anything imports OpenGL,
+this module included; graphics never sets it on its own.
+
+Example::
+
+    # headless Linux, before the first graphics.opengl or OpenGL import
+    os.environ.setdefault( 'PYOPENGL_PLATFORM', 'egl' )
+
+
+    renderer = OffscreenRenderer( 256, 256 )
+
+    def items():
+        for path in paths:
+            mesh, materials = load_obj( path )
+            yield mesh, materials, OffscreenRenderer.fit_camera( mesh )
+
+    for path, image in zip( paths, renderer.render_batch( items() ) ):
+        save_png( path + '.png', image )
+    print( renderer.images_per_second )
+
+"""
+
+import os
+import time
+import ctypes
+import collections
+
+import numpy
+from OpenGL.GL import *
+
+from graphics.core.camera import Camera
+from graphics.core.transform import Transform
+from graphics.opengl.shader import Shader
+from graphics.opengl.state import gl_state
+
+vtx_shader = """
+#version 330
+
+uniform mat4 model;
+uniform mat4 view;
+uniform mat4 projection;
+
+in vec3 in_position;
+in vec3 in_normal;
+
+out vec3 position;
+out vec3 normal;
+
+void main(){
+    vec4 pos    = model*vec4(in_position,1.0);
+    normal      = mat3(model)*in_normal;
+    position    = pos.xyz;
+    gl_Position = projection*view*pos;
+}
+"""
+
+frg_shader = """
+#version 330
+
+uniform vec3  camera_pos = vec3(0.0,0.0,0.0);
+uniform vec3  diffuse    = vec3(0.8,0.8,0.8);
+uniform vec3  ambient    = vec3(0.1,0.1,0.1);
+uniform vec3  specular   = vec3(0.0,0.0,0.0);
+uniform float spec_exp   = 10.0;
+
+in vec3 normal;
+in vec3 position;
+
+out vec4 result;
+
+void main(){
+    // headlight at the camera, two-sided
+    vec3 view_dir = normalize(camera_pos-position);
+    vec3 frag_nor = normalize(normal);
+    frag_nor = dot(frag_nor,view_dir) < 0.0 ? -frag_nor : frag_nor;
+    float cos_theta = max( 0.0, dot( frag_nor, view_dir ) );
+    float spec      = max( 0.0, dot( reflect(-view_dir,frag_nor), view_dir ) );
+    result = vec4( diffuse*cos_theta + ambient + specular*pow( spec, spec_exp ), 1.0 );
+}
+"""
+
+class _EGLContext(object):
+    def __init__( self ):
+        """Creates an OpenGL 3.3 context with a 1x1 pbuffer through EGL,
+        requires PyOpenGL to have been imported with PYOPENGL_PLATFORM=egl"""
+        # without a window system Mesa needs the surfaceless platform, it
+        # is read by the first eglGetDisplay call of the process
+        if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+            os.environ.setdefault( 'EGL_PLATFORM', 'surfaceless' )
+        from OpenGL import EGL, platform
+        if type(platform.PLATFORM).__name__ != 'EGLPlatform':
+            raise RuntimeError('PyOpenGL was imported for another platform, set PYOPENGL_PLATFORM=egl before importing OpenGL')
+        self.egl = EGL
+
+        self.display = EGL.eglGetDisplay( EGL.EGL_DEFAULT_DISPLAY )
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not self.display or not EGL.eglInitialize( self.display, ctypes.pointer(major), ctypes.pointer(minor) ):
+            raise RuntimeError('Could not initialize an EGL display')
+
+        attribs = (EGL.EGLint*13)(
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8,
+            EGL.EGL_DEPTH_SIZE, 24,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_NONE )
+        config, count = EGL.EGLConfig(), EGL.EGLint()
+        if not EGL.eglChooseConfig( self.display, attribs, ctypes.pointer(config), 1, ctypes.pointer(count) ) or count.value == 0:
+            raise RuntimeError('No EGL config supports desktop OpenGL')
+        EGL.eglBindAPI( EGL.EGL_OPENGL_API )
+
+        attribs = (EGL.EGLint*7)(
+            EGL.EGL_CONTEXT_MAJOR_VERSION, 3,
+            EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+            EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+            EGL.EGL_NONE )
+        self.context = EGL.eglCreateContext( self.display, config, EGL.EGL_NO_CONTEXT, attribs )
+        if self.context == EGL.EGL_NO_CONTEXT:
+            raise RuntimeError('Could not create an EGL OpenGL 3.3 context')
+        self.surface = EGL.eglCreatePbufferSurface( self.display, config, (EGL.EGLint*5)( EGL.EGL_WIDTH, 1, EGL.EGL_HEIGHT, 1, EGL.EGL_NONE ) )
+        self.make_current()
+
+    def make_current( self ):
+        if not self.egl.eglMakeCurrent( self.display, self.surface, self.surface, self.context ):
+            raise RuntimeError('Could not make the EGL context current')
+
+    def delete( self ):
+        EGL = self.egl
+        EGL.eglMakeCurrent( self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT )
+        EGL.eglDestroySurface( self.display, self.surface )
+        EGL.eglDestroyContext( self.display, self.context )
+
+class _QtContext(object):
+    def __init__( self ):
+        """Creates an OpenGL 3.3 context on a hidden QOffscreenSurface"""
+        from PyQt5 import QtGui
+        # the offscreen platform plugin needs no window system, Qt aborts
+        # the process if the default one cannot connect to a display
+        self.app = QtGui.QGuiApplication.instance() or QtGui.QGuiApplication( ['graphics', '-platform', 'offscreen'] )
+
+        fmt = QtGui.QSurfaceFormat()
+        fmt.setVersion( 3, 3 )
+        fmt.setProfile( QtGui.QSurfaceFormat.CoreProfile )
+        fmt.setDepthBufferSize( 24 )
+        self.context = QtGui.QOpenGLContext()
+        self.context.setFormat( fmt )
+        if not self.context.create():
+            raise RuntimeError('Could not create a Qt OpenGL context')
+        self.surface = QtGui.QOffscreenSurface()
+        self.surface.setFormat( self.context.format() )
+        self.surface.create()
+        self.make_current()
+
+    def make_current( self ):
+        if not self.context.makeCurrent( self.surface ):
+            raise RuntimeError('Could not make the Qt OpenGL context current')
+
+    def delete( self ):
+        self.context.doneCurrent()
+        self.surface.destroy()
+
+BACKENDS = collections.OrderedDict([ ('egl', _EGLContext), ('qt', _QtContext) ])
+
+class OffscreenRenderer(object):
+    def __init__( self, width, height, backend='auto', frames_in_flight=3, background=(0.0,0.0,0.0,0.0), state=None ):
+        """Creates a context and framebuffer for headless rendering
+
+        Args:
+            width, height (int): image size in pixels
+
+            backend (string): 'egl', 'qt' or 'auto' to try them in that
+                order
+
+            frames_in_flight (int): number of pixel buffer objects in the
+                readback ring of render_batch
+
+            background (4-sequence): RGBA clear colour
+
+            state (graphics.opengl.GLState): state cache used for binds,
+                defaults to the shared gl_state, it is invalidated
+                whenever the context is made current
+
+        Raises:
+            RuntimeError: if no backend can create a context
+        """
+        self.state  = state if state is not None else gl_state
+        self.width  = int(width)
+        self.height = int(height)
+        self.background = tuple(background)
+        self.frames_in_flight = max( int(frames_in_flight), 1 )
+        self.images_per_second = 0.0
+
+        errors = []
+        self.context = None
+        for name in ( BACKENDS if backend == 'auto' else [backend] ):
+            try:
+                self.context = BACKENDS[name]()
+                self.backend = name
+                break
+            except Exception as e:
+                errors.append( '{}: {}'.format( name, e ) )
+        if self.context is None:
+            raise RuntimeError( 'No offscreen OpenGL context available ({})'.format( '; '.join(errors) ) )
+        self.state.invalidate()
+
+        self.shader = Shader( vtx_shader, frg_shader, state=self.state )
+        self.__vao  = glGenVertexArrays(1)
+        self.__fbo  = glGenFramebuffers(1)
+        self.__rbos = list( glGenRenderbuffers(2) )
+        glBindRenderbuffer( GL_RENDERBUFFER, self.__rbos[0] )
+        glRenderbufferStorage( GL_RENDERBUFFER, GL_RGBA8, self.width, self.height )
+        glBindRenderbuffer( GL_RENDERBUFFER, self.__rbos[1] )
+        glRenderbufferStorage( GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, self.width, self.height )
+        glBindRenderbuffer( GL_RENDERBUFFER, 0 )
+        glBindFramebuffer( GL_FRAMEBUFFER, self.__fbo )
+        glFramebufferRenderbuffer( GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.__rbos[0] )
+        glFramebufferRenderbuffer( GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, self.__rbos[1] )
+        if glCheckFramebufferStatus( GL_FRAMEBUFFER ) != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError('Incomplete offscreen framebuffer')
+
+        size = self.width*self.height*4
+        self.__pbos = [ int(p) for p in numpy.atleast_1d( glGenBuffers(self.frames_in_flight) ) ]
+        for pbo in self.__pbos:
+            self.state.bind_buffer( GL_PIXEL_PACK_BUFFER, pbo )
+            glBufferData( GL_PIXEL_PACK_BUFFER, size, None, GL_STREAM_READ )
+        self.state.bind_buffer( GL_PIXEL_PACK_BUFFER, 0 )
+
+    def make_current( self ):
+        """Makes the renderer's context current, needed after using other contexts"""
+        self.context.make_current()
+        self.state.invalidate()
+
+    @staticmethod
+    def fit_camera( mesh, direction=(1.0,0.8,1.2), fov=30.0, aspect=1.0, model=None ):
+        """Returns a Camera looking at the bounding sphere of a mesh from
+        the given direction, framing it tightly"""
+        center, radius = mesh.bounding_sphere
+        center = numpy.asarray( center, dtype=numpy.float64 )
+        if model is not None:
+            M = model.M if isinstance(model,Transform) else numpy.asarray( model )
+            center = M[:3,:3] @ center + M[:3,3]
+            radius = radius*numpy.abs( numpy.linalg.svd( M[:3,:3], compute_uv=False ) ).max()
+        radius = max( float(radius), 1e-6 )
+        direction = numpy.asarray( direction, dtype=numpy.float64 )
+        direction /= numpy.linalg.norm( direction )
+        half = numpy.radians( fov )*0.5
+        if aspect < 1.0:
+            half = numpy.arctan( numpy.tan(half)*aspect )
+        distance = radius/numpy.sin( half )
+        up = (0.0,0.0,1.0) if abs( direction[1] ) > 0.99 else (0.0,1.0,0.0)
+        return Camera( eye=center + direction*distance, target=center, up=up, fov=fov, aspect=aspect,
+                       near=max( distance-radius, 1e-3*radius )*0.5, far=(distance+radius)*1.5 )
+
+    def __begin( self ):
+        glBindFramebuffer( GL_FRAMEBUFFER, self.__fbo )
+        self.state.viewport( 0, 0, self.width, self.height )
+        self.state.enable( GL_DEPTH_TEST )
+        glClearColor( *self.background )
+        glClear( GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT )
+
+    def __draw( self, mesh, materials, camera, model ):
+        if materials is not None and not isinstance(materials,dict):
+            materials = { m.name: m for m in materials }
+        model = Transform() if model is None else model
+        model = model.M if isinstance(model,Transform) else numpy.asarray( model, dtype=numpy.float32 )
+
+        self.__begin()
+        self.state.bind_vertex_array( self.__vao )
+        shader = self.shader
+        shader.use()
+        shader['model']      = model
+        shader['view']       = camera.view().matrix()
+        shader['projection'] = camera.projection().matrix()
+        shader['camera_pos'] = camera.eye.astype(numpy.float32)
+        shader['in_position'] = mesh.vertices
+        shader['in_normal']   = mesh.normals
+        for matname, (start, end) in sorted( mesh.material_triangles.items(), key=lambda x: x[1] ):
+            if end <= start:
+                continue
+            material = materials.get(matname) if materials is not None else None
+            if material is not None:
+                shader['diffuse']  = numpy.asarray( material.diffuse,  dtype=numpy.float32 )
+                shader['ambient']  = numpy.asarray( material.ambient,  dtype=numpy.float32 )
+                shader['specular'] = numpy.asarray( material.specular, dtype=numpy.float32 )
+                shader['spec_exp'] = float( material.specular_exponent )
+            else:
+                shader['diffuse']  = numpy.array( [0.8,0.8,0.8], dtype=numpy.float32 )
+                shader['ambient']  = numpy.array( [0.1,0.1,0.1], dtype=numpy.float32 )
+                shader['specular'] = numpy.zeros( 3, dtype=numpy.float32 )
+            glDrawArrays( GL_TRIANGLES, 3*start, 3*(end-start) )
+
+    def __image( self, pixels ):
+        """Flips bottom-up GL rows into a top-down image"""
+        return numpy.ascontiguousarray( pixels.reshape( self.height, self.width, 4 )[::-1] )
+
+    def render( self, mesh, materials=None, camera=None, model=None ):
+        """Renders a finalized mesh and reads the image back immediately
+
+        Args:
+            mesh (graphics.geometry.Mesh): finalized mesh
+
+            materials (dict or list): materials by name, or a list of
+                graphics.appearance.Material as returned by load_obj,
+                unknown materials are drawn light grey
+
+            camera (graphics.core.Camera): camera, fit_camera(mesh) if None
+
+            model (Transform or ndarray): optional model transform
+
+        Returns:
+            (height,width,4) uint8 RGBA image, first row at the top
+        """
+        if camera is None:
+            camera = self.fit_camera( mesh, aspect=self.width/self.height, model=model )
+        self.__draw( mesh, materials, camera, model )
+        return self.__read()
+
+    def capture( self, draw ):
+        """Calls draw() with the framebuffer bound and cleared and returns
+        the image, for content drawn with other shaders"""
+        self.__begin()
+        draw()
+        return self.__read()
+
+    def __read( self ):
+        pixels = numpy.empty( self.width*self.height*4, dtype=numpy.uint8 )
+        glPixelStorei( GL_PACK_ALIGNMENT, 1 )
+        glReadPixels( 0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, pixels )
+        glBindFramebuffer( GL_FRAMEBUFFER, 0 )
+        return self.__image( pixels )
+
+    def __map( self, fence, pbo ):
+        glClientWaitSync( fence, GL_SYNC_FLUSH_COMMANDS_BIT, 10**10 )
+        glDeleteSync( fence )
+        size = self.width*self.height*4
+        self.state.bind_buffer( GL_PIXEL_PACK_BUFFER, pbo )
+        ptr = glMapBufferRange( GL_PIXEL_PACK_BUFFER, 0, size, GL_MAP_READ_BIT )
+        pixels = numpy.ctypeslib.as_array( ctypes.cast( ptr, ctypes.POINTER(ctypes.c_uint8) ), shape=(size,) )
+        image = self.__image( pixels )
+        glUnmapBuffer( GL_PIXEL_PACK_BUFFER )
+        self.state.bind_buffer( GL_PIXEL_PACK_BUFFER, 0 )
+        return image
+
+    def render_batch( self, items ):
+        """Renders many meshes, yielding images in order
+
+        Readbacks are pipelined: an image is only mapped once
+        frames_in_flight later frames have been submitted. When the
+        iteration finishes images_per_second holds the batch throughput.
+
+        Args:
+            items (iterable): tuples (mesh, materials, camera) or
+                (mesh, materials, camera, model), see render
+
+        Yields:
+            (height,width,4) uint8 RGBA images, first row at the top
+        """
+        pending = collections.deque()
+        count   = 0
+        start   = time.perf_counter()
+        glPixelStorei( GL_PACK_ALIGNMENT, 1 )
+        for item in items:
+            mesh, materials, camera = item[:3]
+            model = item[3] if len(item) > 3 else None
+            if len(pending) == self.frames_in_flight:
+                yield self.__map( *pending.popleft() )
+                count += 1
+            if camera is None:
+                camera = self.fit_camera( mesh, aspect=self.width/self.height, model=model )
+            self.__draw( mesh, materials, camera, model )
+
+            pbo = self.__pbos[ (count+len(pending)) % self.frames_in_flight ]
+            self.state.bind_buffer( GL_PIXEL_PACK_BUFFER, pbo )
+            glReadPixels( 0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0) )
+            self.state.bind_buffer( GL_PIXEL_PACK_BUFFER, 0 )
+            pending.append( (glFenceSync( GL_SYNC_GPU_COMMANDS_COMPLETE, 0 ), pbo) )
+            glFlush()
+        while pending:
+            yield self.__map( *pending.popleft() )
+            count += 1
+        glBindFramebuffer( GL_FRAMEBUFFER, 0 )
+        elapsed = time.perf_counter() - start
+        self.images_per_second = count/elapsed if elapsed > 0 else 0.0
+
+    def delete( self ):
+        """Deletes the GL objects and destroys the context"""
+        self.make_current()
+        glDeleteBuffers( len(self.__pbos), self.__pbos )
+        glDeleteFramebuffers( 1, [self.__fbo] )
+        glDeleteRenderbuffers( 2, self.__rbos )
+        glDeleteVertexArrays( 1, [self.__vao] )
+        glDeleteProgram( self.shader.program_id )
+        self.state.invalidate()
+        self.context.delete()
@@ -0,0 +1,238 @@
+"""Asynchronous GPU picking
+
+The PickingService renders object ids into an offscreen framebuffer only
+when the cursor moves or the scene is invalidated, restricted by a
+scissor box to a small region around the cursor. The region is read back
+into one of a ring of pixel buffer objects guarded by fence syncs and is
+resolved once the fence has signalled, typically one or two frames
+later, so the pipeline never stalls on glReadPixels.
+
+Ids are encoded as 24-bit RGB colours, see encode_ids, and mapped back
+to object indices with an IdMap, a sorted-array lookup that resolves
+whole regions at once.
+
+Example::
+
+    ids    = IdMap( object_ids )
+    picker = PickingService( width, height )
+
+    def render_cb():
+        picker.update( draw_id_pass )
+        selected = ids.lookup( picker.result() )
+
+"""
+
+import ctypes
+import numpy
+from OpenGL.GL import *
+
+from graphics.opengl.state import gl_state
+
+def encode_ids( ids ):
+    """Returns (N,3) float32 RGB colours encoding 24-bit integer ids"""
+    ids = numpy.asarray( ids, dtype=numpy.uint32 )
+    rgb = numpy.stack( ((ids >> 0) & 0xff, (ids >> 8) & 0xff, (ids >> 16) & 0xff), axis=-1 )
+    return rgb.astype(numpy.float32)/255.0
+
+def decode_rgba( pixels ):
+    """Returns integer ids from an (...,4) uint8 array of RGBA pixels"""
+    pixels = numpy.asarray( pixels, dtype=numpy.uint32 )
+    return pixels[...,0] | (pixels[...,1] << 8) | (pixels[...,2] << 16)
+
+class IdMap(object):
+    def __init__( self, ids ):
+        """Maps encoded ids back to the indices of the objects carrying them
+
+        Args:
+            ids (array-like): id of each object, 0 is reserved for background
+        """
+        ids = numpy.asarray( ids, dtype=numpy.uint32 ).ravel()
+        self.__order = numpy.argsort( ids, kind='stable' )
+        self.__ids   = ids[self.__order]
+
+    def lookup( self, codes ):
+        """Returns object indices for an array of ids, -1 where an id is unknown"""
+        codes = numpy.asarray( codes, dtype=numpy.uint32 )
+        if self.__ids.size == 0:
+            return numpy.full( codes.shape, -1, dtype=numpy.int64 )
+        pos = numpy.searchsorted( self.__ids, codes )
+        pos = numpy.minimum( pos, self.__ids.size-1 )
+        hit = self.__ids[pos] == codes
+        return numpy.where( hit, self.__order[pos], -1 )
+
+class PickingService(object):
+    def __init__( self, width, height, radius=2, frames_in_flight=3, state=None ):
+        """Creates the picking service, GL objects are created on the first update
+
+        Args:
+            width, height (int): size of the id framebuffer, normally the
+                viewport size
+
+            radius (int): half-size of the square region read back around
+                the cursor
+
+            frames_in_flight (int): number of pixel buffer objects in the
+                readback ring
+
+            state (graphics.opengl.GLState): state cache used for binds,
+                defaults to the shared gl_state
+        """
+        self.state  = state if state is not None else gl_state
+        self.radius = radius
+        self.width  = max(width,1)
+        self.height = max(height,1)
+
+        self.__ring    = frames_in_flight
+        self.__fbo     = None
+        self.__rbos    = None
+        self.__pbos    = None
+        self.__next    = 0
+        self.__pending = []
+
+        self.__cursor = None
+        self.__dirty  = False
+        self.__result = numpy.zeros( (2*radius+1,2*radius+1), dtype=numpy.uint32 )
+        self.__result_origin = (0,0)
+        self.__frame  = 0
+        self.latency  = 0
+
+    def resize( self, width, height ):
+        self.width  = max(width,1)
+        self.height = max(height,1)
+        self.__release_framebuffer()
+        self.__dirty = True
+
+    def request( self, x, y ):
+        """Sets the cursor position in window pixels with origin at the bottom left"""
+        cursor = (int(x), int(y))
+        if cursor != self.__cursor:
+            self.__cursor = cursor
+            self.__dirty  = True
+
+    def invalidate( self ):
+        """Marks the scene as changed so the next update renders a new id pass"""
+        self.__dirty = True
+
+    def __release_framebuffer( self ):
+        if self.__fbo is not None:
+            glDeleteFramebuffers( 1, [self.__fbo] )
+            glDeleteRenderbuffers( 2, self.__rbos )
+            self.__fbo = None
+
+    def __create( self ):
+        if self.__pbos is None:
+            size = (2*self.radius+1)**2*4
+            self.__pbos = list( numpy.atleast_1d( glGenBuffers(self.__ring) ) )
+            for pbo in self.__pbos:
+                self.state.bind_buffer( GL_PIXEL_PACK_BUFFER, pbo )
+                glBufferData( GL_PIXEL_PACK_BUFFER, size, None, GL_STREAM_READ )
+            self.state.bind_buffer( GL_PIXEL_PACK_BUFFER, 0 )
+
+        if self.__fbo is None:
+            self.__fbo  = glGenFramebuffers(1)
+            self.__rbos = list( glGenRenderbuffers(2) )
+            glBindRenderbuffer( GL_RENDERBUFFER, self.__rbos[0] )
+            glRenderbufferStorage( GL_RENDERBUFFER, GL_RGBA8, self.width, self.height )
+            glBindRenderbuffer( GL_RENDERBUFFER, self.__rbos[1] )
+            glRenderbufferStorage( GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, self.width, self.height )
+            glBindRenderbuffer( GL_RENDERBUFFER, 0 )
+            glBindFramebuffer( GL_FRAMEBUFFER, self.__fbo )
+            glFramebufferRenderbuffer( GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.__rbos[0] )
+            glFramebufferRenderbuffer( GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, self.__rbos[1] )
+            if glCheckFramebufferStatus( GL_FRAMEBUFFER ) != GL_FRAMEBUFFER_COMPLETE:
+                glBindFramebuffer( GL_FRAMEBUFFER, 0 )
+                raise RuntimeError('Incomplete picking framebuffer')
+            glBindFramebuffer( GL_FRAMEBUFFER, 0 )
+
+    def __region( self ):
+        x, y = self.__cursor
+        r  = self.radius
+        x0 = min( max( x-r, 0 ), max( self.width-(2*r+1), 0 ) )
+        y0 = min( max( y-r, 0 ), max( self.height-(2*r+1), 0 ) )
+        return x0, y0, min(2*r+1,self.width), min(2*r+1,self.height)
+
+    def __render( self, render_ids ):
+        x, y, w, h = self.__region()
+        glBindFramebuffer( GL_FRAMEBUFFER, self.__fbo )
+        self.state.viewport( 0, 0, self.width, self.height )
+        self.state.enable( GL_SCISSOR_TEST )
+        glScissor( x, y, w, h )
+        glClearColor( 0.0, 0.0, 0.0, 0.0 )
+        glClear( GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT )
+        render_ids()
+
+        # asynchronous read into the next pixel buffer of the ring
+        pbo = self.__pbos[self.__next]
+        self.__next = (self.__next + 1) % self.__ring
+        self.state.bind_buffer( GL_PIXEL_PACK_BUFFER, pbo )
+        glReadPixels( x, y, w, h, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0) )
+        self.state.bind_buffer( GL_PIXEL_PACK_BUFFER, 0 )
+        fence = glFenceSync( GL_SYNC_GPU_COMMANDS_COMPLETE, 0 )
+        self.__pending.append( (fence, pbo, (x,y,w,h), self.__frame) )
+
+        self.state.disable( GL_SCISSOR_TEST )
+        glBindFramebuffer( GL_FRAMEBUFFER, 0 )
+
+    def __resolve( self ):
+        # consume every completed readback in order, keeping the newest
+        while self.__pending:
+            fence, pbo, (x,y,w,h), frame = self.__pending[0]
+            status = glClientWaitSync( fence, 0, 0 )
+            if status not in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+                break
+            self.__pending.pop(0)
+            glDeleteSync( fence )
+
+            self.state.bind_buffer( GL_PIXEL_PACK_BUFFER, pbo )
+            ptr = glMapBufferRange( GL_PIXEL_PACK_BUFFER, 0, w*h*4, GL_MAP_READ_BIT )
+            pixels = numpy.ctypeslib.as_array( ctypes.cast( ptr, ctypes.POINTER(ctypes.c_uint8) ), shape=(h,w,4) ).copy()
+            glUnmapBuffer( GL_PIXEL_PACK_BUFFER )
+            self.state.bind_buffer( GL_PIXEL_PACK_BUFFER, 0 )
+
+            self.__result = decode_rgba( pixels )
+            self.__result_origin = (x,y)
+            self.latency = self.__frame - frame
+
+    def update( self, render_ids ):
+        """Renders a new id pass if needed and resolves finished readbacks
+
+        Args:
+            render_ids (callable): draws the scene with id colours, called
+                with the picking framebuffer bound
+        """
+        self.__frame += 1
+        if self.__cursor is None:
+            return
+        self.__create()
+        self.__resolve()
+        if self.__dirty and len(self.__pending) < self.__ring:
+            self.__render( render_ids )
+            self.__dirty = False
+
+    def region( self ):
+        """Returns the ids of the last resolved region, row 0 at the bottom"""
+        return self.__result
+
+    def result( self ):
+        """Returns the id under the cursor, or the id nearest to it within the region, 0 for none"""
+        ids = self.__result
+        if ids.size == 0 or self.__cursor is None:
+            return 0
+        x0, y0 = self.__result_origin
+        yy, xx = numpy.nonzero( ids )
+        if yy.size == 0:
+            return 0
+        d = (xx + x0 - self.__cursor[0])**2 + (yy + y0 - self.__cursor[1])**2
+        k = numpy.argmin( d )
+        return int( ids[yy[k],xx[k]] )
+
+    def delete( self ):
+        for fence, pbo, region, frame in self.__pending:
+            glDeleteSync( fence )
+        self.__pending = []
+        self.__release_framebuffer()
+        if self.__pbos is not None:
+            for pbo in self.__pbos:
+                self.state.delete_buffer( pbo )
+            glDeleteBuffers( len(self.__pbos), self.__pbos )
+            self.__pbos = None
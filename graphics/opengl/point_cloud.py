@@ -0,0 +1,233 @@
+"""Streaming level-of-detail renderer for PointOctree point clouds
+
+A PointCloudRenderer keeps the points of recently used octree nodes
+resident in one large vertex buffer, handing out ranges with a
+RangeAllocator. Each frame the octree selects nodes within a point
+budget; selected nodes that are resident are drawn with a single
+glMultiDrawArrays call, the others are read from the memory-mapped node
+files on worker threads. Finished loads are uploaded at the start of a
+later frame, at most max_upload points per frame, evicting the least
+recently used nodes that are not selected when the buffer is full.
+
+Since the selection always contains the ancestors of a node and
+ancestors are requested first, a region is drawn coarsely until its
+finer nodes arrive and never disappears while they load.
+
+The vertex layout is POINT_DTYPE, position at attribute location 0 and
+a normalized RGBA colour at location 1.
+
+Example::
+
+    octree   = PointOctree( 'scan.octree' )
+    renderer = PointCloudRenderer( octree, capacity=8000000 )
+
+    def render_cb():
+        renderer.update( camera, height, budget=3000000 )
+        renderer.render( camera )
+
+"""
+
+import ctypes
+import collections
+import concurrent.futures
+
+import numpy
+from OpenGL.GL import *
+
+from graphics.geometry.point_octree import POINT_DTYPE
+from graphics.opengl.multi_draw import RangeAllocator
+from graphics.opengl.shader import Shader
+from graphics.opengl.state import gl_state
+
+vtx_shader = """
+#version 330
+
+uniform mat4  view;
+uniform mat4  projection;
+uniform float point_size = 2.0;
+
+layout(location=0) in vec3 position;
+layout(location=1) in vec4 color;
+
+out vec4 Color;
+
+void main(){
+    Color        = color;
+    gl_Position  = projection*view*vec4(position,1.0);
+    gl_PointSize = point_size;
+}
+"""
+
+frg_shader = """
+#version 330
+
+in vec4 Color;
+out vec4 result;
+
+void main(){
+    result = Color;
+}
+"""
+
+class PointCloudRenderer(object):
+    def __init__( self, octree, capacity=1<<22, workers=2, max_upload=1<<20, state=None ):
+        """Creates the renderer, GL objects are created on the first update
+
+        Args:
+            octree (graphics.geometry.PointOctree): point cloud to draw
+
+            capacity (int): number of points the vertex buffer holds
+
+            workers (int): number of threads loading node files
+
+            max_upload (int): maximum number of points uploaded per frame
+
+            state (graphics.opengl.GLState): state cache used for binds,
+                defaults to the shared gl_state
+        """
+        self.octree     = octree
+        self.capacity   = int(capacity)
+        self.max_upload = int(max_upload)
+        self.state      = state if state is not None else gl_state
+        self.point_size = 2.0
+        self.shader     = None
+
+        self.__pool     = concurrent.futures.ThreadPoolExecutor( max_workers=workers )
+        self.__ranges   = RangeAllocator( self.capacity )
+        self.__resident = collections.OrderedDict()
+        self.__loading  = collections.OrderedDict()
+        self.__vao      = None
+        self.__vbo      = None
+        self.__draw     = (numpy.zeros( 0, dtype=numpy.int32 ), numpy.zeros( 0, dtype=numpy.int32 ))
+        self.frame      = 0
+        self.selected   = numpy.zeros( 0, dtype=numpy.int64 )
+
+    def __create( self ):
+        self.__vao = glGenVertexArrays(1)
+        self.__vbo = int( glGenBuffers(1) )
+        self.state.bind_vertex_array( self.__vao )
+        self.state.bind_buffer( GL_ARRAY_BUFFER, self.__vbo )
+        glBufferData( GL_ARRAY_BUFFER, self.capacity*POINT_DTYPE.itemsize, None, GL_STATIC_DRAW )
+        stride = POINT_DTYPE.itemsize
+        glVertexAttribPointer( 0, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p( POINT_DTYPE.fields['position'][1] ) )
+        glVertexAttribPointer( 1, 4, GL_UNSIGNED_BYTE, GL_TRUE, stride, ctypes.c_void_p( POINT_DTYPE.fields['color'][1] ) )
+        self.state.enable_vertex_attrib_array( 0 )
+        self.state.enable_vertex_attrib_array( 1 )
+        self.state.bind_vertex_array( 0 )
+
+    def __load( self, node ):
+        # copying from the memory map pages the node in on the worker
+        return numpy.array( self.octree.node_points( node ) )
+
+    def __allocate( self, count, keep ):
+        offset = self.__ranges.allocate( count )
+        while offset is None:
+            victim = next( ( n for n in self.__resident if n not in keep ), None )
+            if victim is None:
+                return None
+            self.__ranges.free( self.__resident.pop( victim )[0] )
+            offset = self.__ranges.allocate( count )
+        return offset
+
+    def update( self, camera, height, budget, min_error=1.0 ):
+        """Selects the nodes to draw, uploads finished loads and requests
+        missing nodes
+
+        Args:
+            camera (graphics.core.Camera): perspective camera
+
+            height (int): viewport height in pixels
+
+            budget (int): maximum number of points drawn, should be well
+                below capacity so nodes can stay resident
+
+            min_error (float): see PointOctree.select
+        """
+        if self.__vbo is None:
+            self.__create()
+        self.frame += 1
+        self.selected = self.octree.select( camera, height, min( budget, self.capacity ), min_error )
+        keep = set( self.selected.tolist() )
+
+        # upload finished loads of still selected nodes, in request order
+        uploaded = 0
+        self.state.bind_buffer( GL_ARRAY_BUFFER, self.__vbo )
+        for node, future in list( self.__loading.items() ):
+            if not future.done():
+                continue
+            if uploaded >= self.max_upload:
+                break
+            del self.__loading[node]
+            if node not in keep:
+                continue
+            data = future.result()
+            offset = self.__allocate( data.shape[0], keep )
+            if offset is None:
+                continue
+            glBufferSubData( GL_ARRAY_BUFFER, offset*POINT_DTYPE.itemsize, data.nbytes, data )
+            self.__resident[node] = (offset, data.shape[0])
+            uploaded += data.shape[0]
+
+        # resident nodes become most recently used, missing ones are requested
+        first, count = [], []
+        for node in self.selected.tolist():
+            if node in self.__resident:
+                self.__resident.move_to_end( node )
+                offset, n = self.__resident[node]
+                first.append( offset )
+                count.append( n )
+            elif node not in self.__loading:
+                self.__loading[node] = self.__pool.submit( self.__load, node )
+        # requests no longer selected and not started are dropped
+        for node in [ n for n in self.__loading if n not in keep ]:
+            if self.__loading[node].cancel():
+                del self.__loading[node]
+        self.__draw = (numpy.array( first, dtype=numpy.int32 ), numpy.array( count, dtype=numpy.int32 ))
+
+    def draw( self ):
+        """Draws the resident selected nodes with the current program"""
+        first, count = self.__draw
+        if first.size == 0:
+            return
+        self.state.bind_vertex_array( self.__vao )
+        glMultiDrawArrays( GL_POINTS, first, count, first.size )
+        self.state.bind_vertex_array( 0 )
+
+    def render( self, camera ):
+        """Draws the resident selected nodes with the built-in shader"""
+        if self.shader is None:
+            self.shader = Shader( vtx_shader, frg_shader, state=self.state )
+        self.shader.use()
+        self.shader['view']       = camera.view().matrix()
+        self.shader['projection'] = camera.projection().matrix()
+        self.shader['point_size'] = self.point_size
+        self.state.enable( GL_PROGRAM_POINT_SIZE )
+        self.draw()
+
+    def stats( self ):
+        """Returns counts of selected, drawn, resident and loading nodes and drawn points"""
+        first, count = self.__draw
+        return {
+            'selected':        int( self.selected.size ),
+            'drawn':           int( first.size ),
+            'drawn_points':    int( count.sum() ),
+            'resident':        len( self.__resident ),
+            'resident_points': self.__ranges.used(),
+            'loading':         len( self.__loading )
+        }
+
+    def wait( self ):
+        """Blocks until all requested nodes are loaded, for tests and batch use"""
+        concurrent.futures.wait( list( self.__loading.values() ) )
+
+    def delete( self ):
+        """Stops the loader threads and deletes the GL objects"""
+        self.__pool.shutdown( wait=True, cancel_futures=True )
+        if self.__vbo is not None:
+            self.state.delete_buffer( self.__vbo )
+            glDeleteBuffers( 1, [self.__vbo] )
+            glDeleteVertexArrays( 1, [self.__vao] )
+            self.__vbo = self.__vao = None
+        self.__resident.clear()
+        self.__loading.clear()
+        self.__ranges = RangeAllocator( self.capacity )
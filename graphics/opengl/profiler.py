@@ -0,0 +1,219 @@
+"""Named CPU and GPU timing scopes
+
+A Profiler times named scopes of code on the CPU and, optionally, on the
+GPU with a pair of GL_TIMESTAMP queries written when the scope is entered
+and left. Each scope name owns a small ring of query pairs: a pair is
+only reused once its results have been read, and results are polled
+without waiting, typically a frame or two later, so profiling never
+stalls the pipeline. If every pair of a ring is still in flight that
+scope instance is timed on the CPU only.
+
+Unlike GL_TIME_ELAPSED queries timestamps nest freely, so scopes opened
+inside another one, e.g. inside the viewer's 'frame' scope, are timed on
+the GPU as well.
+
+Timings of the most recent calls of each scope are kept for percentile
+statistics, available from stats(), as text for an overlay, or dumped as
+JSON or CSV. While disabled, scope() returns a shared no-op context and
+profiled functions are called directly after a single flag check.
+
+Example::
+
+    from graphics.opengl import gl_profiler as profiler
+
+    profiler.enabled = True
+
+    @profiler.profile()
+    def draw_scene():
+        with profiler.scope('opaque'):
+            ...
+
+    # once per frame, collects finished GPU queries
+    profiler.collect()
+    profiler.dump_json( 'frame_times.json' )
+
+"""
+
+import csv
+import json
+import time
+import functools
+import collections
+
+import numpy
+from OpenGL.GL import *
+
+class _NullScope(object):
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *exc ):
+        return False
+
+_NULL_SCOPE = _NullScope()
+
+def _timestamp( query ):
+    """Returns the nanoseconds written by a finished GL_TIMESTAMP query"""
+    # the array converter of PyOpenGL has no numpy type for GLuint64
+    value = GLuint64( 0 )
+    glGetQueryObjectui64v( query, GL_QUERY_RESULT, value )
+    return int( value.value )
+
+class _Scope(object):
+    def __init__( self, profiler, name ):
+        self.profiler = profiler
+        self.name     = name
+
+    def __enter__( self ):
+        self.queries = self.profiler._begin( self.name )
+        self.start   = time.perf_counter()
+        return self
+
+    def __exit__( self, *exc ):
+        elapsed = time.perf_counter() - self.start
+        self.profiler._end( self.name, elapsed, self.queries )
+        return False
+
+class Profiler(object):
+    def __init__( self, enabled=False, gpu=True, history=240, queries=4 ):
+        """Creates a profiler
+
+        Args:
+            enabled (bool): whether scopes record anything
+
+            gpu (bool): whether GL_TIMESTAMP queries are issued, needs a
+                current GL context while scopes are entered
+
+            history (int): number of recent calls per scope kept for
+                statistics
+
+            queries (int): number of query pairs of each scope, i.e. how
+                many of its calls can be in flight on the GPU
+        """
+        self.enabled  = enabled
+        self.gpu      = gpu
+        self.history  = history
+        self.queries  = queries
+        self.__cpu    = {}
+        self.__gpu    = {}
+        self.__counts = collections.Counter()
+        self.__free   = {}
+        self.__pending = []
+
+    def scope( self, name ):
+        """Returns a context manager timing the enclosed code as name"""
+        if not self.enabled:
+            return _NULL_SCOPE
+        return _Scope( self, name )
+
+    def profile( self, name=None ):
+        """Decorator timing every call of a function, named after the
+        function unless name is given"""
+        def decorator( func ):
+            label = name or func.__qualname__
+            @functools.wraps(func)
+            def wrapper( *args, **kwargs ):
+                if not self.enabled:
+                    return func( *args, **kwargs )
+                with _Scope( self, label ):
+                    return func( *args, **kwargs )
+            return wrapper
+        return decorator
+
+    def __series( self, table, name ):
+        if name not in table:
+            table[name] = collections.deque( maxlen=self.history )
+        return table[name]
+
+    def _begin( self, name ):
+        if not self.gpu:
+            return None
+        free = self.__free.get( name )
+        if free is None:
+            ids  = [ int(q) for q in numpy.atleast_1d( glGenQueries( 2*self.queries ) ) ]
+            free = self.__free[name] = list( zip( ids[0::2], ids[1::2] ) )
+        if not free:
+            return None
+        queries = free.pop()
+        glQueryCounter( queries[0], GL_TIMESTAMP )
+        return queries
+
+    def _end( self, name, elapsed, queries ):
+        if queries is not None:
+            glQueryCounter( queries[1], GL_TIMESTAMP )
+            self.__pending.append( (name, queries) )
+        self.__series( self.__cpu, name ).append( elapsed*1e3 )
+        self.__counts[name] += 1
+
+    def collect( self ):
+        """Reads the results of finished GPU queries without waiting"""
+        pending = []
+        for name, queries in self.__pending:
+            if all( numpy.ravel( glGetQueryObjectiv( q, GL_QUERY_RESULT_AVAILABLE ) )[0] for q in queries ):
+                start, end = [ _timestamp( q ) for q in queries ]
+                self.__series( self.__gpu, name ).append( (end - start)*1e-6 )
+                self.__free[name].append( queries )
+            else:
+                pending.append( (name, queries) )
+        self.__pending = pending
+
+    def reset( self ):
+        """Clears the recorded timings, queries in flight are kept"""
+        self.__cpu    = {}
+        self.__gpu    = {}
+        self.__counts = collections.Counter()
+
+    def delete( self ):
+        """Deletes the query objects, needs the GL context they were created in"""
+        for name, pairs in self.__free.items():
+            queries = [ q for pair in pairs for q in pair ] + [ q for n, pair in self.__pending if n == name for q in pair ]
+            if queries:
+                glDeleteQueries( len(queries), queries )
+        self.__free    = {}
+        self.__pending = []
+
+    @staticmethod
+    def __summary( values ):
+        if not values:
+            return None
+        v = numpy.fromiter( values, dtype=numpy.float64 )
+        p50, p95, p99 = numpy.percentile( v, (50,95,99) )
+        return { 'mean': float(v.mean()), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(v.max()) }
+
+    def stats( self ):
+        """Returns name -> {'count', 'cpu', 'gpu'} where cpu and gpu hold
+        mean, p50, p95, p99 and max milliseconds over the recent calls,
+        gpu is None until query results are available"""
+        return { name: { 'count': self.__counts[name],
+                         'cpu':   self.__summary( self.__cpu.get(name) ),
+                         'gpu':   self.__summary( self.__gpu.get(name) ) }
+                 for name in sorted( self.__cpu ) }
+
+    def text( self ):
+        """Returns the statistics as lines of text for an overlay"""
+        lines = [ '{:16s} {:>8s} {:>8s} {:>8s} {:>8s}'.format( 'scope', 'cpu p50', 'cpu p95', 'gpu p50', 'gpu p95' ) ]
+        for name, s in self.stats().items():
+            gpu = s['gpu'] or { 'p50': float('nan'), 'p95': float('nan') }
+            lines.append( '{:16s} {:8.2f} {:8.2f} {:8.2f} {:8.2f}'.format( name[:16], s['cpu']['p50'], s['cpu']['p95'], gpu['p50'], gpu['p95'] ) )
+        return lines
+
+    def draw_overlay( self, widget, x=10, y=20, line_height=14 ):
+        """Draws the statistics text over a QGLWidget, call from its paintGL"""
+        for i, line in enumerate( self.text() ):
+            widget.renderText( x, y + i*line_height, line )
+
+    def dump_json( self, path ):
+        with open( path, 'w' ) as f:
+            json.dump( self.stats(), f, indent=2 )
+
+    def dump_csv( self, path ):
+        with open( path, 'w', newline='' ) as f:
+            writer = csv.writer( f )
+            writer.writerow( ['scope','count','timer','mean','p50','p95','p99','max'] )
+            for name, s in self.stats().items():
+                for timer in ('cpu','gpu'):
+                    if s[timer] is not None:
+                        writer.writerow( [name, s['count'], timer] + [ s[timer][k] for k in ('mean','p50','p95','p99','max') ] )
+
+# profiler shared by the viewer and library code, disabled by default
+gl_profiler = Profiler()
@@ -0,0 +1,142 @@
+"""Opt-in cache of linked shader programs
+
+Programs are keyed by a hash of their sources together with the GL
+vendor, renderer and version strings, so a driver update or a different
+GPU never picks up an incompatible binary. Within a process the cache
+links identical sources only once: every call of shader() returns a new
+Shader, with its own attribute buffers, on the shared program object, so
+uniform values set through one are seen by the others. With a directory
+it also stores glGetProgramBinary output on disk and restores it with
+glProgramBinary on later runs, falling back to compiling from source
+whenever the binary is missing or rejected by the driver.
+
+Example::
+
+    cache  = ProgramCache( os.path.expanduser('~/.cache/graphics/programs') )
+    shader = cache.shader( vertex_source, fragment_source )
+
+"""
+
+import ctypes
+import hashlib
+import logging
+import os
+import struct
+import numpy
+from OpenGL.GL import *
+from OpenGL.error import GLError
+
+from graphics.opengl.shader import Shader
+
+logger = logging.getLogger(__name__)
+
+class ProgramCache(object):
+    def __init__( self, directory=None ):
+        """Creates a program cache
+
+        Args:
+            directory (string): directory holding program binaries, if
+                None only the in-process cache is used
+        """
+        self.directory = directory
+        self.__programs = {}
+        self.__device   = None
+        self.__formats  = None
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs( directory )
+
+    def key( self, vertex, fragment ):
+        """Returns the cache key for a pair of shader sources"""
+        if self.__device is None:
+            self.__device = '\n'.join( _glGetString(name) for name in (GL_VENDOR, GL_RENDERER, GL_VERSION) )
+        h = hashlib.sha256()
+        for part in (self.__device, vertex, fragment):
+            h.update( part.encode('utf-8') )
+            h.update( b'\0' )
+        return h.hexdigest()
+
+    def shader( self, vertex, fragment, state=None ):
+        """Returns a new Shader for the sources, linking their program at
+        most once per process"""
+        return Shader( vertex, fragment, cache=self, state=state )
+
+    def clear( self ):
+        """Forgets in-process programs without deleting them, binaries on
+        disk are kept"""
+        self.__programs = {}
+
+    def __binaries_supported( self ):
+        if self.__formats is None:
+            self.__formats = glGetIntegerv( GL_NUM_PROGRAM_BINARY_FORMATS ) > 0
+        return self.directory is not None and self.__formats
+
+    def __path( self, key ):
+        return os.path.join( self.directory, '{}.bin'.format(key) )
+
+    def load( self, vertex, fragment ):
+        """Returns the program linked earlier in this process or restores
+        it from its stored binary
+
+        Returns:
+            program id, or None if there is no usable binary
+        """
+        key = self.key( vertex, fragment )
+        if key in self.__programs:
+            return self.__programs[key]
+        if not self.__binaries_supported():
+            return None
+        path = self.__path( key )
+        if not os.path.exists(path):
+            return None
+
+        with open( path, 'rb' ) as f:
+            data = f.read()
+        if len(data) <= 4:
+            return None
+        fmt, = struct.unpack( '<I', data[:4] )
+        binary = numpy.frombuffer( data, dtype=numpy.uint8, offset=4 )
+
+        program_id = glCreateProgram()
+        try:
+            glProgramBinary( program_id, fmt, binary, binary.size )
+            linked = glGetProgramiv( program_id, GL_LINK_STATUS ) == GL_TRUE
+        except GLError:
+            linked = False
+        if not linked:
+            logger.info( 'Discarding rejected program binary %s', path )
+            glDeleteProgram( program_id )
+            os.remove( path )
+            return None
+        logger.debug( 'Restored program binary %s', path )
+        self.__programs[key] = program_id
+        return program_id
+
+    def store( self, vertex, fragment, program_id ):
+        """Keeps a linked program for this process and writes its binary
+        to the cache directory"""
+        key = self.key( vertex, fragment )
+        self.__programs[key] = program_id
+        if not self.__binaries_supported():
+            return
+        length = glGetProgramiv( program_id, GL_PROGRAM_BINARY_LENGTH )
+        if length <= 0:
+            return
+
+        size   = (ctypes.c_int*1)()
+        fmt    = (ctypes.c_uint*1)()
+        binary = numpy.zeros( length, dtype=numpy.uint8 )
+        glGetProgramBinary( program_id, length, size, fmt, binary )
+
+        path = self.__path( key )
+        tmp  = '{}.{}.tmp'.format( path, os.getpid() )
+        with open( tmp, 'wb' ) as f:
+            f.write( struct.pack('<I', fmt[0]) )
+            f.write( binary[:size[0]].tobytes() )
+        os.replace( tmp, path )
+        logger.debug( 'Stored program binary %s', path )
+
+def _glGetString( name ):
+    val = glGetString( name )
+    if isinstance(val, bytes):
+        val = val.decode('utf-8', 'replace')
+    return val or ''
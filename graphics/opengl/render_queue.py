@@ -0,0 +1,227 @@
+"""Sorted submission of mesh draws
+
+A RenderQueue collects draw items for a frame, each referencing a shader,
+a material triangle range of a graphics.geometry.Mesh and the
+graphics.appearance.Material to draw it with. On flush the items are
+ordered by 64-bit sort keys, adjacent items that share all state and
+cover contiguous triangles are merged into a single draw, and the result
+is issued through a GLState so repeated binds are elided.
+
+Sort key layout, most significant bits first::
+
+    pass     4 bits
+    program 10 bits
+    textures 12 bits
+    material 14 bits
+    depth   24 bits
+
+Example::
+
+    queue = RenderQueue()
+    for matname in mesh.material_triangles:
+        queue.submit( shader, mesh, matname, materials[matname], depth=d )
+    queue.flush()
+    print( queue.stats() )
+
+"""
+
+import numpy
+from OpenGL.GL import *
+
+from graphics.opengl.state import gl_state
+
+KEY_BITS = (
+    ('pass',      4),
+    ('program',  10),
+    ('textures', 12),
+    ('material', 14),
+    ('depth',    24)
+)
+
+# common attribute names -> Mesh property used by the default mesh binding
+MESH_ATTRIBUTES = {
+    'position':    'vertices',
+    'in_position': 'vertices',
+    'normal':      'normals',
+    'in_normal':   'normals',
+    'texcoord':    'texture_coords',
+    'in_texcoord': 'texture_coords'
+}
+
+def bind_mesh( shader, mesh ):
+    """Default mesh binding, uploads Mesh arrays to matching shader attributes"""
+    attributes = shader.attributes()
+    for name, prop in MESH_ATTRIBUTES.items():
+        if name in attributes:
+            shader[name] = getattr( mesh, prop )
+
+def bind_material( shader, material ):
+    """Default material binding, sets the uniforms used by the example shaders"""
+    if material is None:
+        return
+    uniforms = shader.uniforms()
+    if 'diffuse' in uniforms:
+        shader['diffuse'] = material.diffuse
+    if 'ambient' in uniforms:
+        shader['ambient'] = material.ambient
+    if 'specular' in uniforms:
+        shader['specular'] = material.specular
+    if 'spec_exp' in uniforms:
+        shader['spec_exp'] = material.specular_exponent
+
+def sort_keys( fields ):
+    """Packs integer key fields into 64-bit sort keys
+
+    Args:
+        fields (dict): name -> integer array for every entry of KEY_BITS,
+            values must fit in the field width
+
+    Returns:
+        numpy.uint64 array of keys
+    """
+    keys  = None
+    for name, bits in KEY_BITS:
+        val = numpy.asarray( fields[name], dtype=numpy.uint64 )
+        if numpy.any( val >> numpy.uint64(bits) ):
+            raise ValueError('Sort key field {} exceeds {} bits'.format(name,bits))
+        keys = val if keys is None else (keys << numpy.uint64(bits)) | val
+    return keys
+
+class RenderQueue(object):
+    def __init__( self, state=None, bind_mesh=bind_mesh, bind_material=bind_material, back_to_front=() ):
+        """Creates an empty queue
+
+        Args:
+            state (graphics.opengl.GLState): state cache used to issue
+                binds, defaults to the shared gl_state
+
+            bind_mesh (callable): bind_mesh(shader, mesh), called when
+                the mesh changes between draws
+
+            bind_material (callable): bind_material(shader, material),
+                called when the material changes between draws
+
+            back_to_front (iterable): passes whose items are ordered far
+                to near, e.g. for blending, instead of near to far
+        """
+        self.state         = state if state is not None else gl_state
+        self.bind_mesh     = bind_mesh
+        self.bind_material = bind_material
+        self.back_to_front = set(back_to_front)
+        self.__stats       = {}
+        self.clear()
+
+    def clear( self ):
+        self.__items    = []
+        self.__programs = {}
+        self.__texsets  = {}
+        self.__mats     = {}
+
+    def __len__( self ):
+        return len(self.__items)
+
+    @staticmethod
+    def __intern( table, key ):
+        if key not in table:
+            table[key] = len(table)
+        return table[key]
+
+    def submit( self, shader, mesh, matname, material=None, textures=(), depth=0.0, layer=0 ):
+        """Adds a draw of one material range of a mesh
+
+        Args:
+            shader (graphics.opengl.Shader): program to draw with
+
+            mesh (graphics.geometry.Mesh): finalized mesh
+
+            matname (string): key of mesh.material_triangles selecting
+                the triangle range to draw
+
+            material (graphics.appearance.Material): material passed to
+                bind_material
+
+            textures (sequence): GL texture ids bound to units 0..n-1
+
+            depth (float): normalized view depth in [0,1]
+
+            layer (int): render pass, lower passes are drawn first
+        """
+        start, end = mesh.material_triangles[matname]
+        textures = tuple(textures)
+        self.__items.append((
+            layer,
+            self.__intern( self.__programs, shader.program_id ),
+            self.__intern( self.__texsets, textures ),
+            self.__intern( self.__mats, id(material) ),
+            min( max( float(depth), 0.0 ), 1.0 ),
+            shader, mesh, material, textures, start, end
+        ))
+
+    def keys( self ):
+        """Returns the sort keys of the queued items in submission order"""
+        if not self.__items:
+            return numpy.zeros( 0, dtype=numpy.uint64 )
+        layer, program, texset, mat, depth = [ numpy.array(f) for f in list(zip(*self.__items))[:5] ]
+        dmax  = (1 << KEY_BITS[-1][1]) - 1
+        depth = numpy.round( depth*dmax ).astype(numpy.int64)
+        flip  = numpy.isin( layer, list(self.back_to_front) )
+        depth[flip] = dmax - depth[flip]
+        return sort_keys({ 'pass': layer, 'program': program, 'textures': texset, 'material': mat, 'depth': depth })
+
+    def batches( self ):
+        """Returns merged draws in key order as (shader, mesh, material, textures, start, end)"""
+        order = numpy.argsort( self.keys(), kind='stable' )
+        draws = []
+        for idx in order:
+            shader, mesh, material, textures, start, end = self.__items[idx][5:]
+            if draws:
+                last = draws[-1]
+                if last[0] is shader and last[1] is mesh and last[2] is material and last[3] == textures and last[5] == start:
+                    draws[-1] = last[:5] + (end,)
+                    continue
+            draws.append( (shader, mesh, material, textures, start, end) )
+        return draws
+
+    @staticmethod
+    def state_changes( draws ):
+        """Counts program, texture, material and mesh changes along a draw sequence"""
+        changes = 0
+        last = None
+        for draw in draws:
+            shader, mesh, material, textures = draw[:4]
+            if last is None:
+                changes += 4
+            else:
+                changes += (shader is not last[0]) + (mesh is not last[1]) + (material is not last[2]) + (textures != last[3])
+            last = draw
+        return changes
+
+    def flush( self ):
+        """Issues the queued draws in sorted, merged order and empties the queue"""
+        draws = self.batches()
+        self.__stats = {
+            'items':          len(self.__items),
+            'draws':          len(draws),
+            'changes_before': self.state_changes( [ item[5:] for item in self.__items ] ),
+            'changes_after':  self.state_changes( draws )
+        }
+
+        last = None
+        for shader, mesh, material, textures, start, end in draws:
+            program_changed = last is None or shader is not last[0]
+            if program_changed:
+                shader.use()
+            if program_changed or mesh is not last[1]:
+                self.bind_mesh( shader, mesh )
+            if program_changed or material is not last[2]:
+                self.bind_material( shader, material )
+            for unit, tex in enumerate(textures):
+                self.state.bind_texture( GL_TEXTURE_2D, tex, unit )
+            glDrawArrays( GL_TRIANGLES, start*3, (end-start)*3 )
+            last = (shader, mesh, material)
+
+        self.clear()
+
+    def stats( self ):
+        """Returns item/draw counts and state changes before and after sorting for the last flush"""
+        return dict(self.__stats)
@@ -1,7 +1,18 @@
 import ctypes
+import logging
 import numpy
 from OpenGL.GL import *
 
+from graphics.opengl.state import gl_state
+from graphics.opengl.uniform_buffer import GLSL_TYPE_NAMES, binding_point, uniform_member
+
+logger = logging.getLogger(__name__)
+
+def _decode_log(info):
+    if isinstance(info, bytes):
+        info = info.decode('utf-8', 'replace')
+    return info.strip()
+
 def _glGetActiveAttrib(program, index):
     bufsize = 256
     length = (ctypes.c_int*1)()
@@ -13,36 +24,86 @@ def _glGetActiveAttrib(program, index):
     name = name[:length[0]].decode('utf-8')
     return name, size[0], type[0]
 
+def _glGetActiveUniformBlockName(program, index):
+    bufsize = 256
+    length = (ctypes.c_int*1)()
+    name = ctypes.create_string_buffer(bufsize)
+    glGetActiveUniformBlockName(program, index, bufsize, length, name)
+    return name[:length[0]].decode('utf-8')
+
+def _glGetActiveUniformBlockiv(program, index, pname, count=1):
+    params = numpy.zeros( max(count,1), dtype=numpy.int32 )
+    glGetActiveUniformBlockiv(program, index, pname, params)
+    return params[:count]
+
+def _glGetActiveUniformsiv(program, indices, pname):
+    indices = numpy.asarray( indices, dtype=numpy.uint32 )
+    params = numpy.zeros( indices.size, dtype=numpy.int32 )
+    glGetActiveUniformsiv(program, indices.size, indices, pname, params)
+    return params
+
 class Shader(object):
-    def __init__(self, vertex, fragment):
-        self.program_id = glCreateProgram()
-        vs_id = self.add_shader(vertex, GL_VERTEX_SHADER)
-        frag_id = self.add_shader(fragment, GL_FRAGMENT_SHADER)
+    def __init__(self, vertex, fragment, cache=None, state=None):
+        """Builds a program from vertex and fragment shader sources
 
-        glAttachShader(self.program_id, vs_id)
-        glAttachShader(self.program_id, frag_id)
-        glLinkProgram(self.program_id)
+        Args:
+            vertex (string): vertex shader source
 
-        if glGetProgramiv(self.program_id, GL_LINK_STATUS) != GL_TRUE:
-            info = glGetProgramInfoLog(self.program_id)
-            glDeleteProgram(self.program_id)
-            glDeleteShader(vs_id)
-            glDeleteShader(frag_id)
-            raise RuntimeError('Error linking program: %s' % (info))
+            fragment (string): fragment shader source
 
-        info = glGetProgramInfoLog(self.program_id)
-        print( info )
+            cache (graphics.opengl.ProgramCache): optional cache used to
+                reuse a program linked earlier in the process or restore
+                a stored program binary instead of compiling the sources
 
-        glDeleteShader(vs_id)
-        glDeleteShader(frag_id)
+            state (graphics.opengl.GLState): state cache that program
+                and attribute bindings go through, defaults to the
+                shared gl_state
+        """
+        self.state = state if state is not None else gl_state
+        self.program_id = None
+        if cache is not None:
+            self.program_id = cache.load(vertex, fragment)
+
+        if self.program_id is None:
+            self.program_id = self.link(vertex, fragment, retrievable=cache is not None)
+            if cache is not None:
+                cache.store(vertex, fragment, self.program_id)
 
         self.__glattributes = self.__get_glattributes()
         self.__gluniforms   = self.__get_gluniforms()
+        self.__glblocks     = self.__get_gluniform_blocks()
 
         self.__vbos = {}
         for attr in self.__glattributes:
             self.__vbos[attr] = glGenBuffers(1)
 
+    def link(self, vertex, fragment, retrievable=False):
+        program_id = glCreateProgram()
+        vs_id = self.add_shader(vertex, GL_VERTEX_SHADER)
+        frag_id = self.add_shader(fragment, GL_FRAGMENT_SHADER)
+
+        if retrievable:
+            glProgramParameteri(program_id, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
+
+        glAttachShader(program_id, vs_id)
+        glAttachShader(program_id, frag_id)
+        glLinkProgram(program_id)
+
+        if glGetProgramiv(program_id, GL_LINK_STATUS) != GL_TRUE:
+            info = glGetProgramInfoLog(program_id)
+            glDeleteProgram(program_id)
+            glDeleteShader(vs_id)
+            glDeleteShader(frag_id)
+            raise RuntimeError('Error linking program: %s' % (info))
+
+        info = glGetProgramInfoLog(program_id)
+        if info:
+            logger.info('Program %d link log: %s', program_id, _decode_log(info))
+
+        glDeleteShader(vs_id)
+        glDeleteShader(frag_id)
+        return program_id
+
     def add_shader(self, source, shader_type):
         try:
             shader_id = glCreateShader(shader_type)
@@ -51,16 +112,19 @@ class Shader(object):
             if glGetShaderiv(shader_id, GL_COMPILE_STATUS) != GL_TRUE:
                 info = glGetShaderInfoLog(shader_id)
                 raise RuntimeError('Shader compilation failed: %s' % (info))
+            info = glGetShaderInfoLog(shader_id)
+            if info:
+                logger.info('Shader %d compile log: %s', shader_id, _decode_log(info))
             return shader_id
         except:
             glDeleteShader(shader_id)
             raise
 
     def use( self ):
-        glUseProgram( self.program_id )
+        self.state.use_program( self.program_id )
 
     def release( self ):
-        glUseProgram( 0 )
+        self.state.use_program( 0 )
 
     def uniforms(self):
         return self.__gluniforms
@@ -68,6 +132,10 @@ class Shader(object):
     def attributes(self):
         return self.__glattributes
 
+    def uniform_blocks(self):
+        """Returns active uniform blocks as name -> (index, size, binding, members)"""
+        return self.__glblocks
+
     def __setitem__( self, key, val ):
         if key in self.__gluniforms:
             uni = self.__gluniforms[key]
@@ -90,25 +158,60 @@ class Shader(object):
             attr = self.__glattributes[key]
             loc  = glGetAttribLocation(self.program_id,key)
             if len(val) == attr[0]:
-                glDisableVertexAttribArray( loc )
+                self.state.disable_vertex_attrib_array( loc )
                 SHADER_ATTRIBUTE_FUNC[attr[-1]](
                     loc, val
                 )
             else:
-                glBindBuffer(GL_ARRAY_BUFFER, self.__vbos[key])
+                self.state.bind_buffer(GL_ARRAY_BUFFER, self.__vbos[key])
                 glBufferData( GL_ARRAY_BUFFER, val.itemsize*val.size, val.astype(attr[2]), GL_STATIC_DRAW )
                 glVertexAttribPointer( loc, attr[0], SHADER_GLTYPE[attr[-1]], GL_FALSE, 0, None )
-                glEnableVertexAttribArray( loc )
+                self.state.enable_vertex_attrib_array( loc )
 
 
     def __get_gluniforms( self ):
         results = {}
         num_uniforms = glGetProgramiv( self.program_id, GL_ACTIVE_UNIFORMS )
+        if num_uniforms == 0:
+            return results
+        # members of uniform blocks are set through a UniformBuffer instead
+        blocks = _glGetActiveUniformsiv( self.program_id, range(num_uniforms), GL_UNIFORM_BLOCK_INDEX )
         for i in range(num_uniforms):
+            if blocks[i] >= 0:
+                continue
             name, size, vtype = glGetActiveUniform( self.program_id, i )
             results[name.decode('utf-8')] = (SHADER_COMPONENTS[vtype],size,SHADER_TYPE[vtype],vtype)
         return results
 
+    def __get_gluniform_blocks( self ):
+        results = {}
+        num_blocks = glGetProgramiv( self.program_id, GL_ACTIVE_UNIFORM_BLOCKS )
+        for i in range(num_blocks):
+            name    = _glGetActiveUniformBlockName( self.program_id, i )
+            size    = int(_glGetActiveUniformBlockiv( self.program_id, i, GL_UNIFORM_BLOCK_DATA_SIZE )[0])
+            count   = int(_glGetActiveUniformBlockiv( self.program_id, i, GL_UNIFORM_BLOCK_ACTIVE_UNIFORMS )[0])
+            indices = _glGetActiveUniformBlockiv( self.program_id, i, GL_UNIFORM_BLOCK_ACTIVE_UNIFORM_INDICES, count )
+
+            offsets   = _glGetActiveUniformsiv( self.program_id, indices, GL_UNIFORM_OFFSET )
+            astrides  = _glGetActiveUniformsiv( self.program_id, indices, GL_UNIFORM_ARRAY_STRIDE )
+            mstrides  = _glGetActiveUniformsiv( self.program_id, indices, GL_UNIFORM_MATRIX_STRIDE )
+            row_major = _glGetActiveUniformsiv( self.program_id, indices, GL_UNIFORM_IS_ROW_MAJOR )
+
+            members = {}
+            for j, idx in enumerate(indices):
+                uname, usize, vtype = glGetActiveUniform( self.program_id, int(idx) )
+                uname = uname.decode('utf-8')
+                if uname.endswith('[0]'):
+                    uname = uname[:-3]
+                members[uname] = uniform_member( GLSL_TYPE_NAMES[vtype], int(offsets[j]), usize,
+                                                 int(astrides[j]), int(mstrides[j]), bool(row_major[j]) )
+
+            # every program shares the binding point reserved for the block name
+            binding = binding_point( name )
+            glUniformBlockBinding( self.program_id, i, binding )
+            results[name] = (i, size, binding, members)
+        return results
+
     def __get_glattributes( self ):
         def active_attributes( program, index ):
             bufsize = 256
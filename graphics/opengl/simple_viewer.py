@@ -1,11 +1,119 @@
+"""Qt OpenGL viewer widget with callbacks and frame pacing
+
+The viewer schedules frames in one of three modes:
+
+    ON_DEMAND  frames are drawn only after input, a resize, showing the
+               window or a call to request_redraw()
+    FIXED      frames are drawn at a target rate, deadlines advance by
+               whole periods so timer jitter does not accumulate
+    VSYNC      buffer swaps wait for the display refresh, frames are
+               capped at the screen refresh rate in case the driver
+               ignores the swap interval
+
+While the window is hidden or minimized no frames are drawn and idle_cb
+is only emitted at idle_fps. frame_stats() reports frame times and the
+CPU usage of the process for the recent frames. Each frame is also timed
+as the 'frame' scope of the viewer's Profiler, whose statistics are drawn
+over the scene when show_profile is set and the profiler is enabled.
+
+The viewer's GLState cache is invalidated whenever its context is
+created and after Qt draws the profile overlay, so callbacks can go
+through the cache from the first frame on.
+
+Example::
+
+    viewer = SimpleViewer( mode=SimpleViewer.ON_DEMAND )
+    viewer.render_cb.connect( render_cb )
+
+    # after changing the scene outside of input handlers
+    viewer.request_redraw()
+
+"""
+
 import sys
+import time
+import collections
+
+import numpy
+
 from PyQt5 import QtWidgets
 from PyQt5 import QtCore
 from PyQt5 import QtGui
 from PyQt5 import QtOpenGL
 
+from graphics.opengl.profiler import gl_profiler
+from graphics.opengl.state import gl_state
+
+class FramePacer(object):
+    def __init__( self, fps, clock=time.perf_counter ):
+        """Computes drift-free frame deadlines at a target rate
+
+        Args:
+            fps (float): target frames per second
+
+            clock (callable): time source in seconds
+        """
+        self.clock  = clock
+        self.period = 1.0/fps
+        self.__deadline = None
+
+    def reset( self ):
+        self.__deadline = None
+
+    def delay( self ):
+        """Returns the time in seconds until the next frame is due
+
+        Deadlines advance by whole periods from the first frame. If the
+        caller falls more than a period behind, the schedule restarts
+        from now rather than drawing a burst of late frames.
+        """
+        now = self.clock()
+        if self.__deadline is None or now - self.__deadline > self.period:
+            self.__deadline = now
+        self.__deadline += self.period
+        return max( self.__deadline - now, 0.0 )
+
+class FrameStats(object):
+    def __init__( self, frames=120, clock=time.perf_counter, cpu_clock=time.process_time ):
+        """Collects frame intervals, render times and CPU usage over the
+        most recent frames"""
+        self.clock     = clock
+        self.cpu_clock = cpu_clock
+        self.__times   = collections.deque( maxlen=frames+1 )
+        self.__render  = collections.deque( maxlen=frames )
+        self.__start   = None
+        self.count     = 0
+
+    def begin( self ):
+        self.__start = self.clock()
+        self.__times.append( (self.__start, self.cpu_clock()) )
+
+    def end( self ):
+        self.__render.append( self.clock() - self.__start )
+        self.count += 1
+
+    def summary( self ):
+        """Returns a dict with frames, fps, frame_ms (mean, p50, p95, max
+        of frame intervals), render_ms (mean time in the render callback)
+        and cpu, the process CPU time over wall time between frames"""
+        result = { 'frames': self.count, 'fps': 0.0, 'frame_ms': (0.0,0.0,0.0,0.0), 'render_ms': 0.0, 'cpu': 0.0 }
+        if self.__render:
+            result['render_ms'] = 1e3*float( numpy.mean( self.__render ) )
+        if len(self.__times) > 1:
+            wall, cpu = numpy.array( self.__times ).T
+            dt   = numpy.diff( wall )*1e3
+            span = wall[-1] - wall[0]
+            result['fps']      = (len(wall)-1)/span if span > 0 else 0.0
+            result['frame_ms'] = ( float(dt.mean()), float(numpy.percentile(dt,50)), float(numpy.percentile(dt,95)), float(dt.max()) )
+            result['cpu']      = (cpu[-1]-cpu[0])/span if span > 0 else 0.0
+        return result
+
 class SimpleViewer(QtOpenGL.QGLWidget):
 
+    ON_DEMAND = 'on_demand'
+    FIXED     = 'fixed'
+    VSYNC     = 'vsync'
+
     initialize_cb    = QtCore.pyqtSignal()
     resize_cb        = QtCore.pyqtSignal(int,int)
     idle_cb          = QtCore.pyqtSignal()
@@ -23,43 +131,151 @@ class SimpleViewer(QtOpenGL.QGLWidget):
     def application():
         return QtWidgets.QApplication(sys.argv)
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, mode=FIXED, fps=60.0, idle_fps=2.0, profiler=None, state=None):
+        """Creates the viewer
+
+        Args:
+            parent (QWidget): parent widget
+
+            mode (string): ON_DEMAND, FIXED or VSYNC frame scheduling
+
+            fps (float): target frame rate in FIXED mode
+
+            idle_fps (float): rate of idle_cb while the window is hidden
+
+            profiler (graphics.opengl.Profiler): profiler timing frames,
+                defaults to the shared gl_profiler
+
+            state (graphics.opengl.GLState): state cache of the viewer's
+                context, defaults to the shared gl_state
+        """
         self.parent = parent
-        QtOpenGL.QGLWidget.__init__(self, parent)
+        fmt = QtOpenGL.QGLFormat()
+        fmt.setSwapInterval( 1 if mode == SimpleViewer.VSYNC else 0 )
+        QtOpenGL.QGLWidget.__init__(self, fmt, parent)
         self.setMouseTracking(True)
 
+        self.mode     = mode
+        self.fps      = fps
+        self.idle_fps = idle_fps
+        self.stats    = FrameStats()
+        self.profiler = profiler if profiler is not None else gl_profiler
+        self.state    = state if state is not None else gl_state
+        self.show_profile = False
+        self.__pacer  = None
+        self.__redraw = False
+
+        self.timer = QtCore.QTimer()
+        self.timer.setSingleShot( True )
+        self.timer.setTimerType( QtCore.Qt.PreciseTimer )
+        self.timer.timeout.connect( self.idle )
+
+    def set_mode( self, mode, fps=None ):
+        """Switches the frame scheduling mode"""
+        self.mode = mode
+        if fps is not None:
+            self.fps = fps
+        self.__pacer = None
+        self.stats = FrameStats()
+        self.request_redraw()
+
+    def frame_stats( self ):
+        """Returns frame timing and CPU usage of recent frames, see FrameStats.summary"""
+        result = self.stats.summary()
+        result['mode'] = self.mode
+        return result
+
+    def request_redraw( self ):
+        """Schedules a frame, repeated requests before it is drawn are merged"""
+        self.__redraw = True
+        if not self.timer.isActive():
+            self.timer.start( 0 )
+
+    def __hidden( self ):
+        return not self.isVisible() or self.window().isMinimized()
+
+    def __target_fps( self ):
+        if self.mode == SimpleViewer.VSYNC:
+            screen = self.window().windowHandle().screen() if self.window().windowHandle() else None
+            return screen.refreshRate() if screen is not None and screen.refreshRate() > 0 else 60.0
+        return self.fps
+
+    def __schedule( self ):
+        if self.__hidden():
+            self.timer.start( int( 1000.0/self.idle_fps ) )
+        elif self.mode != SimpleViewer.ON_DEMAND or self.__redraw:
+            if self.__pacer is None:
+                self.__pacer = FramePacer( self.__target_fps() )
+            self.timer.start( int( round( self.__pacer.delay()*1000.0 ) ) )
 
     def idle( self ):
         self.idle_cb.emit()
-        self.updateGL()
+        if self.__hidden():
+            self.__pacer = None
+        elif self.mode != SimpleViewer.ON_DEMAND or self.__redraw:
+            self.__redraw = False
+            self.updateGL()
+        self.__schedule()
 
     def mouseMoveEvent( self, evt ):
         self.mouse_move_cb.emit( evt )
+        self.__input()
 
     def mousePressEvent( self, evt ):
         self.mouse_press_cb.emit( evt )
+        self.__input()
 
     def mouseReleaseEvent( self, evt ):
         self.mouse_release_cb.emit( evt )
+        self.__input()
+
+    def wheelEvent( self, evt ):
+        self.mouse_wheel_cb.emit( evt )
+        self.__input()
 
     def keyPressEvent( self, evt ):
         self.key_press_cb.emit(evt)
+        self.__input()
 
     def keyReleaseEvent( self, evt ):
         self.key_release_cb.emit(evt)
+        self.__input()
+
+    def __input( self ):
+        if self.mode == SimpleViewer.ON_DEMAND:
+            self.request_redraw()
+
+    def showEvent( self, evt ):
+        QtOpenGL.QGLWidget.showEvent( self, evt )
+        self.__pacer = None
+        self.request_redraw()
+
+    def changeEvent( self, evt ):
+        QtOpenGL.QGLWidget.changeEvent( self, evt )
+        if evt.type() == QtCore.QEvent.WindowStateChange and not self.__hidden():
+            self.__pacer = None
+            self.request_redraw()
 
     def initializeGL(self):
+        # a new context starts from default state whatever was cached
+        self.state.invalidate()
         self.initialize_cb.emit()
-        self.timer = QtCore.QTimer()
-        self.timer.setSingleShot( False )
-        self.timer.setInterval( 0.016 )
-        self.timer.timeout.connect( self.idle )
-        self.timer.start()
+        self.request_redraw()
 
     def resizeGL(self, width, height):
         if height == 0: height = 1
         self.resize_cb.emit(width,height)
+        if self.mode == SimpleViewer.ON_DEMAND:
+            self.request_redraw()
 
     def paintGL(self):
-        self.render_cb.emit()
-
+        self.stats.begin()
+        with self.profiler.scope('frame'):
+            self.render_cb.emit()
+        self.stats.end()
+        if self.profiler.enabled:
+            self.profiler.collect()
+            if self.show_profile:
+                self.profiler.draw_overlay( self )
+                # renderText changes bindings behind the cache
+                self.state.invalidate()
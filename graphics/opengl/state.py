@@ -0,0 +1,170 @@
+"""Cache of OpenGL binding and fixed-function state
+
+GLState remembers the program, buffer, vertex array, texture, capability,
+depth/blend and viewport state it last set and skips calls that would
+not change anything. Every call is counted as issued or elided so the
+per-frame savings can be inspected.
+
+The cache only knows about changes made through it. Raw GL calls that
+change cached state, e.g. glBindVertexArray, glUseProgram, glEnable or
+glViewport, must be followed by invalidate(), otherwise the next cached
+call with the value the cache last set is skipped although the context
+now holds another one. Likewise call invalidate() whenever a context is
+created or made current in place of another; SimpleViewer does this in
+initializeGL.
+
+Example::
+
+    from graphics.opengl.state import gl_state
+
+    gl_state.begin_frame()
+    gl_state.enable( GL_DEPTH_TEST )
+    shader.use()
+    ...
+    print( gl_state.stats() )
+
+"""
+
+from OpenGL.GL import *
+
+class GLState(object):
+    def __init__( self ):
+        self.issued = 0
+        self.elided = 0
+        self.calls  = {}
+        self.invalidate()
+
+    def invalidate( self ):
+        """Forgets all cached state so the next call of each kind is issued"""
+        self.__program    = None
+        self.__vao        = None
+        self.__buffers    = {}
+        self.__indexed    = {}
+        self.__unit       = None
+        self.__textures   = {}
+        self.__caps       = {}
+        self.__attribs    = {}
+        self.__depth_func = None
+        self.__depth_mask = None
+        self.__blend_func = None
+        self.__viewport   = None
+
+    def begin_frame( self ):
+        """Resets the call counters, returning the stats of the previous frame"""
+        stats = self.stats()
+        self.issued = 0
+        self.elided = 0
+        self.calls  = {}
+        return stats
+
+    def stats( self ):
+        """Returns issued/elided totals and a per-function breakdown"""
+        return {
+            'issued': self.issued,
+            'elided': self.elided,
+            'calls':  { k: tuple(v) for k, v in self.calls.items() }
+        }
+
+    def __count( self, name, issued ):
+        counts = self.calls.setdefault( name, [0,0] )
+        if issued:
+            self.issued += 1
+            counts[0]   += 1
+        else:
+            self.elided += 1
+            counts[1]   += 1
+        return issued
+
+    def use_program( self, program ):
+        if self.__count( 'glUseProgram', program != self.__program ):
+            glUseProgram( program )
+            self.__program = program
+
+    def bind_vertex_array( self, vao ):
+        if self.__count( 'glBindVertexArray', vao != self.__vao ):
+            glBindVertexArray( vao )
+            self.__vao = vao
+
+    def __buffer_key( self, target ):
+        # the element array binding is part of the vertex array object
+        return (target, self.__vao) if target == GL_ELEMENT_ARRAY_BUFFER else target
+
+    def bind_buffer( self, target, buffer ):
+        key = self.__buffer_key( target )
+        if self.__count( 'glBindBuffer', self.__buffers.get(key) != buffer ):
+            glBindBuffer( target, buffer )
+            self.__buffers[key] = buffer
+
+    def bind_buffer_base( self, target, index, buffer ):
+        """Binds an indexed buffer target, which also sets the generic binding"""
+        if self.__count( 'glBindBufferBase', self.__indexed.get((target,index)) != buffer ):
+            glBindBufferBase( target, index, buffer )
+            self.__indexed[(target,index)] = buffer
+            self.__buffers[target] = buffer
+
+    def delete_buffer( self, buffer ):
+        """Forgets bindings of a buffer that is about to be deleted"""
+        for cache in (self.__buffers, self.__indexed):
+            for key in [ k for k, v in cache.items() if v == buffer ]:
+                del cache[key]
+
+    def enable_vertex_attrib_array( self, loc ):
+        key = (self.__vao, loc)
+        if self.__count( 'glEnableVertexAttribArray', self.__attribs.get(key) is not True ):
+            glEnableVertexAttribArray( loc )
+            self.__attribs[key] = True
+
+    def disable_vertex_attrib_array( self, loc ):
+        key = (self.__vao, loc)
+        if self.__count( 'glDisableVertexAttribArray', self.__attribs.get(key) is not False ):
+            glDisableVertexAttribArray( loc )
+            self.__attribs[key] = False
+
+    def active_texture( self, unit ):
+        """Selects texture unit, given as an index rather than GL_TEXTUREi"""
+        if self.__count( 'glActiveTexture', unit != self.__unit ):
+            glActiveTexture( GL_TEXTURE0 + unit )
+            self.__unit = unit
+
+    def bind_texture( self, target, texture, unit=None ):
+        if unit is not None:
+            self.active_texture( unit )
+        key = (self.__unit, target)
+        if self.__count( 'glBindTexture', self.__textures.get(key) != texture ):
+            glBindTexture( target, texture )
+            self.__textures[key] = texture
+
+    def enable( self, cap ):
+        if self.__count( 'glEnable', self.__caps.get(cap) is not True ):
+            glEnable( cap )
+            self.__caps[cap] = True
+
+    def disable( self, cap ):
+        if self.__count( 'glDisable', self.__caps.get(cap) is not False ):
+            glDisable( cap )
+            self.__caps[cap] = False
+
+    def depth_func( self, func ):
+        if self.__count( 'glDepthFunc', func != self.__depth_func ):
+            glDepthFunc( func )
+            self.__depth_func = func
+
+    def depth_mask( self, flag ):
+        flag = bool(flag)
+        if self.__count( 'glDepthMask', flag != self.__depth_mask ):
+            glDepthMask( GL_TRUE if flag else GL_FALSE )
+            self.__depth_mask = flag
+
+    def blend_func( self, src, dst ):
+        if self.__count( 'glBlendFunc', (src,dst) != self.__blend_func ):
+            glBlendFunc( src, dst )
+            self.__blend_func = (src,dst)
+
+    def viewport( self, x, y, width, height ):
+        vp = (x,y,width,height)
+        if self.__count( 'glViewport', vp != self.__viewport ):
+            glViewport( x, y, width, height )
+            self.__viewport = vp
+
+# shared cache for the current context
+gl_state = GLState()
@@ -0,0 +1,248 @@
+"""Ring-buffered streaming of per-frame vertex data
+
+A StreamBuffer holds a (rows,components) array of vertex data, e.g.
+positions or colours, that changes a little every frame. The GL buffer
+is divided into a ring of frames regions, each a full copy of the array.
+Every frame draws from the next region while the GPU may still read the
+others, and a fence per region guarantees it is never written while a
+draw using it is in flight, so updates never stall on the GPU.
+
+Writes go to a CPU-side copy and mark the written rows dirty for every
+region. When a region comes around, only its dirty rows are copied into
+it: unchanged data is never copied again nor sent to the GPU, a frame
+changing a single row costs a single row per region.
+
+With GL 4.4 / ARB_buffer_storage the buffer is mapped once, persistently
+and coherently, and dirty rows are copied straight into the mapping.
+Otherwise the current region is mapped each frame with
+GL_MAP_UNSYNCHRONIZED_BIT, which is safe because of the fences, instead
+of orphaning the whole buffer, which would require re-sending all of it.
+
+Example::
+
+    colors = StreamBuffer( state.colors )
+
+    def render_cb():
+        colors.begin_frame()
+        colors.write( state.colors[previous], offset=previous )
+        colors.write( (1.0,1.0,0.0), offset=selected )
+        colors.attrib_pointer( shader.attribute_location('color') )
+        glDrawArrays( GL_POINTS, 0, len(colors) )
+
+"""
+
+import ctypes
+import numpy
+from OpenGL.GL import *
+
+from graphics.opengl.state import gl_state
+
+# GL type of the supported attribute dtypes
+GL_TYPES = {
+    numpy.dtype(numpy.float32): GL_FLOAT,
+    numpy.dtype(numpy.int32):   GL_INT,
+    numpy.dtype(numpy.uint32):  GL_UNSIGNED_INT,
+    numpy.dtype(numpy.int16):   GL_SHORT,
+    numpy.dtype(numpy.uint16):  GL_UNSIGNED_SHORT,
+    numpy.dtype(numpy.int8):    GL_BYTE,
+    numpy.dtype(numpy.uint8):   GL_UNSIGNED_BYTE,
+}
+
+def _merged( ranges ):
+    """Returns sorted (start,end) ranges with overlapping and adjacent ones merged"""
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1],hi))
+        else:
+            merged.append( (lo,hi) )
+    return merged
+
+class StreamBuffer(object):
+    def __init__( self, data, dtype=numpy.float32, frames=3, target=GL_ARRAY_BUFFER, persistent=None, alignment=256, state=None ):
+        """Creates a streaming buffer, GL objects are created on the first frame
+
+        Args:
+            data (array-like or tuple): initial (rows,components) data, or
+                the shape of a zero-filled array
+
+            dtype (numpy.dtype): element type
+
+            frames (int): number of regions in the ring
+
+            target (GLenum): buffer binding target
+
+            persistent (bool): whether to map the buffer persistently,
+                None uses persistent mapping when glBufferStorage is
+                available
+
+            alignment (int): byte alignment of the regions
+
+            state (graphics.opengl.GLState): state cache used for binds,
+                defaults to the shared gl_state
+        """
+        if isinstance(data,tuple):
+            data = numpy.zeros( data, dtype=dtype )
+        data = numpy.array( data, dtype=dtype )
+        self.__data = data.reshape( data.shape[0], -1 ) if data.ndim != 2 else data
+
+        self.state      = state if state is not None else gl_state
+        self.frames     = max( int(frames), 1 )
+        self.target     = target
+        self.persistent = persistent
+        self.buffer_id  = None
+        # regions hold whole rows so first is exact
+        step = int( numpy.lcm( alignment, max( self.__data[0].nbytes if len(self.__data) else 1, 1 ) ) )
+        self.region_size = max( (self.__data.nbytes + step - 1)//step*step, step )
+
+        self.__index   = self.frames - 1
+        self.__fences  = [ None ]*self.frames
+        self.__used    = False
+        self.__mapped  = None
+        # every region starts out dirty
+        self.__dirty   = [ [(0,self.__data.shape[0])] for i in range(self.frames) ]
+        self.stalls    = 0
+        self.uploaded  = 0
+
+    def __len__( self ):
+        return self.__data.shape[0]
+
+    @property
+    def data( self ):
+        """Read-only view of the CPU-side copy"""
+        view = self.__data.view()
+        view.flags.writeable = False
+        return view
+
+    @property
+    def index( self ):
+        """Ring index of the region used by the current frame"""
+        return self.__index
+
+    @property
+    def offset( self ):
+        """Byte offset of the current frame's region, for attribute pointers"""
+        return self.__index*self.region_size
+
+    @property
+    def first( self ):
+        """Index of the current region's first row when the buffer is
+        bound at offset 0, for glDrawArrays first or baseVertex"""
+        return self.offset//self.__data[0].nbytes if len(self) else 0
+
+    def dirty_ranges( self, index=None ):
+        """Returns the merged (start,end) rows not yet copied to a region,
+        the current one if index is None"""
+        return _merged( self.__dirty[self.__index if index is None else index] )
+
+    def write( self, data, offset=0 ):
+        """Writes rows starting at offset, a single row may be given as a
+        1D array
+
+        Args:
+            data (array-like): (k,components) rows or a (components,) row
+
+            offset (int): index of the first row written
+        """
+        data = numpy.asarray( data, dtype=self.__data.dtype ).reshape( -1, self.__data.shape[1] )
+        end  = offset + data.shape[0]
+        if offset < 0 or end > len(self):
+            raise IndexError('Rows {}:{} out of range for {} rows'.format( offset, end, len(self) ))
+        self.__data[offset:end] = data
+        for dirty in self.__dirty:
+            dirty.append( (offset,end) )
+            if len(dirty) > 64:
+                dirty[:] = _merged( dirty )
+
+    def __create( self ):
+        self.buffer_id = int( glGenBuffers(1) )
+        size = self.region_size*self.frames
+        if self.persistent is None:
+            self.persistent = bool(glBufferStorage)
+        self.state.bind_buffer( self.target, self.buffer_id )
+        if self.persistent:
+            flags = GL_MAP_WRITE_BIT | GL_MAP_PERSISTENT_BIT | GL_MAP_COHERENT_BIT
+            glBufferStorage( self.target, size, None, flags )
+            ptr = glMapBufferRange( self.target, 0, size, flags )
+            self.__mapped = numpy.ctypeslib.as_array( ctypes.cast( ptr, ctypes.POINTER(ctypes.c_uint8) ), shape=(size,) )
+        else:
+            glBufferData( self.target, size, None, GL_DYNAMIC_DRAW )
+
+    def __region( self, mapped ):
+        """Returns the rows of the current region within mapped bytes"""
+        rows = mapped[:self.__data.nbytes].view( self.__data.dtype )
+        return rows.reshape( self.__data.shape )
+
+    def begin_frame( self ):
+        """Fences the region of the previous frame and advances to the next
+        region, waiting only if the GPU still reads from it"""
+        if self.buffer_id is None:
+            self.__create()
+        if self.__used:
+            self.__fences[self.__index] = glFenceSync( GL_SYNC_GPU_COMMANDS_COMPLETE, 0 )
+        self.__index = (self.__index + 1) % self.frames
+        self.__used  = False
+        fence = self.__fences[self.__index]
+        if fence is not None:
+            if glClientWaitSync( fence, 0, 0 ) not in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+                self.stalls += 1
+                glClientWaitSync( fence, GL_SYNC_FLUSH_COMMANDS_BIT, 10**10 )
+            glDeleteSync( fence )
+            self.__fences[self.__index] = None
+
+    def sync( self ):
+        """Copies the dirty rows of the current region to the GPU, called by
+        bind and attrib_pointer after the frame's writes"""
+        if self.buffer_id is None:
+            self.begin_frame()
+        self.__used = True
+        ranges = self.dirty_ranges()
+        self.__dirty[self.__index] = []
+        if not ranges:
+            return
+        base = self.offset
+        stride = self.__data[0].nbytes
+        if self.persistent:
+            rows = self.__region( self.__mapped[base:base+self.region_size] )
+            for lo, hi in ranges:
+                rows[lo:hi] = self.__data[lo:hi]
+        else:
+            lo, hi = ranges[0][0], ranges[-1][1]
+            self.state.bind_buffer( self.target, self.buffer_id )
+            ptr = glMapBufferRange( self.target, base + lo*stride, (hi-lo)*stride,
+                                    GL_MAP_WRITE_BIT | GL_MAP_UNSYNCHRONIZED_BIT | GL_MAP_FLUSH_EXPLICIT_BIT )
+            span = numpy.ctypeslib.as_array( ctypes.cast( ptr, ctypes.POINTER(ctypes.c_uint8) ), shape=((hi-lo)*stride,) )
+            span = span.view( self.__data.dtype ).reshape( hi-lo, -1 )
+            for a, b in ranges:
+                span[a-lo:b-lo] = self.__data[a:b]
+                glFlushMappedBufferRange( self.target, (a-lo)*stride, (b-a)*stride )
+            glUnmapBuffer( self.target )
+        self.uploaded += sum( (b-a)*stride for a, b in ranges )
+
+    def bind( self ):
+        """Syncs the current region and binds the buffer to its target"""
+        self.sync()
+        self.state.bind_buffer( self.target, self.buffer_id )
+
+    def attrib_pointer( self, location, normalized=False ):
+        """Points a vertex attribute at the current region and enables it"""
+        self.bind()
+        glVertexAttribPointer( location, self.__data.shape[1], GL_TYPES[self.__data.dtype],
+                               GL_TRUE if normalized else GL_FALSE, 0, ctypes.c_void_p(self.offset) )
+        self.state.enable_vertex_attrib_array( location )
+
+    def delete( self ):
+        """Deletes the buffer and pending fences, needs the buffer's context"""
+        for fence in self.__fences:
+            if fence is not None:
+                glDeleteSync( fence )
+        self.__fences = [ None ]*self.frames
+        if self.buffer_id is not None:
+            if self.__mapped is not None:
+                self.state.bind_buffer( self.target, self.buffer_id )
+                glUnmapBuffer( self.target )
+                self.__mapped = None
+            self.state.delete_buffer( self.buffer_id )
+            glDeleteBuffers( 1, [self.buffer_id] )
+            self.buffer_id = None
+        self.__dirty = [ [(0,len(self))] for i in range(self.frames) ]
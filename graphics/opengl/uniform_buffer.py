@@ -0,0 +1,287 @@
+"""Uniform buffer objects shared between shader programs
+
+A UniformBuffer keeps a CPU-side copy of a uniform block, packs numpy
+values into it using the block layout and uploads only the byte ranges
+that changed since the last upload. Buffers are attached to named
+binding points; every Shader binds its uniform blocks to the binding
+point with the same name, so e.g. per-frame camera data is uploaded
+once and seen by all programs declaring the block.
+
+Layouts are either given as a sequence of (name, glsl_type[, count])
+fields which are laid out with the std140 rules, or taken from the
+reflection data of a linked Shader.
+
+Example::
+
+    camera = UniformBuffer( 'Camera', [('modelview','mat4'),('projection','mat4')] )
+    camera['modelview']  = Transform().lookat( ... ).matrix()
+    camera['projection'] = Transform().perspective( ... ).matrix()
+    camera.bind()
+
+"""
+
+import numpy
+from OpenGL.GL import *
+
+from graphics.opengl.state import gl_state
+
+# glsl type name -> (dtype, columns, rows)
+GLSL_TYPES = {
+    'float':  (numpy.float32, 1, 1),
+    'vec2':   (numpy.float32, 1, 2),
+    'vec3':   (numpy.float32, 1, 3),
+    'vec4':   (numpy.float32, 1, 4),
+    'int':    (numpy.int32,   1, 1),
+    'ivec2':  (numpy.int32,   1, 2),
+    'ivec3':  (numpy.int32,   1, 3),
+    'ivec4':  (numpy.int32,   1, 4),
+    'uint':   (numpy.uint32,  1, 1),
+    'uvec2':  (numpy.uint32,  1, 2),
+    'uvec3':  (numpy.uint32,  1, 3),
+    'uvec4':  (numpy.uint32,  1, 4),
+    'mat2':   (numpy.float32, 2, 2),
+    'mat3':   (numpy.float32, 3, 3),
+    'mat4':   (numpy.float32, 4, 4),
+    'mat2x3': (numpy.float32, 2, 3),
+    'mat2x4': (numpy.float32, 2, 4),
+    'mat3x2': (numpy.float32, 3, 2),
+    'mat3x4': (numpy.float32, 3, 4),
+    'mat4x2': (numpy.float32, 4, 2),
+    'mat4x3': (numpy.float32, 4, 3),
+}
+
+# GL type enum -> glsl type name, used when reflecting uniform blocks
+GLSL_TYPE_NAMES = {
+    GL_FLOAT:             'float',
+    GL_FLOAT_VEC2:        'vec2',
+    GL_FLOAT_VEC3:        'vec3',
+    GL_FLOAT_VEC4:        'vec4',
+    GL_INT:               'int',
+    GL_INT_VEC2:          'ivec2',
+    GL_INT_VEC3:          'ivec3',
+    GL_INT_VEC4:          'ivec4',
+    GL_UNSIGNED_INT:      'uint',
+    GL_UNSIGNED_INT_VEC2: 'uvec2',
+    GL_UNSIGNED_INT_VEC3: 'uvec3',
+    GL_UNSIGNED_INT_VEC4: 'uvec4',
+    GL_FLOAT_MAT2:        'mat2',
+    GL_FLOAT_MAT3:        'mat3',
+    GL_FLOAT_MAT4:        'mat4',
+    GL_FLOAT_MAT2x3:      'mat2x3',
+    GL_FLOAT_MAT2x4:      'mat2x4',
+    GL_FLOAT_MAT3x2:      'mat3x2',
+    GL_FLOAT_MAT3x4:      'mat3x4',
+    GL_FLOAT_MAT4x2:      'mat4x2',
+    GL_FLOAT_MAT4x3:      'mat4x3',
+}
+
+_binding_points = {}
+
+def binding_point( name ):
+    """Returns the uniform buffer binding point reserved for a block name
+
+    Binding points are handed out in order of first request and are
+    shared by every program and buffer using the same block name.
+    """
+    if name not in _binding_points:
+        _binding_points[name] = len(_binding_points)
+    return _binding_points[name]
+
+def uniform_member( glsl_type, offset, count=1, array_stride=0, matrix_stride=0, row_major=False ):
+    """Builds a uniform block member descriptor
+
+    Args:
+        glsl_type (string): glsl type name, e.g. 'vec3' or 'mat4'
+
+        offset (int): byte offset of the member within the block
+
+        count (int): number of array elements, 1 for non-arrays
+
+        array_stride (int): bytes between array elements
+
+        matrix_stride (int): bytes between matrix columns (or rows
+            for row_major matrices)
+
+        row_major (bool): whether matrices are stored by rows
+
+    Returns:
+        tuple (offset, dtype, columns, rows, count, array_stride, matrix_stride, row_major)
+    """
+    if glsl_type not in GLSL_TYPES:
+        raise ValueError('Unsupported uniform block type: {}'.format(glsl_type))
+    dtype, cols, rows = GLSL_TYPES[glsl_type]
+    itemsize = numpy.dtype(dtype).itemsize
+    if matrix_stride == 0:
+        matrix_stride = itemsize*(rows if not row_major else cols)
+    if array_stride == 0:
+        array_stride = matrix_stride*(cols if not row_major else rows)
+    return (offset, dtype, cols, rows, count, array_stride, matrix_stride, row_major)
+
+def std140_layout( fields ):
+    """Computes the std140 layout of a uniform block
+
+    Args:
+        fields (sequence): (name, glsl_type) or (name, glsl_type, count)
+            tuples in declaration order
+
+    Returns:
+        dict of member descriptors, see uniform_member
+
+        int size of the block in bytes
+    """
+    def round_up( val, align ):
+        return (val + align - 1)//align*align
+
+    members = {}
+    offset = 0
+    for field in fields:
+        name, glsl_type = field[0], field[1]
+        count = field[2] if len(field) > 2 else 1
+        if glsl_type not in GLSL_TYPES:
+            raise ValueError('Unsupported uniform block type: {}'.format(glsl_type))
+        dtype, cols, rows = GLSL_TYPES[glsl_type]
+        itemsize = numpy.dtype(dtype).itemsize
+
+        if cols == 1 and count == 1:
+            # scalars & vectors, vec3 aligns like vec4
+            align = itemsize*(4 if rows == 3 else rows)
+            size  = itemsize*rows
+            offset = round_up( offset, align )
+            members[name] = uniform_member( glsl_type, offset, 1, size, size )
+        else:
+            # arrays and matrices: every column/element is padded to a vec4
+            column = round_up( itemsize*rows, 16 )
+            stride = column*cols
+            offset = round_up( offset, 16 )
+            members[name] = uniform_member( glsl_type, offset, count, stride, column )
+            size = stride*count
+        offset += size
+
+    return members, round_up( offset, 16 )
+
+class UniformBuffer(object):
+    def __init__( self, name, layout, size=None, usage=GL_DYNAMIC_DRAW, state=None ):
+        """Creates a uniform buffer for the named uniform block
+
+        The GL buffer itself is created on the first upload, so the
+        object can be built and filled before a context exists.
+
+        Args:
+            name (string): name of the uniform block, also selects the
+                binding point
+
+            layout (sequence or dict): std140 field list, see
+                std140_layout, or dict of member descriptors as returned
+                by Shader.uniform_blocks()
+
+            size (int): size of the block in bytes, required when
+                layout is a dict of member descriptors
+
+            usage (GLenum): buffer usage hint
+
+            state (graphics.opengl.GLState): state cache used for buffer
+                bindings, defaults to the shared gl_state
+        """
+        if isinstance(layout,dict):
+            if size is None:
+                raise ValueError('Expected block size with explicit member layout')
+            self.__members = dict(layout)
+        else:
+            self.__members, size = std140_layout( layout )
+
+        self.name      = name
+        self.binding   = binding_point( name )
+        self.usage     = usage
+        self.state     = state if state is not None else gl_state
+        self.buffer_id = None
+
+        self.__data  = numpy.zeros( size, dtype=numpy.uint8 )
+        self.__dirty = []
+
+    @staticmethod
+    def from_shader( shader, block, usage=GL_DYNAMIC_DRAW ):
+        """Creates a buffer matching a uniform block reflected from a Shader"""
+        blocks = shader.uniform_blocks()
+        if block not in blocks:
+            raise KeyError('Shader has no active uniform block {}'.format(block))
+        index, size, binding, members = blocks[block]
+        return UniformBuffer( block, members, size, usage )
+
+    @property
+    def size( self ):
+        return self.__data.size
+
+    def members( self ):
+        return self.__members
+
+    def data( self ):
+        """Returns the packed block contents as bytes"""
+        return self.__data.tobytes()
+
+    def dirty_ranges( self ):
+        """Returns the sorted, merged (start,end) byte ranges changed since the last upload"""
+        merged = []
+        for lo, hi in sorted(self.__dirty):
+            if merged and lo <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1],hi))
+            else:
+                merged.append( (lo,hi) )
+        return merged
+
+    def __view( self, key ):
+        offset, dtype, cols, rows, count, astride, mstride, row_major = self.__members[key]
+        itemsize = numpy.dtype(dtype).itemsize
+        inner, outer = (cols, rows) if row_major else (rows, cols)
+        view = numpy.ndarray( shape=(count,outer,inner), dtype=dtype, buffer=self.__data,
+                              offset=offset, strides=(astride,mstride,itemsize) )
+        end = offset + (count-1)*astride + (outer-1)*mstride + inner*itemsize
+        return view, end
+
+    def __getitem__( self, key ):
+        view, end = self.__view( key )
+        offset, dtype, cols, rows, count = self.__members[key][:5]
+        row_major = self.__members[key][-1]
+        val = view if row_major else view.swapaxes(1,2)
+        if count == 1:
+            val = val[0]
+        if cols == 1:
+            val = val.reshape(val.shape[:-1]) if count > 1 else val.ravel()
+        return val.copy()
+
+    def __setitem__( self, key, val ):
+        """Packs a row-major numpy value into the block, marking changed bytes dirty"""
+        view, end = self.__view( key )
+        offset, dtype, cols, rows, count = self.__members[key][:5]
+        row_major = self.__members[key][-1]
+        val = numpy.asarray( val, dtype=dtype ).reshape( count, rows, cols )
+        if not row_major:
+            val = val.swapaxes(1,2)
+        if numpy.array_equal( view, val ):
+            return
+        view[...] = val
+        self.__dirty.append( (offset,end) )
+
+    def upload( self ):
+        """Sends dirty ranges to the GL buffer, creating it if needed"""
+        if self.buffer_id is None:
+            self.buffer_id = glGenBuffers(1)
+            self.state.bind_buffer( GL_UNIFORM_BUFFER, self.buffer_id )
+            glBufferData( GL_UNIFORM_BUFFER, self.__data.size, self.__data, self.usage )
+        else:
+            ranges = self.dirty_ranges()
+            if ranges:
+                self.state.bind_buffer( GL_UNIFORM_BUFFER, self.buffer_id )
+            for lo, hi in ranges:
+                glBufferSubData( GL_UNIFORM_BUFFER, lo, hi-lo, self.__data[lo:hi] )
+        self.__dirty = []
+
+    def bind( self ):
+        """Uploads pending changes and attaches the buffer to its binding point"""
+        self.upload()
+        self.state.bind_buffer_base( GL_UNIFORM_BUFFER, self.binding, self.buffer_id )
+
+    def delete( self ):
+        if self.buffer_id is not None:
+            self.state.delete_buffer( self.buffer_id )
+            glDeleteBuffers( 1, [self.buffer_id] )
+            self.buffer_id = None
@@ -0,0 +1,6 @@
+import os
+
+# PyOpenGL picks its platform when first imported, without a window system
+# the offscreen tests can only get a context through EGL
+if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+    os.environ.setdefault( 'PYOPENGL_PLATFORM', 'egl' )
@@ -1,3 +1,4 @@
+import graphics
 from graphics.geometry import *
 from graphics.io import *
 
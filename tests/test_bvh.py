@@ -0,0 +1,59 @@
+import unittest
+
+import numpy
+
+from graphics.core import Transform
+from graphics.geometry import BVH, cube, screen_rays
+
+def brute_force( tris, org, dirs ):
+    e1 = tris[:,1] - tris[:,0]
+    e2 = tris[:,2] - tris[:,0]
+    result = numpy.full( org.shape[0], -1 )
+    for i in range(org.shape[0]):
+        p   = numpy.cross( dirs[i], e2 )
+        det = numpy.sum( e1*p, axis=1 )
+        s   = org[i] - tris[:,0]
+        u   = numpy.sum( s*p, axis=1 )/det
+        q   = numpy.cross( s, e1 )
+        v   = numpy.sum( q*dirs[i], axis=1 )/det
+        t   = numpy.sum( e2*q, axis=1 )/det
+        hit = (u >= 0) & (v >= 0) & (u+v <= 1) & (t >= 0)
+        if numpy.any(hit):
+            result[i] = numpy.where(hit)[0][numpy.argmin(t[hit])]
+    return result
+
+class TestBVH(unittest.TestCase):
+
+    def test_random_triangles( self ):
+        rng  = numpy.random.default_rng( 1 )
+        tris = rng.uniform( -1, 1, (2000,1,3) ) + rng.normal( 0, 0.05, (2000,3,3) )
+        bvh  = BVH( tris )
+        org  = rng.uniform( -2, 2, (500,3) )
+        dirs = rng.normal( size=(500,3) )
+
+        tri, t, uv = bvh.intersect( org, dirs )
+        self.assertTrue( numpy.array_equal( tri, brute_force( tris, org, dirs ) ) )
+
+        hit = tri >= 0
+        self.assertTrue( numpy.any(hit) )
+        self.assertTrue( numpy.all( numpy.isinf( t[~hit] ) ) )
+        p = tris[tri[hit]]
+        w = numpy.column_stack( (1.0-uv[hit].sum(axis=1), uv[hit]) )
+        self.assertTrue( numpy.allclose( numpy.einsum( 'ij,ijk->ik', w, p ), org[hit] + t[hit,None]*dirs[hit], atol=1e-4 ) )
+
+    def test_pick_cube( self ):
+        mesh, materials = cube()
+        bvh = BVH.from_mesh( mesh )
+        projection = Transform().perspective( 45.0, 1.0, 0.1, 10.0 )
+        modelview  = Transform().lookat( 0.0, 0.0, 4.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0 )
+        org, dirs = screen_rays( [(50,50),(0,0)], 100, 100, projection, modelview )
+        tri, t, uv = bvh.intersect( org, dirs )
+
+        # center ray hits the +z face of the unit cube, the corner misses
+        tris = mesh.vertices.reshape(-1,3,3)
+        self.assertTrue( numpy.allclose( tris[tri[0],:,2], 0.5 ) )
+        self.assertAlmostEqual( float((org[0] + t[0]*dirs[0])[2]), 0.5, places=4 )
+        self.assertEqual( tri[1], -1 )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+import numpy
+
+from graphics.core import Camera, Transform
+
+class TestCamera(unittest.TestCase):
+
+    def setUp( self ):
+        self.camera = Camera( eye=(4.0,3.0,5.0), target=(0.0,0.5,0.0), fov=50.0, aspect=1.5, near=0.5, far=20.0 )
+
+    def test_cache( self ):
+        cam = self.camera
+        view, proj, planes = cam.view(), cam.projection(), cam.frustum_planes()
+        self.assertIs( cam.view(), view )
+        self.assertIs( cam.inverse_view_projection(), cam.inverse_view_projection() )
+        version = cam.version
+
+        cam.aspect = 1.5
+        cam.eye = (4.0,3.0,5.0)
+        self.assertEqual( cam.version, version )
+        self.assertIs( cam.frustum_planes(), planes )
+
+        cam.aspect = 2.0
+        self.assertIs( cam.view(), view )
+        self.assertIsNot( cam.projection(), proj )
+        cam.target = (1.0,0.0,0.0)
+        self.assertIsNot( cam.view(), view )
+        self.assertEqual( cam.version, version+2 )
+
+        expected = Transform().perspective( 50.0, 2.0, 0.5, 20.0 )*Transform().lookat( 4.0, 3.0, 5.0, 1.0, 0.0, 0.0, 0.0, 1.0, 0.0 )
+        self.assertTrue( numpy.allclose( cam.view_projection().matrix(), expected.matrix(), atol=1e-5 ) )
+
+    def test_project( self ):
+        cam = self.camera
+        viewport = (10, 20, 640, 480)
+        P = numpy.random.default_rng( 2 ).uniform( -1, 1, (100,3) )
+        W = cam.project( P, viewport )
+        H = numpy.column_stack( (P, numpy.ones(100)) ) @ cam.view_projection().matrix().T
+        ndc = H[:,:3]/H[:,3:]
+        self.assertTrue( numpy.allclose( W[:,0], 10 + (ndc[:,0]+1)*320, atol=1e-3 ) )
+        self.assertTrue( numpy.allclose( W[:,2], (ndc[:,2]+1)*0.5, atol=1e-5 ) )
+        self.assertTrue( numpy.allclose( cam.unproject( W, viewport ), P, atol=1e-3 ) )
+
+    def test_planes( self ):
+        cam = self.camera
+        rng = numpy.random.default_rng( 3 )
+        ndc = rng.uniform( -1.5, 1.5, (1000,3) )
+        P = cam.unproject( ndc )
+        planes = cam.frustum_planes()
+        inside = numpy.all( P @ planes[:,:3].T + planes[:,3] >= 0, axis=1 )
+        self.assertTrue( numpy.array_equal( inside, numpy.all( numpy.abs(ndc) <= 1.0, axis=1 ) ) )
+        self.assertTrue( numpy.allclose( numpy.linalg.norm( planes[:,:3], axis=1 ), 1.0 ) )
+
+if __name__ == '__main__':
+    unittest.main()
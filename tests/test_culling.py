@@ -0,0 +1,55 @@
+import unittest
+
+import numpy
+
+from graphics.core import Camera, Transform
+from graphics.geometry import FrustumCuller, cube, cull_boxes, cull_spheres, mesh_bounds, transform_boxes
+
+class TestCulling(unittest.TestCase):
+
+    def setUp( self ):
+        self.camera = Camera( eye=(0.0,0.0,10.0), fov=60.0, aspect=1.5, near=0.5, far=30.0 )
+        rng = numpy.random.default_rng( 4 )
+        self.centers = rng.uniform( -40, 40, (20000,3) ).astype(numpy.float32)
+        self.half    = rng.uniform( 0.01, 2.0, (20000,3) ).astype(numpy.float32)
+
+    def brute_force( self, mins, maxs ):
+        # a box is culled when all 8 corners are outside one plane
+        planes = self.camera.frustum_planes()
+        corners = numpy.stack( [ numpy.where( [i&1,i&2,i&4], maxs, mins ) for i in range(8) ], axis=1 )
+        d = corners @ planes[:,:3].T + planes[:,3]
+        return ~numpy.any( numpy.all( d < 0, axis=1 ), axis=1 )
+
+    def test_boxes( self ):
+        mins, maxs = self.centers - self.half, self.centers + self.half
+        expected = self.brute_force( mins, maxs )
+        self.assertTrue( 0 < numpy.count_nonzero(expected) < expected.size )
+        self.assertTrue( numpy.array_equal( cull_boxes( self.camera.view_projection(), mins, maxs ), expected ) )
+        culler = FrustumCuller( mins, maxs, chunk_size=64 )
+        self.assertTrue( numpy.array_equal( culler.visible( self.camera.frustum_planes() ), expected ) )
+
+    def test_spheres( self ):
+        radii = numpy.linalg.norm( self.half, axis=1 )
+        mask = cull_spheres( self.camera.view_projection(), self.centers, radii )
+        # sphere culling is conservative with respect to the enclosed boxes
+        boxes = self.brute_force( self.centers - self.half, self.centers + self.half )
+        self.assertTrue( numpy.all( mask[boxes] ) )
+
+    def test_mesh_bounds( self ):
+        mesh, materials = cube()
+        lo, hi = mesh.aabb
+        self.assertIs( mesh.aabb, mesh.aabb )
+        center, radius = mesh.bounding_sphere
+        self.assertTrue( numpy.allclose( radius, numpy.linalg.norm( hi-lo )/2 ) )
+
+        T = Transform().rotate( 45.0, 0.0, 0.0, 1.0 ).translate( 5.0, 0.0, 0.0 )
+        mins, maxs = transform_boxes( T, *mesh_bounds( [mesh] ) )
+        P = T.apply_points( mesh.vertices )
+        self.assertTrue( numpy.allclose( mins[0], P.min(axis=0), atol=1e-5 ) )
+        self.assertTrue( numpy.allclose( maxs[0], P.max(axis=0), atol=1e-5 ) )
+        M = numpy.stack( [T.matrix(), Transform().matrix()] )
+        mins2, maxs2 = transform_boxes( M, *mesh_bounds( [mesh,mesh] ) )
+        self.assertTrue( numpy.allclose( mins2[0], mins[0] ) and numpy.allclose( maxs2[1], hi ) )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+from graphics.opengl.simple_viewer import FramePacer, FrameStats
+
+class Clock(object):
+    def __init__( self ):
+        self.now = 0.0
+    def __call__( self ):
+        return self.now
+
+class TestFramePacing(unittest.TestCase):
+
+    def test_drift( self ):
+        clock = Clock()
+        pacer = FramePacer( 50.0, clock=clock )
+        self.assertAlmostEqual( pacer.delay(), 0.02 )
+
+        # late wakeups are absorbed by shorter delays, deadlines stay on the grid
+        clock.now = 0.023
+        self.assertAlmostEqual( pacer.delay(), 0.017 )
+        clock.now = 0.041
+        self.assertAlmostEqual( pacer.delay(), 0.019 )
+
+        # falling more than a period behind restarts the schedule
+        clock.now = 0.2
+        self.assertAlmostEqual( pacer.delay(), 0.02 )
+
+    def test_stats( self ):
+        clock, cpu = Clock(), Clock()
+        stats = FrameStats( frames=10, clock=clock, cpu_clock=cpu )
+        for i in range(20):
+            clock.now = i*0.01
+            cpu.now   = i*0.002
+            stats.begin()
+            clock.now += 0.004
+            stats.end()
+        s = stats.summary()
+        self.assertEqual( s['frames'], 20 )
+        self.assertAlmostEqual( s['fps'], 100.0 )
+        self.assertAlmostEqual( s['frame_ms'][1], 10.0 )
+        self.assertAlmostEqual( s['render_ms'], 4.0 )
+        self.assertAlmostEqual( s['cpu'], 0.2 )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+from OpenGL.GL import GL_ARRAY_BUFFER, GL_ELEMENT_ARRAY_BUFFER, GL_DEPTH_TEST
+
+import graphics.opengl.state as state_module
+from graphics.opengl.state import GLState
+
+class TestGLState(unittest.TestCase):
+
+    def setUp( self ):
+        # record GL calls instead of issuing them, no context is needed
+        self.log = []
+        self.saved = {}
+        for name in ('glUseProgram','glBindBuffer','glBindVertexArray','glEnable','glDisable','glViewport'):
+            self.saved[name] = getattr(state_module,name)
+            setattr( state_module, name, lambda *args, name=name: self.log.append( (name,)+args ) )
+
+    def tearDown( self ):
+        for name, fn in self.saved.items():
+            setattr( state_module, name, fn )
+
+    def test_elide_program( self ):
+        st = GLState()
+        st.use_program( 3 )
+        st.use_program( 3 )
+        st.use_program( 4 )
+        self.assertEqual( self.log, [('glUseProgram',3),('glUseProgram',4)] )
+        self.assertEqual( (st.issued,st.elided), (2,1) )
+        self.assertEqual( st.stats()['calls']['glUseProgram'], (2,1) )
+
+    def test_element_buffer_per_vao( self ):
+        st = GLState()
+        st.bind_vertex_array( 1 )
+        st.bind_buffer( GL_ELEMENT_ARRAY_BUFFER, 7 )
+        st.bind_buffer( GL_ARRAY_BUFFER, 8 )
+        st.bind_vertex_array( 2 )
+        st.bind_buffer( GL_ELEMENT_ARRAY_BUFFER, 7 )
+        st.bind_buffer( GL_ARRAY_BUFFER, 8 )
+        st.bind_vertex_array( 1 )
+        st.bind_buffer( GL_ELEMENT_ARRAY_BUFFER, 7 )
+        self.assertEqual( [ c for c in self.log if c[0] == 'glBindBuffer' ], [
+            ('glBindBuffer',GL_ELEMENT_ARRAY_BUFFER,7),
+            ('glBindBuffer',GL_ARRAY_BUFFER,8),
+            ('glBindBuffer',GL_ELEMENT_ARRAY_BUFFER,7)
+        ])
+
+    def test_frame_counters( self ):
+        st = GLState()
+        for frame in range(3):
+            st.begin_frame()
+            st.enable( GL_DEPTH_TEST )
+            st.viewport( 0, 0, 640, 480 )
+        stats = st.begin_frame()
+        self.assertEqual( (stats['issued'],stats['elided']), (0,2) )
+        st.invalidate()
+        st.enable( GL_DEPTH_TEST )
+        self.assertEqual( st.issued, 1 )
+
+    def test_viewer_invalidates( self ):
+        from PyQt5 import QtWidgets
+        from graphics.opengl.simple_viewer import SimpleViewer
+        app = QtWidgets.QApplication.instance() or QtWidgets.QApplication( ['graphics', '-platform', 'offscreen'] )
+
+        st = GLState()
+        viewer = SimpleViewer( state=st )
+        st.use_program( 3 )
+        st.use_program( 3 )
+        # a new context was created, the cached program is no longer bound
+        viewer.initializeGL()
+        st.use_program( 3 )
+        self.assertEqual( self.log, [('glUseProgram',3),('glUseProgram',3)] )
+
+if __name__ == '__main__':
+    unittest.main()
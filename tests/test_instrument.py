@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import graphics.instrument as instrument
+from graphics.instrument import PhaseCollector, add_listener, remove_listener, phase
+from graphics.geometry import cube
+from graphics.io import load_obj, save_obj, save_mtl_file
+
+class TestInstrument(unittest.TestCase):
+
+    def setUp( self ):
+        self.path = tempfile.mkdtemp()
+        mesh, materials = cube()
+        self.obj = os.path.join( self.path, 'cube.obj' )
+        save_obj( mesh, self.obj, 'cube.mtl' )
+        save_mtl_file( materials, os.path.join( self.path, 'cube.mtl' ) )
+
+    def tearDown( self ):
+        shutil.rmtree( self.path )
+
+    def test_disabled( self ):
+        self.assertEqual( instrument._listeners, [] )
+        self.assertIs( phase('a'), phase('b') )
+        with phase('a') as p:
+            p.count( items=1 )
+
+    def test_pipeline( self ):
+        with PhaseCollector() as collector:
+            mesh, materials = load_obj( self.obj )
+            save_obj( mesh, os.path.join( self.path, 'out.obj' ) )
+        self.assertEqual( instrument._listeners, [] )
+
+        phases = collector.phases
+        for name in ('load_obj', 'load_obj.parse', 'load_mtl_file', 'finalize', 'finalize.sort',
+                     'finalize.faces', 'finalize.arrays', 'finalize.normals', 'save_obj',
+                     'save_obj.vertices', 'save_obj.faces'):
+            self.assertEqual( phases[name]['calls'], 1, name )
+            self.assertGreaterEqual( phases[name]['seconds'], 0.0 )
+            self.assertIsNone( phases[name]['peak_bytes'] )
+        self.assertEqual( phases['load_obj']['counts']['triangles'], 12 )
+        self.assertEqual( phases['load_mtl_file']['counts']['materials'], len(materials) )
+        self.assertEqual( phases['finalize.arrays']['counts']['vertices'], 36 )
+        self.assertEqual( phases['save_obj']['counts']['triangles'], 12 )
+        self.assertEqual( phases['load_obj']['depth'], 0 )
+        self.assertEqual( phases['load_mtl_file']['depth'], 2 )
+        self.assertGreaterEqual( phases['load_obj']['seconds'], phases['finalize']['seconds'] )
+
+        lines = collector.summary().splitlines()
+        self.assertTrue( lines[1].startswith( 'load_obj ' ) )
+        self.assertTrue( lines[2].startswith( '  load_obj.parse' ) )
+
+    def test_memory( self ):
+        records = []
+        add_listener( records.append, memory=True )
+        try:
+            with phase('outer'):
+                with phase('inner'):
+                    big = bytearray( 1 << 22 )
+                    del big
+                small = bytearray( 1 << 10 )
+        finally:
+            remove_listener( records.append )
+        inner, outer = records
+        self.assertEqual( (inner.name, inner.depth, outer.depth), ('inner', 1, 0) )
+        self.assertGreaterEqual( inner.peak_bytes, 1 << 22 )
+        # the outer peak includes the inner one
+        self.assertGreaterEqual( outer.peak_bytes, inner.peak_bytes )
+        with self.assertRaises( ValueError ):
+            remove_listener( records.append )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import json
+import subprocess
+import sys
+import unittest
+
+def imported_after( statement ):
+    """Runs statement in a fresh interpreter and returns the modules it imported"""
+    code = 'import sys\n{}\nimport json\nprint( json.dumps( sorted( sys.modules ) ) )'.format( statement )
+    out = subprocess.run( [sys.executable, '-c', code], check=True, stdout=subprocess.PIPE, universal_newlines=True ).stdout
+    return json.loads( out.splitlines()[-1] )
+
+def gui_modules( modules ):
+    return [ m for m in modules if m.split('.')[0] in ('PyQt5','OpenGL') or m.startswith('graphics.opengl.') ]
+
+class TestLazyImport(unittest.TestCase):
+
+    def test_io_without_gui( self ):
+        self.assertEqual( gui_modules( imported_after( 'import graphics.io' ) ), [] )
+        self.assertEqual( gui_modules( imported_after( 'from graphics.io import load_obj, save_obj' ) ), [] )
+        self.assertEqual( gui_modules( imported_after( 'import graphics\ngraphics.Mesh\ngraphics.geometry.PointGrid' ) ), [] )
+
+    def test_submodules_on_access( self ):
+        modules = imported_after( 'import graphics.geometry' )
+        self.assertNotIn( 'graphics.geometry.mesh', modules )
+        modules = imported_after( 'from graphics.geometry import Mesh' )
+        self.assertIn( 'graphics.geometry.mesh', modules )
+        self.assertNotIn( 'graphics.geometry.rasterizer', modules )
+
+    def test_exports( self ):
+        import graphics
+        import graphics.geometry
+        from graphics.geometry.mesh import Mesh
+        self.assertIs( graphics.Mesh, Mesh )
+        self.assertIs( graphics.geometry.Mesh, Mesh )
+        self.assertIn( 'Mesh', dir( graphics.geometry ) )
+        with self.assertRaises( AttributeError ):
+            graphics.geometry.missing
+        with self.assertRaises( ImportError ):
+            exec( 'from graphics.io import missing', {} )
+
+        # the top level exports every subpackage's names once
+        names = graphics.__all__
+        self.assertEqual( len( names ), len( set( names ) ) )
+        self.assertIn( 'Shader', names )
+        self.assertIn( 'load_obj', names )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+
+import numpy
+
+from graphics.appearance import Material
+from graphics.geometry import cube, mesh_indices
+from graphics.opengl.multi_draw import MeshBatch, RangeAllocator
+from graphics.opengl.offscreen import OffscreenRenderer
+from graphics.opengl.shader import Shader
+from OpenGL.GL import glGetIntegerv, GL_MAJOR_VERSION, GL_MINOR_VERSION
+
+VERTEX = """
+#version 430
+layout(location=0) in vec3 position;
+layout(location=1) in vec3 normal;
+layout(location=2) in uint material_index;
+flat out uint material;
+void main() {
+    material = material_index;
+    gl_Position = vec4( position.xy, 0.5*position.z, 1.0 );
+}
+"""
+
+FRAGMENT = """
+#version 430
+layout(std140) uniform MaterialBlock {
+    vec4 diffuse[256];
+    vec4 ambient[256];
+    vec4 specular[256];
+};
+flat in uint material;
+out vec4 color;
+void main() { color = vec4( diffuse[material].rgb, 1.0 ); }
+"""
+
+class TestRangeAllocator(unittest.TestCase):
+
+    def test_allocate_free( self ):
+        a = RangeAllocator( 100 )
+        self.assertEqual( a.allocate( 40 ), 0 )
+        self.assertEqual( a.allocate( 40 ), 40 )
+        self.assertIsNone( a.allocate( 40 ) )
+        a.free( 0 )
+        self.assertEqual( a.allocate( 30 ), 0 )
+        a.free( 40 )
+        a.free( 0 )
+        # everything coalesced back into one range
+        self.assertEqual( a.allocate( 100 ), 0 )
+
+    def test_grow( self ):
+        a = RangeAllocator( 10 )
+        a.allocate( 8 )
+        a.grow( 20 )
+        self.assertEqual( a.allocate( 12 ), 8 )
+
+class TestMeshBatch(unittest.TestCase):
+
+    def test_commands( self ):
+        mesh, materials = cube()
+        batch = MeshBatch( vertex_capacity=16, index_capacity=16 )
+        h0 = batch.add( mesh, materials )
+        h1 = batch.add( mesh, materials )
+
+        cmd, mat = batch.commands()
+        ntri = sum( e-s for s, e in mesh.material_triangles.values() )
+        self.assertEqual( cmd.shape, (2*len(mesh.material_triangles),5) )
+        self.assertEqual( int(cmd[:,0].sum()), 2*3*ntri )
+        self.assertTrue( numpy.all( cmd[:,1] == 1 ) )
+        self.assertTrue( numpy.array_equal( cmd[:,4], numpy.arange(cmd.shape[0]) ) )
+        # both copies share materials but not vertex ranges
+        half = cmd.shape[0]//2
+        self.assertTrue( numpy.array_equal( mat[:half], mat[half:] ) )
+        self.assertNotEqual( cmd[0,3], cmd[half,3] )
+
+        batch.remove( h0 )
+        cmd, mat = batch.commands()
+        self.assertEqual( cmd.shape[0], half )
+
+    def test_optimize( self ):
+        mesh, materials = cube()
+        plain = MeshBatch( vertex_capacity=16, index_capacity=16 )
+        plain.add( mesh, materials )
+        batch = MeshBatch( vertex_capacity=16, index_capacity=16 )
+        batch.add( mesh, materials, optimize=True )
+        batch.add( mesh, materials, optimize=True )
+        cmd, mat = batch.commands()
+        half = cmd.shape[0]//2
+        # the same draws, the second mesh starts after the merged vertices
+        self.assertTrue( numpy.array_equal( cmd[:half,:3], plain.commands()[0][:,:3] ) )
+        self.assertEqual( int(cmd[half,3]), mesh_indices( mesh )[0].size )
+        self.assertLess( int(cmd[half,3]), mesh.vertices.shape[0] )
+
+class TestMeshBatchDraw(unittest.TestCase):
+
+    @classmethod
+    def setUpClass( cls ):
+        try:
+            cls.renderer = OffscreenRenderer( 64, 32 )
+        except RuntimeError as e:
+            raise unittest.SkipTest( str(e) )
+        if glGetIntegerv( GL_MAJOR_VERSION )*10 + glGetIntegerv( GL_MINOR_VERSION ) < 43:
+            cls.renderer.delete()
+            raise unittest.SkipTest( 'glMultiDrawElementsIndirect needs OpenGL 4.3' )
+
+    @classmethod
+    def tearDownClass( cls ):
+        cls.renderer.delete()
+
+    def test_draw( self ):
+        state = self.renderer.state
+        shader = Shader( VERTEX, FRAGMENT, state=state )
+        batch = MeshBatch( vertex_capacity=16, index_capacity=16, state=state )
+
+        # a cube with one material per side on the left, a green one on the right
+        left, materials = cube()
+        left.vertices[:,0] -= 0.6
+        right, sides = cube()
+        right.vertices[:,0] += 0.6
+        green = Material( mdict={ 'name': 'green', 'diffuse': [0.0,1.0,0.0] } )
+        batch.add( left, materials )
+        batch.add( right, { m.name: green for m in sides } )
+
+        def draw():
+            shader.use()
+            batch.draw()
+        image = self.renderer.capture( draw )
+
+        # the near side faces the camera, every draw picked its own material
+        near = [ m for m in materials if m.name == 'near' ][0]
+        self.assertTrue( numpy.allclose( image[16,12,:3], 255*numpy.asarray( near.diffuse ), atol=2 ) )
+        self.assertEqual( image[16,51].tolist(), [0,255,0,255] )
+        self.assertFalse( numpy.any( image[16,32] ) )
+        self.assertFalse( numpy.any( image[2,12] ) )
+        shader.release()
+
+if __name__ == '__main__':
+    unittest.main()
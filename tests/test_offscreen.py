@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import numpy
+
+from graphics.core import Camera
+from graphics.geometry import cube
+from graphics.opengl.offscreen import OffscreenRenderer
+
+class TestOffscreen(unittest.TestCase):
+
+    @classmethod
+    def setUpClass( cls ):
+        try:
+            cls.renderer = OffscreenRenderer( 64, 48, frames_in_flight=2 )
+        except RuntimeError as e:
+            raise unittest.SkipTest( str(e) )
+
+    @classmethod
+    def tearDownClass( cls ):
+        cls.renderer.delete()
+
+    def test_render( self ):
+        mesh, materials = cube()
+        image = self.renderer.render( mesh, materials )
+        self.assertEqual( image.shape, (48,64,4) )
+        self.assertEqual( image.dtype, numpy.uint8 )
+
+        # the fitted camera frames the cube around the image center
+        covered = image[...,3] > 0
+        self.assertTrue( covered[24,32] )
+        self.assertFalse( covered[0,0] )
+        self.assertGreater( covered.mean(), 0.2 )
+
+    def test_batch( self ):
+        mesh, materials = cube()
+        camera = Camera( eye=(0.0,0.0,4.0), aspect=64/48, near=0.1, far=10.0 )
+        single = self.renderer.render( mesh, materials, camera )
+        empty  = Camera( eye=(0.0,0.0,4.0), target=(0.0,0.0,8.0), aspect=64/48, near=0.1, far=10.0 )
+
+        items  = [ (mesh, materials, camera if i%2 == 0 else empty) for i in range(5) ]
+        images = list( self.renderer.render_batch( items ) )
+        self.assertEqual( len(images), 5 )
+        for i, image in enumerate(images):
+            if i%2 == 0:
+                self.assertTrue( numpy.array_equal( image, single ) )
+            else:
+                self.assertFalse( numpy.any( image ) )
+        self.assertGreater( self.renderer.images_per_second, 0.0 )
+
+class TestQtBackend(unittest.TestCase):
+
+    def test_headless( self ):
+        # a Qt platform plugin failing to start aborts the interpreter, so
+        # the backend is created in a child without a display
+        code = '\n'.join([
+            'from graphics.opengl.offscreen import OffscreenRenderer',
+            'try:',
+            '    OffscreenRenderer( 4, 4, backend="qt" ).delete()',
+            '    print( "created" )',
+            'except RuntimeError:',
+            '    print( "unavailable" )',
+        ])
+        env = { k: v for k, v in os.environ.items() if k not in ('DISPLAY', 'WAYLAND_DISPLAY', 'QT_QPA_PLATFORM') }
+        result = subprocess.run( [sys.executable, '-c', code], cwd=os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ),
+                                 env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True )
+        self.assertEqual( result.returncode, 0, result.stderr )
+        self.assertIn( result.stdout.split()[-1], ('created', 'unavailable') )
+
+if __name__ == '__main__':
+    unittest.main()
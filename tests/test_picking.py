@@ -0,0 +1,139 @@
+import unittest
+
+import numpy
+
+from graphics.opengl.picking import IdMap, PickingService, encode_ids, decode_rgba
+from graphics.opengl.offscreen import OffscreenRenderer
+from graphics.opengl.shader import Shader
+from OpenGL.GL import *
+
+VERTEX = """
+#version 330 core
+in vec2 position;
+void main() { gl_Position = vec4( position, 0.0, 1.0 ); }
+"""
+
+FRAGMENT = """
+#version 330 core
+uniform vec3 color;
+out vec4 frag;
+void main() { frag = vec4( color, 1.0 ); }
+"""
+
+class TestPicking(unittest.TestCase):
+
+    def test_encode_decode( self ):
+        ids = numpy.random.randint( 1, 2**24-1, size=1000 )
+        rgba = numpy.zeros( (1000,4), dtype=numpy.uint8 )
+        rgba[:,:3] = numpy.round( encode_ids(ids)*255.0 )
+        self.assertTrue( numpy.array_equal( decode_rgba(rgba), ids ) )
+
+    def test_lookup( self ):
+        ids = numpy.array([ 50, 7, 1000, 3 ])
+        idmap = IdMap( ids )
+        self.assertTrue( numpy.array_equal( idmap.lookup([3,7,50,1000]), [3,1,0,2] ) )
+        self.assertTrue( numpy.array_equal( idmap.lookup([[0,4],[2000,7]]), [[-1,-1],[-1,1]] ) )
+        self.assertEqual( int(IdMap([]).lookup(5)), -1 )
+
+class TestPickingService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass( cls ):
+        try:
+            cls.renderer = OffscreenRenderer( 1, 1 )
+        except RuntimeError as e:
+            raise unittest.SkipTest( str(e) )
+        state = cls.renderer.state
+        cls.shader = Shader( VERTEX, FRAGMENT, state=state )
+        # id 5 on the left half, id 70000 on the lower right quarter
+        quads = numpy.array( [ [-1,-1], [0,-1], [0,1], [-1,-1], [0,1], [-1,1],
+                               [0,-1], [1,-1], [1,0], [0,-1], [1,0], [0,0] ], dtype=numpy.float32 )
+        cls.vao = glGenVertexArrays(1)
+        cls.vbo = glGenBuffers(1)
+        state.bind_vertex_array( cls.vao )
+        state.bind_buffer( GL_ARRAY_BUFFER, cls.vbo )
+        glBufferData( GL_ARRAY_BUFFER, quads.nbytes, quads, GL_STATIC_DRAW )
+        loc = cls.shader.attribute_location('position')
+        glVertexAttribPointer( loc, 2, GL_FLOAT, GL_FALSE, 0, None )
+        state.enable_vertex_attrib_array( loc )
+        state.bind_vertex_array( 0 )
+
+    @classmethod
+    def tearDownClass( cls ):
+        cls.renderer.state.delete_buffer( cls.vbo )
+        glDeleteBuffers( 1, [cls.vbo] )
+        glDeleteVertexArrays( 1, [cls.vao] )
+        cls.renderer.delete()
+
+    def setUp( self ):
+        self.picker = PickingService( 64, 48, radius=2, frames_in_flight=2, state=self.renderer.state )
+        self.passes = 0
+
+    def tearDown( self ):
+        self.picker.delete()
+
+    def render_ids( self ):
+        self.passes += 1
+        state = self.renderer.state
+        self.shader.use()
+        state.bind_vertex_array( self.vao )
+        for first, id in ( (0,5), (6,70000) ):
+            self.shader['color'] = encode_ids( [id] )
+            glDrawArrays( GL_TRIANGLES, first, 6 )
+        state.bind_vertex_array( 0 )
+
+    def pick( self, x, y ):
+        """Requests (x,y) and updates until its readback has resolved"""
+        self.picker.request( x, y )
+        self.picker.update( self.render_ids )
+        glFinish()
+        self.picker.update( self.render_ids )
+        return self.picker.result()
+
+    def test_result( self ):
+        self.picker.request( 10, 20 )
+        self.picker.update( self.render_ids )
+        # the readback is only resolved by a later update
+        self.assertEqual( self.picker.result(), 0 )
+        glFinish()
+        self.picker.update( self.render_ids )
+        self.assertEqual( self.picker.result(), 5 )
+        self.assertEqual( self.picker.latency, 1 )
+        self.assertEqual( self.passes, 1 )
+
+        # nothing changed, no new id pass
+        self.picker.update( self.render_ids )
+        self.assertEqual( self.passes, 1 )
+        self.picker.invalidate()
+        self.picker.update( self.render_ids )
+        self.assertEqual( self.passes, 2 )
+
+        self.assertEqual( self.pick( 50, 10 ), 70000 )
+        self.assertEqual( self.pick( 50, 40 ), 0 )
+        # background under the cursor, the nearest id within the radius wins
+        self.assertEqual( self.pick( 33, 40 ), 5 )
+        self.assertEqual( self.picker.region().shape, (5,5) )
+
+    def test_ring( self ):
+        # cursor moves every frame, at most frames_in_flight readbacks are pending
+        for x in range(40,60):
+            self.picker.request( x, 10 )
+            self.picker.update( self.render_ids )
+        self.assertLessEqual( self.passes, 20 )
+        self.picker.request( 10, 10 )
+        for i in range(4):
+            glFinish()
+            self.picker.update( self.render_ids )
+        self.assertEqual( self.picker.result(), 5 )
+
+    def test_resize( self ):
+        self.assertEqual( self.pick( 40, 20 ), 70000 )
+        # the ids now cover twice as many pixels
+        self.picker.resize( 128, 96 )
+        self.assertEqual( self.pick( 40, 20 ), 5 )
+        self.assertEqual( self.pick( 100, 20 ), 70000 )
+        # the region is clamped to the framebuffer at the border
+        self.assertEqual( self.pick( 127, 0 ), 70000 )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from graphics.core import Camera
+from graphics.geometry.point_octree import PointOctree
+from graphics.opengl.point_cloud import PointCloudRenderer
+from graphics.opengl.offscreen import OffscreenRenderer
+
+class TestPointCloudRenderer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass( cls ):
+        try:
+            cls.offscreen = OffscreenRenderer( 64, 64 )
+        except RuntimeError as e:
+            raise unittest.SkipTest( str(e) )
+        rng = numpy.random.default_rng( 3 )
+        points = rng.uniform( -1.0, 1.0, (40000,3) ).astype(numpy.float32)
+        colors = numpy.full( (40000,3), 255, dtype=numpy.uint8 )
+        cls.path   = tempfile.mkdtemp()
+        cls.octree = PointOctree.build( cls.path, points, colors, resolution=8, depth=8 )
+
+    @classmethod
+    def tearDownClass( cls ):
+        cls.offscreen.delete()
+        shutil.rmtree( cls.path )
+
+    def test_streaming( self ):
+        self.offscreen.make_current()
+        camera   = Camera( eye=(0.0,0.0,4.0), fov=45.0, near=0.1, far=100.0 )
+        renderer = PointCloudRenderer( self.octree, capacity=30000, max_upload=1000000 )
+
+        # nothing is resident before the first loads finish
+        renderer.update( camera, 64, budget=20000 )
+        self.assertEqual( renderer.stats()['drawn'], 0 )
+        renderer.wait()
+        renderer.update( camera, 64, budget=20000 )
+        stats = renderer.stats()
+        self.assertEqual( stats['drawn'], stats['selected'] )
+        self.assertLessEqual( stats['drawn_points'], 20000 )
+        self.assertGreater( stats['drawn_points'], 0 )
+
+        image = self.offscreen.capture( lambda: renderer.render( camera ) )
+        self.assertEqual( image.shape, (64,64,4) )
+        self.assertGreater( int( (image[...,0] > 0).sum() ), 0 )
+
+        # moving away selects coarser nodes, the buffer never overflows
+        for z in (8.0, 16.0, 2.0, 4.0):
+            camera = Camera( eye=(0.0,0.0,z), fov=45.0, near=0.1, far=100.0 )
+            renderer.update( camera, 64, budget=20000 )
+            renderer.wait()
+            renderer.update( camera, 64, budget=20000 )
+            self.assertLessEqual( renderer.stats()['resident_points'], 30000 )
+        renderer.delete()
+
+if __name__ == '__main__':
+    unittest.main()
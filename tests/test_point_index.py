@@ -0,0 +1,86 @@
+import unittest
+
+import numpy
+
+from graphics.geometry import PointGrid
+
+class TestPointGrid(unittest.TestCase):
+
+    def setUp( self ):
+        rng = numpy.random.default_rng( 3 )
+        self.points  = rng.uniform( -1, 1, (5000,3) ).astype(numpy.float32)
+        self.queries = rng.uniform( -1.2, 1.2, (50,3) ).astype(numpy.float32)
+
+    def test_knearest( self ):
+        grid = PointGrid( self.points )
+        ids, dist = grid.knearest( self.queries, 5 )
+        d = numpy.linalg.norm( self.points[None] - self.queries[:,None], axis=2 )
+        expected = numpy.sort( d, axis=1 )[:,:5]
+        self.assertTrue( numpy.allclose( dist, expected, atol=1e-5 ) )
+        self.assertTrue( numpy.allclose( d[numpy.arange(50)[:,None],ids], expected, atol=1e-5 ) )
+
+    def test_knearest_far( self ):
+        # queries far outside the cloud, boxes are clipped to the occupied cells
+        grid = PointGrid( self.points, cell_size=0.02 )
+        queries = numpy.array( [[3.0,3.0,3.0], [-40.0,0.0,0.5], [0.0,1e4,0.0]], dtype=numpy.float32 )
+        ids, dist = grid.knearest( queries, 4 )
+        d = numpy.linalg.norm( self.points[None] - queries[:,None], axis=2 )
+        self.assertTrue( numpy.allclose( dist, numpy.sort( d, axis=1 )[:,:4], rtol=1e-5 ) )
+        self.assertTrue( numpy.array_equal( ids[:,0], numpy.argmin( d, axis=1 ) ) )
+
+    def test_radius( self ):
+        grid = PointGrid( self.points )
+        qi, ids, dist = grid.radius( self.queries, 0.2 )
+        d = numpy.linalg.norm( self.points[None] - self.queries[:,None], axis=2 )
+        for i in range(self.queries.shape[0]):
+            found = set( ids[qi == i].tolist() )
+            self.assertEqual( found, set( numpy.flatnonzero( d[i] <= 0.2 ).tolist() ) )
+
+    def test_insert_remove( self ):
+        grid = PointGrid( self.points[:1000] )
+        new = grid.insert( self.points[1000:1100] )
+        self.assertTrue( numpy.array_equal( new, numpy.arange(1000,1100) ) )
+        grid.remove( numpy.arange(0,1000,2) )
+        self.assertEqual( len(grid), 600 )
+
+        alive = numpy.concatenate( (numpy.arange(1,1000,2), new) )
+        ids, dist = grid.knearest( self.queries, 3 )
+        d = numpy.linalg.norm( self.points[alive][None] - self.queries[:,None], axis=2 )
+        self.assertTrue( numpy.allclose( dist, numpy.sort( d, axis=1 )[:,:3], atol=1e-5 ) )
+        self.assertTrue( numpy.all( numpy.isin( ids, alive ) ) )
+
+        # enough inserts to trigger a rebuild of the sorted cells
+        grid.insert( self.points[1100:] )
+        self.assertEqual( len(grid), 600 + 3900 )
+        qi, ids, dist = grid.radius( self.points[4000], 1e-6 )
+        self.assertIn( 4000, ids )
+
+    def test_pick( self ):
+        grid = PointGrid( self.points )
+        origins = numpy.tile( [0.0,0.0,5.0], (10,1) )
+        target  = self.points[:10]
+        ids = grid.pick( origins, target - origins, numpy.deg2rad(0.01) )
+        self.assertTrue( numpy.array_equal( ids, numpy.arange(10) ) )
+        for i in range(10):
+            qi, found, along, ang = grid.cone( origins[i], target[i] - origins[i], numpy.deg2rad(0.01) )
+            self.assertIn( i, found )
+
+    def test_cone( self ):
+        rng = numpy.random.default_rng( 5 )
+        origins = rng.uniform( -3, 3, (40,3) )
+        directions = rng.uniform( -0.5, 0.5, (40,3) ) - origins
+        angle = numpy.deg2rad( 5.0 )
+        # small cells need several coarser levels
+        for cell_size in (None, 0.02):
+            grid = PointGrid( self.points, cell_size=cell_size )
+            qi, ids, along, ang = grid.cone( origins, directions, angle, max_distance=4.0 )
+            for i in range(40):
+                axis = directions[i]/numpy.linalg.norm( directions[i] )
+                v = self.points - origins[i]
+                t = v @ axis
+                a = numpy.arctan2( numpy.linalg.norm( v - t[:,None]*axis, axis=1 ), t )
+                expected = numpy.flatnonzero( (t >= 0) & (t <= 4.0) & (a <= angle) )
+                self.assertEqual( sorted( ids[qi == i].tolist() ), expected.tolist() )
+
+if __name__ == '__main__':
+    unittest.main()
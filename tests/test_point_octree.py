@@ -0,0 +1,104 @@
+import heapq
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from graphics.core import Camera
+from graphics.geometry.culling import cull_boxes
+from graphics.geometry.point_octree import PointOctree, morton_codes, morton_cells
+
+def heap_select( octree, camera, height, budget, min_error=1.0 ):
+    """Reference selection refining one node at a time from a heap"""
+    nodes = octree.nodes
+    half  = nodes['half'][:,None]
+    visible = cull_boxes( camera.frustum_planes(), nodes['center'] - half, nodes['center'] + half )
+    error = octree.screen_errors( camera, height )
+    selected, total = [], 0
+    heap = [ (-float(error[0]), 0) ] if visible[0] else []
+    while heap:
+        e, node = heapq.heappop( heap )
+        if total + nodes['count'][node] > budget:
+            break
+        selected.append( node )
+        total += nodes['count'][node]
+        for child in octree.children( node ):
+            if visible[child] and error[child] >= min_error:
+                heapq.heappush( heap, (-float(error[child]), int(child)) )
+    return numpy.array( selected, dtype=numpy.int64 )
+
+class TestPointOctree(unittest.TestCase):
+
+    @classmethod
+    def setUpClass( cls ):
+        rng = numpy.random.default_rng( 5 )
+        cls.points = rng.normal( 0.0, 1.0, (60000,3) ).astype(numpy.float32)
+        cls.colors = rng.integers( 0, 255, (60000,3), dtype=numpy.uint8 )
+        cls.path   = tempfile.mkdtemp()
+        # small chunks exercise the carries between chunks
+        cls.octree = PointOctree.build( cls.path, cls.points, cls.colors, resolution=8, depth=10, chunk_size=7000 )
+
+    @classmethod
+    def tearDownClass( cls ):
+        shutil.rmtree( cls.path )
+
+    def test_morton( self ):
+        cells = numpy.random.randint( 0, 1 << 21, (100,3) )
+        self.assertTrue( numpy.array_equal( morton_cells( morton_codes( cells ) ), cells ) )
+
+    def test_nodes( self ):
+        octree = PointOctree( self.path )
+        nodes  = octree.nodes
+        self.assertEqual( int( nodes['count'].sum() ), self.points.shape[0] )
+        self.assertEqual( int( nodes['parent'][0] ), -1 )
+
+        # every point is kept once, with its colour
+        rec = numpy.asarray( octree.points )
+        order = numpy.lexsort( rec['position'].T )
+        expected = numpy.lexsort( self.points.T )
+        self.assertTrue( numpy.array_equal( rec['position'][order], self.points[expected] ) )
+        self.assertTrue( numpy.array_equal( rec['color'][order,:3], self.colors[expected] ) )
+        self.assertTrue( numpy.all( rec['color'][:,3] == 255 ) )
+
+        finest = nodes['level'].max()
+        for i in range( len(octree) ):
+            pts = octree.node_points( i )['position']
+            self.assertTrue( numpy.all( numpy.abs( pts - nodes['center'][i] ) <= nodes['half'][i]*1.0001 ) )
+            if nodes['level'][i] < finest:
+                # at most one point per grid cell of the node
+                cells = numpy.floor( (pts - (nodes['center'][i] - nodes['half'][i]))/nodes['spacing'][i] ).astype(int)
+                self.assertEqual( numpy.unique( cells, axis=0 ).shape[0], pts.shape[0] )
+            children = octree.children( i )
+            self.assertTrue( numpy.all( nodes['parent'][children] == i ) )
+            self.assertTrue( numpy.all( nodes['level'][children] == nodes['level'][i]+1 ) )
+
+    def test_select( self ):
+        octree = self.octree
+        camera = Camera( eye=(0.0,0.0,5.0), fov=45.0, near=0.1, far=100.0 )
+        drawn = []
+        for budget in (1000, 10000, 100000):
+            sel = octree.select( camera, 600, budget )
+            drawn.append( int( octree.nodes['count'][sel].sum() ) )
+            self.assertLessEqual( drawn[-1], budget )
+            # parents are selected before their children
+            seen = set()
+            for node in sel:
+                parent = int( octree.nodes['parent'][node] )
+                self.assertTrue( parent < 0 or parent in seen )
+                seen.add( int(node) )
+        self.assertTrue( drawn[0] < drawn[1] < drawn[2] )
+
+        # nothing behind the camera, coarse nodes only when far away
+        self.assertEqual( octree.select( Camera( eye=(0.0,0.0,50.0), target=(0.0,0.0,100.0) ), 600, 10000 ).size, 0 )
+        far = octree.select( Camera( eye=(0.0,0.0,400.0), near=1.0, far=1000.0 ), 600, 100000 )
+        self.assertLess( far.size, 10 )
+
+        # same nodes in the same order as refining one node at a time
+        for camera in ( camera, Camera( eye=(1.5,0.5,0.5), target=(-1.0,0.0,0.0), fov=60.0, near=0.05, far=10.0 ) ):
+            for budget, min_error in ( (500, 1.0), (20000, 1.0), (100000, 4.0), (100000, 0.0) ):
+                self.assertTrue( numpy.array_equal( octree.select( camera, 600, budget, min_error ),
+                                                    heap_select( octree, camera, 600, budget, min_error ) ) )
+
+if __name__ == '__main__':
+    unittest.main()
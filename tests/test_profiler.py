@@ -0,0 +1,132 @@
+import os
+import csv
+import json
+import tempfile
+import unittest
+
+import graphics.opengl.profiler as profiler_module
+from graphics.geometry import cube
+from graphics.opengl.profiler import Profiler
+from graphics.opengl.offscreen import OffscreenRenderer
+from OpenGL.GL import glFinish
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp( self ):
+        # emulate GL timestamp queries, every counter advances the clock by
+        # 1ms and results become available when ready is set
+        self.log    = []
+        self.ready  = set()
+        self.next   = [100]
+        self.stamps = {}
+        def gen( n ):
+            self.next[0] += n
+            return list( range( self.next[0]-n, self.next[0] ) )
+        def counter( q, target ):
+            self.log.append( q )
+            self.stamps[q] = len(self.log)*1000000
+        def result( q, pname, value ):
+            value.value = self.stamps[q]
+        fake = {
+            'glGenQueries':          gen,
+            'glQueryCounter':        counter,
+            'glGetQueryObjectiv':    lambda q, pname: int( q in self.ready ),
+            'glGetQueryObjectui64v': result
+        }
+        self.saved = {}
+        for name, fn in fake.items():
+            self.saved[name] = getattr( profiler_module, name )
+            setattr( profiler_module, name, fn )
+
+    def tearDown( self ):
+        for name, fn in self.saved.items():
+            setattr( profiler_module, name, fn )
+
+    def test_disabled( self ):
+        prof = Profiler()
+        self.assertIs( prof.scope('a'), prof.scope('b') )
+        f = prof.profile()( lambda x: x+1 )
+        with prof.scope('a'):
+            self.assertEqual( f(1), 2 )
+        self.assertEqual( prof.stats(), {} )
+        self.assertEqual( self.log, [] )
+
+    def test_scopes( self ):
+        prof = Profiler( enabled=True, queries=2 )
+
+        @prof.profile('draw')
+        def draw():
+            with prof.scope('inner'):
+                pass
+
+        for i in range(3):
+            with prof.scope('frame'):
+                draw()
+
+        # nested scopes are timed on the GPU too, the third frame found the rings empty
+        self.assertEqual( self.log, [102,106,110,111,107,103, 100,104,108,109,105,101] )
+        stats = prof.stats()
+        self.assertEqual( sorted(stats), ['draw','frame','inner'] )
+        self.assertEqual( stats['frame']['count'], 3 )
+        self.assertIsNone( stats['frame']['gpu'] )
+
+        # a pair is read once both of its timestamps are available
+        self.ready.update( [102,106,110,111,107] )
+        prof.collect()
+        stats = prof.stats()
+        self.assertIsNone( stats['frame']['gpu'] )
+        self.assertAlmostEqual( stats['draw']['gpu']['p50'], 3.0 )
+        self.assertAlmostEqual( stats['inner']['gpu']['p50'], 1.0 )
+
+        self.ready.add( 103 )
+        prof.collect()
+        self.assertAlmostEqual( prof.stats()['frame']['gpu']['p50'], 5.0 )
+        with prof.scope('frame'):
+            pass
+        self.assertEqual( self.log[-2:], [102,103] )
+
+    def test_dump( self ):
+        prof = Profiler( enabled=True, gpu=False )
+        for i in range(10):
+            with prof.scope('frame'):
+                pass
+        self.assertEqual( len(prof.text()), 2 )
+        with tempfile.TemporaryDirectory() as tmp:
+            prof.dump_json( os.path.join(tmp,'stats.json') )
+            prof.dump_csv( os.path.join(tmp,'stats.csv') )
+            with open( os.path.join(tmp,'stats.json') ) as f:
+                self.assertEqual( json.load(f)['frame']['count'], 10 )
+            with open( os.path.join(tmp,'stats.csv') ) as f:
+                rows = list( csv.reader(f) )
+            self.assertEqual( rows[1][:3], ['frame','10','cpu'] )
+
+class TestProfilerGL(unittest.TestCase):
+
+    @classmethod
+    def setUpClass( cls ):
+        try:
+            cls.renderer = OffscreenRenderer( 16, 16 )
+        except RuntimeError as e:
+            raise unittest.SkipTest( str(e) )
+
+    @classmethod
+    def tearDownClass( cls ):
+        cls.renderer.delete()
+
+    def test_nested_gpu_time( self ):
+        prof = Profiler( enabled=True )
+        mesh, materials = cube()
+        with prof.scope('frame'):
+            with prof.scope('draw'):
+                self.renderer.render( mesh, materials )
+        glFinish()
+        prof.collect()
+        stats = prof.stats()
+        for name in ('frame', 'draw'):
+            self.assertIsNotNone( stats[name]['gpu'] )
+            self.assertGreaterEqual( stats[name]['gpu']['p50'], 0.0 )
+        self.assertGreaterEqual( stats['frame']['gpu']['p50'], stats['draw']['gpu']['p50'] )
+        prof.delete()
+
+if __name__ == '__main__':
+    unittest.main()
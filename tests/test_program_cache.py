@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+
+from graphics.opengl.program_cache import ProgramCache
+from graphics.opengl.shader import Shader
+from graphics.opengl.offscreen import OffscreenRenderer
+from OpenGL.GL import glGetIntegerv, GL_NUM_PROGRAM_BINARY_FORMATS
+
+VERTEX = """
+#version 330 core
+in vec3 position;
+uniform mat4 mvp;
+void main() { gl_Position = mvp*vec4( position, 1.0 ); }
+"""
+
+FRAGMENT = """
+#version 330 core
+uniform vec4 color;
+out vec4 frag;
+void main() { frag = color; }
+"""
+
+class TestProgramCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass( cls ):
+        try:
+            cls.renderer = OffscreenRenderer( 1, 1 )
+        except RuntimeError as e:
+            raise unittest.SkipTest( str(e) )
+
+    @classmethod
+    def tearDownClass( cls ):
+        cls.renderer.delete()
+
+    def setUp( self ):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.link = Shader.link
+        self.links = 0
+        def counting( shader, *args, **kwargs ):
+            self.links += 1
+            return self.link( shader, *args, **kwargs )
+        Shader.link = counting
+
+    def tearDown( self ):
+        Shader.link = self.link
+        self.tmp.cleanup()
+
+    def require_binaries( self ):
+        if glGetIntegerv( GL_NUM_PROGRAM_BINARY_FORMATS ) <= 0:
+            self.skipTest( 'the driver has no program binary formats' )
+
+    def test_hits( self ):
+        cache = ProgramCache()
+        a = cache.shader( VERTEX, FRAGMENT )
+        b = cache.shader( VERTEX, FRAGMENT )
+        self.assertEqual( self.links, 1 )
+        self.assertIsNot( a, b )
+        self.assertEqual( a.program_id, b.program_id )
+        self.assertEqual( a.attributes(), b.attributes() )
+
+        c = cache.shader( VERTEX, FRAGMENT.replace( 'frag = color', 'frag = 0.5*color' ) )
+        self.assertEqual( self.links, 2 )
+        self.assertNotEqual( c.program_id, a.program_id )
+
+        cache.clear()
+        cache.shader( VERTEX, FRAGMENT )
+        self.assertEqual( self.links, 3 )
+
+    def test_binary_round_trip( self ):
+        self.require_binaries()
+        first = ProgramCache( self.tmp.name ).shader( VERTEX, FRAGMENT )
+        self.assertEqual( len( os.listdir( self.tmp.name ) ), 1 )
+
+        # a new cache, as on the next run, restores the binary without linking
+        restored = ProgramCache( self.tmp.name ).shader( VERTEX, FRAGMENT )
+        self.assertEqual( self.links, 1 )
+        self.assertNotEqual( restored.program_id, first.program_id )
+        self.assertEqual( restored.uniforms(), first.uniforms() )
+        self.assertEqual( restored.attributes(), first.attributes() )
+
+    def test_rejected_binary( self ):
+        self.require_binaries()
+        cache = ProgramCache( self.tmp.name )
+        path = os.path.join( self.tmp.name, '{}.bin'.format( cache.key( VERTEX, FRAGMENT ) ) )
+        with open( path, 'wb' ) as f:
+            f.write( b'\x01\x00\x00\x00' + b'garbage'*16 )
+
+        with self.assertLogs( 'graphics.opengl.program_cache', 'INFO' ):
+            shader = cache.shader( VERTEX, FRAGMENT )
+        self.assertEqual( self.links, 1 )
+        self.assertIn( 'mvp', shader.uniforms() )
+
+        # the rejected file was replaced by a usable binary
+        ProgramCache( self.tmp.name ).shader( VERTEX, FRAGMENT )
+        self.assertEqual( self.links, 1 )
+
+if __name__ == '__main__':
+    unittest.main()
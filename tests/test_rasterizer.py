@@ -0,0 +1,76 @@
+import unittest
+
+import numpy
+
+from graphics.core import Camera, Transform
+from graphics.geometry.rasterizer import rasterize
+
+def fan( n, z=0.0 ):
+    """n triangles around the origin covering the square [-1,1]^2"""
+    a = numpy.linspace( 0.0, 2.0*numpy.pi, n+1 )
+    r = 2.0
+    tris = numpy.zeros( (n,3,3) )
+    tris[:,1,0], tris[:,1,1] = r*numpy.cos(a[:-1]), r*numpy.sin(a[:-1])
+    tris[:,2,0], tris[:,2,1] = r*numpy.cos(a[1:]),  r*numpy.sin(a[1:])
+    tris[...,2] = z
+    return tris
+
+class TestRasterizer(unittest.TestCase):
+
+    def test_coverage( self ):
+        # shared edges are covered exactly once, without holes
+        I = Transform()
+        tris = fan( 7 )
+        depth, ids = rasterize( tris, 37, 29, I, I )
+        self.assertTrue( numpy.all( ids >= 0 ) )
+        self.assertTrue( numpy.allclose( depth, 0.5 ) )
+
+        count = numpy.zeros( (29,37), dtype=int )
+        for i in range(7):
+            count += rasterize( tris[i:i+1], 37, 29, I, I )[1] >= 0
+        self.assertTrue( numpy.all( count == 1 ) )
+
+        # back faces are skipped when culling
+        self.assertTrue( numpy.all( rasterize( tris[:,::-1], 37, 29, I, I, cull_backfaces=True )[1] == -1 ) )
+
+    def test_nearest( self ):
+        I = Transform()
+        near = fan( 4, -0.5 )
+        far  = fan( 4,  0.5 )
+        for tris in ( numpy.concatenate((near,far)), numpy.concatenate((far,near)) ):
+            depth, ids = rasterize( tris, 16, 16, I, I )
+            self.assertTrue( numpy.allclose( depth, 0.25 ) )
+            self.assertTrue( numpy.all( numpy.isclose( tris[ids,0,2], -0.5 ) ) )
+
+    def test_camera( self ):
+        camera = Camera( eye=(0.0,0.0,3.0), fov=60.0, aspect=1.0, near=0.5, far=10.0 )
+        quad = numpy.array([ [[-1,-1,0],[1,-1,0],[1,1,0]], [[-1,-1,0],[1,1,0],[-1,1,0]] ], dtype=numpy.float32 )
+        depth, ids = rasterize( quad.reshape(-1,3), 64, 64, camera.projection(), camera.view() )
+
+        covered = numpy.argwhere( ids >= 0 )
+        lo, hi = camera.project( [[-1,-1,0],[1,1,0]], viewport=(0,0,64,64) )
+        self.assertTrue( numpy.all( covered[:,::-1] + 0.5 >= lo[:2] ) )
+        self.assertTrue( numpy.all( covered[:,::-1] + 0.5 <= hi[:2] ) )
+        self.assertTrue( numpy.allclose( depth[ids >= 0], lo[2], atol=1e-6 ) )
+        self.assertTrue( numpy.all( depth[ids < 0] == 1.0 ) )
+
+    def test_near_clip( self ):
+        # a ground plane passing under and behind the camera
+        camera = Camera( eye=(0.0,0.0,0.0), target=(0.0,0.0,-1.0), fov=90.0, near=0.1, far=100.0 )
+        ground = numpy.array([ [[-50,-1,50],[50,-1,50],[50,-1,-50]], [[-50,-1,50],[50,-1,-50],[-50,-1,-50]] ] )
+        depth, ids = rasterize( ground, 32, 32, camera.projection(), camera.view() )
+        self.assertTrue( numpy.all( ids[:15] >= 0 ) )
+        self.assertTrue( numpy.all( ids[17:] == -1 ) )
+        self.assertTrue( numpy.all( numpy.diff( depth[:15,16] ) >= 0.0 ) )
+
+    def test_workers( self ):
+        rng = numpy.random.default_rng( 3 )
+        tris = rng.uniform( -1.0, 1.0, (500,1,3) ) + rng.normal( 0.0, 0.2, (500,3,3) )
+        camera = Camera( eye=(0.0,0.0,1.2), near=0.1, far=5.0 )
+        single = rasterize( tris, 40, 70, camera.projection(), camera.view(), tile_size=8 )
+        pooled = rasterize( tris, 40, 70, camera.projection(), camera.view(), tile_size=8, workers=2 )
+        self.assertTrue( numpy.array_equal( single[0], pooled[0] ) )
+        self.assertTrue( numpy.array_equal( single[1], pooled[1] ) )
+
+if __name__ == '__main__':
+    unittest.main()
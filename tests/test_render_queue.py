@@ -0,0 +1,57 @@
+import unittest
+
+from graphics.appearance import Material
+from graphics.opengl.render_queue import RenderQueue, sort_keys
+
+class FakeShader:
+    def __init__( self, program_id ):
+        self.program_id = program_id
+
+class FakeMesh:
+    def __init__( self, ranges ):
+        self.material_triangles = ranges
+
+class TestRenderQueue(unittest.TestCase):
+
+    def test_sort_keys( self ):
+        keys = sort_keys({ 'pass': [1,0], 'program': [0,5], 'textures': [0,0], 'material': [0,0], 'depth': [0,0] })
+        self.assertTrue( keys[0] > keys[1] )
+        self.assertEqual( int(keys[0]), 1 << 60 )
+        with self.assertRaises( ValueError ):
+            sort_keys({ 'pass': [16], 'program': [0], 'textures': [0], 'material': [0], 'depth': [0] })
+
+    def test_sorted_batches( self ):
+        s1, s2 = FakeShader(1), FakeShader(2)
+        m1, m2 = Material('a'), Material('b')
+        mesh = FakeMesh({ 'a0': (0,10), 'b0': (10,20), 'a1': (20,30), 'a2': (30,40) })
+
+        queue = RenderQueue()
+        queue.submit( s1, mesh, 'a0', m1 )
+        queue.submit( s2, mesh, 'b0', m2 )
+        queue.submit( s1, mesh, 'a2', m1 )
+        queue.submit( s2, mesh, 'b0', m2, layer=1 )
+        queue.submit( s1, mesh, 'a1', m1 )
+
+        draws = queue.batches()
+        # pass 0 draws are grouped by program, the pass 1 draw comes last
+        self.assertEqual( [ (d[0].program_id, d[4], d[5]) for d in draws ], [(1,0,10),(1,30,40),(1,20,30),(2,10,20),(2,10,20)] )
+
+        unsorted = [ (s1,mesh,m1,()), (s2,mesh,m2,()), (s1,mesh,m1,()), (s2,mesh,m2,()), (s1,mesh,m1,()) ]
+        self.assertTrue( RenderQueue.state_changes(draws) < RenderQueue.state_changes(unsorted) )
+
+    def test_merge_contiguous( self ):
+        s = FakeShader(1)
+        m = Material('a')
+        mesh = FakeMesh({ 'x': (0,5), 'y': (5,9), 'z': (9,12) })
+        queue = RenderQueue()
+        for name in ('z','y','x'):
+            queue.submit( s, mesh, name, m )
+        # equal keys keep submission order, so nothing is contiguous
+        self.assertEqual( len(queue.batches()), 3 )
+        queue.clear()
+        for name, depth in (('z',0.3),('y',0.2),('x',0.1)):
+            queue.submit( s, mesh, name, m, depth=depth )
+        self.assertEqual( [ d[4:] for d in queue.batches() ], [(0,12)] )
+
+if __name__ == '__main__':
+    unittest.main()
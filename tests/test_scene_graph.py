@@ -0,0 +1,57 @@
+import unittest
+
+import numpy
+
+from graphics.core import SceneGraph, Transform, TransformArray
+
+def naive_world( parents, locals_ ):
+    world = []
+    for i, p in enumerate(parents):
+        world.append( locals_[i] if p < 0 else world[p] @ locals_[i] )
+    return numpy.array( world )
+
+class TestSceneGraph(unittest.TestCase):
+
+    def setUp( self ):
+        rng = numpy.random.default_rng( 5 )
+        self.rng = rng
+        self.n = 500
+        self.parents = numpy.array( [ -1 if i == 0 or rng.random() < 0.05 else rng.integers(0,i) for i in range(self.n) ] )
+        self.locals = TransformArray( self.n ).rotate( rng.uniform(-90,90,self.n), 0, 1, 0 ).translate( *rng.normal(size=(3,self.n)) ).matrices()
+
+    def test_update( self ):
+        scene = SceneGraph( capacity=16 )
+        scene.add_nodes( self.parents[:100], self.locals[:100] )
+        for i in range(100,self.n):
+            scene.add_node( self.parents[i], Transform( self.locals[i] ) )
+        changed = scene.update()
+        self.assertEqual( changed.size, self.n )
+        self.assertTrue( numpy.allclose( scene.world_matrices(), naive_world( self.parents, self.locals ), atol=1e-4 ) )
+        self.assertEqual( scene.update().size, 0 )
+
+        # change a few nodes, only their subtrees are updated
+        nodes = self.rng.choice( self.n, 5, replace=False )
+        self.locals[nodes] = TransformArray( 5 ).scale( 2.0, 2.0, 2.0 ).matrices()
+        scene.set_locals( nodes, self.locals[nodes] )
+        changed = scene.update()
+        expected = naive_world( self.parents, self.locals )
+        self.assertTrue( numpy.allclose( scene.world_matrices(), expected, atol=1e-4 ) )
+
+        subtree = numpy.zeros( self.n, dtype=bool )
+        subtree[nodes] = True
+        for i in range(self.n):
+            subtree[i] |= self.parents[i] >= 0 and subtree[self.parents[i]]
+        self.assertTrue( numpy.array_equal( changed, numpy.flatnonzero(subtree) ) )
+
+        data = scene.column_major()
+        self.assertTrue( numpy.allclose( data.reshape(-1,4,4).transpose(0,2,1), expected, atol=1e-4 ) )
+
+    def test_order( self ):
+        scene = SceneGraph()
+        with self.assertRaises( ValueError ):
+            scene.add_nodes( [0] )
+        nodes = scene.add_nodes( [-1,0,1] )
+        self.assertEqual( scene.parent( nodes[2] ), 1 )
+
+if __name__ == '__main__':
+    unittest.main()
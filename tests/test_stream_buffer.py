@@ -0,0 +1,75 @@
+import unittest
+
+import numpy
+
+from graphics.opengl.stream_buffer import StreamBuffer
+from graphics.opengl.offscreen import OffscreenRenderer
+from OpenGL.GL import *
+
+class TestStreamBuffer(unittest.TestCase):
+
+    def test_dirty_ranges( self ):
+        buf = StreamBuffer( (100,3), frames=3 )
+        self.assertEqual( [ buf.dirty_ranges(i) for i in range(3) ], [[(0,100)]]*3 )
+
+        buf = StreamBuffer( numpy.ones( (100,3) ), frames=3 )
+        buf.write( numpy.zeros( (5,3) ), offset=10 )
+        buf.write( (1.0,2.0,3.0), offset=15 )
+        buf.write( (4.0,5.0,6.0), offset=50 )
+        self.assertTrue( numpy.array_equal( buf.data[15], (1,2,3) ) )
+        self.assertEqual( buf.data.dtype, numpy.float32 )
+        with self.assertRaises( IndexError ):
+            buf.write( numpy.zeros( (2,3) ), offset=99 )
+
+    def test_regions( self ):
+        buf = StreamBuffer( (10,3), frames=3, alignment=256 )
+        # regions hold whole rows at aligned offsets
+        self.assertEqual( buf.region_size % 256, 0 )
+        self.assertEqual( buf.region_size % 12, 0 )
+
+class TestStreamBufferGL(unittest.TestCase):
+
+    @classmethod
+    def setUpClass( cls ):
+        try:
+            cls.renderer = OffscreenRenderer( 1, 1 )
+        except RuntimeError as e:
+            raise unittest.SkipTest( str(e) )
+
+    @classmethod
+    def tearDownClass( cls ):
+        cls.renderer.delete()
+
+    def region( self, buf ):
+        buf.bind()
+        data = glGetBufferSubData( buf.target, buf.offset, buf.data.nbytes )
+        return numpy.frombuffer( bytes(data), dtype=numpy.float32 ).reshape( buf.data.shape )
+
+    def check( self, persistent ):
+        self.renderer.make_current()
+        colors = numpy.random.uniform( size=(50,3) ).astype(numpy.float32)
+        buf = StreamBuffer( colors, frames=3, persistent=persistent )
+        for frame in range(3):
+            buf.begin_frame()
+            self.assertTrue( numpy.array_equal( self.region( buf ), colors ) )
+        self.assertEqual( buf.uploaded, 3*colors.nbytes )
+
+        # each later write reaches every region once, one row at a time
+        for frame in range(6):
+            buf.begin_frame()
+            buf.write( (frame,frame,frame), offset=frame )
+            colors[frame] = frame
+            self.assertTrue( numpy.array_equal( self.region( buf ), colors[:frame+1].tolist() + buf.data[frame+1:].tolist() ) )
+            self.assertEqual( buf.dirty_ranges(), [] )
+        self.assertEqual( buf.uploaded, 3*colors.nbytes + (1+2+3+3+3+3)*12 )
+        self.assertEqual( buf.index, 8 % 3 )
+        buf.delete()
+
+    def test_persistent( self ):
+        self.check( True )
+
+    def test_unsynchronized( self ):
+        self.check( False )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,7 @@ from OpenGL.GLU import *
 
 from graphics.opengl import GLWidget
 from graphics.core import Transform
+from graphics.core.transform import classify, IDENTITY, TRANSLATION, RIGID, AFFINE, PROJECTIVE
 
 class TestTransform(unittest.TestCase):
 
@@ -25,6 +26,94 @@ class TestTransform(unittest.TestCase):
         self.assertTrue( numpy.allclose( M1.matrix(), M2.matrix() ) )
         self.assertTrue( numpy.allclose( M1.matrix(), M3 ) )
 
+    def test_inverse( self ):
+        for i in range(100):
+            p = numpy.random.randn(9)
+            T = Transform().translate( *p[:3] )
+            R = T.rotate( numpy.random.uniform(-180,180), *p[3:6] ).lookat( *p )
+            A = R.scale( *numpy.random.uniform(0.5,2.0,3) )
+            P = A.perspective( 45.0, 1.5, 0.1, 100.0 )
+            for M, kind in ( (T,TRANSLATION), (R,RIGID), (A,AFFINE), (P,PROJECTIVE) ):
+                self.assertEqual( M.kind, kind )
+                self.assertEqual( classify( M.matrix() ), kind )
+                self.assertTrue( numpy.allclose( M.inverse().matrix(), numpy.linalg.inv(M.matrix()), rtol=1e-4, atol=1e-4 ) )
+            self.assertIs( A.inverse(), A.inverse() )
+            self.assertIs( A.inverse().inverse(), A )
+            self.assertTrue( numpy.allclose( A.normal_matrix(), numpy.linalg.inv(A.matrix()[:3,:3]).T, rtol=1e-4, atol=1e-4 ) )
+        self.assertEqual( Transform().kind, IDENTITY )
+
+    def test_inplace( self ):
+        for i in range(100):
+            p = numpy.random.randn(9)
+            deg = numpy.random.uniform(-180,180)
+            E = Transform().scale( 2.0, 3.0, 4.0 ).rotate( deg, *p[:3] ).translate( *p[3:6] ).lookat( *p ).perspective( 45.0, 1.5, 0.1, 100.0 ).translate( *p[:3] )
+            T = Transform()
+            inv = T.inverse()
+            T.scale_( 2.0, 3.0, 4.0 ).rotate_( deg, *p[:3] ).translate_( *p[3:6] ).lookat_( *p ).perspective_( 45.0, 1.5, 0.1, 100.0 ).translate_( *p[:3] )
+            self.assertTrue( numpy.allclose( T.matrix(), E.matrix(), rtol=1e-4, atol=1e-4 ) )
+            self.assertEqual( T.kind, E.kind )
+            self.assertIsNot( T.inverse(), inv )
+            self.assertIsNone( inv._Transform__inverse )
+
+            A = Transform().rotate( deg, *p[:3] )
+            B = Transform().translate( *p[3:6] )
+            self.assertTrue( numpy.allclose( Transform(A).mul_( B ).matrix(), (A*B).matrix() ) )
+            self.assertEqual( T.identity_().kind, IDENTITY )
+            self.assertTrue( numpy.allclose( T.set_( A ).matrix(), A.matrix() ) )
+
+        view = T.matrix( copy=False )
+        self.assertFalse( view.flags.writeable )
+        T.translate_( 1.0, 0.0, 0.0 )
+        self.assertTrue( numpy.allclose( view, T.matrix() ) )
+
+    def test_float64( self ):
+        p = numpy.random.randn(9)
+        for build in ( lambda T: T.rotate( 30.0, 0.0, 1.0, 0.0 ),
+                       lambda T: T.translate( *p[:3] ).scale( 2.0, 3.0, 4.0 ),
+                       lambda T: T.lookat( *p ),
+                       lambda T: T.perspective( 45.0, 1.5, 0.1, 100.0 ).translate( *p[:3] ),
+                       lambda T: T.frustum( -1.0, 1.0, -1.0, 1.0, 1.0, 10.0 ),
+                       lambda T: T.ortho( -1.0, 1.0, -1.0, 1.0, 1.0, 10.0 ),
+                       lambda T: Transform( T ).mul_( Transform().rotate( 10.0, 1.0, 0.0, 0.0 ) ) ):
+            T = build( Transform( numpy.eye( 4 ) ) )
+            E = build( Transform() )
+            self.assertEqual( T.matrix().dtype, numpy.float64 )
+            self.assertTrue( numpy.allclose( T.matrix(), E.matrix(), rtol=1e-4, atol=1e-4 ) )
+            self.assertEqual( T.kind, E.kind )
+        # a float32 transform multiplied by a float64 one stays float32
+        T = Transform().mul_( Transform( numpy.eye( 4 ) ).translate( 1.0, 2.0, 3.0 ) )
+        self.assertEqual( T.matrix().dtype, numpy.float32 )
+        self.assertTrue( numpy.allclose( T.matrix()[:3,3], [1.0,2.0,3.0] ) )
+
+    def test_assign_matrix( self ):
+        T = Transform().translate( 1.0, 2.0, 3.0 )
+        inv = T.inverse()
+        A = Transform().rotate( 30.0, 0.0, 1.0, 0.0 ).scale( 2.0, 1.0, 1.0 )
+        T.M = A.matrix()
+        self.assertEqual( T.kind, AFFINE )
+        self.assertIsNot( T.inverse(), inv )
+        self.assertIsNone( inv._Transform__inverse )
+        self.assertTrue( numpy.allclose( T.inverse().matrix(), numpy.linalg.inv( A.matrix() ), rtol=1e-4, atol=1e-4 ) )
+
+    def test_apply( self ):
+        p = numpy.random.randn(9)
+        P = numpy.random.randn(1000,3).astype(numpy.float32)
+        transforms = [ Transform(), Transform().translate( *p[:3] ), Transform().lookat( *p ),
+                       Transform().scale( 1.0, 2.0, 3.0 ).rotate( 30.0, *p[:3] ),
+                       Transform().lookat( *p ).perspective( 45.0, 1.5, 0.1, 100.0 ) ]
+        for T in transforms:
+            M = T.matrix()
+            H = numpy.column_stack( (P, numpy.ones(len(P))) ) @ M.T
+            expected = H[:,:3]/H[:,3:]
+            self.assertTrue( numpy.allclose( T.apply_points( P ), expected, rtol=1e-4, atol=1e-4 ) )
+            self.assertTrue( numpy.allclose( T.apply_points( P, chunk_size=64, workers=4 ), expected, rtol=1e-4, atol=1e-4 ) )
+            self.assertTrue( numpy.allclose( T*P.T, expected.T, rtol=1e-4, atol=1e-4 ) )
+            self.assertTrue( numpy.allclose( T.apply_vectors( P ), P @ M[:3,:3].T, rtol=1e-4, atol=1e-4 ) )
+            out = P.copy()
+            self.assertIs( T.apply_points( out, out=out, chunk_size=100 ), out )
+            self.assertTrue( numpy.allclose( out, expected, rtol=1e-4, atol=1e-4 ) )
+            self.assertTrue( numpy.allclose( T.apply_points( P[0] ), expected[0], rtol=1e-4, atol=1e-4 ) )
+
     def test_translate(self):
         t = [1.0, 2.0, 3.0]
         glMatrixMode(GL_MODELVIEW)
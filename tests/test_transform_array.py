@@ -0,0 +1,51 @@
+import unittest
+
+import numpy
+
+from graphics.core import Transform, TransformArray
+
+class TestTransformArray(unittest.TestCase):
+
+    def setUp( self ):
+        rng = numpy.random.default_rng( 7 )
+        self.n    = 20
+        self.pos  = rng.normal( size=(self.n,3) )
+        self.deg  = rng.uniform( -180, 180, self.n )
+        self.axis = rng.normal( size=(self.n,3) )
+        self.scl  = rng.uniform( 0.5, 2.0, (self.n,3) )
+
+    def test_builders( self ):
+        p, a, s = self.pos.T, self.axis.T, self.scl.T
+        T = TransformArray( self.n ).scale( *s ).rotate( self.deg, *a ).translate( *p ).lookat( 1, 2, 3, *p, 0, 1, 0 )
+        for i in range(self.n):
+            E = Transform().scale( *self.scl[i] ).rotate( self.deg[i], *self.axis[i] ).translate( *self.pos[i] ).lookat( 1, 2, 3, *self.pos[i], 0, 1, 0 )
+            self.assertTrue( numpy.allclose( T[i].matrix(), E.matrix(), atol=1e-5 ) )
+
+    def test_compose_inverse( self ):
+        A = TransformArray( self.n ).rotate( self.deg, *self.axis.T ).translate( *self.pos.T )
+        C = Transform().perspective( 45.0, 1.5, 0.1, 100.0 )
+        for i, M in enumerate( (C*A).matrices() ):
+            self.assertTrue( numpy.allclose( M, (C*A[i]).matrix(), atol=1e-5 ) )
+        I = (A*A.inverse()).matrices()
+        self.assertTrue( numpy.allclose( I, numpy.eye(4)[None], atol=1e-5 ) )
+
+    def test_apply( self ):
+        A = TransformArray( self.n ).scale( *self.scl.T ).rotate( self.deg, *self.axis.T ).translate( *self.pos.T )
+        P = numpy.random.default_rng( 8 ).normal( size=(self.n,5,3) )
+        R = A.apply_points( P )
+        V = A.apply_vectors( P[:,0] )
+        for i in range(self.n):
+            M = A[i].matrix()
+            self.assertTrue( numpy.allclose( R[i], P[i] @ M[:3,:3].T + M[:3,3], atol=1e-5 ) )
+            self.assertTrue( numpy.allclose( V[i], M[:3,:3] @ P[i,0], atol=1e-5 ) )
+        self.assertTrue( numpy.allclose( A.apply_points( P[:,0] ), R[:,0] ) )
+
+    def test_column_major( self ):
+        A = TransformArray( self.n ).translate( *self.pos.T )
+        out = numpy.zeros( (self.n,16), dtype=numpy.float32 )
+        data = A.column_major( out=out )
+        self.assertIs( data, out )
+        self.assertTrue( numpy.allclose( data[:,12:15], self.pos ) )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+import numpy
+
+from graphics.opengl.uniform_buffer import UniformBuffer, std140_layout, binding_point
+
+class TestUniformBuffer(unittest.TestCase):
+
+    def test_std140_offsets( self ):
+        members, size = std140_layout([
+            ('a', 'float'),
+            ('b', 'vec3'),
+            ('c', 'float'),
+            ('d', 'mat3'),
+            ('e', 'vec2'),
+            ('f', 'float', 3),
+            ('g', 'mat4')
+        ])
+        offsets = { k: v[0] for k, v in members.items() }
+        self.assertEqual( offsets, {'a': 0, 'b': 16, 'c': 28, 'd': 32, 'e': 80, 'f': 96, 'g': 144} )
+        self.assertEqual( size, 208 )
+
+    def test_pack_matrix( self ):
+        ubo = UniformBuffer( 'TestPackMatrix', [('v','vec3'),('m','mat3')] )
+        M = numpy.arange(9, dtype=numpy.float32).reshape(3,3)
+        ubo['m'] = M
+        data = numpy.frombuffer( ubo.data(), dtype=numpy.float32 )
+        # columns are padded to vec4 and stored column-major
+        self.assertTrue( numpy.array_equal( data[4:7],  M[:,0] ) )
+        self.assertTrue( numpy.array_equal( data[8:11], M[:,1] ) )
+        self.assertTrue( numpy.array_equal( data[12:15], M[:,2] ) )
+        self.assertTrue( numpy.array_equal( ubo['m'], M ) )
+
+    def test_dirty_ranges( self ):
+        ubo = UniformBuffer( 'TestDirty', [('a','mat4'),('b','mat4'),('c','vec4'),('d','vec4')] )
+        self.assertEqual( ubo.dirty_ranges(), [] )
+
+        ubo['d'] = (1,2,3,4)
+        self.assertEqual( ubo.dirty_ranges(), [(144,160)] )
+
+        # writing unchanged values does not dirty anything
+        ubo['d'] = (1,2,3,4)
+        ubo['c'] = (0,0,0,0)
+        self.assertEqual( ubo.dirty_ranges(), [(144,160)] )
+
+        ubo['a'] = numpy.eye(4)
+        ubo['b'] = 2.0*numpy.eye(4)
+        self.assertEqual( ubo.dirty_ranges(), [(0,128),(144,160)] )
+
+    def test_binding_points( self ):
+        a = UniformBuffer( 'TestBindingA', [('x','float')] )
+        b = UniformBuffer( 'TestBindingA', [('x','float')] )
+        c = UniformBuffer( 'TestBindingB', [('x','float')] )
+        self.assertEqual( a.binding, b.binding )
+        self.assertNotEqual( a.binding, c.binding )
+        self.assertEqual( binding_point('TestBindingB'), c.binding )
+
+if __name__ == '__main__':
+    unittest.main()
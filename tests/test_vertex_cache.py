@@ -0,0 +1,108 @@
+import unittest
+
+import numpy
+
+from graphics.geometry import Mesh, cube
+from graphics.geometry.vertex_cache import (cache_misses, cache_stats, mesh_indices, optimize_indices,
+                                            optimize_mesh, optimize_overdraw, tipsify)
+
+def grid_indices( n ):
+    q = (numpy.arange( n )[:,None]*(n+1) + numpy.arange( n )).ravel()
+    tri = numpy.concatenate( (numpy.stack( (q, q+1, q+n+2), axis=1 ), numpy.stack( (q, q+n+2, q+n+1), axis=1 )), axis=1 )
+    u, v = numpy.meshgrid( numpy.linspace( 0.0, 1.0, n+1 ), numpy.linspace( 0.0, 1.0, n+1 ), indexing='ij' )
+    positions = numpy.stack( (u, 0.2*numpy.sin( 6.0*u )*numpy.cos( 6.0*v ), v), axis=-1 ).reshape(-1,3)
+    return tri.reshape(-1,3), positions
+
+def grid_mesh( n ):
+    tri, positions = grid_indices( n )
+    mesh = Mesh()
+    for p in positions.tolist():
+        mesh.add_vertex( p )
+    mesh.add_texcoord( (0.0,0.0) )
+    mesh.add_material( 'a' )
+    mesh.add_material( 'b' )
+    for i, t in enumerate( tri.tolist() ):
+        mesh.add_face( t, [0,0,0], i % 2 )
+    mesh.finalize()
+    return mesh
+
+def triangle_set( indices ):
+    return sorted( map( tuple, numpy.sort( numpy.asarray( indices ), axis=1 ).tolist() ) )
+
+class TestVertexCache(unittest.TestCase):
+
+    def test_cache_misses( self ):
+        self.assertEqual( cache_misses( [[0,1,2],[0,2,3]], cache_size=3 ).tolist(), [3,1] )
+        # FIFO: 0 was inserted first and is evicted by 3 even though it was
+        # used since, reinserting 0 then evicts 1
+        self.assertEqual( cache_misses( [[0,1,2],[0,2,3],[3,0,1]], cache_size=3 ).tolist(), [3,1,2] )
+        acmr, atvr = cache_stats( [[0,1,2],[0,2,3]], cache_size=3 )
+        self.assertEqual( (acmr, atvr), (2.0, 1.0) )
+
+    def test_tipsify( self ):
+        tri, positions = grid_indices( 40 )
+        shuffled = tri[numpy.random.default_rng( 1 ).permutation( tri.shape[0] )]
+        order, starts = tipsify( shuffled, positions.shape[0], cache_size=16 )
+        self.assertTrue( numpy.array_equal( numpy.sort( order ), numpy.arange( tri.shape[0] ) ) )
+        self.assertEqual( starts[0], 0 )
+        self.assertLess( cache_stats( shuffled[order] )[0], 0.75 )
+        self.assertGreater( cache_stats( shuffled )[0], 2.5 )
+
+    def test_regions( self ):
+        # large enough to be ordered by regions side by side
+        tri, positions = grid_indices( 260 )
+        shuffled = tri[numpy.random.default_rng( 1 ).permutation( tri.shape[0] )]
+        order, starts = tipsify( shuffled, positions.shape[0] )
+        self.assertTrue( numpy.array_equal( numpy.sort( order ), numpy.arange( tri.shape[0] ) ) )
+        self.assertEqual( starts[0], 0 )
+        self.assertTrue( numpy.all( numpy.diff( starts ) > 0 ) )
+        acmr = cache_stats( shuffled[order] )[0]
+        self.assertLess( acmr, 0.75 )
+        result = optimize_overdraw( shuffled, positions, order, starts )
+        self.assertTrue( numpy.array_equal( numpy.sort( result ), numpy.arange( tri.shape[0] ) ) )
+        self.assertLessEqual( cache_stats( shuffled[result] )[0], 1.15*acmr )
+
+    def test_overdraw( self ):
+        tri, positions = grid_indices( 40 )
+        order, starts = tipsify( tri, positions.shape[0] )
+        acmr = cache_stats( tri[order] )[0]
+        result = optimize_overdraw( tri, positions, order, starts, threshold=1.05 )
+        self.assertTrue( numpy.array_equal( numpy.sort( result ), numpy.arange( tri.shape[0] ) ) )
+        # only the last cluster before each Tipsify jump may exceed the threshold
+        self.assertLessEqual( cache_stats( tri[result] )[0], 1.15*acmr )
+
+        with self.assertRaises( ValueError ):
+            optimize_indices( tri, overdraw=True )
+
+    def test_optimize_indices( self ):
+        tri, positions = grid_indices( 30 )
+        ranges = [ (0, 700), (700, tri.shape[0]) ]
+        indices, vertices, stats = optimize_indices( tri, positions, ranges, overdraw=True, stats=True )
+        self.assertEqual( indices.dtype, numpy.uint32 )
+        self.assertLess( stats['acmr_after'], stats['acmr_before'] )
+        self.assertGreaterEqual( stats['atvr_after'], 1.0 )
+        # triangles stay within their range, vertices are in order of first use
+        for start, end in ranges:
+            self.assertEqual( triangle_set( vertices[indices[start:end]] ), triangle_set( tri[start:end] ) )
+        first = numpy.unique( indices.ravel(), return_index=True )[1]
+        self.assertTrue( numpy.all( numpy.diff( first ) > 0 ) )
+        # the cache is only simulated on request
+        self.assertIsNone( optimize_indices( tri, positions, ranges )[2] )
+
+    def test_mesh( self ):
+        mesh, materials = cube()
+        rows, indices = mesh_indices( mesh )
+        self.assertLess( rows.size, mesh.vertices.shape[0] )
+        self.assertTrue( numpy.array_equal( mesh.vertices[rows][indices].reshape(-1,3), mesh.vertices ) )
+
+        mesh = grid_mesh( 20 )
+        rows, indices, stats = optimize_mesh( mesh, stats=True )
+        self.assertLess( stats['acmr_after'], stats['acmr_before'] )
+        P = mesh.vertices.reshape(-1,3,3)
+        for name, (start, end) in mesh.material_triangles.items():
+            got = mesh.vertices[rows][indices[start:end]]
+            key = lambda A: sorted( tuple( sorted( map( tuple, t ) ) ) for t in A.tolist() )
+            self.assertEqual( key( got ), key( P[start:end] ) )
+
+if __name__ == '__main__':
+    unittest.main()